@@ -0,0 +1,77 @@
+import sys
+import os
+import time
+import zipfile
+import argparse
+import tempfile
+from pathlib import Path
+
+# 将 src 目录添加到模块搜索路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.enums import DataCategory
+from services.experiment_report import BATCH_MODE_ZIP, write_batch_report
+from services.maintenance_jobs import MaintenanceJob, RecalculateStockJob, run_partitions, set_fields
+from utils.parallel import available_cpus
+
+
+class BusyJob(MaintenanceJob):
+    """模拟单实体耗时较长的作业 (纯 CPU 计算)"""
+    name = "benchmark_busy"
+    parallel = True
+
+    @staticmethod
+    def work(entity):
+        record_id, loops = entity
+        total = 0
+        for i in range(loops):
+            total += i * i % 7
+        return [set_fields(DataCategory.RAW_MATERIALS.value, record_id, checksum=total)]
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def benchmark(entities: int, loops: int):
+    """
+    对比维护作业串行与自动选择 (按实测耗时与 CPU 数量决定是否使用进程池) 的耗时，结果须一致。
+    内置作业单实体仅需微秒，自动选择应保持串行；BusyJob 单实体耗时较长，多核时自动选择进程池并明显更快。
+    """
+    print(f"可用 CPU: {available_cpus()}")
+    print(f"{'作业':<24}{'实体数':>8}{'串行(s)':>10}{'自动(s)':>10}{'加速比':>8}")
+    stock_entities = [{"id": i, "unit": "kg", "stock": 0.0, "records": [("in", 1.0, "kg")] * 5, "now": ""}
+                      for i in range(entities)]
+    busy_entities = [(i, loops) for i in range(entities)]
+    for job_cls, items in ((RecalculateStockJob, stock_entities), (BusyJob, busy_entities)):
+        serial_t, serial = _timed(lambda: run_partitions(job_cls, items, max_workers=1))
+        auto_t, auto = _timed(lambda: run_partitions(job_cls, items))
+        assert serial == auto, f"{job_cls.__name__} 串行与并行结果不一致"
+        print(f"{job_cls.__name__:<24}{len(items):>8}{serial_t:>10.3f}{auto_t:>10.3f}{serial_t / auto_t:>8.2f}x")
+
+
+def benchmark_reports(reports: int):
+    """对比批量实验报告 (zip 模式) 串行与自动选择的耗时，压缩包内容须一致"""
+    experiments = [{"id": i, "formula_name": f"PC-{i % 5}", "test_date": "2024-03-01", "water_cement_ratio": 0.45,
+                    "test_recipes": [{"name": "基准", "performance": {"strengths": {"7d": 20.0 + i % 7, "28d": 35.0}}}]}
+                   for i in range(reports)]
+    with tempfile.TemporaryDirectory() as tmp:
+        serial_path, auto_path = Path(tmp) / "serial.zip", Path(tmp) / "auto.zip"
+        serial_t, _ = _timed(lambda: write_batch_report("mortar", experiments, serial_path, mode=BATCH_MODE_ZIP,
+                                                        max_workers=1))
+        auto_t, _ = _timed(lambda: write_batch_report("mortar", experiments, auto_path, mode=BATCH_MODE_ZIP))
+        with zipfile.ZipFile(serial_path) as a, zipfile.ZipFile(auto_path) as b:
+            assert a.namelist() == b.namelist(), "串行与并行生成的报告不一致"
+    print(f"{'批量实验报告 (zip)':<24}{reports:>8}{serial_t:>10.3f}{auto_t:>10.3f}{serial_t / auto_t:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="维护作业与批量报告进程池基准测试")
+    parser.add_argument("--entities", type=int, default=2000, help="实体数")
+    parser.add_argument("--loops", type=int, default=200000, help="BusyJob 单实体计算量")
+    parser.add_argument("--reports", type=int, default=400, help="批量报告数")
+    args = parser.parse_args()
+    benchmark(args.entities, args.loops)
+    benchmark_reports(args.reports)
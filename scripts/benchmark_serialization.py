@@ -0,0 +1,54 @@
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+
+# 将 src 目录添加到模块搜索路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config import DATA_FILE
+from utils.data_codec import DATA_FORMATS, FORMAT_ZSTD, encode_data, decode_data, read_data_file, orjson, zstandard
+
+
+def _timed(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def benchmark(path, repeat: int = 5):
+    """
+    对比各数据文件格式的保存/读取耗时与文件大小 (内存中编码解码，不改动数据文件)。
+    基准行为原实现：json.dump(indent=4, ensure_ascii=False) / json.load。
+    """
+    data = read_data_file(path)
+    print(f"数据文件: {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+    print(f"orjson: {'可用' if orjson else '未安装'}；zstandard: {'可用' if zstandard else '未安装 (zstd 退回 gzip)'}")
+    print(f"{'格式':<16}{'保存(ms)':>10}{'读取(ms)':>10}{'大小(KB)':>12}{'压缩比':>8}")
+
+    save_t, baseline = _timed(lambda: json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8"), repeat)
+    load_t, _ = _timed(lambda: json.loads(baseline.decode("utf-8")), repeat)
+    rows = [("json indent=4", save_t, load_t, len(baseline))]
+    for fmt in DATA_FORMATS:
+        if fmt == FORMAT_ZSTD and zstandard is None:
+            continue
+        save_t, raw = _timed(lambda: encode_data(data, fmt), repeat)
+        load_t, decoded = _timed(lambda: decode_data(raw), repeat)
+        assert decoded == json.loads(baseline.decode("utf-8")), f"{fmt} 往返结果不一致"
+        rows.append((fmt, save_t, load_t, len(raw)))
+    for name, save_t, load_t, size in rows:
+        print(f"{name:<16}{save_t * 1000:>10.2f}{load_t * 1000:>10.2f}{size / 1024:>12.1f}{len(baseline) / size:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据文件序列化格式基准测试")
+    parser.add_argument("--file", default=str(DATA_FILE), help="数据文件路径 (默认 data/data.json)")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数 (取中位数)")
+    args = parser.parse_args()
+    benchmark(args.file, args.repeat)
@@ -0,0 +1,55 @@
+import sys
+import os
+import argparse
+import logging
+
+# 将 src 目录添加到模块搜索路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from services.data_service import DataService
+from services.integrity_service import CHECKS, SEVERITY_ERROR, IntegrityService, report_to_json
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def print_report(report):
+    logger.info("=" * 60)
+    logger.info(f"数据完整性检查 ({report['generated_at']}，耗时 {report['duration_ms']} ms)")
+    logger.info("=" * 60)
+    for name, result in report["checks"].items():
+        status = "✅" if not result["issues"] else ("❌" if result["errors"] else "⚠️")
+        logger.info(f"\n{status} {result['title']} [{name}]: {result['issues']} 项")
+        for issue in report["issues"]:
+            if issue["check"] == name:
+                level = "错误" if issue["severity"] == SEVERITY_ERROR else "警告"
+                logger.info(f"    - [{level}] {issue['collection']}#{issue['record_id']}: {issue['message']}")
+    summary = report["summary"]
+    logger.info("\n" + "=" * 60)
+    logger.info(f"共 {summary['total']} 项 (错误 {summary[SEVERITY_ERROR]}，警告 {summary['warning']})")
+
+
+def main(checks=None, argv=None):
+    """
+    运行数据完整性检查。
+    退出码：无错误为 0，发现错误为 1 (仅有警告时为 0)。
+    """
+    parser = argparse.ArgumentParser(description="数据完整性检查")
+    parser.add_argument("--check", action="append", choices=list(CHECKS), help="只运行指定检查项 (可重复)")
+    parser.add_argument("--json", metavar="PATH", help="将检查报告写入 JSON 文件 ('-' 输出到标准输出)")
+    args = parser.parse_args(argv)
+
+    report = IntegrityService(DataService()).run(args.check or checks)
+    if args.json == "-":
+        print(report_to_json(report))
+    else:
+        print_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                f.write(report_to_json(report))
+            logger.info(f"报告已写入: {args.json}")
+    return 1 if report["summary"][SEVERITY_ERROR] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import sys
+import os
+import argparse
+import logging
+
+# 将 src 目录添加到模块搜索路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from services.data_service import DataService
+from services.maintenance_jobs import JOBS, MaintenanceJobRunner
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+DIFF_PREVIEW_LIMIT = 50
+
+
+def print_plan(plan):
+    logger.info(f"{plan['title']} [{plan['job']}]: 检查 {plan['entities']} 项，耗时 {plan['duration_ms']} ms")
+    for d in plan["diff"][:DIFF_PREVIEW_LIMIT]:
+        if d["op"] == "set":
+            logger.info(f"    {d['collection']}#{d['id']}.{d['field']}: {d['old']!r} -> {d['new']!r}")
+        else:
+            logger.info(f"    {d['op']} {d['collection']}#{d['id']}")
+    if len(plan["diff"]) > DIFF_PREVIEW_LIMIT:
+        logger.info(f"    ... 共 {len(plan['diff'])} 项变更")
+    for conflict in plan["conflicts"]:
+        logger.error(f"    冲突: {conflict}")
+
+
+def main(job=None, argv=None, run=None):
+    """
+    运行维护作业 (默认预演，只输出差异)。
+    退出码：成功为 0，冲突或保存失败为 1。
+    """
+    parser = argparse.ArgumentParser(description="数据维护作业")
+    if job is None:
+        parser.add_argument("job", choices=list(JOBS), help="作业名称")
+    parser.add_argument("--run", action="store_true", help="正式执行并保存 (默认仅预演)")
+    parser.add_argument("--workers", type=int, help="并行进程数上限 (1 为串行；默认按 CPU 数量与实测耗时自动选择)")
+    args = parser.parse_args(argv)
+    job = job or args.job
+    run = args.run if run is None else run
+
+    runner = MaintenanceJobRunner(DataService())
+    if not run:
+        plan = runner.plan(job, max_workers=args.workers)
+        print_plan(plan)
+        logger.info("\n注意：当前为预览模式，未对数据库进行实际修改。")
+        return 1 if plan["conflicts"] else 0
+    ok, message = runner.run(job, max_workers=args.workers)
+    (logger.info if ok else logger.error)(message)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Export Job Panel Component
+显示后台导出任务的进度，完成后提供文件下载。
+"""
+
+import streamlit as st
+from pathlib import Path
+from typing import Optional
+from services.export_jobs import ExportJobService, JOB_STATUS_LABELS
+from services.export_service import EXCEL_MIME, ZIP_MIME
+
+
+def render_export_job(job_service: ExportJobService, state_key: str, file_name: Optional[str] = None):
+    """
+    渲染 session_state[state_key] 中记录的导出任务
+    Args:
+        file_name: 下载文件名，默认使用任务生成的文件名
+    """
+    job_id = st.session_state.get(state_key)
+    job = job_service.get_job(job_id) if job_id else None
+    if not job:
+        return
+
+    status = job["status"]
+    if status in ("pending", "running"):
+        st.progress(job["progress"], text=f"{JOB_STATUS_LABELS[status]} {job['message']}".strip())
+        if st.button("🔄 刷新状态", key=f"{state_key}_refresh"):
+            st.rerun()
+    elif status == "failed":
+        st.error(job["message"])
+    elif job.get("path") and Path(job["path"]).exists():
+        if job["message"]:
+            st.caption(job["message"])
+        is_zip = job["path"].endswith(".zip")
+        with open(job["path"], "rb") as f:
+            st.download_button("📥 下载压缩包" if is_zip else "📥 下载 Excel 文件", f,
+                               file_name=file_name or job["file_name"], mime=ZIP_MIME if is_zip else EXCEL_MIME,
+                               key=f"{state_key}_download")
+    else:
+        st.warning("导出文件已过期，请重新导出")
@@ -1,5 +1,7 @@
 import streamlit as st
 import uuid
+from services.experiment_schema import parse_flow_minutes
+from services.trend_service import label_retention
 
 class PasteFluidityWidget:
     """
@@ -50,13 +52,6 @@ class PasteFluidityWidget:
         # 清空现有动态行
         st.session_state[self.dynamic_rows_key] = []
         
-        # 预定义排序顺序，以便加载时按逻辑顺序排列
-        order_map = {
-            "初始": 0, "Initial": 0, "initial": 0, 
-            "10min": 1, "30min": 2, "60min": 3, "1h": 3, 
-            "90min": 4, "1.5h": 4, "120min": 5, "2h": 5
-        }
-        
         # 筛选出非 initial 的键
         time_points = []
         for key, value in defaults.items():
@@ -83,13 +78,38 @@ class PasteFluidityWidget:
                 
             time_points.append({"label": label, "value": value})
             
-        # 排序
-        time_points.sort(key=lambda x: order_map.get(x["label"], 999))
+        # 按时间点分钟数排序 (无法解析的标签排在最后)
+        time_points.sort(key=lambda x: self._minutes_sort_key(x["label"]))
         
         # 添加到状态
         for pt in time_points:
             self.add_row(label=pt["label"], value=0.0, std_value=pt["value"])
             
+    @staticmethod
+    def _minutes_sort_key(label):
+        minutes = parse_flow_minutes(label)
+        return float("inf") if minutes != minutes else minutes
+
+    def get_retention(self, use_std=False):
+        """
+        当前录入的流动度保持率
+        Returns:
+            [(时间点标签, 分钟数, 保持率%)]，按分钟数排序，以最早的时间点为基准
+        """
+        field = "std_value" if use_std else "value"
+        points = {}
+        for row in st.session_state.get(self.dynamic_rows_key, []):
+            label = (row.get("time_label") or "").strip()
+            minutes = parse_flow_minutes(label)
+            try:
+                value = float(row.get(field, 0.0) or 0.0)
+            except (ValueError, TypeError):
+                continue
+            if label and minutes == minutes:
+                points[minutes] = (label, value)
+        retention = label_retention([(m, v) for m, (_, v) in points.items()])
+        return [(points[m][0], m, r) for m, r in sorted(retention.items())]
+
     def add_row(self, label="", value=0.0, std_value=0.0):
         st.session_state[self.dynamic_rows_key].append({
             "id": str(uuid.uuid4()),
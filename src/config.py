@@ -9,12 +9,19 @@ ROOT_DIR = APP_DIR.parent
 
 # Data paths
 DATA_FILE = ROOT_DIR / "data" / "data.json"
+# 主数据文件格式: pretty (缩进 JSON) / compact / gzip / zstd；读取时自动识别，切换格式无需迁移。
+# 压缩格式下 scripts/ 中直接 json.load 数据文件的维护脚本将无法读取
+DATA_FILE_FORMAT = "pretty"
 BACKUP_DIR = ROOT_DIR / "data" / "backups"
 TEMP_DIR = ROOT_DIR / "data" / "temp"
+ARCHIVE_DIR = ROOT_DIR / "data" / "archive"
+# 台账增量重建的水位线与检查点
+LEDGER_STATE_FILE = ROOT_DIR / "data" / "ledger_state.json"
 
 # Ensure directories exist
 BACKUP_DIR.mkdir(parents=True, exist_ok=True)
 TEMP_DIR.mkdir(parents=True, exist_ok=True)
+ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
 
 # Application Settings
 APP_NAME = "聚羧酸减水剂研发管理系统"
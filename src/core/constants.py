@@ -10,6 +10,8 @@ DEFAULT_UNIT_KG = "kg"
 DEFAULT_UNIT_TON = "吨"
 DEFAULT_BOM_PLAN_QTY = 1000.0  # BOM计算默认基准数量
 BACKUP_INTERVAL_SECONDS = 3600 # 自动备份间隔
+ARCHIVE_INTERVAL_SECONDS = 7 * 24 * 3600 # Parquet 归档间隔
+ARCHIVE_RETRY_SECONDS = 600 # 归档失败后首次重试间隔 (连续失败时翻倍，最长为归档间隔)
 
 # 特殊物料列表
 # 这些物料通常不参与库存严格校验或有特殊逻辑
@@ -13,8 +13,6 @@ import hashlib
 import os
 import secrets
 from openpyxl import Workbook
-from openpyxl.chart import LineChart, BarChart, Reference
-from openpyxl.styles import Font, Alignment
 
 from .timeline_manager import TimelineManager
 from .models import (
@@ -28,11 +26,12 @@ from .enums import (
     StockMovementType, BOMStatus, ProductionOrderStatus, IssueStatus, ProductCategory, UnitType, PriorityType, MaterialType, DataCategory,
     ReceiptStatus, ShippingStatus, PermissionAction
 )
-from config import DATA_FILE, BACKUP_DIR, DEFAULT_UNIT
+from config import DATA_FILE, BACKUP_DIR, DEFAULT_UNIT, DATA_FILE_FORMAT
 from .constants import DATE_FORMAT, DATETIME_FORMAT, BACKUP_INTERVAL_SECONDS, DEFAULT_OPERATOR_NAME, DEFAULT_UNIT_KG, WATER_MATERIAL_ALIASES, PRODUCT_NAME_WJSNJ, PRODUCT_NAME_YJSNJ, DEFAULT_BOM_PLAN_QTY
 from utils.logger import logger
 from utils.unit_helper import convert_quantity, normalize_unit
 from utils.file_lock import file_lock
+from utils.data_codec import encode_data, read_data_file, read_json_text
 
 class DataManager:
     """统一数据管理器"""
@@ -58,8 +57,7 @@ class DataManager:
         try:
             # 尝试加载数据，验证文件是否有效
             if self.data_file.exists():
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = read_data_file(self.data_file)
                 # 检查数据结构
                 if not isinstance(data, dict):
                     raise ValueError("数据格式不正确")
@@ -120,8 +118,7 @@ class DataManager:
             if self._data_cache is not None:
                 return self._ensure_data_structure(self._data_cache)
             if self.data_file.exists():
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = read_data_file(self.data_file)
                 data = self._ensure_data_structure(data)
                 self._data_cache = data
                 return data
@@ -134,8 +131,8 @@ class DataManager:
             self._data_cache = initial
             return initial
     
-    def save_data(self, data):
-        """保存数据到JSON文件，并创建备份"""
+    def save_data(self, data, changed=None):
+        """保存数据到JSON文件，并创建备份 (changed 与 DataService 接口一致，此处不区分集合)"""
         try:
             self.data_file.parent.mkdir(parents=True, exist_ok=True)
             
@@ -147,8 +144,8 @@ class DataManager:
                 # 2. 原子写入 (Write to temp -> Flush -> Rename)
                 temp_file = self.data_file.with_suffix('.tmp')
                 
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
+                with open(temp_file, 'wb') as f:
+                    f.write(encode_data(data, DATA_FILE_FORMAT))
                     f.flush()
                     os.fsync(f.fileno()) # 确保数据落盘
                 
@@ -3022,93 +3019,10 @@ class DataManager:
         return False
 
     # -------------------- 数据导出/导入功能 --------------------
-    def export_to_excel(self):
-        """将所有数据导出到Excel文件"""
-        try:
-            # 创建内存中的Excel文件
-            output = BytesIO()
-            
-            # 使用pandas的ExcelWriter
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                # 获取所有数据
-                data = self.load_data()
-                
-                # 导出各个数据表
-                # 1. 项目数据
-                if data.get(DataCategory.PROJECTS.value):
-                    projects_df = pd.DataFrame(data[DataCategory.PROJECTS.value])
-                    projects_df.to_excel(writer, sheet_name='项目', index=False)
-                
-                # 2. 实验数据
-                if data.get(DataCategory.EXPERIMENTS.value):
-                    experiments_df = pd.DataFrame(data[DataCategory.EXPERIMENTS.value])
-                    experiments_df.to_excel(writer, sheet_name='实验', index=False)
-                
-                # 3. 原材料数据
-                if data.get(DataCategory.RAW_MATERIALS.value):
-                    raw_materials_df = pd.DataFrame(data[DataCategory.RAW_MATERIALS.value])
-                    raw_materials_df.to_excel(writer, sheet_name='原材料', index=False)
-                
-                # 4. 合成实验记录
-                if data.get(DataCategory.SYNTHESIS_RECORDS.value):
-                    synthesis_df = pd.DataFrame(data[DataCategory.SYNTHESIS_RECORDS.value])
-                    synthesis_df.to_excel(writer, sheet_name='合成实验', index=False)
-                
-                # 5. 成品减水剂
-                if data.get(DataCategory.PRODUCTS.value):
-                    products_df = pd.DataFrame(data[DataCategory.PRODUCTS.value])
-                    products_df.to_excel(writer, sheet_name='成品减水剂', index=False)
-                
-                # 6. 净浆实验
-                if data.get(DataCategory.PASTE_EXPERIMENTS.value):
-                    paste_df = pd.DataFrame(data[DataCategory.PASTE_EXPERIMENTS.value])
-                    paste_df.to_excel(writer, sheet_name='净浆实验', index=False)
-                
-                # 7. 砂浆实验
-                if data.get(DataCategory.MORTAR_EXPERIMENTS.value):
-                    mortar_df = pd.DataFrame(data[DataCategory.MORTAR_EXPERIMENTS.value])
-                    mortar_df.to_excel(writer, sheet_name='砂浆实验', index=False)
-                
-                # 8. 混凝土实验
-                if data.get(DataCategory.CONCRETE_EXPERIMENTS.value):
-                    concrete_df = pd.DataFrame(data[DataCategory.CONCRETE_EXPERIMENTS.value])
-                    concrete_df.to_excel(writer, sheet_name='混凝土实验', index=False)
-                
-                # 9. 性能数据
-                if data.get(DataCategory.PERFORMANCE_DATA.value):
-                    perf_data = data[DataCategory.PERFORMANCE_DATA.value]
-                    if perf_data.get("synthesis"):
-                        perf_synth_df = pd.DataFrame(perf_data["synthesis"])
-                        perf_synth_df.to_excel(writer, sheet_name='合成性能数据', index=False)
-                
-                # 10. 数据字典（说明）
-                metadata = {
-                    'Sheet名称': ['项目', '实验', '原材料', '合成实验', '成品减水剂', '净浆实验', '砂浆实验', '混凝土实验', '合成性能数据'],
-                    '描述': [
-                        '项目基本信息和管理信息',
-                        '实验计划和执行信息',
-                        '原材料库管理信息',
-                        '合成实验详细记录',
-                        '成品减水剂信息',
-                        '净浆实验测试数据',
-                        '砂浆实验测试数据',
-                        '混凝土实验测试数据',
-                        '合成性能测试数据'
-                    ]
-                }
-                metadata_df = pd.DataFrame(metadata)
-                metadata_df.to_excel(writer, sheet_name='数据字典', index=False)
-            
-            # 获取二进制数据
-            excel_data = output.getvalue()
-            b64 = base64.b64encode(excel_data).decode()
-            href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="聚羧酸减水剂研发数据_{datetime.now().strftime("%Y%m%d")}.xlsx">点击下载 Excel 文件</a>'
-            
-            return href
-        
-        except Exception as e:
-            st.error(f"导出数据失败: {e}")
-            return None
+    def export_to_excel(self) -> Tuple[bool, str]:
+        """将所有数据 (含 SAP 台账) 导出到临时 Excel 文件，返回 (成功与否, 文件路径或错误信息)"""
+        from services.export_service import ExportService
+        return ExportService(self).export_to_excel()
 
     def export_experiment_report(self, experiment_type, experiment_id, strength_y_max=None, strength_chart_type="line"):
         try:
@@ -3152,388 +3066,22 @@ class DataManager:
             return None
 
     def _fill_mortar_report_sheet(self, ws, experiment, strength_y_max=None, strength_chart_type="line"):
-        title_font = Font(size=16, bold=True)
-        header_font = Font(bold=True)
-        center_align = Alignment(horizontal="center", vertical="center")
-        row = 1
-        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=8)
-        cell = ws.cell(row=row, column=1, value="混凝土外加剂匀质性试验报告（砂浆）")
-        cell.font = title_font
-        cell.alignment = center_align
-        row += 1
-        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=8)
-        std_cell = ws.cell(row=row, column=1, value="执行标准：GB/T 8077-2023，产品标准：GB/T 8076-2025")
-        std_cell.alignment = center_align
-        row += 2
-        headers = ["实验ID", "关联配方/外加剂名称", "试验日期", "试验人员", "水灰比", "外加剂掺量(%)", "砂含水率(%)", "备注"]
-        values = [
-            experiment.get("id"),
-            experiment.get("formula_name"),
-            experiment.get("test_date"),
-            experiment.get("operator"),
-            experiment.get("water_cement_ratio"),
-            experiment.get("admixture_dosage"),
-            experiment.get("sand_moisture"),
-            experiment.get("notes"),
-        ]
-        for col, h in enumerate(headers, start=1):
-            cell = ws.cell(row=row, column=col, value=h)
-            cell.font = header_font
-            cell.alignment = center_align
-        row += 1
-        for col, v in enumerate(values, start=1):
-            ws.cell(row=row, column=col, value=v)
-        row += 2
-        binders = ((experiment.get("materials") or {}).get("binders") or [])
-        aggregates = ((experiment.get("materials") or {}).get("aggregates") or [])
-        ws.cell(row=row, column=1, value="材料类型").font = header_font
-        ws.cell(row=row, column=2, value="材料名称").font = header_font
-        ws.cell(row=row, column=3, value="用量(g)").font = header_font
-        ws.cell(row=row, column=4, value="备注").font = header_font
-        row += 1
-        for item in binders:
-            ws.cell(row=row, column=1, value="胶凝材料")
-            ws.cell(row=row, column=2, value=item.get("name"))
-            ws.cell(row=row, column=3, value=item.get("dosage"))
-            row += 1
-        for item in aggregates:
-            ws.cell(row=row, column=1, value="细骨料")
-            ws.cell(row=row, column=2, value=item.get("name"))
-            ws.cell(row=row, column=3, value=item.get("dosage"))
-            row += 1
-        row += 2
-        recipes = experiment.get("test_recipes") or []
-        def age_sort_key(age):
-            s = str(age)
-            digits = "".join(ch for ch in s if ch.isdigit())
-            if digits:
-                try:
-                    return int(digits)
-                except Exception:
-                    return 0
-            return 0
-        ages_set = set()
-        for r in recipes:
-            perf = r.get("performance") or {}
-            cs = perf.get("compressive_strengths") or {}
-            for k in cs.keys():
-                ages_set.add(k)
-        ages = sorted(list(ages_set), key=age_sort_key)
-        if ages and recipes:
-            ws.cell(row=row, column=1, value="龄期").font = header_font
-            col_offset = 2
-            for idx, r in enumerate(recipes):
-                name = r.get("name") or f"配方{idx + 1}"
-                ws.cell(row=row, column=col_offset + idx, value=name).font = header_font
-            start_data_row = row + 1
-            for r_idx, age in enumerate(ages):
-                ws.cell(row=start_data_row + r_idx, column=1, value=str(age))
-                for c_idx, r in enumerate(recipes):
-                    perf = r.get("performance") or {}
-                    cs = perf.get("compressive_strengths") or {}
-                    val = cs.get(age)
-                    if val is not None:
-                        ws.cell(row=start_data_row + r_idx, column=col_offset + c_idx, value=float(val))
-            if strength_chart_type == "bar":
-                chart = BarChart()
-            else:
-                chart = LineChart()
-            chart.title = "砂浆抗压强度发展曲线"
-            chart.y_axis.title = "抗压强度(MPa)"
-            chart.x_axis.title = "龄期"
-            if strength_y_max and strength_y_max > 0:
-                chart.y_axis.scaling.max = float(strength_y_max)
-            data_ref = Reference(ws, min_col=2, max_col=1 + len(recipes), min_row=row, max_row=start_data_row + len(ages) - 1)
-            chart.add_data(data_ref, titles_from_data=True)
-            cats_ref = Reference(ws, min_col=1, min_row=start_data_row, max_row=start_data_row + len(ages) - 1)
-            chart.set_categories(cats_ref)
-            chart.legend.title = "配方"
-            chart_row = start_data_row + len(ages) + 2
-            ws.add_chart(chart, f"A{chart_row}")
-            ratio_header_row = chart_row + 15
-        else:
-            ratio_header_row = row + 2
-        ws.cell(row=ratio_header_row, column=1, value="指标").font = header_font
-        ws.cell(row=ratio_header_row, column=2, value="数值").font = header_font
-        ratio_data = [
-            ("水灰比", experiment.get("water_cement_ratio")),
-            ("外加剂掺量(%)", experiment.get("admixture_dosage")),
-            ("砂含水率(%)", experiment.get("sand_moisture")),
-        ]
-        for idx, (name, val) in enumerate(ratio_data, start=1):
-            ws.cell(row=ratio_header_row + idx, column=1, value=name)
-            ws.cell(row=ratio_header_row + idx, column=2, value=val)
-        bar = BarChart()
-        bar.title = "砂浆配合比关键参数"
-        bar.y_axis.title = "数值"
-        bar.x_axis.title = "参数"
-        data_ref = Reference(ws, min_col=2, min_row=ratio_header_row, max_row=ratio_header_row + len(ratio_data))
-        bar.add_data(data_ref, titles_from_data=True)
-        cats_ref = Reference(ws, min_col=1, min_row=ratio_header_row + 1, max_row=ratio_header_row + len(ratio_data))
-        bar.set_categories(cats_ref)
-        ws.add_chart(bar, f"E{ratio_header_row}")
+        from services.experiment_report import fill_mortar_report_sheet
+        fill_mortar_report_sheet(ws, experiment, strength_y_max, strength_chart_type)
 
     def _fill_concrete_report_sheet(self, ws, experiment, strength_y_max=None, strength_chart_type="line"):
-        title_font = Font(size=16, bold=True)
-        header_font = Font(bold=True)
-        center_align = Alignment(horizontal="center", vertical="center")
-        row = 1
-        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=10)
-        cell = ws.cell(row=row, column=1, value="混凝土外加剂性能试验报告（拌和物与强度）")
-        cell.font = title_font
-        cell.alignment = center_align
-        row += 1
-        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=10)
-        std_cell = ws.cell(row=row, column=1, value="执行标准：GB/T 8076-2025，试验方法：GB/T 8077-2023 相关条款")
-        std_cell.alignment = center_align
-        row += 2
-        headers = [
-            "实验ID",
-            "关联配方",
-            "测试日期",
-            "操作人",
-            "水灰比",
-            "砂率(%)",
-            "单位用量(kg/m³)",
-            "外加剂掺量(%)",
-            "砂含水率(%)",
-            "石子含水率(%)",
-        ]
-        values = [
-            experiment.get("id"),
-            experiment.get("formula_name"),
-            experiment.get("test_date"),
-            experiment.get("operator"),
-            experiment.get("water_cement_ratio"),
-            experiment.get("sand_ratio"),
-            experiment.get("unit_weight"),
-            experiment.get("admixture_dosage"),
-            experiment.get("sand_moisture"),
-            experiment.get("stone_moisture"),
-        ]
-        for col, h in enumerate(headers, start=1):
-            cell = ws.cell(row=row, column=col, value=h)
-            cell.font = header_font
-            cell.alignment = center_align
-        row += 1
-        for col, v in enumerate(values, start=1):
-            ws.cell(row=row, column=col, value=v)
-        row += 2
-        binders = ((experiment.get("materials") or {}).get("binders") or [])
-        aggregates = ((experiment.get("materials") or {}).get("aggregates") or [])
-        ws.cell(row=row, column=1, value="材料类型").font = header_font
-        ws.cell(row=row, column=2, value="材料名称").font = header_font
-        ws.cell(row=row, column=3, value="用量(kg/m³)").font = header_font
-        row += 1
-        for item in binders:
-            ws.cell(row=row, column=1, value="胶凝材料")
-            ws.cell(row=row, column=2, value=item.get("name"))
-            ws.cell(row=row, column=3, value=item.get("dosage"))
-            row += 1
-        for item in aggregates:
-            ws.cell(row=row, column=1, value="骨料")
-            ws.cell(row=row, column=2, value=item.get("name"))
-            ws.cell(row=row, column=3, value=item.get("dosage"))
-            row += 1
-        row += 2
-        recipes = experiment.get("test_recipes") or []
-        def age_sort_key(age):
-            s = str(age)
-            digits = "".join(ch for ch in s if ch.isdigit())
-            if digits:
-                try:
-                    return int(digits)
-                except Exception:
-                    return 0
-            return 0
-        ages_set = set()
-        for r in recipes:
-            perf = r.get("performance") or {}
-            strengths = perf.get("strengths") or {}
-            for k in strengths.keys():
-                ages_set.add(k)
-        ages = sorted(list(ages_set), key=age_sort_key)
-        if ages and recipes:
-            ws.cell(row=row, column=1, value="龄期").font = header_font
-            col_offset = 2
-            for idx, r in enumerate(recipes):
-                name = r.get("name") or f"配方{idx + 1}"
-                ws.cell(row=row, column=col_offset + idx, value=name).font = header_font
-            start_data_row = row + 1
-            for r_idx, age in enumerate(ages):
-                ws.cell(row=start_data_row + r_idx, column=1, value=str(age))
-                for c_idx, r in enumerate(recipes):
-                    perf = r.get("performance") or {}
-                    strengths = perf.get("strengths") or {}
-                    val = strengths.get(age)
-                    if val is not None:
-                        ws.cell(row=start_data_row + r_idx, column=col_offset + c_idx, value=float(val))
-            if strength_chart_type == "bar":
-                chart = BarChart()
-            else:
-                chart = LineChart()
-            chart.title = "混凝土抗压强度发展曲线"
-            chart.y_axis.title = "抗压强度(MPa)"
-            chart.x_axis.title = "龄期"
-            if strength_y_max and strength_y_max > 0:
-                chart.y_axis.scaling.max = float(strength_y_max)
-            data_ref = Reference(ws, min_col=2, max_col=1 + len(recipes), min_row=row, max_row=start_data_row + len(ages) - 1)
-            chart.add_data(data_ref, titles_from_data=True)
-            cats_ref = Reference(ws, min_col=1, min_row=start_data_row, max_row=start_data_row + len(ages) - 1)
-            chart.set_categories(cats_ref)
-            chart.legend.title = "配方"
-            chart_row = start_data_row + len(ages) + 2
-            ws.add_chart(chart, f"A{chart_row}")
-            ratio_header_row = chart_row + 15
-        else:
-            ratio_header_row = row + 2
-        ws.cell(row=ratio_header_row, column=1, value="指标").font = header_font
-        ws.cell(row=ratio_header_row, column=2, value="数值").font = header_font
-        ratio_data = [
-            ("水灰比", experiment.get("water_cement_ratio")),
-            ("砂率(%)", experiment.get("sand_ratio")),
-            ("单位用量(kg/m³)", experiment.get("unit_weight")),
-            ("外加剂掺量(%)", experiment.get("admixture_dosage")),
-        ]
-        for idx, (name, val) in enumerate(ratio_data, start=1):
-            ws.cell(row=ratio_header_row + idx, column=1, value=name)
-            ws.cell(row=ratio_header_row + idx, column=2, value=val)
-        bar = BarChart()
-        bar.title = "混凝土配合比关键参数"
-        bar.y_axis.title = "数值"
-        bar.x_axis.title = "参数"
-        data_ref = Reference(ws, min_col=2, min_row=ratio_header_row, max_row=ratio_header_row + len(ratio_data))
-        bar.add_data(data_ref, titles_from_data=True)
-        cats_ref = Reference(ws, min_col=1, min_row=ratio_header_row + 1, max_row=ratio_header_row + len(ratio_data))
-        bar.set_categories(cats_ref)
-        ws.add_chart(bar, f"E{ratio_header_row}")
-
-    def import_from_excel(self, uploaded_file):
-        """从Excel文件导入数据"""
-        try:
-            # 读取Excel文件
-            excel_file = pd.ExcelFile(uploaded_file)
-            
-            # 获取现有数据
-            data = self.load_data()
-            
-            # 导入各个工作表
-            import_summary = []
-            
-            # 1. 导入项目数据
-            if '项目' in excel_file.sheet_names:
-                projects_df = pd.read_excel(excel_file, sheet_name='项目')
-                if not projects_df.empty:
-                    # 转换为字典列表
-                    projects_list = projects_df.to_dict('records')
-                    # 确保ID字段存在
-                    for i, project in enumerate(projects_list, 1):
-                        if 'id' not in project or pd.isna(project['id']):
-                            project['id'] = i
-                    data['projects'] = projects_list
-                    import_summary.append(f"项目: {len(projects_list)} 条")
-            
-            # 2. 导入实验数据
-            if '实验' in excel_file.sheet_names:
-                experiments_df = pd.read_excel(excel_file, sheet_name='实验')
-                if not experiments_df.empty:
-                    experiments_list = experiments_df.to_dict('records')
-                    for i, exp in enumerate(experiments_list, 1):
-                        if 'id' not in exp or pd.isna(exp['id']):
-                            exp['id'] = i
-                    data['experiments'] = experiments_list
-                    import_summary.append(f"实验: {len(experiments_list)} 条")
-            
-            # 3. 导入原材料数据
-            if '原材料' in excel_file.sheet_names:
-                materials_df = pd.read_excel(excel_file, sheet_name='原材料')
-                if not materials_df.empty:
-                    materials_list = materials_df.to_dict('records')
-                    for i, mat in enumerate(materials_list, 1):
-                        if 'id' not in mat or pd.isna(mat['id']):
-                            mat['id'] = i
-                    data['raw_materials'] = materials_list
-                    import_summary.append(f"原材料: {len(materials_list)} 条")
-            
-            # 4. 导入合成实验数据
-            if '合成实验' in excel_file.sheet_names:
-                synthesis_df = pd.read_excel(excel_file, sheet_name='合成实验')
-                if not synthesis_df.empty:
-                    synthesis_list = synthesis_df.to_dict('records')
-                    for i, record in enumerate(synthesis_list, 1):
-                        if 'id' not in record or pd.isna(record['id']):
-                            record['id'] = i
-                    data['synthesis_records'] = synthesis_list
-                    import_summary.append(f"合成实验: {len(synthesis_list)} 条")
-            
-            # 5. 导入成品减水剂数据
-            if '成品减水剂' in excel_file.sheet_names:
-                products_df = pd.read_excel(excel_file, sheet_name='成品减水剂')
-                if not products_df.empty:
-                    products_list = products_df.to_dict('records')
-                    for i, product in enumerate(products_list, 1):
-                        if 'id' not in product or pd.isna(product['id']):
-                            product['id'] = i
-                    data['products'] = products_list
-                    import_summary.append(f"成品减水剂: {len(products_list)} 条")
-            
-            # 6. 导入净浆实验数据
-            if '净浆实验' in excel_file.sheet_names:
-                paste_df = pd.read_excel(excel_file, sheet_name='净浆实验')
-                if not paste_df.empty:
-                    paste_list = paste_df.to_dict('records')
-                    for i, exp in enumerate(paste_list, 1):
-                        if 'id' not in exp or pd.isna(exp['id']):
-                            exp['id'] = i
-                    data['paste_experiments'] = paste_list
-                    import_summary.append(f"净浆实验: {len(paste_list)} 条")
-            
-            # 7. 导入砂浆实验数据
-            if '砂浆实验' in excel_file.sheet_names:
-                mortar_df = pd.read_excel(excel_file, sheet_name='砂浆实验')
-                if not mortar_df.empty:
-                    mortar_list = mortar_df.to_dict('records')
-                    for i, exp in enumerate(mortar_list, 1):
-                        if 'id' not in exp or pd.isna(exp['id']):
-                            exp['id'] = i
-                    data['mortar_experiments'] = mortar_list
-                    import_summary.append(f"砂浆实验: {len(mortar_list)} 条")
-            
-            # 8. 导入混凝土实验数据
-            if '混凝土实验' in excel_file.sheet_names:
-                concrete_df = pd.read_excel(excel_file, sheet_name='混凝土实验')
-                if not concrete_df.empty:
-                    concrete_list = concrete_df.to_dict('records')
-                    for i, exp in enumerate(concrete_list, 1):
-                        if 'id' not in exp or pd.isna(exp['id']):
-                            exp['id'] = i
-                    data['concrete_experiments'] = concrete_list
-                    import_summary.append(f"混凝土实验: {len(concrete_list)} 条")
-            
-            # 9. 导入合成性能数据
-            if '合成性能数据' in excel_file.sheet_names:
-                perf_df = pd.read_excel(excel_file, sheet_name='合成性能数据')
-                if not perf_df.empty:
-                    perf_list = perf_df.to_dict('records')
-                    if 'performance_data' not in data:
-                        data['performance_data'] = {}
-                    data['performance_data']['synthesis'] = perf_list
-                    import_summary.append(f"合成性能数据: {len(perf_list)} 条")
-            
-            # 保存导入的数据
-            if self.save_data(data):
-                return True, "，".join(import_summary)
-            else:
-                return False, "保存导入数据失败"
-                
-        except Exception as e:
-            return False, f"导入数据失败: {str(e)}"
+        from services.experiment_report import fill_concrete_report_sheet
+        fill_concrete_report_sheet(ws, experiment, strength_y_max, strength_chart_type)
+
+    def import_from_excel(self, uploaded_file, mode="merge", conflict="skip", dry_run=False) -> Tuple[bool, str]:
+        """从Excel文件导入数据 (按 ID / 业务键合并或替换)，返回 (成功与否, 差异摘要或错误信息)"""
+        from services.import_service import ImportService
+        return ImportService(self).import_excel(uploaded_file, mode, conflict, dry_run)
 
     def get_json_content(self):
         """获取当前数据的JSON字符串"""
         if self.data_file.exists():
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return f.read()
+            return read_json_text(self.data_file)
         return "{}"
 
     def import_from_json(self, json_content):
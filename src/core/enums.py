@@ -75,6 +75,9 @@ class BOMStatus(str, Enum):
     ARCHIVED = "archived"
 
 class ProductionOrderStatus(str, Enum):
+    DRAFT = "draft"
+    RELEASED = "released"
+    ISSUED = "issued"
     PLANNED = "planned"
     IN_PROGRESS = "in_progress"
     FINISHED = "finished"
@@ -114,6 +117,7 @@ class DataCategory(str, Enum):
     PRODUCTION_ORDERS = "production_orders"
     BOMS = "boms"
     BOM_VERSIONS = "bom_versions"
+    BOM_HISTORY = "bom_history"
     MOTHER_LIQUORS = "mother_liquors"
     MATERIAL_ISSUES = "material_issues"
     USERS = "users"
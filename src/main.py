@@ -6,6 +6,10 @@ import time
 
 # 导入服务容器与模型
 from core.container import ServiceContainer
+try:
+    from services.archive_service import ArchiveService
+except ImportError:   # 未安装 pyarrow 时不做 Parquet 归档
+    ArchiveService = None
 from schemas.user import UserLogin, UserCreate
 
 # 导入页面模块
@@ -150,6 +154,10 @@ def main():
     st.session_state.services['inventory_service'] = container.inventory_service
     st.session_state.services['auth_service'] = container.auth_service
 
+    # 到期时在后台执行 Parquet 归档
+    if ArchiveService is not None:
+        ArchiveService(container.data_service).archive_if_due()
+
     # 4. 路由配置
     PAGE_ROUTES = {
         "📊 项目概览": lambda: render_dashboard(container.data_service),
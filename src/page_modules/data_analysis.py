@@ -3,6 +3,10 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from services.analysis_service import AnalysisService
+from services.feature_screening import SCREENING_METHODS
+from services.dataset_builder import DEFAULT_SEED, FILL_STRATEGIES
+from services.model_service import ModelService, MODEL_TYPES
+from services.chart_pipeline import prepare_chart_data, histogram_bins, linear_fit, COUNT_COLUMN
 import json
 
 def render_analysis_page(data_manager):
@@ -88,22 +92,52 @@ def render_analysis_page(data_manager):
         st.subheader("特征关联分析")
         
         # 计算相关性
-        numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
+        numeric_cols = df.select_dtypes(include='number').columns.tolist()
         
         if len(numeric_cols) < 2:
             st.info("数值型特征不足，无法进行关联分析。")
         else:
-            # 热力图
-            st.markdown("#### 相关性热力图")
-            corr_matrix = df[numeric_cols].corr()
-            fig_heatmap = px.imshow(
-                corr_matrix, 
-                text_auto=True, 
-                aspect="auto",
-                color_continuous_scale="RdBu_r",
-                title="特征相关性矩阵"
+            # 特征筛选 (对目标变量)
+            st.markdown("#### 特征筛选")
+            sc1, sc2, sc3 = st.columns(3)
+            with sc1:
+                screen_target = st.selectbox("目标变量", numeric_cols, index=len(numeric_cols)-1, key="screen_target")
+            with sc2:
+                rank_by = st.selectbox(
+                    "排序指标", list(SCREENING_METHODS.keys()),
+                    format_func=lambda m: SCREENING_METHODS[m], key="screen_rank_by"
+                )
+            with sc3:
+                top_k = st.slider("显示前 K 个特征", 5, 50, 15, key="screen_top_k")
+
+            screening = am.screen_features(
+                current_type, screen_target, rank_by=rank_by, top_k=top_k,
+                methods=["pearson", "spearman", "mutual_info"]
             )
-            st.plotly_chart(fig_heatmap, use_container_width=True)
+            if screening.empty:
+                st.info("有效样本不足，无法计算与目标变量的相关性。")
+            else:
+                fig_rank = px.bar(
+                    screening.iloc[::-1], x=rank_by, y="feature", orientation="h",
+                    hover_data=["n_obs", "pearson", "spearman", "mutual_info"],
+                    title=f"与 {screen_target} 的{SCREENING_METHODS[rank_by]} (前 {len(screening)} 个)"
+                )
+                st.plotly_chart(fig_rank, use_container_width=True)
+                st.dataframe(screening.drop(columns=["score"]), use_container_width=True, hide_index=True)
+
+                # 热力图只展示筛选出的特征
+                st.markdown("#### 相关性热力图 (已筛选特征)")
+                heat_cols = screening["feature"].tolist() + [screen_target]
+                corr_matrix = am.get_correlation_matrix(df, heat_cols)
+                fig_heatmap = px.imshow(
+                    corr_matrix,
+                    text_auto=".2f" if len(heat_cols) <= 20 else False,
+                    aspect="auto",
+                    color_continuous_scale="RdBu_r",
+                    zmin=-1, zmax=1,
+                    title="特征相关性矩阵"
+                )
+                st.plotly_chart(fig_heatmap, use_container_width=True)
             
             st.divider()
             
@@ -117,7 +151,7 @@ def render_analysis_page(data_manager):
                 y_axis = st.selectbox("Y轴变量", numeric_cols, index=min(1, len(numeric_cols)-1))
             with col_color:
                 # 尝试找到分类变量用于着色
-                cat_cols = df.select_dtypes(include=['object']).columns.tolist()
+                cat_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
                 color_axis = st.selectbox("颜色分组 (可选)", ["无"] + cat_cols)
             
             if color_axis == "无":
@@ -125,12 +159,19 @@ def render_analysis_page(data_manager):
             else:
                 color_arg = color_axis
                 
+            scatter_df, scatter_info = prepare_chart_data(df, "scatter", x_axis, y_axis, color_arg)
             fig_scatter = px.scatter(
-                df, x=x_axis, y=y_axis, color=color_arg,
-                title=f"{x_axis} vs {y_axis}",
-                trendline="ols" if len(df) > 2 else None
+                scatter_df, x=x_axis, y=y_axis, color=color_arg,
+                size=COUNT_COLUMN if scatter_info["reduced"] else None,
+                title=f"{x_axis} vs {y_axis}"
             )
+            # 趋势线在全部原始数据上拟合
+            fit = linear_fit(df, x_axis, y_axis) if len(df) > 2 else None
+            if fit is not None:
+                fig_scatter.add_scatter(x=fit[x_axis], y=fit[y_axis], mode="lines", name="线性拟合")
             st.plotly_chart(fig_scatter, use_container_width=True)
+            if scatter_info["reduced"]:
+                st.caption(f"共 {scatter_info['original']} 个点，已按网格分箱为 {scatter_info['rendered']} 个点 (点大小为箱内点数)")
 
     # ==================== Tab 3: 趋势可视化 ====================
     with tab3:
@@ -142,14 +183,33 @@ def render_analysis_page(data_manager):
         
         with col_v1:
             st.markdown(f"**{viz_col} 分布直方图**")
-            fig_hist = px.histogram(df, x=viz_col, nbins=20, marginal="box")
+            hist = histogram_bins(df[viz_col], nbins=20)
+            fig_hist = px.bar(hist, x="bin_center", y="count", labels={"bin_center": viz_col, "count": "频数"})
+            fig_hist.update_traces(width=(hist["bin_right"] - hist["bin_left"]).tolist())
             st.plotly_chart(fig_hist, use_container_width=True)
             
         with col_v2:
             st.markdown(f"**{viz_col} 序列图 (按索引)**")
-            fig_line = px.line(df, y=viz_col, markers=True)
+            seq_df, seq_info = prepare_chart_data(df[[viz_col]].reset_index(), "line", "index", viz_col)
+            fig_line = px.line(seq_df, x="index", y=viz_col, markers=not seq_info["reduced"])
             st.plotly_chart(fig_line, use_container_width=True)
 
+        strength_df = am.get_strength_table(current_type)
+        if not strength_df.empty:
+            st.markdown("**强度发展 (按龄期)**")
+            group_col = "recipe_name" if "recipe_name" in strength_df.columns and strength_df["recipe_name"].notna().any() else "formula_name"
+            fig_strength = px.line(
+                strength_df.dropna(subset=[group_col]), x="age_days", y="strength",
+                color=group_col, line_group="id", markers=True,
+                labels={"age_days": "龄期 (天)", "strength": "抗压强度 (MPa)"}
+            )
+            st.plotly_chart(fig_strength, use_container_width=True)
+
+        trend_kind = "fluidity" if not am.get_fluidity_table(current_type).empty else (
+            "strength" if not strength_df.empty else None)
+        if trend_kind:
+            _render_trend_aggregation(am, current_type, trend_kind)
+
     # ==================== Tab 4: AI训练准备 ====================
     with tab4:
         st.subheader("🤖 AI 数据集生成")
@@ -169,6 +229,12 @@ def render_analysis_page(data_manager):
             )
             
             split_ratio = st.slider("训练集比例", 0.5, 0.9, 0.8, 0.05)
+            split_seed = st.number_input("随机种子", min_value=0, value=DEFAULT_SEED, step=1,
+                                         help="相同数据与种子总是得到相同的划分")
+            strat_options = [c for c in ("formula_name", "recipe_name", "product_name") if c in df.columns]
+            stratify_by = st.selectbox("分层字段", ["不分层"] + strat_options,
+                                       help="按配方/产品分层，保证每组在训练集和测试集中的比例一致")
+            stratify_by = None if stratify_by == "不分层" else stratify_by
             
         with ai_col2:
             if not selected_features:
@@ -176,7 +242,8 @@ def render_analysis_page(data_manager):
             else:
                 st.markdown("#### 2. 数据预览")
                 # 准备数据
-                dataset = am.prepare_ai_dataset(df, target_col, selected_features, split_ratio)
+                dataset = am.prepare_ai_dataset(df, target_col, selected_features, split_ratio,
+                                                seed=int(split_seed), stratify_by=stratify_by)
                 
                 if "error" in dataset: # 简单的错误处理假设
                      pass
@@ -215,6 +282,24 @@ def render_analysis_page(data_manager):
                             mime="text/csv"
                         )
                         
+                    st.markdown("**训练用数据集文件** (Parquet 分块 + NumPy memmap + manifest)")
+                    fill_mode = st.radio("特征缺失值", list(FILL_STRATEGIES.keys()),
+                                         format_func=lambda k: FILL_STRATEGIES[k], horizontal=True)
+                    if st.button("📦 生成数据集文件"):
+                        try:
+                            manifest = am.export_ai_dataset(
+                                current_type, target_col, selected_features, split_ratio,
+                                seed=int(split_seed), stratify_by=stratify_by, fill=fill_mode
+                            )
+                            verb = "已存在，直接复用" if manifest.get("reused") else "已生成"
+                            st.success(
+                                f"数据集 {manifest['dataset_id']} {verb}: "
+                                f"训练 {manifest['splits']['train']['rows']} 行 / 测试 {manifest['splits']['test']['rows']} 行"
+                            )
+                            st.code(manifest["path"])
+                        except ValueError as e:
+                            st.error(f"生成失败: {e}")
+
                     # 代码生成
                     st.divider()
                     st.markdown("#### 4. 代码集成")
@@ -226,3 +311,104 @@ def render_analysis_page(data_manager):
                     with code_tab2:
                         st.code(am.generate_tensorflow_code(selected_features, target_col), language="python")
 
+                    st.divider()
+                    _render_model_training(data_service, dataset, df)
+
+
+def _render_model_training(data_service, dataset, df):
+    """模型训练 (后台线程) 与候选配方批量预测"""
+    st.markdown("#### 5. 模型训练与预测")
+    ms = ModelService(data_service)
+    target_col = dataset["info"]["target"]
+    features = dataset["info"]["features"]
+
+    m_col1, m_col2 = st.columns([1, 2])
+    with m_col1:
+        model_type = st.radio("模型", list(MODEL_TYPES.keys()),
+                              format_func=lambda k: MODEL_TYPES[k].label, horizontal=True)
+        if model_type == "ridge":
+            params = {"alpha": st.number_input("正则化系数 alpha", min_value=0.0, value=1.0, step=0.1)}
+        else:
+            params = {
+                "n_estimators": st.slider("树的数量", 20, 500, 200, 10),
+                "max_depth": st.slider("最大深度", 1, 6, 3),
+                "learning_rate": st.select_slider("学习率", [0.02, 0.05, 0.1, 0.2, 0.3], value=0.1),
+            }
+        if st.button("🚀 后台训练", type="primary"):
+            ok, result = ms.submit_training(dataset, model_type, params)
+            if ok:
+                st.session_state.model_job_id = result
+            else:
+                st.error(result)
+
+    with m_col2:
+        job_id = st.session_state.get("model_job_id")
+        job = ms.get_job(job_id) if job_id else None
+        if not job:
+            st.caption("训练在后台线程执行，页面可继续操作。")
+            return
+        if job["status"] in ("pending", "running"):
+            st.info("⏳ 模型训练中...")
+            st.button("🔄 刷新状态")
+            return
+        if job["status"] == "failed":
+            st.error(job["message"])
+            return
+
+        info = ms.get_model(job["model_key"])
+        if info is None:
+            st.warning("模型已被淘汰，请重新训练。")
+            return
+        if info["target"] != target_col or info["features"] != features:
+            st.caption("当前选择的目标/特征与已训练模型不同，以下为上次训练的模型。")
+        test = info["test_metrics"] or {}
+        k1, k2, k3 = st.columns(3)
+        k1.metric("测试集 R²", f"{test.get('r2', float('nan')):.3f}")
+        k2.metric("测试集 RMSE", f"{test.get('rmse', float('nan')):.3f}")
+        k3.metric("训练耗时", f"{info['train_seconds']:.2f} s")
+        st.caption(f"{MODEL_TYPES[info['model_type']].label} · {job['message']} · 训练于 {info['trained_at']}")
+
+        st.markdown(f"**候选配方预测 ({info['target']})**")
+        defaults = pd.DataFrame([info["fill_values"]])[info["features"]]
+        candidates = st.data_editor(defaults, num_rows="dynamic", use_container_width=True,
+                                    key=f"model_candidates_{info['key']}")
+        if st.button("📈 批量预测") and not candidates.empty:
+            preds = ms.predict(info["key"], candidates)
+            st.dataframe(candidates.assign(**{preds.name: preds}), use_container_width=True)
+
+
+def _render_trend_aggregation(am, data_type, kind):
+    """保持率曲线 (按配方平均) 与按测试日期的滚动均值"""
+    is_fluidity = kind == "fluidity"
+    time_label = "时间 (min)" if is_fluidity else "龄期 (天)"
+    value_label = "流动度 (mm)" if is_fluidity else "抗压强度 (MPa)"
+    stats = am.get_trend_statistics(data_type, kind)
+    if stats.empty:
+        return
+
+    st.markdown("**流动度经时保持率 (按配方平均)**" if is_fluidity else "**强度发展率 (相对 28d，按配方平均)**")
+    groups = stats["group"].astype(str).unique().tolist()
+    selected = st.multiselect("选择配方", groups, default=groups[:8], key=f"trend_groups_{data_type}_{kind}")
+    shown = stats[stats["group"].astype(str).isin(selected)]
+    if not shown.empty:
+        fig_ret = px.line(
+            shown, x="time", y="retention_mean", color="group", markers=True,
+            error_y="retention_std", hover_data=["n", "mean"],
+            labels={"time": time_label, "retention_mean": "保持率 (%)", "group": "配方"}
+        )
+        st.plotly_chart(fig_ret, use_container_width=True)
+
+    trend = am.get_trend_table(data_type, kind)
+    if "test_date" in trend.columns:
+        times = sorted(trend["time"].unique().tolist())
+        trend_time = st.selectbox(f"滚动均值时间点 ({time_label})", times, key=f"trend_time_{data_type}_{kind}")
+        at_time = trend[trend["time"] == trend_time].copy()
+        at_time["test_date"] = pd.to_datetime(at_time["test_date"], errors="coerce")
+        at_time = at_time.dropna(subset=["test_date"]).sort_values("test_date")
+        if not at_time.empty:
+            points, _ = prepare_chart_data(at_time, "scatter", "test_date", "value")
+            rolling, _ = prepare_chart_data(at_time, "line", "test_date", "rolling_mean")
+            fig_roll = px.scatter(points, x="test_date", y="value", opacity=0.5,
+                                  labels={"test_date": "测试日期", "value": value_label})
+            fig_roll.add_scatter(x=rolling["test_date"], y=rolling["rolling_mean"], mode="lines", name="滚动均值")
+            st.plotly_chart(fig_roll, use_container_width=True)
@@ -9,6 +9,14 @@ from pathlib import Path
 import json
 import uuid
 from components.access_manager import has_permission
+from services.export_jobs import ExportJobService, EXPORT_FULL
+from components.export_job_panel import render_export_job
+from services.record_maintenance import RecordMaintenanceService, DEFAULT_PAGE_SIZE
+from services.integrity_service import IntegrityService, report_to_json
+from services.maintenance_jobs import MaintenanceJobRunner
+from services.import_service import (
+    ImportService, IMPORT_MODES, CONFLICT_MODES, IMPORT_MODE_REPLACE
+)
 
 def render_data_management(data_manager, inventory_service=None, auth_service=None):
     """渲染数据管理页面"""
@@ -29,7 +37,8 @@ def render_data_management(data_manager, inventory_service=None, auth_service=No
             "📥 数据导入", 
             "🔙 备份管理",
             "⚙️ 系统设置",
-            "🔧 库存盘点"
+            "🔧 库存盘点",
+            "🧾 记录维护"
         ]
         tabs = st.tabs(tab_names)
         
@@ -48,6 +57,11 @@ def render_data_management(data_manager, inventory_service=None, auth_service=No
                 _render_inventory_init_tab(inventory_service)
             else:
                 st.warning("⚠️ InventoryService 未注入，无法使用库存盘点功能。请检查 main.py。")
+        with tabs[6]:
+            _render_integrity_section(data_manager)
+            _render_maintenance_jobs_section(data_manager)
+            st.divider()
+            _render_record_maintenance_tab(data_manager)
     else:
         # 普通用户：仅显示库存盘点功能 (假设普通用户有盘点权限，或者至少能看到入口)
         # 如果未来有更多功能开放给普通用户，可以在这里添加
@@ -873,6 +887,7 @@ def _render_export_tab(data_manager):
         **导出功能说明:**
         - 导出所有数据到Excel文件
         - 包含项目、实验、原材料、合成实验、成品减水剂等所有数据
+        - 包含 BOM、生产订单、收发货及原材料/成品库存台账
         - 自动生成数据字典说明
         - 文件格式: .xlsx (Excel 2007+)
         """)
@@ -894,27 +909,26 @@ def _render_export_tab(data_manager):
             help="不需要添加.xlsx扩展名"
         )
     
-    # 导出按钮
+    # 导出按钮 (后台执行，数据未变化时直接复用已生成的文件)
+    job_service = ExportJobService(data_manager)
     if st.button("🚀 开始导出数据", type="primary", use_container_width=True):
-        with st.spinner("正在准备导出数据..."):
-            time.sleep(1)
-            
-            # 执行导出
-            download_link = data_manager.export_to_excel()
-            
-            if download_link:
-                st.success("✅ 数据导出成功！")
-                st.markdown(download_link, unsafe_allow_html=True)
-                
-                # 显示导出统计
-                with st.expander("📊 导出数据统计", expanded=False):
-                    st.write(f"**项目:** {len(data_manager.get_all_projects())} 条")
-                    st.write(f"**实验:** {len(data_manager.get_all_experiments())} 条")
-                    st.write(f"**原材料:** {len(data_manager.get_all_raw_materials())} 条")
-                    st.write(f"**合成实验:** {len(data_manager.get_all_synthesis_records())} 条")
-                    st.write(f"**成品减水剂:** {len(data_manager.get_all_products())} 条")
-            else:
-                st.error("❌ 数据导出失败，请重试")
+        ok, result = job_service.submit(EXPORT_FULL)
+        if ok:
+            st.session_state["data_export_job"] = result
+        else:
+            st.error(f"❌ {result}")
+    
+    render_export_job(job_service, "data_export_job", file_name=f"{filename}.xlsx")
+    
+    job = job_service.get_job(st.session_state.get("data_export_job") or "")
+    if job and job["status"] == "done":
+        # 显示导出统计
+        with st.expander("📊 导出数据统计", expanded=False):
+            st.write(f"**项目:** {len(data_manager.get_all_projects())} 条")
+            st.write(f"**实验:** {len(data_manager.get_all_experiments())} 条")
+            st.write(f"**原材料:** {len(data_manager.get_all_raw_materials())} 条")
+            st.write(f"**合成实验:** {len(data_manager.get_all_synthesis_records())} 条")
+            st.write(f"**成品减水剂:** {len(data_manager.get_all_products())} 条")
 
 def _render_import_tab(data_manager):
     """渲染数据导入标签页"""
@@ -923,7 +937,7 @@ def _render_import_tab(data_manager):
     st.warning("""
     ⚠️ **导入前请注意:**
     1. 建议先备份当前数据
-    2. 导入将覆盖现有数据
+    2. 替换模式将覆盖对应集合的现有数据，合并模式按 ID / 业务键新增或更新
     3. 确保导入文件格式正确
     4. 导入过程可能需要一些时间
     """)
@@ -931,8 +945,8 @@ def _render_import_tab(data_manager):
     # 文件上传
     uploaded_file = st.file_uploader(
         "选择Excel文件", 
-        type=['xlsx', 'xls'],
-        help="支持 .xlsx 和 .xls 格式"
+        type=['xlsx'],
+        help="支持 .xlsx 格式 (与数据导出的工作表一致)"
     )
     
     if uploaded_file is not None:
@@ -961,17 +975,37 @@ def _render_import_tab(data_manager):
             with col1:
                 import_mode = st.radio(
                     "导入模式",
-                    options=["替换现有数据", "合并数据（不重复）"],
-                    index=0
+                    options=list(IMPORT_MODES),
+                    format_func=IMPORT_MODES.get,
+                    index=1
                 )
             
             with col2:
                 conflict_resolution = st.selectbox(
                     "数据冲突处理",
-                    options=["跳过重复数据", "覆盖重复数据"],
-                    disabled=(import_mode == "替换现有数据")
+                    options=list(CONFLICT_MODES),
+                    format_func=CONFLICT_MODES.get,
+                    disabled=(import_mode == IMPORT_MODE_REPLACE),
+                    help="合并时按 ID 或业务键 (物料编号/名称、配方编号、产品编码等) 匹配已有记录"
                 )
             
+            # 预演差异
+            if st.button("🔍 预览导入差异", use_container_width=True):
+                with st.spinner("正在计算差异..."):
+                    try:
+                        _, summary, _ = ImportService(data_manager).plan(uploaded_file, import_mode, conflict_resolution)
+                        st.session_state["import_dry_run"] = summary
+                    except Exception as e:
+                        st.session_state.pop("import_dry_run", None)
+                        st.error(f"预览失败: {e}")
+            
+            dry_run = st.session_state.get("import_dry_run")
+            if dry_run:
+                st.dataframe(pd.DataFrame(dry_run).rename(columns={
+                    "sheet": "工作表", "rows": "文件行数", "insert": "新增", "update": "更新",
+                    "unchanged": "未变化", "skip": "跳过", "delete": "替换原有",
+                }), use_container_width=True, hide_index=True)
+            
             # 备份选项
             create_backup = st.checkbox("导入前自动备份当前数据", value=True)
             
@@ -983,9 +1017,10 @@ def _render_import_tab(data_manager):
                         st.success("✅ 数据备份完成")
                 
                 with st.spinner("正在导入数据，请稍候..."):
-                    success, message = data_manager.import_from_excel(uploaded_file)
+                    success, message = data_manager.import_from_excel(uploaded_file, import_mode, conflict_resolution)
                     
                     if success:
+                        st.session_state.pop("import_dry_run", None)
                         st.success(f"✅ 数据导入成功！")
                         st.info(f"导入统计: {message}")
                         time.sleep(2)
@@ -1146,6 +1181,176 @@ def _render_backup_tab(data_manager):
     else:
         st.info("暂无备份文件")
 
+    _render_archive_section(data_manager)
+
+
+def _render_archive_section(data_manager):
+    """Parquet 列式归档：手动归档及归档概况"""
+    st.markdown("### 🗄️ 列式归档 (Parquet)")
+    try:
+        from services.archive_service import ArchiveService
+    except ImportError:
+        st.info("未安装 pyarrow，列式归档不可用 (请执行 pip install -r requirements.txt)")
+        return
+    archive_service = ArchiveService(data_manager)
+    last_archive = archive_service.last_archive_time()
+    st.caption(f"上次归档时间: {last_archive.strftime('%Y-%m-%d %H:%M:%S') if last_archive else '尚未归档'}"
+               "；主数据按快照归档，台账与审计日志按月分区增量归档")
+
+    if st.button("🗄️ 立即归档", key="archive_now_btn"):
+        with st.spinner("正在归档..."):
+            ok, message = archive_service.create_archive()
+        if ok:
+            st.success(message)
+            data_manager.add_audit_log(st.session_state.get("user"), "ARCHIVE_CREATED", message)
+        else:
+            st.error(message)
+
+    summary = archive_service.get_summary()
+    if summary:
+        df = pd.DataFrame(summary).rename(columns={"collection": "集合", "files": "文件数", "rows": "记录数", "bytes": "大小"})
+        st.write(f"**归档总占用空间:** {df['大小'].sum() / (1024 * 1024):.2f} MB")
+        df["大小"] = (df["大小"] / 1024).map(lambda v: f"{v:.1f} KB")
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+def _render_integrity_section(data_manager):
+    """数据完整性检查：台账与库存、孤立引用、重复 ID、单位、领料撤销链"""
+    service = IntegrityService(data_manager)
+    with st.expander("🩺 数据完整性检查", expanded=False):
+        checks = service.list_checks()
+        selected = st.multiselect("检查项", options=list(checks), default=list(checks),
+                                  format_func=lambda c: checks[c], key="integrity_checks")
+        if st.button("▶️ 运行检查", key="integrity_run", disabled=not selected):
+            st.session_state["integrity_report"] = service.run(selected)
+
+        report = st.session_state.get("integrity_report")
+        if not report:
+            return
+        summary = report["summary"]
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("问题总数", summary["total"])
+        c2.metric("错误", summary["error"])
+        c3.metric("警告", summary["warning"])
+        c4.metric("耗时", f"{report['duration_ms']:.0f} ms")
+        if report["issues"]:
+            df = pd.DataFrame([{
+                "检查项": report["checks"][i["check"]]["title"],
+                "级别": "错误" if i["severity"] == "error" else "警告",
+                "集合": i["collection"],
+                "记录 ID": str(i["record_id"]) if i["record_id"] is not None else "",
+                "说明": i["message"],
+            } for i in report["issues"]])
+            st.dataframe(df, use_container_width=True, hide_index=True)
+            st.caption("可在下方记录维护中按集合与记录 ID 修正问题数据。")
+        else:
+            st.success("未发现问题")
+        st.download_button("📥 下载检查报告 (JSON)", data=report_to_json(report).encode("utf-8"),
+                           file_name=f"integrity_report_{report['generated_at'].replace(' ', '_').replace(':', '')}.json",
+                           mime="application/json", key="integrity_download")
+
+
+def _render_maintenance_jobs_section(data_manager):
+    """维护作业：预演差异后一次提交 (原 scripts/ 中的重算库存、单位修正等脚本)"""
+    runner = MaintenanceJobRunner(data_manager)
+    with st.expander("🛠️ 维护作业", expanded=False):
+        jobs = runner.list_jobs()
+        job = st.selectbox("作业", options=list(jobs), format_func=lambda j: jobs[j], key="maint_job")
+        if st.button("🔍 预演", key="maint_job_plan"):
+            plan = runner.plan(job)
+            st.session_state["maint_job_plan"] = {k: v for k, v in plan.items() if k != "collections"}
+
+        plan = st.session_state.get("maint_job_plan")
+        if not plan or plan["job"] != job:
+            return
+        st.caption(f"检查 {plan['entities']} 项，耗时 {plan['duration_ms']:.0f} ms")
+        for conflict in plan["conflicts"]:
+            st.error(conflict)
+        if not plan["diff"]:
+            st.success("无需修改")
+            return
+        st.dataframe(pd.DataFrame([{
+            "集合": d["collection"], "记录 ID": str(d["id"]), "操作": d["op"], "字段": d["field"],
+            "原值": "" if d["old"] is None else str(d["old"]), "新值": "" if d["new"] is None else str(d["new"]),
+        } for d in plan["diff"]]), use_container_width=True, hide_index=True)
+        if st.button("✅ 执行", type="primary", key="maint_job_run", disabled=bool(plan["conflicts"])):
+            ok, message = runner.run(job, expected_revision=plan["revision"])
+            if ok:
+                st.success(message)
+                data_manager.add_audit_log(st.session_state.get("user"), "MAINTENANCE_JOB", message)
+                st.session_state.pop("maint_job_plan", None)
+            else:
+                st.error(message)
+
+
+def _render_record_maintenance_tab(data_manager):
+    """按集合 / 单条记录编辑原始 JSON，经模型校验后只替换对应部分"""
+    st.subheader("🧾 记录维护")
+    st.caption("直接编辑原始数据，保存前按数据模型校验；只拒绝本次修改新引入的问题。保存前会自动备份。")
+    service = RecordMaintenanceService(data_manager)
+    collections = {c["collection"]: c for c in service.list_collections()}
+    collection = st.selectbox(
+        "数据集合", options=list(collections),
+        format_func=lambda c: f"{c} ({collections[c]['count']} 条{'，' + collections[c]['model'] if collections[c]['model'] else ''})",
+        key="maint_collection"
+    )
+    mode = st.radio("编辑范围", options=["单条记录", "按页编辑"], horizontal=True, key="maint_mode")
+    user = st.session_state.get("user")
+
+    if mode == "单条记录":
+        c1, c2 = st.columns([3, 1])
+        with c1:
+            rid_text = st.text_input("记录 ID (留空为新增记录)", key="maint_record_id").strip()
+        record_id = int(rid_text) if rid_text.isdigit() else (rid_text or None)
+        with c2:
+            st.write("")
+            if st.button("📂 加载", key="maint_load_record", use_container_width=True):
+                content = service.get_record_json(collection, record_id) if record_id is not None else "{}"
+                if content is None:
+                    st.error(f"未找到记录 (ID: {record_id})")
+                else:
+                    st.session_state["maint_record_base"] = (collection, record_id, content)
+                    st.session_state["maint_record_text"] = content
+        loaded = st.session_state.get("maint_record_base")
+        if loaded and loaded[:2] == (collection, record_id):
+            text = st.text_area("记录 JSON", height=360, key="maint_record_text")
+            if st.button("💾 保存记录", type="primary", key="maint_save_record"):
+                ok, message = service.save_record(collection, record_id, text,
+                                                  base_json=loaded[2] if record_id is not None else None)
+                if ok:
+                    st.success(message)
+                    st.session_state.pop("maint_record_base", None)
+                    data_manager.add_audit_log(user, "RECORD_EDITED", f"维护 {collection} 记录 {record_id or '新增'}")
+                else:
+                    st.error(message)
+    else:
+        total = collections[collection]["count"]
+        pages = max(1, (total + DEFAULT_PAGE_SIZE - 1) // DEFAULT_PAGE_SIZE)
+        page = st.number_input(f"页码 (共 {pages} 页，每页 {DEFAULT_PAGE_SIZE} 条)", min_value=1, max_value=pages,
+                               value=1, key="maint_page")
+        offset = (int(page) - 1) * DEFAULT_PAGE_SIZE
+        # 记下开始编辑时的页面内容，保存时据此检查期间是否有他人增删记录
+        base_key = f"maint_page_base_{collection}_{offset}"
+        text_key = f"maint_page_text_{collection}_{offset}"
+        if base_key not in st.session_state:
+            st.session_state[base_key] = service.get_collection_json(collection, offset, DEFAULT_PAGE_SIZE)
+            st.session_state.pop(text_key, None)
+        text = st.text_area("本页记录 JSON (数组，可在页内增删记录)", value=st.session_state[base_key],
+                            height=420, key=text_key)
+        c1, c2 = st.columns(2)
+        if c1.button("💾 保存本页", type="primary", key="maint_save_page"):
+            ok, message = service.save_collection_page(collection, text, offset, DEFAULT_PAGE_SIZE,
+                                                       base_json=st.session_state[base_key])
+            if ok:
+                st.success(message)
+                st.session_state.pop(base_key, None)
+                data_manager.add_audit_log(user, "RECORD_EDITED", f"维护 {collection} 第 {int(page)} 页")
+            else:
+                st.error(message)
+        if c2.button("🔄 重新加载", key="maint_reload_page"):
+            st.session_state.pop(base_key, None)
+            st.rerun()
+
+
 def _render_system_settings_tab(data_manager, auth_service):
     """渲染系统设置标签页"""
     st.subheader("⚙️ 系统设置")
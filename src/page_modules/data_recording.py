@@ -6,18 +6,21 @@ import pandas as pd
 import time
 import uuid
 from components.paste_fluidity_widget import PasteFluidityWidget
+from services.experiment_schema import parse_age_days
+from services.analysis_service import AnalysisService
+from services.export_jobs import ExportJobService, EXPORT_FULL, EXPORT_REPORT, EXPORT_BATCH_REPORT
+from services.experiment_report import BATCH_MODES
+from components.export_job_panel import render_export_job
+from services.similarity_service import (
+    SimilarityService, SOURCE_SYNTHESIS, SOURCE_PRODUCT, calculate_theoretical_solid
+)
 
 # 常量定义
 AGE_OPTIONS = ["1d", "3d", "7d", "14d", "28d", "56d", "90d", "1y"]
 
 def _parse_age_days(age_str):
     """解析龄期字符串为天数"""
-    if not age_str: return 0
-    if age_str.endswith('d'):
-        return int(age_str[:-1])
-    elif age_str.endswith('y'):
-        return int(age_str[:-1]) * 365
-    return 0
+    return parse_age_days(age_str)
 
 def _render_strength_inputs(container, current_strengths=None, key_prefix=""):
     """
@@ -1258,7 +1261,7 @@ def _render_synthesis_experiments_tab(experiment_service, data_manager):
                                     st.success(f"BOM 已生成: {bom_data['bom_code']}")
 
                             # 分页显示详细信息
-                            detail_tabs = st.tabs(["基础信息", "反应釜物料", "A料", "B料", "助剂", "反应参数", "工艺备注"])
+                            detail_tabs = st.tabs(["基础信息", "反应釜物料", "A料", "B料", "助剂", "反应参数", "工艺备注", "相似配方"])
                             
                             with detail_tabs[0]:
                                 base_col1, base_col2 = st.columns(2)
@@ -1350,6 +1353,9 @@ def _render_synthesis_experiments_tab(experiment_service, data_manager):
                                     st.info(record['process_notes'])
                                 else:
                                     st.info("暂无工艺备注")
+
+                            with detail_tabs[7]:
+                                _render_similar_formulations(data_manager, SOURCE_SYNTHESIS, record_id, f"syn_sim_{record_key}")
                     
                     st.divider()
             
@@ -1411,27 +1417,46 @@ def _render_products_tab(experiment_service, data_manager):
 
 def _calculate_theoretical_solid(ingredients, raw_materials_map):
     """计算理论固含"""
-    total_mass = 0.0
-    total_solid_mass = 0.0
-    
-    for item in ingredients:
-        name = item.get("name")
-        amount = float(item.get("amount", 0.0) or 0.0)
-        
-        if name and amount > 0:
-            total_mass += amount
-            
-            # 查找原材料固含
-            raw_mat = raw_materials_map.get(name)
-            solid_percent = 0.0
-            if raw_mat:
-                solid_percent = float(raw_mat.get("solid_content", 0.0) or 0.0)
-            
-            total_solid_mass += amount * (solid_percent / 100.0)
-            
-    if total_mass > 0:
-        return (total_solid_mass / total_mass) * 100.0
-    return 0.0
+    return calculate_theoretical_solid(ingredients, raw_materials_map)
+
+
+def _render_fluidity_retention(data_manager, fluidity_widget, formula_name):
+    """当前录入的流动度保持率，及该配方历史平均保持率 (复用分析页的缓存统计)"""
+    current = fluidity_widget.get_retention()
+    if len(current) < 2:
+        return
+    history = pd.DataFrame()
+    if formula_name:
+        stats = AnalysisService(data_manager).get_trend_statistics("paste", "fluidity")
+        history = stats[stats["group"] == formula_name].set_index("time")
+    rows = []
+    for label, minutes, retention in current:
+        row = {"时间点": label, "分钟": minutes, "保持率(%)": round(retention, 1)}
+        if not history.empty and minutes in history.index:
+            row["历史平均保持率(%)"] = round(float(history.at[minutes, "retention_mean"]), 1)
+            row["历史次数"] = int(history.at[minutes, "n"])
+        rows.append(row)
+    st.markdown("###### 📉 流动度保持率")
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
+def _render_similar_formulations(data_manager, source, record_id, key_prefix):
+    """相似配方 (按原料质量比例的余弦相似度)"""
+    if record_id is None:
+        return
+    k = st.number_input("显示数量", min_value=1, max_value=50, value=5, step=1, key=f"{key_prefix}_k")
+    results = SimilarityService(data_manager).find_similar(source, record_id, k=int(k))
+    if not results:
+        st.info("暂无可比较的历史配方")
+        return
+    st.dataframe(pd.DataFrame([{
+        "来源": r["source_label"],
+        "名称": r["label"],
+        "相似度": round(r["similarity"], 4),
+        "理论固含(%)": round(r["solid"], 2),
+        "日期": r["date"] or "",
+        "共同原料": "、".join(r["shared_materials"]),
+    } for r in results]), use_container_width=True, hide_index=True)
 
 def _render_add_product_tab(data_manager, raw_materials_map, synthesis_record_map):
     """渲染新增成品标签页"""
@@ -2526,6 +2551,9 @@ def _render_products_list_tab(data_manager, products, raw_materials):
                 if product.get('description'):
                     st.markdown("**产品描述**")
                     st.info(product['description'])
+
+                st.markdown("**相似配方**")
+                _render_similar_formulations(data_manager, SOURCE_PRODUCT, product['id'], f"prod_sim_{product['id']}")
             
             st.divider()
     
@@ -2636,6 +2664,39 @@ def _render_recording_experiment_manager(title, type_key, records, update_record
     
     filtered.sort(key=lambda x: (_dr_safe_parse_datetime(x.get("created_at")) or datetime.min), reverse=True)
     st.caption(f"筛选后 {len(filtered)} 条")
+
+    if data_manager and type_key in ("mortar", "concrete") and filtered:
+        with st.expander("📦 批量导出报告"):
+            operator_options = ["全部"] + sorted({str(r.get("operator", "")).strip() for r in filtered if str(r.get("operator", "")).strip()})
+            batch_formula_options = ["全部"] + sorted({str(r.get("formula_name", "")).strip() for r in filtered if str(r.get("formula_name", "")).strip()})
+            bc1, bc2 = st.columns(2)
+            with bc1:
+                batch_operator = st.selectbox("试验人员", options=operator_options, key=f"{type_key}_batch_operator_{mgmt_id}")
+                batch_formula = st.selectbox("关联配方", options=batch_formula_options, key=f"{type_key}_batch_formula_{mgmt_id}")
+            with bc2:
+                batch_use_dates = st.checkbox("限定试验日期", value=False, key=f"{type_key}_batch_use_dates_{mgmt_id}")
+                batch_dates = st.date_input("试验日期范围", value=[default_start, default_end], disabled=not batch_use_dates,
+                                            key=f"{type_key}_batch_dates_{mgmt_id}")
+            batch_mode = st.radio("导出方式", options=list(BATCH_MODES), format_func=BATCH_MODES.get,
+                                  horizontal=True, key=f"{type_key}_batch_mode_{mgmt_id}")
+            batch_from, batch_to = (list(batch_dates) + [None, None])[:2] if batch_use_dates else (None, None)
+            if st.button("生成批量报告", key=f"{type_key}_batch_btn_{mgmt_id}"):
+                ok, result = ExportJobService(data_manager).submit(EXPORT_BATCH_REPORT, {
+                    "experiment_type": type_key,
+                    "experiment_ids": [r.get("id") for r in filtered],
+                    "operator": None if batch_operator == "全部" else batch_operator,
+                    "formula_name": None if batch_formula == "全部" else batch_formula,
+                    "date_from": batch_from.isoformat() if batch_from else None,
+                    "date_to": batch_to.isoformat() if batch_to else None,
+                    "mode": batch_mode,
+                    "strength_y_max": st.session_state.get(f"{type_key}_chart_y_max"),
+                    "strength_chart_type": st.session_state.get(f"{type_key}_chart_type", "line"),
+                })
+                if ok:
+                    st.session_state[f"{type_key}_batch_report_job"] = result
+                else:
+                    st.error(result)
+            render_export_job(ExportJobService(data_manager), f"{type_key}_batch_report_job")
     
     selected_key = f"{type_key}_rec_selected_ids"
     selected_ids = set(st.session_state.get(selected_key, []))
@@ -2807,15 +2868,19 @@ def _render_recording_experiment_manager(title, type_key, records, update_record
                         strength_y_max = st.session_state.get(y_max_key)
                         chart_type_key = f"{type_key}_chart_type"
                         chart_type = st.session_state.get(chart_type_key, "line")
-                        link = data_manager.export_experiment_report(
-                            experiment_type=type_key,
-                            experiment_id=rid,
-                            strength_y_max=strength_y_max,
-                            strength_chart_type=chart_type,
-                        )
-                        if link:
-                            st.success("实验报告导出成功")
-                            st.markdown(link, unsafe_allow_html=True)
+                        ok, result = ExportJobService(data_manager).submit(EXPORT_REPORT, {
+                            "experiment_type": type_key,
+                            "experiment_id": rid,
+                            "strength_y_max": strength_y_max,
+                            "strength_chart_type": chart_type,
+                        })
+                        if ok:
+                            st.session_state[f"{type_key}_report_job_{rid}"] = result
+                        else:
+                            st.error(result)
+        
+        if data_manager and type_key in ("mortar", "concrete"):
+            render_export_job(ExportJobService(data_manager), f"{type_key}_report_job_{rid}")
         
         if st.session_state[show_detail_key].get(rid, False):
             with st.expander(f"记录详情 (ID: {rid})", expanded=True):
@@ -3338,6 +3403,7 @@ def _render_paste_experiments_tab(experiment_service, data_manager):
         
         # 渲染输入界面
         fluidity_widget.render_input_section(experiment_purpose, std_defaults)
+        _render_fluidity_retention(data_manager, fluidity_widget, formula_name)
     
     notes = st.text_area("实验备注", height=80, key=f"paste_notes_{form_id}")
     
@@ -4794,25 +4860,25 @@ def _render_data_maintenance_tab(data_manager):
         st.markdown("### Excel 数据导出")
         st.write("导出为 Excel 格式，便于查看和制作报表。")
         
-        if st.button("生成 Excel 导出链接", key="btn_export_excel"):
-             with st.spinner("正在生成 Excel 文件..."):
-                href = data_manager.export_to_excel()
-                if href:
-                    st.markdown(href, unsafe_allow_html=True)
-                    st.success("✅ Excel 文件已生成，请点击上方链接下载。")
-                else:
-                    st.error("生成失败。")
+        job_service = ExportJobService(data_manager)
+        if st.button("生成 Excel 文件", key="btn_export_excel"):
+            ok, result = job_service.submit(EXPORT_FULL)
+            if ok:
+                st.session_state["excel_export_job"] = result
+            else:
+                st.error(result)
+        render_export_job(job_service, "excel_export_job")
 
     with tab_import:
         st.markdown("### Excel 数据导入")
         st.write("从 Excel 文件导入数据。支持增量导入（合并）或更新现有记录。")
         st.info("注意：Excel 导入可能无法完全还原复杂的数据结构（如配方详情），建议仅用于数据迁移或批量录入。")
         
-        uploaded_excel = st.file_uploader("上传 Excel 文件", type=["xlsx", "xls"], key="excel_import_uploader")
+        uploaded_excel = st.file_uploader("上传 Excel 文件", type=["xlsx"], key="excel_import_uploader")
         if uploaded_excel is not None:
              if st.button("📥 开始导入", key="btn_import_excel"):
                 with st.spinner("正在导入..."):
-                    success, msg = data_manager.import_from_excel(uploaded_excel)
+                    success, msg = data_manager.import_from_excel(uploaded_excel, "merge", "overwrite")
                     if success:
                         st.success(f"✅ 导入成功: {msg}")
                         time.sleep(1)
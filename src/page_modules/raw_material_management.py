@@ -7,6 +7,7 @@ import io
 from utils.unit_helper import convert_quantity, normalize_unit
 from components.ui_manager import UIManager
 from core.constants import RAW_MATERIAL_CATEGORIES
+from services.where_used_service import REFERENCE_CATEGORIES
 
 def _render_batch_import(inventory_service, data_manager):
     st.markdown("### 📂 批量导入原材料")
@@ -1157,6 +1158,18 @@ def delete_raw_material_dialog(material_id, material_name, data_manager):
     st.error("此操作将永久删除该原材料，不可恢复！")
     st.markdown(f"- 名称：**{material_name}**")
     st.markdown(f"- ID：`{material_id}`")
+
+    refs = data_manager.get_where_used(material_id)
+    if refs:
+        summary = data_manager.where_used_service.summarize(refs)
+        st.warning("该原材料存在以下引用：" + "，".join(
+            f"{REFERENCE_CATEGORIES.get(cat, cat)} {cnt} 处" for cat, cnt in summary.items()
+        ))
+        with st.expander("查看引用明细"):
+            st.dataframe(pd.DataFrame([
+                {"类别": REFERENCE_CATEGORIES.get(r["category"], r["category"]), "引用位置": r["label"]}
+                for r in refs
+            ]), use_container_width=True, hide_index=True)
     
     confirm_text = st.text_input(
         "请输入 '确认删除' 以继续：",
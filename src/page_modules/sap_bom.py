@@ -1,5 +1,5 @@
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import pandas as pd
 import uuid
 import io
@@ -7,6 +7,9 @@ import graphviz
 from utils.unit_helper import convert_quantity, normalize_unit
 from components.access_manager import check_page_permission, has_permission
 from components.material_selector import render_material_cascade_selector
+from services.production_service import ORDER_STATUS_LABELS
+from services.mrp_service import format_substitutes
+from services.inventory_report_service import InventoryReportService, PERIOD_GRANULARITIES
 
 def _render_step_progress(current_status):
     """渲染生产订单步骤进度条"""
@@ -56,8 +59,9 @@ def _render_bom_tree_graphviz(bom_tree):
         else: # 物料行
             label = f"{node.get('item_name')}\n{node.get('qty')} {node.get('uom')}"
             fillcolor = '#f5f5f5' # 浅灰色
-            if node.get('substitutes'):
-                label += f"\n(🔄 {node.get('substitutes')})"
+            subs = format_substitutes(node)
+            if subs:
+                label += f"\n(🔄 {subs})"
         
         dot.node(node_id, label, fillcolor=fillcolor)
         
@@ -138,6 +142,9 @@ def _render_bom_management(data_manager, inventory_service, bom_service):
                         })
                         st.rerun()
 
+    with st.expander("🔎 物料配方变更审计", expanded=False):
+        _render_material_change_audit(data_manager, bom_service)
+
     if "bom_active_id" not in st.session_state:
         st.session_state.bom_active_id = None
     if "bom_edit_mode" not in st.session_state:
@@ -367,6 +374,11 @@ def _render_bom_detail(data_manager, inventory_service, bom, bom_service):
                 else:
                     st.info("两个版本无差异")
 
+    history = bom_service.get_bom_history(bom['id'])
+    if history:
+        with st.expander(f"🕘 变更历史 ({len(history)})", expanded=False):
+            _render_bom_history_table(history)
+
     if st.button("➕ 新增版本", type="primary"):
         # 自动生成版本号逻辑
         existing_nums = []
@@ -397,67 +409,68 @@ def _render_bom_detail(data_manager, inventory_service, bom, bom_service):
                 _render_version_editor(data_manager, inventory_service, ver)
 
 
-def _build_bom_version_diff(version_a, version_b):
-    lines_a = version_a.get("lines", []) or []
-    lines_b = version_b.get("lines", []) or []
-    merged = {}
-    for line in lines_a:
-        key = (line.get("item_type"), line.get("item_id"))
-        if key not in merged:
-            merged[key] = {}
-        merged[key]["a"] = line
-    for line in lines_b:
-        key = (line.get("item_type"), line.get("item_id"))
-        if key not in merged:
-            merged[key] = {}
-        merged[key]["b"] = line
+_CHANGE_TYPE_LABELS = {"modified": "修改", "added": "新增", "deleted": "删除"}
+_HISTORY_EVENT_LABELS = {"created": "创建", "updated": "更新"}
+
+
+def _render_bom_history_table(history):
     rows = []
-    for key, value in merged.items():
-        line_a = value.get("a")
-        line_b = value.get("b")
-        qty_a = float(line_a.get("qty", 0.0)) if line_a else 0.0
-        qty_b = float(line_b.get("qty", 0.0)) if line_b else 0.0
-        base_line = line_b or line_a or {}
-        name = base_line.get("item_name", "")
-        uom = base_line.get("uom", "")
-        diff_qty = qty_b - qty_a
-        pct = None
-        if qty_a != 0:
-            pct = diff_qty / qty_a * 100.0
-        if line_a is None:
-            change = "新增"
-        elif line_b is None:
-            change = "删除"
-        elif abs(diff_qty) < 1e-6:
-            change = "不变"
-        elif diff_qty > 0:
-            change = "用量增加"
-        else:
-            change = "用量减少"
-        rows.append(
-            {
-                "物料名称": name,
-                "物料ID": key[1],
-                "单位": uom,
-                "版本A用量": qty_a,
-                "版本B用量": qty_b,
-                "差异用量": diff_qty,
-                "差异百分比": pct,
-                "变更类型": change,
-            }
-        )
-    if not rows:
-        return pd.DataFrame([])
-    df = pd.DataFrame(rows)
-    df["版本A用量"] = df["版本A用量"].round(3)
-    df["版本B用量"] = df["版本B用量"].round(3)
-    df["差异用量"] = df["差异用量"].round(3)
-    if "差异百分比" in df.columns:
-        df["差异百分比"] = df["差异百分比"].apply(
-            lambda v: "" if pd.isna(v) else f"{v:.1f}%"
+    for entry in history:
+        diffs = entry.get("diffs", []) or []
+        fields = entry.get("fields", {}) or {}
+        summary = "; ".join(
+            f"{_CHANGE_TYPE_LABELS.get(d.get('type'), d.get('type'))} {d.get('item_name')} "
+            f"{d.get('old_qty', 0):g} -> {d.get('new_qty', 0):g}"
+            for d in diffs
         )
-    df = df.sort_values(["变更类型", "物料名称"])
-    return df
+        field_summary = "; ".join(f"{k}: {v[0]} -> {v[1]}" for k, v in fields.items())
+        rows.append({
+            "id": entry.get("id"),
+            "时间": entry.get("changed_at"),
+            "版本": entry.get("version"),
+            "事件": _HISTORY_EVENT_LABELS.get(entry.get("event"), entry.get("event")),
+            "操作人": entry.get("changed_by") or "-",
+            "物料变更": summary or "-",
+            "头信息变更": field_summary or "-",
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True, column_config={"id": None})
+
+
+def _render_material_change_audit(data_manager, bom_service):
+    materials = data_manager.get_all_raw_materials()
+    products = data_manager.get_all_products()
+    options = [("raw_material", m.get("id"), f"[原料] {m.get('name')}") for m in materials]
+    options += [("product", p.get("id"), f"[产品] {p.get('product_name') or p.get('name')}") for p in products]
+    if not options:
+        st.info("暂无物料数据")
+        return
+
+    c1, c2 = st.columns([2, 1])
+    with c1:
+        selected = st.selectbox("物料", options, format_func=lambda o: o[2], key="bom_audit_material")
+    with c2:
+        since = st.date_input("起始日期", value=date.today() - timedelta(days=90), key="bom_audit_since")
+
+    changes = bom_service.get_material_changes(selected[1], item_type=selected[0], since=since)
+    if not changes:
+        st.info("该物料在所选日期后无配方变更")
+        return
+
+    bom_map = {b.get("id"): b for b in data_manager.get_all_boms()}
+    df = pd.DataFrame([
+        {
+            "时间": c["changed_at"],
+            "BOM": (bom_map.get(c["bom_id"]) or {}).get("bom_code") or c["bom_id"],
+            "版本": c["version"],
+            "类型": _CHANGE_TYPE_LABELS.get(c["type"], c["type"]),
+            "原用量": c["old_qty"],
+            "新用量": c["new_qty"],
+            "单位": c["uom"],
+            "操作人": c["changed_by"] or "-",
+        }
+        for c in reversed(changes)
+    ])
+    st.dataframe(df, use_container_width=True, hide_index=True)
 
 
 def _render_export_download(df, base_filename, key_prefix, csv_encoding="utf-8-sig"):
@@ -636,6 +649,17 @@ def _render_version_editor(data_manager, inventory_service, version):
                 with lc2:
                     l_phase = st.text_input("阶段 (e.g. A料)", value="")
                 
+                sub_opts = {
+                    f"{m.get('name')} (ID: {m.get('id')})": m
+                    for m in data_manager.get_all_raw_materials()
+                    if not (item_type == "raw_material" and m.get("id") == selected_id)
+                }
+                sc1, sc2 = st.columns([3, 1])
+                with sc1:
+                    l_sub_labels = st.multiselect("替代料 (主料库存不足时按顺序使用)", list(sub_opts.keys()))
+                with sc2:
+                    l_sub_ratio = st.number_input("替代比例", min_value=0.01, value=1.0, step=0.05,
+                                                  help="每 kg 主料需要的替代料 kg 数")
                 l_subs = st.text_input("替代料说明 (可选)", placeholder="例如: 可用类似规格替代")
                 
                 submitted = st.form_submit_button("确认添加")
@@ -654,7 +678,16 @@ def _render_version_editor(data_manager, inventory_service, version):
                             "uom": "kg",
                             "phase": l_phase,
                             "remark": "",
-                            "substitutes": l_subs
+                            "substitutes": [
+                                {
+                                    "item_type": "raw_material",
+                                    "item_id": sub_opts[lbl].get("id"),
+                                    "item_name": sub_opts[lbl].get("name"),
+                                    "ratio": l_sub_ratio
+                                }
+                                for lbl in l_sub_labels
+                            ],
+                            "substitutes_note": l_subs
                         }
                         current_lines.append(new_line)
                         data_manager.update_bom_version(version['id'], {"lines": current_lines})
@@ -710,23 +743,20 @@ def _render_production_management(data_manager, bom_service, inventory_service):
     if "active_order_id" not in st.session_state:
         st.session_state.active_order_id = None
         
+    production_service = data_manager.production_service
     orders = data_manager.get_all_production_orders()
     
     # --- KPI 看板 ---
     if st.session_state.prod_view == "list":
-        status_counts = {"draft": 0, "released": 0, "issued": 0, "finished": 0}
-        for o in orders:
-            st_code = o.get("status", "draft")
-            if st_code in status_counts:
-                status_counts[st_code] += 1
+        status_counts = production_service.get_status_counts()
         
         with st.container(border=True):
             st.markdown("##### 📊 生产概览")
             c1, c2, c3, c4 = st.columns(4)
-            c1.metric("草稿", status_counts["draft"])
-            c2.metric("已下达", status_counts["released"])
-            c3.metric("领料中", status_counts["issued"])
-            c4.metric("已完工", status_counts["finished"])
+            c1.metric("草稿", status_counts.get("draft", 0))
+            c2.metric("已下达", status_counts.get("released", 0))
+            c3.metric("领料中", status_counts.get("issued", 0))
+            c4.metric("已完工", status_counts.get("finished", 0))
 
     if st.session_state.prod_view == "list":
         col_btn, col_search = st.columns([1, 3])
@@ -734,6 +764,16 @@ def _render_production_management(data_manager, bom_service, inventory_service):
             if st.button("➕ 创建生产单", type="primary", use_container_width=True):
                 st.session_state.prod_view = "create"
                 st.rerun()
+        with col_search:
+            status_filter = st.selectbox(
+                "状态筛选",
+                ["全部", "draft", "released", "issued", "finished"],
+                format_func=lambda x: ORDER_STATUS_LABELS.get(x, x),
+                key="prod_status_filter",
+                label_visibility="collapsed",
+            )
+        if status_filter != "全部":
+            orders = production_service.get_orders_by_status(status_filter)
         
         if not orders:
             st.info("暂无生产单")
@@ -779,6 +819,18 @@ def _render_production_management(data_manager, bom_service, inventory_service):
                 st.session_state.prod_view = "detail"
                 st.rerun()
 
+            # 批量下达 / 完工
+            with st.expander("🚀 批量下达 / 完工"):
+                _render_batch_order_transitions(data_manager, production_service)
+
+            # 批量生成领料单 (替代料分配)
+            with st.expander("📄 批量生成领料单 (含替代料分配)"):
+                _render_batch_issue_generation(data_manager, bom_service, production_service)
+
+            # 批量领料过账 (班末集中过账)
+            with st.expander("📦 批量领料过账"):
+                _render_batch_issue_posting(data_manager, inventory_service)
+
             # 原材料预警 (简化版，放在看板下方)
             with st.expander("⚠️ 原材料预警与消耗分析"):
                 _render_production_scarcity_analysis(data_manager, boms, bom_map)
@@ -789,6 +841,113 @@ def _render_production_management(data_manager, bom_service, inventory_service):
     elif st.session_state.prod_view == "detail":
         _render_production_detail(data_manager, inventory_service)
 
+def _render_batch_order_transitions(data_manager, production_service):
+    """批量下达草稿生产单 / 批量完工已领料生产单，一次提交并逐单展示结果"""
+    outcomes = st.session_state.get("batch_order_result")
+    if outcomes:
+        st.dataframe(pd.DataFrame([{
+            "单号": o.get("order_code") or o.get("order_id"),
+            "结果": "✅ 成功" if o.get("success") else "❌ 失败",
+            "说明": o.get("message"),
+        } for o in outcomes]), use_container_width=True, hide_index=True)
+        if st.button("清除结果", key="clear_batch_order_result"):
+            st.session_state.batch_order_result = None
+            st.rerun()
+
+    user = st.session_state.get("user")
+    operator = user.get("username") if user else "User"
+    actions = [
+        ("draft", "🚀 批量下达", production_service.release_orders, "PROD_ORDER_STATUS_UPDATED"),
+        ("issued", "🏁 批量完工入库", lambda ids: production_service.finish_orders(ids, operator=operator), "PROD_ORDER_FINISHED"),
+    ]
+    for status, label, action, log_action in actions:
+        candidates = production_service.get_orders_by_status(status)
+        if not candidates:
+            continue
+        opts = {f"{o.get('order_code')} ({o.get('plan_qty')} kg)": o["id"] for o in candidates}
+        selected = st.multiselect(
+            f"{ORDER_STATUS_LABELS.get(status)}生产单",
+            list(opts.keys()),
+            default=list(opts.keys()),
+            key=f"batch_order_sel_{status}",
+        )
+        if st.button(label, key=f"batch_order_btn_{status}", disabled=not selected):
+            result = action([opts[k] for k in selected])
+            st.session_state.batch_order_result = result
+            ok_codes = [o.get("order_code") for o in result if o.get("success")]
+            if user and ok_codes:
+                data_manager.add_audit_log(user, log_action, f"{label}: {', '.join(map(str, ok_codes))}")
+            st.rerun()
+
+
+def _render_batch_issue_generation(data_manager, bom_service, production_service):
+    """为已下达的生产单一次性分配主料/替代料并生成领料单"""
+    released = production_service.get_orders_by_status("released")
+    if not released:
+        st.info("暂无已下达的生产单")
+        return
+
+    opts = {f"{o.get('order_code')} ({o.get('plan_qty')} kg)": o["id"] for o in released}
+    selected = st.multiselect("生产单 (按选择顺序占用库存)", list(opts.keys()), default=list(opts.keys()),
+                              key="batch_issue_gen_sel")
+    order_ids = [opts[k] for k in selected]
+    if not order_ids:
+        return
+
+    plans = bom_service.allocate_orders(order_ids)
+    st.dataframe(pd.DataFrame([{
+        "单号": p.get("order_code"),
+        "状态": "✅ 可领料" if p.get("feasible") else "⚠️ 缺料",
+        "说明": p.get("message"),
+    } for p in plans]), use_container_width=True, hide_index=True)
+
+    allow_shortage = st.checkbox("缺料订单也生成领料单", value=False, key="batch_issue_gen_allow_shortage")
+    if st.button("📄 生成领料单", type="primary", key="batch_issue_gen_btn"):
+        result = bom_service.create_issues_from_orders(order_ids, allow_shortage=allow_shortage)
+        st.session_state.batch_order_result = result
+        user = st.session_state.get("user")
+        ok_codes = [o.get("order_code") for o in result if o.get("success")]
+        if user and ok_codes:
+            data_manager.add_audit_log(user, "ISSUE_CREATED_FROM_ORDER", f"批量生成领料单: {', '.join(map(str, ok_codes))}")
+        st.rerun()
+
+
+def _render_batch_issue_posting(data_manager, inventory_service):
+    """批量过账所有草稿领料单，一次提交并逐单展示结果"""
+    outcomes = st.session_state.get("batch_post_result")
+    if outcomes:
+        df_result = pd.DataFrame([{
+            "领料单号": o.get("issue_code") or o["issue_id"],
+            "结果": "✅ 成功" if o["success"] else "❌ 失败",
+            "说明": o["message"]
+        } for o in outcomes])
+        st.dataframe(df_result, use_container_width=True, hide_index=True)
+
+    draft_issues = [i for i in data_manager.get_material_issues() if i.get("status") == "draft"]
+    if not draft_issues:
+        st.info("暂无待过账的领料单")
+        return
+
+    issue_opts = {f"{i.get('issue_code')} (ID: {i.get('id')})": i.get("id") for i in draft_issues}
+    selected = st.multiselect("选择领料单", list(issue_opts.keys()), default=list(issue_opts.keys()), key="batch_post_issues")
+    allow_negative = st.checkbox("允许扣减为负库存", value=False, key="batch_post_allow_negative")
+
+    if st.button("✅ 批量过账", type="primary", disabled=not selected, key="batch_post_btn"):
+        user = st.session_state.get("user")
+        operator_name = user.get("username") if user else "User"
+        outcomes = inventory_service.post_issues(
+            [issue_opts[label] for label in selected],
+            operator=operator_name,
+            allow_negative_stock=allow_negative
+        )
+        posted = [o for o in outcomes if o["success"]]
+        if user and posted:
+            detail = "批量过账领料单: " + ", ".join(str(o.get("issue_code") or o["issue_id"]) for o in posted)
+            data_manager.add_audit_log(user, "ISSUE_POSTED", detail)
+
+        st.session_state.batch_post_result = outcomes
+        st.rerun()
+
 def _render_production_scarcity_analysis(data_manager, boms, bom_map):
     """提取原有的预警逻辑到独立函数"""
     raw_materials = data_manager.get_all_raw_materials()
@@ -1653,140 +1812,73 @@ def _render_inventory_reports(data_manager, bom_service):
             st.info("暂无成品消耗记录")
 
     with tab_stats:
-        gran = st.selectbox("统计周期", ["周", "月", "年度"], index=1)
-        enabled = st.checkbox("启用综合统计分析", value=False, key="inventory_stats_enabled")
-        if not enabled:
-            st.info("开启上方开关后，将加载原材料消耗、生产产出和发货出库的统计图表。")
-        else:
-            mats = data_manager.get_inventory_records()
-            prods = data_manager.get_product_inventory_records()
-            def parse_dt(x, fallback=None):
-                if not x and fallback:
-                    x = fallback
-                try:
-                    return pd.to_datetime(x)
-                except:
-                    return pd.NaT
-            def period_str(dt):
-                if pd.isna(dt):
-                    return ""
-                if gran == "周":
-                    iso = dt.isocalendar()
-                    return f"{iso.year}-W{int(iso.week):02d}"
-                if gran == "月":
-                    return dt.strftime("%Y-%m")
-                return dt.strftime("%Y")
-            df_m = pd.DataFrame(mats)
-            if not df_m.empty:
-                if "created_at" in df_m.columns:
-                    df_m["_dt"] = df_m["created_at"].apply(lambda x: parse_dt(x))
-                else:
-                    df_m["_dt"] = df_m["date"].apply(lambda x: parse_dt(x))
-                df_m["period"] = df_m["_dt"].apply(period_str)
-                df_m_cons = df_m[df_m.get("type").isin(["consume_out"])].copy()
-                mat_agg = df_m_cons.groupby("period")["quantity"].sum().reset_index()
+        gran = st.selectbox("统计周期", list(PERIOD_GRANULARITIES), index=1)
+        stats = InventoryReportService(data_manager).get_period_statistics(gran)
+        mat_agg, prod_agg, ship_agg = stats["mat_agg"], stats["prod_agg"], stats["ship_agg"]
+        mat_pivot = stats["mat_by_type"]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.caption("原材料消耗 (kg)")
+            if not mat_agg.empty:
+                st.bar_chart(mat_agg.set_index("period"))
+                mat_exp = mat_agg.rename(columns={"period": "周期", "quantity": "数量(kg)"})
+                _render_export_download(mat_exp, f"原材料消耗_{gran}", f"mat_stats_export_{gran}")
+                mat_pivot_reset = mat_pivot.reset_index()
+                st.dataframe(mat_pivot_reset, use_container_width=True)
+                _render_export_download(
+                    mat_pivot_reset,
+                    f"原材料消耗_按种类_{gran}",
+                    f"mat_type_stats_export_{gran}",
+                )
             else:
-                mat_agg = pd.DataFrame(columns=["period", "quantity"])
-            df_p = pd.DataFrame(prods)
-            if not df_p.empty:
-                if "created_at" in df_p.columns:
-                    df_p["_dt"] = df_p["created_at"].apply(lambda x: parse_dt(x))
-                else:
-                    df_p["_dt"] = df_p["date"].apply(lambda x: parse_dt(x))
-                df_p["period"] = df_p["_dt"].apply(period_str)
-                df_p_prod = df_p[df_p.get("type").isin(["in"])].copy()
-                df_p_ship = df_p[(df_p.get("type").isin(["out"])) & (df_p.get("related_doc_type") == "SHIPPING")].copy()
-                prod_agg = df_p_prod.groupby("period")["quantity"].sum().reset_index()
-                ship_agg = df_p_ship.groupby("period")["quantity"].sum().reset_index()
+                st.info("暂无数据")
+        with col2:
+            st.caption("生产产出 (吨)")
+            if not prod_agg.empty:
+                st.bar_chart(prod_agg.set_index("period"))
+                prod_exp = prod_agg.rename(columns={"period": "周期", "quantity": "数量(吨)"})
+                _render_export_download(prod_exp, f"生产产出_{gran}", f"prod_stats_export_{gran}")
             else:
-                prod_agg = pd.DataFrame(columns=["period", "quantity"])
-                ship_agg = pd.DataFrame(columns=["period", "quantity"])
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.caption("原材料消耗 (kg)")
-                if not mat_agg.empty:
-                    st.bar_chart(mat_agg.set_index("period"))
-                    mat_exp = mat_agg.rename(columns={"period": "周期", "quantity": "数量(kg)"})
-                    _render_export_download(mat_exp, f"原材料消耗_{gran}", f"mat_stats_export_{gran}")
-                    materials = data_manager.get_all_raw_materials()
-                    mat_map = {m['id']: m['name'] for m in materials}
-                    df_m_cons["_name"] = df_m_cons["material_id"].map(mat_map)
-                    if "unit" in df_m_cons.columns:
-                        df_m_cons["qty_kg"] = df_m_cons.apply(
-                            lambda x: convert_quantity(
-                                float(x["quantity"]), x["unit"], "kg"
-                            )[0]
-                            if pd.notna(x["unit"])
-                            else float(x["quantity"]),
-                            axis=1,
-                        )
-                    else:
-                        df_m_cons["qty_kg"] = df_m_cons["quantity"].astype(float)
-                    mat_by_type = (
-                        df_m_cons.groupby(["period", "_name"])["qty_kg"]
-                        .sum()
-                        .reset_index()
-                        .rename(columns={"_name": "原材料名称"})
-                    )
-                    mat_pivot = mat_by_type.pivot(
-                        index="原材料名称", columns="period", values="qty_kg"
-                    ).fillna(0.0)
-                    mat_pivot_reset = mat_pivot.reset_index()
-                    st.dataframe(mat_pivot_reset, use_container_width=True)
-                    _render_export_download(
-                        mat_pivot_reset,
-                        f"原材料消耗_按种类_{gran}",
-                        f"mat_type_stats_export_{gran}",
-                    )
-                else:
-                    st.info("暂无数据")
-            with col2:
-                st.caption("生产产出 (吨)")
-                if not prod_agg.empty:
-                    st.bar_chart(prod_agg.set_index("period"))
-                    prod_exp = prod_agg.rename(columns={"period": "周期", "quantity": "数量(吨)"})
-                    _render_export_download(prod_exp, f"生产产出_{gran}", f"prod_stats_export_{gran}")
-                else:
-                    st.info("暂无数据")
-            with col3:
-                st.caption("发货出库 (吨)")
-                if not ship_agg.empty:
-                    st.bar_chart(ship_agg.set_index("period"))
-                    ship_exp = ship_agg.rename(columns={"period": "周期", "quantity": "数量(吨)"})
-                    _render_export_download(ship_exp, f"发货出库_{gran}", f"ship_stats_export_{gran}")
-                else:
-                    st.info("暂无数据")
-            total_mat = float(mat_agg["quantity"].sum()) if not mat_agg.empty else 0.0
-            total_prod = float(prod_agg["quantity"].sum()) if not prod_agg.empty else 0.0
-            total_ship = float(ship_agg["quantity"].sum()) if not ship_agg.empty else 0.0
-            st.markdown(f"**摘要**：原料 {total_mat:.4f} kg | 生产 {total_prod:.4f} 吨 | 发货 {total_ship:.4f} 吨")
-            if not mat_agg.empty and not prod_agg.empty and not ship_agg.empty:
-                all_out = io.BytesIO()
-                try:
-                    with pd.ExcelWriter(all_out, engine='xlsxwriter') as writer:
-                        mat_exp.to_excel(writer, index=False, sheet_name=f'原材料消耗_{gran}')
-                        try:
-                            mat_pivot.reset_index().to_excel(writer, index=False, sheet_name=f'原材料消耗_按种类_{gran}')
-                        except:
-                            pass
-                        prod_exp.to_excel(writer, index=False, sheet_name=f'生产产出_{gran}')
-                        ship_exp.to_excel(writer, index=False, sheet_name=f'发货出库_{gran}')
-                        pd.DataFrame([{"指标": "原料(kg)", "总量": f"{total_mat:.4f}"},
-                                      {"指标": "生产(吨)", "总量": f"{total_prod:.4f}"},
-                                      {"指标": "发货(吨)", "总量": f"{total_ship:.4f}"}]).to_excel(writer, index=False, sheet_name='摘要')
-                except:
-                    with pd.ExcelWriter(all_out) as writer:
-                        mat_exp.to_excel(writer, index=False, sheet_name=f'原材料消耗_{gran}')
-                        try:
-                            mat_pivot.reset_index().to_excel(writer, index=False, sheet_name=f'原材料消耗_按种类_{gran}')
-                        except:
-                            pass
-                        prod_exp.to_excel(writer, index=False, sheet_name=f'生产产出_{gran}')
-                        ship_exp.to_excel(writer, index=False, sheet_name=f'发货出库_{gran}')
-                        pd.DataFrame([{"指标": "原料(kg)", "总量": f"{total_mat:.4f}"},
-                                      {"指标": "生产(吨)", "总量": f"{total_prod:.4f}"},
-                                      {"指标": "发货(吨)", "总量": f"{total_ship:.4f}"}]).to_excel(writer, index=False, sheet_name='摘要')
-                st.download_button("导出整合Excel", all_out.getvalue(), file_name=f"综合统计_{gran}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                st.info("暂无数据")
+        with col3:
+            st.caption("发货出库 (吨)")
+            if not ship_agg.empty:
+                st.bar_chart(ship_agg.set_index("period"))
+                ship_exp = ship_agg.rename(columns={"period": "周期", "quantity": "数量(吨)"})
+                _render_export_download(ship_exp, f"发货出库_{gran}", f"ship_stats_export_{gran}")
+            else:
+                st.info("暂无数据")
+        total_mat = float(mat_agg["quantity"].sum()) if not mat_agg.empty else 0.0
+        total_prod = float(prod_agg["quantity"].sum()) if not prod_agg.empty else 0.0
+        total_ship = float(ship_agg["quantity"].sum()) if not ship_agg.empty else 0.0
+        st.markdown(f"**摘要**：原料 {total_mat:.4f} kg | 生产 {total_prod:.4f} 吨 | 发货 {total_ship:.4f} 吨")
+        if not mat_agg.empty and not prod_agg.empty and not ship_agg.empty:
+            all_out = io.BytesIO()
+            try:
+                with pd.ExcelWriter(all_out, engine='xlsxwriter') as writer:
+                    mat_exp.to_excel(writer, index=False, sheet_name=f'原材料消耗_{gran}')
+                    try:
+                        mat_pivot.reset_index().to_excel(writer, index=False, sheet_name=f'原材料消耗_按种类_{gran}')
+                    except:
+                        pass
+                    prod_exp.to_excel(writer, index=False, sheet_name=f'生产产出_{gran}')
+                    ship_exp.to_excel(writer, index=False, sheet_name=f'发货出库_{gran}')
+                    pd.DataFrame([{"指标": "原料(kg)", "总量": f"{total_mat:.4f}"},
+                                  {"指标": "生产(吨)", "总量": f"{total_prod:.4f}"},
+                                  {"指标": "发货(吨)", "总量": f"{total_ship:.4f}"}]).to_excel(writer, index=False, sheet_name='摘要')
+            except:
+                with pd.ExcelWriter(all_out) as writer:
+                    mat_exp.to_excel(writer, index=False, sheet_name=f'原材料消耗_{gran}')
+                    try:
+                        mat_pivot.reset_index().to_excel(writer, index=False, sheet_name=f'原材料消耗_按种类_{gran}')
+                    except:
+                        pass
+                    prod_exp.to_excel(writer, index=False, sheet_name=f'生产产出_{gran}')
+                    ship_exp.to_excel(writer, index=False, sheet_name=f'发货出库_{gran}')
+                    pd.DataFrame([{"指标": "原料(kg)", "总量": f"{total_mat:.4f}"},
+                                  {"指标": "生产(吨)", "总量": f"{total_prod:.4f}"},
+                                  {"指标": "发货(吨)", "总量": f"{total_ship:.4f}"}]).to_excel(writer, index=False, sheet_name='摘要')
+            st.download_button("导出整合Excel", all_out.getvalue(), file_name=f"综合统计_{gran}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 # 移除 _render_bom_tree_recursive，已迁移至 BOMService 并重构为 _render_bom_tree_from_struct
 
 def _render_bom_tree_from_struct(node):
@@ -1827,7 +1919,7 @@ def _render_bom_tree_from_struct(node):
         name = node.get("item_name", "Unknown")
         qty = node.get("qty", 0)
         uom = node.get("uom", "kg")
-        subs = node.get("substitutes", "")
+        subs = format_substitutes(node)
         
         info = f"{qty} {uom}"
         if subs:
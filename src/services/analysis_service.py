@@ -7,76 +7,242 @@ Handles data analysis, DataFrame conversion, and AI preparation.
 import pandas as pd
 import numpy as np
 import logging
-import streamlit as st
+import weakref
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional, Union
+from pathlib import Path
 from services.data_service import DataService
+from services.analysis_store import AnalysisStore, ANALYSIS_CACHE_DIRNAME, flatten_records
+from services.experiment_schema import EXPERIMENT_SCHEMAS, strength_long, fluidity_long
+from services.feature_screening import screen_features, correlation_matrix
+from services.trend_service import TREND_KINDS, DEFAULT_ROLLING_WINDOW, trend_table, formula_statistics
+from services.dataset_builder import DatasetBuilder, DATASET_DIRNAME, DEFAULT_SEED, row_keys, split_mask
+from core.enums import DataCategory
 
 logger = logging.getLogger(__name__)
 
+# 分析数据源 -> DataService 集合
+DATA_TYPE_COLLECTIONS = {
+    "concrete": DataCategory.CONCRETE_EXPERIMENTS.value,
+    "mortar": DataCategory.MORTAR_EXPERIMENTS.value,
+    "paste": DataCategory.PASTE_EXPERIMENTS.value,
+    "product": DataCategory.PRODUCTS.value,
+    "synthesis": DataCategory.SYNTHESIS_RECORDS.value,
+}
+
+
+class FrameCache:
+    """
+    按 (数据源, 集合代数) 缓存扁平化后的 DataFrame，LRU 淘汰
+
+    命中判断只比较整数代数，不再对整份记录列表做哈希。
+    缓存在所有会话间共享，存取时均复制，调用方修改返回的 DataFrame (增删列、inplace 操作等) 不影响缓存。
+    """
+
+    def __init__(self, max_entries: int = 16, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+        self._sizes: Dict[tuple, int] = {}
+
+    def get(self, key: tuple) -> Optional[pd.DataFrame]:
+        df = self._entries.get(key)
+        if df is None:
+            return None
+        self._entries.move_to_end(key)
+        return df.copy()
+
+    def put(self, key: tuple, df: pd.DataFrame) -> None:
+        # 同一数据源的旧代数不会再被命中，直接丢弃
+        for stale in [k for k in self._entries if k[0] == key[0] and k != key]:
+            self._evict(stale)
+        self._entries[key] = df.copy()
+        self._sizes[key] = int(df.memory_usage(index=True, deep=False).sum())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries or (
+            len(self._entries) > 1 and sum(self._sizes.values()) > self.max_bytes
+        ):
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: tuple) -> None:
+        self._entries.pop(key, None)
+        self._sizes.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._sizes.clear()
+
+
+# 每个 DataService 实例一份缓存 (AnalysisService 随页面渲染重建，缓存需挂在数据层生命周期上)
+_frame_caches: "weakref.WeakKeyDictionary[Any, FrameCache]" = weakref.WeakKeyDictionary()
+_analysis_stores: "weakref.WeakKeyDictionary[Any, AnalysisStore]" = weakref.WeakKeyDictionary()
+
+
 class AnalysisService:
     """Service for data analysis and AI preparation."""
     
     def __init__(self, data_service: DataService):
         self.data_service = data_service
 
+    @property
+    def frame_cache(self) -> FrameCache:
+        cache = _frame_caches.get(self.data_service)
+        if cache is None:
+            cache = FrameCache()
+            _frame_caches[self.data_service] = cache
+        return cache
+
+    @property
+    def store(self) -> Optional[AnalysisStore]:
+        """持久化的增量扁平化存储，位于数据文件旁的 analysis_cache 目录"""
+        data_file = getattr(self.data_service, "data_file", None)
+        if data_file is None:
+            return None
+        store = _analysis_stores.get(self.data_service)
+        if store is None or store.cache_dir.parent != Path(data_file).parent:
+            store = AnalysisStore(Path(data_file).parent / ANALYSIS_CACHE_DIRNAME)
+            _analysis_stores[self.data_service] = store
+        return store
+
     @staticmethod
-    @st.cache_data(show_spinner=False)
-    def _convert_to_dataframe_cached(data: List[Dict[str, Any]]) -> pd.DataFrame:
+    def _convert_to_dataframe(data: List[Dict[str, Any]]) -> pd.DataFrame:
         """
-        Convert list of dicts to flattened DataFrame with caching.
+        Convert list of dicts to flattened DataFrame.
         Uses pd.json_normalize for vectorized flattening.
         """
-        if not data:
+        return flatten_records(data)
+
+    def _flatten_collection(self, data_type: str, collection: str, data: List[Dict[str, Any]]) -> pd.DataFrame:
+        """实验数据按声明结构做带类型扁平化 (每个测试配方一行)，其余数据源通用扁平化"""
+        schema = EXPERIMENT_SCHEMAS.get(data_type)
+        store = self.store
+        if schema is None:
+            return store.get_frame(collection, data) if store is not None else self._convert_to_dataframe(data)
+        if store is None:
+            return schema.flatten(data)
+        return store.get_frame(f"{collection}_typed", data, flatten=schema.flatten, finalize=schema.apply_dtypes)
+
+    def _get_derived_frame(self, data_type: str, kind: str, builder) -> pd.DataFrame:
+        collection = DATA_TYPE_COLLECTIONS.get(data_type)
+        if collection is None or data_type not in EXPERIMENT_SCHEMAS:
             return pd.DataFrame()
-        
-        # Vectorized flattening
-        df = pd.json_normalize(data, sep='_')
-        
-        # Vectorized numeric conversion
-        # Use apply to convert all columns that can be converted to numeric
-        # 'ignore' will leave non-numeric columns as is
-        df = df.apply(pd.to_numeric, errors='ignore')
-        
+        cache_key = None
+        if hasattr(self.data_service, "get_generation"):
+            cache_key = (f"{data_type}:{kind}", self.data_service.get_generation(collection))
+            cached = self.frame_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        df = builder(self.get_data_as_dataframe(data_type))
+        if cache_key is not None and self.data_service.get_generation(collection) == cache_key[1]:
+            self.frame_cache.put(cache_key, df)
         return df
 
+    def get_strength_table(self, data_type: str = "concrete") -> pd.DataFrame:
+        """
+        强度-龄期长表 (每个配方每个龄期一行)
+        Returns:
+            DataFrame: [id, recipe_id, recipe_name, formula_name, test_date, age, age_days, strength]
+        """
+        return self._get_derived_frame(data_type, "strength", strength_long)
+
+    def get_fluidity_table(self, data_type: str = "paste") -> pd.DataFrame:
+        """
+        流动度-时间长表
+        Returns:
+            DataFrame: [id, recipe_id, recipe_name, formula_name, test_date, time_label, minutes, flow_mm, std_flow_mm]
+        """
+        return self._get_derived_frame(data_type, "fluidity", fluidity_long)
+
+    def get_trend_table(self, data_type: str = "paste", kind: str = "fluidity",
+                        window: int = DEFAULT_ROLLING_WINDOW) -> pd.DataFrame:
+        """
+        趋势长表 (见 trend_service.trend_table)，按集合代数缓存
+        Args:
+            kind: fluidity (相对初始流动度的经时保持率) / strength (相对 28d 强度的发展率)
+            window: 按测试日期的滚动均值窗口
+        Returns:
+            DataFrame: [id, recipe_id, <配方列>, test_date, time, value, retention, rolling_mean]
+        """
+        if kind not in TREND_KINDS:
+            raise ValueError(f"未知的趋势类型: {kind}")
+        time_col, value_col, reference = TREND_KINDS[kind]
+        long_builder = fluidity_long if kind == "fluidity" else strength_long
+        return self._get_derived_frame(
+            data_type, f"{kind}_trend:{window}",
+            lambda df: trend_table(long_builder(df), time_col, value_col, reference, window)
+        )
+
+    def get_trend_statistics(self, data_type: str = "paste", kind: str = "fluidity") -> pd.DataFrame:
+        """
+        按配方 × 时间点的统计 (见 trend_service.formula_statistics)，按集合代数缓存
+        Returns:
+            DataFrame: [group, time, n, mean, std, min, max, retention_mean, retention_std]
+        """
+        return self._get_derived_frame(
+            data_type, f"{kind}_stats",
+            lambda df: formula_statistics(self.get_trend_table(data_type, kind))
+        )
+
     def get_data_as_dataframe(self, data_type: str = "concrete") -> pd.DataFrame:
         """
         Get data of specified type and convert to flattened DataFrame.
+        Frames are cached per collection generation, so repeated calls are free until the collection changes.
+        On a generation change only new/modified records are flattened (see AnalysisStore).
+        Paste/mortar/concrete records are flattened by their declared schema (see experiment_schema):
+        one row per test recipe, float32 / categorical columns, strength_{age} and flow_{time}_mm columns.
         
         Args:
             data_type: 'concrete', 'mortar', 'paste', 'product', 'synthesis'
         """
-        data = []
+        collection = DATA_TYPE_COLLECTIONS.get(data_type)
+        if collection is None:
+            return pd.DataFrame()
         try:
-            if data_type == "concrete":
-                data = self.data_service.get_all_concrete_experiments()
-            elif data_type == "mortar":
-                data = self.data_service.get_all_mortar_experiments()
-            elif data_type == "paste":
-                data = self.data_service.get_all_paste_experiments()
-            elif data_type == "product":
-                data = self.data_service.get_all_products()
-            elif data_type == "synthesis":
-                data = self.data_service.get_all_synthesis_records()
-            
-            if not data:
-                return pd.DataFrame()
+            cache_key = None
+            if hasattr(self.data_service, "get_generation"):
+                cache_key = (data_type, self.data_service.get_generation(collection))
+                cached = self.frame_cache.get(cache_key)
+                if cached is not None:
+                    return cached
 
-            # Use cached static method for heavy lifting
-            return self._convert_to_dataframe_cached(data)
+            data = self.data_service.load_data().get(collection, [])
+            df = self._flatten_collection(data_type, collection, data)
+            if cache_key is not None:
+                # 生成期间数据未变化才写入缓存
+                if self.data_service.get_generation(collection) == cache_key[1]:
+                    self.frame_cache.put(cache_key, df)
+            return df
             
         except Exception as e:
             logger.error(f"Error converting data to DataFrame: {e}")
             return pd.DataFrame()
 
     @staticmethod
-    @st.cache_data(show_spinner=False)
-    def get_correlation_matrix(df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate correlation matrix for numeric columns."""
-        numeric_df = df.select_dtypes(include=[np.number])
-        if numeric_df.empty:
-            return pd.DataFrame()
-        return numeric_df.corr()
+    def get_correlation_matrix(df: pd.DataFrame, columns: Optional[List[str]] = None,
+                               method: str = "pearson") -> pd.DataFrame:
+        """Calculate pairwise-complete correlation matrix for numeric (or given) columns."""
+        return correlation_matrix(df, columns, method)
+
+    def screen_features(self, data_type: str, target: str, rank_by: str = "pearson",
+                        top_k: int = 20, methods: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Rank features of a data source against a target (see feature_screening.screen_features).
+        Results are cached per collection generation.
+        """
+        methods = list(methods or ("pearson", "spearman"))
+        collection = DATA_TYPE_COLLECTIONS.get(data_type)
+        cache_key = None
+        if collection and hasattr(self.data_service, "get_generation"):
+            cache_key = (f"{data_type}:screen:{target}:{rank_by}:{top_k}:{','.join(methods)}",
+                         self.data_service.get_generation(collection))
+            cached = self.frame_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        result = screen_features(self.get_data_as_dataframe(data_type), target,
+                                 rank_by=rank_by, top_k=top_k, methods=methods)
+        if cache_key is not None and self.data_service.get_generation(collection) == cache_key[1]:
+            self.frame_cache.put(cache_key, result)
+        return result
 
     def clean_data(self, df: pd.DataFrame, strategy: str = "mean") -> pd.DataFrame:
         """Clean data by handling missing values."""
@@ -116,8 +282,14 @@ class AnalysisService:
         
         return df_norm
 
-    def prepare_ai_dataset(self, df: pd.DataFrame, target_col: str, feature_cols: Optional[List[str]] = None, split_ratio: float = 0.8) -> Union[Dict[str, Any], tuple]:
-        """Prepare dataset for AI training."""
+    def prepare_ai_dataset(self, df: pd.DataFrame, target_col: str, feature_cols: Optional[List[str]] = None,
+                           split_ratio: float = 0.8, seed: int = DEFAULT_SEED,
+                           stratify_by: Optional[str] = None) -> Union[Dict[str, Any], tuple]:
+        """
+        Prepare dataset for AI training.
+        The split is derived from (seed, row id) hashes, so it is reproducible across runs;
+        stratify_by keeps each group's train/test ratio (see dataset_builder.split_mask).
+        """
         if target_col not in df.columns:
             return None, f"Target column '{target_col}' not found"
         
@@ -134,7 +306,8 @@ class AnalysisService:
         y = y.fillna(y.mean())
         
         # Split
-        mask = np.random.rand(len(df)) < split_ratio
+        groups = df[stratify_by] if stratify_by and stratify_by in df.columns else None
+        mask = split_mask(row_keys(df), split_ratio, seed, groups)
         
         X_train = X[mask]
         X_test = X[~mask]
@@ -145,7 +318,9 @@ class AnalysisService:
             "features": feature_cols,
             "target": target_col,
             "train_samples": len(X_train),
-            "test_samples": len(X_test)
+            "test_samples": len(X_test),
+            "seed": seed,
+            "stratify_by": groups.name if groups is not None else None
         }
         
         return {
@@ -156,58 +331,86 @@ class AnalysisService:
             "info": dataset_info
         }
 
+    def export_ai_dataset(self, data_type: str, target_col: str, feature_cols: List[str],
+                          split_ratio: float = 0.8, seed: int = DEFAULT_SEED,
+                          stratify_by: Optional[str] = None, fill: str = "mean") -> Dict[str, Any]:
+        """
+        Write a reproducible train/test dataset (chunked Parquet + float32 .npy memmaps + manifest)
+        next to the data file. Identical data and parameters reuse the existing dataset directory.
+        """
+        data_file = getattr(self.data_service, "data_file", None)
+        root = Path(data_file).parent / DATASET_DIRNAME if data_file else Path(DATASET_DIRNAME)
+        collection = DATA_TYPE_COLLECTIONS.get(data_type)
+        source = {"data_type": data_type, "collection": collection}
+        return DatasetBuilder(root).build(
+            self.get_data_as_dataframe(data_type), target_col, feature_cols,
+            split_ratio=split_ratio, seed=seed, stratify_by=stratify_by, fill=fill, source=source
+        )
+
     def generate_pytorch_code(self, feature_cols: List[str], target_col: str) -> str:
-        """Generate PyTorch Dataset code snippet."""
+        """Generate PyTorch Dataset code snippet (streams the exported .npy memmaps)."""
         return f"""
+import json
+from pathlib import Path
+import numpy as np
 import torch
 from torch.utils.data import Dataset, DataLoader
-import pandas as pd
-import numpy as np
 
 class PolyCarbDataset(Dataset):
-    def __init__(self, csv_file, is_train=True):
-        self.df = pd.read_csv(csv_file)
-        
+    \"\"\"Reads a dataset exported by the analysis page (manifest.json + *_X.npy / *_y.npy).\"\"\"
+
+    def __init__(self, dataset_dir, split="train"):
+        dataset_dir = Path(dataset_dir)
+        self.manifest = json.loads((dataset_dir / "manifest.json").read_text(encoding="utf-8"))
+        info = self.manifest["splits"][split]
         # Features: {feature_cols}
-        self.features = self.df[{feature_cols}].values.astype(np.float32)
-        
         # Target: {target_col}
-        self.target = self.df['{target_col}'].values.astype(np.float32)
-        
+        # mmap_mode='r': rows are paged in on access, the file is never loaded whole
+        self.features = np.load(dataset_dir / info["X"], mmap_mode="r")
+        self.target = np.load(dataset_dir / info["y"], mmap_mode="r")
+
     def __len__(self):
-        return len(self.df)
-    
+        return len(self.target)
+
     def __getitem__(self, idx):
-        return self.features[idx], self.target[idx]
+        return torch.from_numpy(np.array(self.features[idx])), torch.tensor(self.target[idx])
 
 # Usage
-# dataset = PolyCarbDataset('train_data.csv')
-# loader = DataLoader(dataset, batch_size=32, shuffle=True)
+# train_set = PolyCarbDataset('data/datasets/<dataset_id>', 'train')
+# loader = DataLoader(train_set, batch_size=32, shuffle=True, generator=torch.Generator().manual_seed(train_set.manifest["seed"]))
 """
 
     def generate_tensorflow_code(self, feature_cols: List[str], target_col: str) -> str:
-        """Generate TensorFlow/Keras code snippet."""
+        """Generate TensorFlow/Keras code snippet (streams the exported .npy memmaps)."""
         return f"""
+import json
+from pathlib import Path
+import numpy as np
 import tensorflow as tf
-import pandas as pd
 
-def load_dataset(csv_file):
-    df = pd.read_csv(csv_file)
-    
+def load_dataset(dataset_dir, split="train", batch_size=32):
+    dataset_dir = Path(dataset_dir)
+    manifest = json.loads((dataset_dir / "manifest.json").read_text(encoding="utf-8"))
+    info = manifest["splits"][split]
     features = {feature_cols}
     target = '{target_col}'
-    
-    X = df[features].values
-    y = df[target].values
-    
-    return X, y
+
+    X = np.load(dataset_dir / info["X"], mmap_mode="r")
+    y = np.load(dataset_dir / info["y"], mmap_mode="r")
+
+    def gen():
+        for start in range(0, len(y), batch_size):
+            yield np.array(X[start:start + batch_size]), np.array(y[start:start + batch_size])
+
+    spec = (tf.TensorSpec((None, len(features)), tf.float32), tf.TensorSpec((None,), tf.float32))
+    return tf.data.Dataset.from_generator(gen, output_signature=spec), manifest
 
 # Usage
-# X_train, y_train = load_dataset('train_data.csv')
+# train_ds, manifest = load_dataset('data/datasets/<dataset_id>', 'train')
 # model = tf.keras.Sequential([
-#     tf.keras.layers.Dense(64, activation='relu', input_shape=(len(features),)),
+#     tf.keras.layers.Dense(64, activation='relu', input_shape=(len(manifest["features"]),)),
 #     tf.keras.layers.Dense(1)
 # ])
 # model.compile(optimizer='adam', loss='mse')
-# model.fit(X_train, y_train, epochs=100)
+# model.fit(train_ds, epochs=100)
 """
@@ -0,0 +1,298 @@
+"""
+Analysis Store Module
+分析数据的增量扁平化存储：只扁平化新增/修改的记录，并把结果持久化为 Parquet 列式缓存。
+
+目录结构 (analysis_cache 下，每个集合):
+    <集合>.parquet                 基础文件 (最近一次合并时的全部行)
+    <集合>.manifest.json           基础文件的 id -> 指纹 映射及当前增量日志名
+    <集合>.journal-<令牌>.jsonl    增量日志：每次变化一行 (增量文件名、变化记录的指纹、删除的 id)
+    <集合>.delta-<令牌>.parquet    增量文件：变化记录的扁平化行
+"""
+
+import json
+import uuid
+import logging
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable, Set
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_DIRNAME = "analysis_cache"
+ROW_ID_COLUMN = "id"
+MANIFEST_VERSION = 2
+# 增量文件数或累计行数 (相对当前行数) 超过阈值时合并为新的基础文件
+MAX_DELTA_PARTS = 32
+COMPACT_DELTA_RATIO = 0.5
+
+
+def record_fingerprint(record: Dict[str, Any]) -> str:
+    """
+    记录版本指纹 (内容哈希)
+    last_modified 只精确到秒，同一秒内的两次修改无法区分，因此使用内容哈希；
+    repr 比 json.dumps(sort_keys=True) 快约一倍，键顺序不同只会多做一次扁平化。
+    """
+    return hashlib.sha1(repr(record).encode("utf-8")).hexdigest()
+
+
+def flatten_records(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """扁平化记录 (嵌套字典展开为 a_b 列) 并把可转换的列转为数值"""
+    if not records:
+        return pd.DataFrame()
+    df = pd.json_normalize(records, sep='_')
+    return df.apply(pd.to_numeric, errors='ignore')
+
+
+def _coerce_object_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    统一 object 列类型，保证可写入 Parquet
+    可整体转为数值的列转为数值；其余非空值统一为字符串 (list/dict 为 JSON)。
+    """
+    for col in df.columns[df.dtypes == object]:
+        series = df[col]
+        numeric = pd.to_numeric(series, errors='coerce')
+        if numeric.notna().sum() == series.notna().sum():
+            df[col] = numeric
+            continue
+        df[col] = series.map(
+            lambda v: v if v is None or isinstance(v, str) or (isinstance(v, float) and np.isnan(v))
+            else json.dumps(v, ensure_ascii=False, default=str) if isinstance(v, (list, dict))
+            else str(v)
+        )
+    return df
+
+
+def _tmp_path(path: Path) -> Path:
+    """唯一的临时文件名，并发写入互不覆盖"""
+    return path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+
+
+def _drop_rows(frame: pd.DataFrame, keys: Set[str]) -> pd.DataFrame:
+    if frame.empty or not keys:
+        return frame
+    return frame[~frame[ROW_ID_COLUMN].astype(str).isin(keys)]
+
+
+def _concat_rows(kept: pd.DataFrame, delta: pd.DataFrame,
+                 finalize: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+    """
+    拼接保留的行与 (已统一类型的) 增量行
+    分类列先合并类别以保持 category 类型；只对拼接后类型发生变化的列重新统一类型。
+    """
+    if kept.empty:
+        return delta.reset_index(drop=True)
+    if delta.empty:
+        return kept.reset_index(drop=True)
+    kept, delta = kept.copy(deep=False), delta.copy(deep=False)
+    for col in kept.columns.intersection(delta.columns):
+        if isinstance(kept[col].dtype, pd.CategoricalDtype) and isinstance(delta[col].dtype, pd.CategoricalDtype):
+            categories = kept[col].cat.categories.union(delta[col].cat.categories)
+            kept[col] = kept[col].cat.set_categories(categories)
+            delta[col] = delta[col].cat.set_categories(categories)
+    frame = pd.concat([kept, delta], ignore_index=True)
+    before = {**delta.dtypes.to_dict(), **kept.dtypes.to_dict()}
+    mismatched = [col for col in frame.columns
+                  if col not in kept.columns or col not in delta.columns or frame[col].dtype != before[col]]
+    if mismatched:
+        fixed = finalize(frame[mismatched].copy())
+        for col in mismatched:
+            frame[col] = fixed[col]
+    return frame
+
+
+def _order_rows(frame: pd.DataFrame, records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """按 records 顺序排列行 (增量行拼接在末尾)"""
+    if frame.empty:
+        return frame
+    order = {str(r.get(ROW_ID_COLUMN)): pos for pos, r in enumerate(records)}
+    positions = frame[ROW_ID_COLUMN].astype(str).map(order).to_numpy()
+    if (positions[1:] >= positions[:-1]).all():
+        return frame
+    return frame.iloc[np.argsort(positions, kind="stable")].reset_index(drop=True)
+
+
+class AnalysisStore:
+    """
+    增量分析存储
+
+    每个集合维护一份扁平化 DataFrame 及 id -> 指纹 映射；刷新时只重新扁平化并统一类型
+    指纹变化或新增的记录，删除的记录直接丢弃。
+    磁盘上每次变化只追加一个增量文件和一行增量日志，增量累积到一定程度才合并重写基础文件；
+    进程重启后从基础文件与增量日志恢复，无需重新扁平化历史记录。
+    存储在所有会话间共享，同一集合的刷新与写盘由该集合的锁串行化。
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._fingerprints: Dict[str, Dict[str, str]] = {}
+        # 集合 -> {"journal": 当前增量日志名 (尚未落盘为 None), "parts": 增量文件数, "rows": 增量行数}
+        self._journals: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        # 按增量日志重放后行顺序未与记录对齐的集合
+        self._unordered: Set[str] = set()
+
+    def _lock(self, collection: str) -> threading.Lock:
+        return self._locks.setdefault(collection, threading.Lock())
+
+    def _paths(self, collection: str):
+        return (self.cache_dir / f"{collection}.parquet",
+                self.cache_dir / f"{collection}.manifest.json")
+
+    def _delta_files(self, collection: str) -> List[Path]:
+        if not self.cache_dir.exists():
+            return []
+        return (list(self.cache_dir.glob(f"{collection}.journal-*.jsonl"))
+                + list(self.cache_dir.glob(f"{collection}.delta-*.parquet")))
+
+    def _load_persisted(self, collection: str, finalize: Callable[[pd.DataFrame], pd.DataFrame]) -> None:
+        """读取基础文件并按增量日志重放"""
+        if collection in self._frames:
+            return
+        frame_path, manifest_path = self._paths(collection)
+        frame, fingerprints, journal = pd.DataFrame(), {}, {"journal": None, "parts": 0, "rows": 0}
+        if frame_path.exists() and manifest_path.exists():
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get("version") != MANIFEST_VERSION:
+                    raise ValueError("cache format changed")
+                fingerprints = manifest.get("fingerprints", {})
+                # 全空的分类列等类型经 Parquet 往返后丢失，读入后统一一次
+                frame = finalize(pd.read_parquet(frame_path))
+                journal["journal"] = manifest.get("journal")
+                journal_path = self.cache_dir / journal["journal"] if journal["journal"] else None
+                if journal_path is not None and journal_path.exists():
+                    with open(journal_path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            entry = json.loads(line)
+                            part = pd.read_parquet(self.cache_dir / entry["part"]) if entry["part"] else pd.DataFrame()
+                            frame = _concat_rows(_drop_rows(frame, set(entry["removed"]) | set(entry["fingerprints"])),
+                                                 part, finalize)
+                            for key in entry["removed"]:
+                                fingerprints.pop(key, None)
+                            fingerprints.update(entry["fingerprints"])
+                            journal["parts"] += 1
+                            journal["rows"] += len(part)
+                            self._unordered.add(collection)
+                if ROW_ID_COLUMN not in frame.columns or frame[ROW_ID_COLUMN].nunique() != len(fingerprints):
+                    raise ValueError("manifest does not match cached frame")
+            except Exception as e:
+                logger.warning(f"Analysis cache for {collection} unreadable, rebuilding: {e}")
+                frame, fingerprints, journal = pd.DataFrame(), {}, {"journal": None, "parts": 0, "rows": 0}
+        self._frames[collection] = frame
+        self._fingerprints[collection] = fingerprints
+        self._journals[collection] = journal
+
+    def _persist(self, collection: str, delta: pd.DataFrame, changed_fps: Dict[str, str], removed: Set[str]) -> None:
+        """
+        追加一次变化：写增量文件并在增量日志中记一行
+        首次写入或增量累积过多时改为重写基础文件 (合并)。
+        """
+        journal = self._journals[collection]
+        frame = self._frames[collection]
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            if (journal["journal"] is None or journal["parts"] >= MAX_DELTA_PARTS
+                    or journal["rows"] + len(delta) > COMPACT_DELTA_RATIO * max(len(frame), 1)):
+                self._compact(collection)
+                return
+            part = None
+            if not delta.empty:
+                part = f"{collection}.delta-{uuid.uuid4().hex}.parquet"
+                tmp_part = _tmp_path(self.cache_dir / part)
+                delta.to_parquet(tmp_part, index=False)
+                tmp_part.replace(self.cache_dir / part)
+            # 日志行写入后变化才生效；中途失败时指纹未登记，下次启动会重新扁平化这些记录
+            with open(self.cache_dir / journal["journal"], 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"part": part, "fingerprints": changed_fps, "removed": sorted(removed)},
+                                   ensure_ascii=False) + "\n")
+            journal["parts"] += 1
+            journal["rows"] += len(delta)
+        except Exception as e:
+            # 持久化失败只影响下次启动的速度，内存中的结果仍然有效；下次改为整体重写
+            journal["journal"] = None
+            logger.warning(f"Failed to persist analysis cache for {collection}: {e}")
+
+    def _compact(self, collection: str) -> None:
+        """重写基础文件与清单，并换用新的增量日志 (清单指向新日志后旧增量文件即失效)"""
+        frame_path, manifest_path = self._paths(collection)
+        stale = self._delta_files(collection)
+        journal_name = f"{collection}.journal-{uuid.uuid4().hex}.jsonl"
+        tmp_frame = _tmp_path(frame_path)
+        self._frames[collection].to_parquet(tmp_frame, index=False)
+        tmp_frame.replace(frame_path)
+        tmp_manifest = _tmp_path(manifest_path)
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "journal": journal_name,
+                       "fingerprints": self._fingerprints[collection]}, f, ensure_ascii=False)
+        tmp_manifest.replace(manifest_path)
+        self._journals[collection] = {"journal": journal_name, "parts": 0, "rows": 0}
+        for path in stale:
+            path.unlink(missing_ok=True)
+
+    def get_frame(self, collection: str, records: List[Dict[str, Any]],
+                  flatten: Optional[Callable[[List[Dict[str, Any]]], pd.DataFrame]] = None,
+                  finalize: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None) -> pd.DataFrame:
+        """
+        获取集合的扁平化 DataFrame，仅增量处理变化的记录
+        Args:
+            collection: 缓存名称 (用作缓存文件名)
+            records: 当前全部记录
+            flatten: 扁平化函数，默认 flatten_records；一条记录可展开为多行 (id 列相同)
+            finalize: 列类型统一函数 (逐列处理)，默认将 object 列转为数值/字符串
+        Returns:
+            按 records 顺序排列的 DataFrame (副本，调用方可随意修改)
+        """
+        flatten = flatten or flatten_records
+        finalize = finalize or _coerce_object_columns
+        with self._lock(collection):
+            self._load_persisted(collection, finalize)
+            old_frame = self._frames[collection]
+            old_fps = self._fingerprints[collection]
+
+            current_fps: Dict[str, str] = {}
+            changed: List[Dict[str, Any]] = []
+            changed_fps: Dict[str, str] = {}
+            for rec in records:
+                key = str(rec.get(ROW_ID_COLUMN))
+                fp = record_fingerprint(rec)
+                current_fps[key] = fp
+                if old_fps.get(key) != fp:
+                    changed.append(rec)
+                    changed_fps[key] = fp
+
+            removed = set(old_fps) - set(current_fps)
+            if not changed and not removed and len(old_fps) == len(current_fps):
+                if collection in self._unordered:
+                    self._frames[collection] = _order_rows(old_frame, records)
+                    self._unordered.discard(collection)
+                return self._frames[collection].copy()
+
+            delta = flatten(changed)
+            if not delta.empty:
+                delta = finalize(delta.reset_index(drop=True))
+            frame = _concat_rows(_drop_rows(old_frame, removed | set(changed_fps)), delta, finalize)
+            frame = _order_rows(frame, records)
+            self._frames[collection] = frame
+            self._unordered.discard(collection)
+            self._fingerprints[collection] = current_fps
+            logger.info(f"Analysis cache {collection}: {len(changed)} flattened, {len(removed)} removed")
+            self._persist(collection, delta, changed_fps, removed)
+            return frame.copy()
+
+    def clear(self, collection: Optional[str] = None) -> None:
+        """清除缓存 (内存及磁盘)"""
+        targets = [collection] if collection else list(self._frames.keys())
+        for name in targets:
+            with self._lock(name):
+                self._frames.pop(name, None)
+                self._fingerprints.pop(name, None)
+                self._journals.pop(name, None)
+                for path in list(self._paths(name)) + self._delta_files(name):
+                    if path.exists():
+                        path.unlink()
@@ -0,0 +1,375 @@
+"""
+Archive Service Module
+长期数据的列式归档：按 DataCategory 把数据写为 zstd 压缩的 Parquet 文件。
+
+目录结构 (ARCHIVE_DIR 下):
+    snapshots/<YYYYmmdd_HHMMSS>/<集合>.parquet    主数据每次归档一份快照
+    ledgers/<集合>/month=<YYYY-MM>.parquet         台账与审计日志按月分区，仅重写内容变化的月份
+
+分析与报表服务通过 read_collection (列裁剪 + 按月分区裁剪) 直接查询历史数据，无需解析旧 JSON 备份。
+"""
+
+import copy
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import ARCHIVE_DIR
+from core.constants import ARCHIVE_INTERVAL_SECONDS, ARCHIVE_RETRY_SECONDS
+from core.enums import DataCategory
+from services.inventory_report_service import parse_datetimes
+
+logger = logging.getLogger(__name__)
+
+PARQUET_COMPRESSION = "zstd"
+ARCHIVE_METADATA_KEY = b"polycarb_archive"
+SNAPSHOT_FORMAT = "%Y%m%d_%H%M%S"
+ARCHIVE_MAX_SNAPSHOTS = 24
+UNDATED_PARTITION = "undated"
+
+# 按月分区的集合 -> (时间字段优先顺序, 是否只追加)
+# 审计日志在主数据中只保留最近 1000 条，归档需保留被截断的历史，故只追加不删除
+PARTITIONED_COLLECTIONS: Dict[str, Tuple[Tuple[str, ...], bool]] = {
+    DataCategory.INVENTORY_RECORDS.value: (("created_at", "date"), False),
+    DataCategory.PRODUCT_INVENTORY_RECORDS.value: (("created_at", "date"), False),
+    DataCategory.AUDIT_LOGS.value: (("time", "created_at"), True),
+}
+# 含密码哈希，不归档
+EXCLUDED_COLLECTIONS = {DataCategory.USERS.value}
+
+_archive_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+# 归档目录 -> {"time": 最近一次尝试时间, "failures": 连续失败次数, "pending": 是否已提交后台归档}；
+# 失败时不生成快照，须据此退避。读写须持有 _attempts_lock
+_attempts: Dict[str, Dict[str, Any]] = {}
+_attempts_lock = threading.Lock()
+
+
+def iter_collections(data: Dict[str, Any]) -> Iterable[Tuple[str, List[Dict[str, Any]]]]:
+    """遍历可归档的集合；嵌套集合 (如 performance_data.synthesis) 以 "父.子" 命名"""
+    for key, value in data.items():
+        if key in EXCLUDED_COLLECTIONS:
+            continue
+        if isinstance(value, list):
+            yield key, value
+        elif isinstance(value, dict):
+            for sub, records in value.items():
+                if isinstance(records, list):
+                    yield f"{key}.{sub}", records
+
+
+def records_to_table(records: List[Dict[str, Any]], collection: str) -> pa.Table:
+    """
+    记录列表转为 Arrow 表
+    嵌套结构或类型混杂的列以 JSON 文本存储，并在文件元数据中登记，read_records 读取时还原。
+    """
+    df = pd.DataFrame.from_records([r for r in records if isinstance(r, dict)])
+    df.columns = [str(c) for c in df.columns]
+    json_columns = []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        kinds = {type(v) for v in df[col] if v is not None and not (isinstance(v, float) and pd.isna(v))}
+        if len(kinds) > 1 or kinds & {dict, list, tuple}:
+            df[col] = df[col].map(lambda v: None if v is None or (isinstance(v, float) and pd.isna(v))
+                                  else json.dumps(v, ensure_ascii=False, default=str))
+            json_columns.append(col)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[ARCHIVE_METADATA_KEY] = json.dumps({"collection": collection, "json_columns": json_columns},
+                                            ensure_ascii=False).encode("utf-8")
+    return table.replace_schema_metadata(meta)
+
+
+def _write_table(table: pa.Table, path: Path):
+    """先写临时文件再原子替换"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(table, tmp_path, compression=PARQUET_COMPRESSION)
+    tmp_path.replace(path)
+
+
+def _fingerprint(records: List[Dict[str, Any]]) -> str:
+    payload = json.dumps(records, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _record_key(record: Dict[str, Any]) -> str:
+    """只追加集合的去重键：忽略空值字段 (归档读回时空值字段被省略)"""
+    return _fingerprint([{k: v for k, v in record.items() if v is not None}])
+
+
+def month_partitions(records: List[Dict[str, Any]], time_fields: Tuple[str, ...]) -> Dict[str, List[Dict[str, Any]]]:
+    """按记录时间分到 YYYY-MM 月份；无法解析时间的记录归入 undated"""
+    records = [r for r in records if isinstance(r, dict)]
+    if not records:
+        return {}
+    df = pd.DataFrame({field: [r.get(field) for r in records] for field in time_fields})
+    parsed = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    for field in time_fields:
+        missing = parsed.isna()
+        if missing.any():
+            parsed[missing] = parse_datetimes(df.loc[missing, field])
+    labels = parsed.dt.strftime("%Y-%m").where(parsed.notna(), UNDATED_PARTITION)
+    partitions: Dict[str, List[Dict[str, Any]]] = {}
+    for record, label in zip(records, labels):
+        partitions.setdefault(label, []).append(record)
+    return partitions
+
+
+def _month_in_range(month: str, start_month: Optional[str], end_month: Optional[str]) -> bool:
+    """月份是否在范围内；undated 分区只在不限范围或明确指定时返回"""
+    if month == UNDATED_PARTITION:
+        return start_month in (None, UNDATED_PARTITION) and end_month in (None, UNDATED_PARTITION)
+    return (not start_month or month >= start_month) and (not end_month or month <= end_month)
+
+
+def _decode_records(df: pd.DataFrame, json_columns: Iterable[str]) -> List[Dict[str, Any]]:
+    json_columns = set(json_columns)
+    records = []
+    for row in df.to_dict("records"):
+        record = {}
+        for key, value in row.items():
+            if value is None or (isinstance(value, float) and pd.isna(value)):
+                continue
+            if key in json_columns:
+                value = json.loads(value)
+            elif hasattr(value, "item"):
+                value = value.item()
+            record[key] = value
+        records.append(record)
+    return records
+
+
+class ArchiveService:
+    """Parquet 归档与查询服务"""
+
+    def __init__(self, data_service, archive_dir: Optional[Path] = None):
+        """
+        Args:
+            data_service: DataService 实例。
+            archive_dir: 归档目录，默认 ARCHIVE_DIR。
+        """
+        self.data_service = data_service
+        self.archive_dir = Path(archive_dir or ARCHIVE_DIR)
+        self.snapshot_dir = self.archive_dir / "snapshots"
+        self.ledger_dir = self.archive_dir / "ledgers"
+
+    # -------------------- 归档 --------------------
+    def _archive_partitioned(self, collection: str, records: List[Dict[str, Any]]) -> int:
+        """按月写出分区集合，返回重写的分区数"""
+        time_fields, append_only = PARTITIONED_COLLECTIONS[collection]
+        target = self.ledger_dir / collection
+        manifest_path = target / "_manifest.json"
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+        partitions = month_partitions(records, time_fields)
+        written = 0
+        for month, month_records in partitions.items():
+            path = target / f"month={month}.parquet"
+            if append_only and path.exists():
+                archived = self.read_records(collection, start_month=month, end_month=month)
+                seen = {_record_key(r) for r in archived}
+                month_records = archived + [r for r in month_records if _record_key(r) not in seen]
+            fingerprint = _fingerprint(month_records)
+            if manifest.get(month) == fingerprint and path.exists():
+                continue
+            _write_table(records_to_table(month_records, collection), path)
+            manifest[month] = fingerprint
+            written += 1
+        if not append_only:
+            for month in set(manifest) - set(partitions):
+                (target / f"month={month}.parquet").unlink(missing_ok=True)
+                manifest.pop(month)
+                written += 1
+        if manifest or target.exists():
+            target.mkdir(parents=True, exist_ok=True)
+            manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, sort_keys=True, indent=2),
+                                     encoding="utf-8")
+        return written
+
+    def _attempt_state(self) -> Dict[str, Any]:
+        """本归档目录的尝试记录 (调用方持有 _attempts_lock)"""
+        return _attempts.setdefault(str(self.archive_dir), {"time": None, "failures": 0, "pending": False})
+
+    def _record_attempt(self, ok: bool):
+        with _attempts_lock:
+            state = self._attempt_state()
+            state["time"] = datetime.now()
+            state["failures"] = 0 if ok else state["failures"] + 1
+
+    def create_archive(self, data: Optional[Dict[str, Any]] = None) -> Tuple[bool, str]:
+        """
+        归档当前全部数据：主数据写一份快照，台账与审计日志增量更新按月分区
+        Args:
+            data: 数据快照；为空时复制当前数据 (load_data 返回的字典会被页面代码就地修改)
+        Returns:
+            (成功与否, 说明)
+        """
+        if not _archive_lock.acquire(blocking=False):
+            return False, "归档正在进行中"
+        ok = False
+        try:
+            if data is None:
+                data = copy.deepcopy(self.data_service.load_data())
+            snapshot = datetime.now().strftime(SNAPSHOT_FORMAT)
+            snapshot_path = self.snapshot_dir / snapshot
+            collections, partitions = 0, 0
+            for collection, records in iter_collections(data):
+                if collection in PARTITIONED_COLLECTIONS:
+                    partitions += self._archive_partitioned(collection, records)
+                elif records:
+                    _write_table(records_to_table(records, collection), snapshot_path / f"{collection}.parquet")
+                collections += 1
+            snapshot_path.mkdir(parents=True, exist_ok=True)
+            self._cleanup_snapshots()
+            logger.info(f"Archive {snapshot} written: {collections} collections, {partitions} ledger partitions updated")
+            ok = True
+            return True, f"已归档 {collections} 个集合 (快照 {snapshot}，更新 {partitions} 个月度分区)"
+        except Exception as e:
+            logger.error(f"Archive failed: {e}")
+            return False, f"归档失败: {e}"
+        finally:
+            self._record_attempt(ok)
+            _archive_lock.release()
+
+    def _cleanup_snapshots(self, max_snapshots: int = ARCHIVE_MAX_SNAPSHOTS):
+        for old in self.list_snapshots()[:-max_snapshots]:
+            shutil.rmtree(self.snapshot_dir / old, ignore_errors=True)
+            logger.info(f"Deleted old archive snapshot: {old}")
+
+    def last_archive_time(self) -> Optional[datetime]:
+        snapshots = self.list_snapshots()
+        return datetime.strptime(snapshots[-1], SNAPSHOT_FORMAT) if snapshots else None
+
+    def archive_if_due(self, interval_seconds: int = ARCHIVE_INTERVAL_SECONDS,
+                       retry_seconds: int = ARCHIVE_RETRY_SECONDS) -> bool:
+        """
+        距上次归档超过间隔时在后台线程执行归档，返回是否已提交
+        失败后按 retry_seconds 起、连续失败翻倍 (最长 interval_seconds) 退避，不在每次页面刷新时重试
+        """
+        now = datetime.now()
+        last = self.last_archive_time()
+        if last is not None and (now - last).total_seconds() < interval_seconds:
+            return False
+        # 检查与登记在同一把锁内完成，多个会话同时到期时只有一个提交 (并复制数据)
+        with _attempts_lock:
+            state = self._attempt_state()
+            if state["pending"] or _archive_lock.locked():
+                return False
+            if state["failures"]:
+                backoff = min(interval_seconds, retry_seconds * 2 ** (state["failures"] - 1))
+                if (now - state["time"]).total_seconds() < backoff:
+                    return False
+            state["pending"] = True
+        try:
+            # 在调用线程中复制数据，后台线程不遍历共享的缓存字典
+            _executor.submit(self._run_pending, copy.deepcopy(self.data_service.load_data()))
+        except Exception:
+            self._clear_pending()
+            raise
+        return True
+
+    def _run_pending(self, data: Dict[str, Any]) -> Tuple[bool, str]:
+        try:
+            return self.create_archive(data)
+        finally:
+            self._clear_pending()
+
+    def _clear_pending(self):
+        with _attempts_lock:
+            self._attempt_state()["pending"] = False
+
+    # -------------------- 查询 --------------------
+    def list_snapshots(self) -> List[str]:
+        """快照名称 (时间升序)"""
+        if not self.snapshot_dir.exists():
+            return []
+        names = []
+        for p in self.snapshot_dir.iterdir():
+            try:
+                datetime.strptime(p.name, SNAPSHOT_FORMAT)
+                names.append(p.name)
+            except ValueError:
+                continue
+        return sorted(names)
+
+    def list_partitions(self, collection: str) -> List[str]:
+        """分区集合已归档的月份 (升序，undated 在最后)"""
+        target = self.ledger_dir / collection
+        if not target.exists():
+            return []
+        months = [p.stem.split("=", 1)[1] for p in target.glob("month=*.parquet")]
+        return sorted(months, key=lambda m: (m == UNDATED_PARTITION, m))
+
+    def _collection_files(self, collection: str, snapshot: Optional[str],
+                          start_month: Optional[str], end_month: Optional[str]) -> List[Path]:
+        if collection in PARTITIONED_COLLECTIONS:
+            months = [m for m in self.list_partitions(collection) if _month_in_range(m, start_month, end_month)]
+            return [self.ledger_dir / collection / f"month={m}.parquet" for m in months]
+        snapshots = self.list_snapshots()
+        snapshot = snapshot or (snapshots[-1] if snapshots else None)
+        path = self.snapshot_dir / snapshot / f"{collection}.parquet" if snapshot else None
+        return [path] if path is not None and path.exists() else []
+
+    def _read(self, collection: str, columns: Optional[List[str]], snapshot: Optional[str],
+              start_month: Optional[str], end_month: Optional[str]) -> Tuple[pd.DataFrame, List[str]]:
+        frames, json_columns = [], set()
+        for path in self._collection_files(collection, snapshot, start_month, end_month):
+            schema = pq.read_schema(path)
+            meta = json.loads((schema.metadata or {}).get(ARCHIVE_METADATA_KEY, b"{}"))
+            json_columns.update(meta.get("json_columns", []))
+            wanted = [c for c in columns if c in schema.names] if columns else None
+            frames.append(pq.read_table(path, columns=wanted).to_pandas())
+        if not frames:
+            return pd.DataFrame(columns=columns or []), []
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        if columns:
+            df = df.reindex(columns=columns)
+        return df, sorted(json_columns & set(df.columns))
+
+    def read_collection(self, collection: str, columns: Optional[List[str]] = None,
+                        snapshot: Optional[str] = None, start_month: Optional[str] = None,
+                        end_month: Optional[str] = None) -> pd.DataFrame:
+        """
+        读取归档集合为 DataFrame (只读取所需列；嵌套/混合类型列保持 JSON 文本)
+        Args:
+            collection: 集合名 (嵌套集合如 "performance_data.synthesis")
+            columns: 需要的列，默认全部
+            snapshot: 主数据快照名，默认最新；分区集合忽略
+            start_month / end_month: 分区集合的月份范围 "YYYY-MM" (含端点)
+        """
+        return self._read(collection, columns, snapshot, start_month, end_month)[0]
+
+    def read_records(self, collection: str, snapshot: Optional[str] = None,
+                     start_month: Optional[str] = None, end_month: Optional[str] = None) -> List[Dict[str, Any]]:
+        """读取归档集合为原始记录 (还原 JSON 列，省略空值字段)"""
+        df, json_columns = self._read(collection, None, snapshot, start_month, end_month)
+        return _decode_records(df, json_columns)
+
+    def get_summary(self) -> List[Dict[str, Any]]:
+        """各归档集合的文件数、行数与占用空间 (最新快照 + 全部月度分区)"""
+        snapshots = self.list_snapshots()
+        paths: Dict[str, List[Path]] = {}
+        if snapshots:
+            for p in (self.snapshot_dir / snapshots[-1]).glob("*.parquet"):
+                paths.setdefault(p.stem, []).append(p)
+        for collection in PARTITIONED_COLLECTIONS:
+            files = list((self.ledger_dir / collection).glob("month=*.parquet"))
+            if files:
+                paths[collection] = files
+        return [{
+            "collection": collection,
+            "files": len(files),
+            "rows": sum(pq.ParquetFile(p).metadata.num_rows for p in files),
+            "bytes": sum(p.stat().st_size for p in files),
+        } for collection, files in sorted(paths.items())]
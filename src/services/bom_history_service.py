@@ -0,0 +1,286 @@
+"""
+BOM History Service Module
+记录 BOM 版本的行级变更，并通过物料索引回答配方变更审计查询。
+"""
+
+import copy
+import logging
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, date
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from core.enums import DataCategory, MaterialType
+
+logger = logging.getLogger(__name__)
+
+# 版本头部中需要审计的字段
+TRACKED_VERSION_FIELDS = ("version", "effective_from", "yield_base", "status")
+
+
+class BOMHistoryService:
+    """
+    BOM 版本变更历史服务
+
+    每次 add_bom_version / update_bom_version 时由 DataService 追加一条历史记录
+    (含行级 diff 与行快照)，本服务在只追加的历史上维护增量索引：
+    - (item_type, item_id) -> 按时间排序的变更列表，用于 "物料 M 自日期 D 以来的全部变更"
+    - version_id -> 最新历史记录，用于版本间 diff 的缓存失效
+    """
+
+    _DIFF_CACHE_SIZE = 256
+
+    def __init__(self, data_service=None):
+        """
+        Args:
+            data_service: DataService 实例，用于读取 bom_history。
+        """
+        self.data_service = data_service
+        self._reset_index()
+        self._diff_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+
+    # -------------------- Diff / Entry Builders --------------------
+    @staticmethod
+    def line_key(line: Dict[str, Any]) -> Tuple[str, Any]:
+        """BOM 行的唯一键 (item_type, item_id)"""
+        return (line.get("item_type") or MaterialType.RAW_MATERIAL.value, line.get("item_id"))
+
+    @staticmethod
+    def diff_lines(old_lines: Optional[List[Dict[str, Any]]],
+                   new_lines: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        按 (item_type, item_id) 比较两组 BOM 行
+        Returns:
+            list: [{type: added/deleted/modified, item_type, item_id, item_name, uom, qty, old_qty, new_qty}]
+        """
+        map_old = {BOMHistoryService.line_key(l): l for l in (old_lines or [])}
+        map_new = {BOMHistoryService.line_key(l): l for l in (new_lines or [])}
+
+        diffs = []
+        for key in list(map_old.keys()) + [k for k in map_new.keys() if k not in map_old]:
+            lo = map_old.get(key)
+            ln = map_new.get(key)
+            qty_old = float(lo.get("qty", 0) or 0) if lo else 0.0
+            qty_new = float(ln.get("qty", 0) or 0) if ln else 0.0
+            ref = ln or lo
+
+            if lo and not ln:
+                change_type, qty = "deleted", qty_old
+            elif ln and not lo:
+                change_type, qty = "added", qty_new
+            elif abs(qty_old - qty_new) > 1e-6:
+                change_type, qty = "modified", qty_new - qty_old
+            else:
+                continue
+
+            diffs.append({
+                "type": change_type,
+                "item_type": key[0],
+                "item_id": key[1],
+                "item_name": ref.get("item_name"),
+                "uom": ref.get("uom"),
+                "qty": qty,
+                "old_qty": qty_old,
+                "new_qty": qty_new
+            })
+        return diffs
+
+    @staticmethod
+    def find_last_entry(history: List[Dict[str, Any]], version_id: Any) -> Optional[Dict[str, Any]]:
+        """从尾部向前查找某版本最近的一条历史记录"""
+        for entry in reversed(history):
+            if entry.get("bom_version_id") == version_id:
+                return entry
+        return None
+
+    @staticmethod
+    def record_change(data: Dict[str, Any],
+                      version: Dict[str, Any],
+                      event: str,
+                      changed_by: Optional[str] = None,
+                      previous: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        向 data 中追加一条 BOM 版本变更记录 (不负责保存)
+
+        行 diff 以该版本上一次记录的行快照为基准，而非内存中的版本对象：
+        页面可能已就地修改了 lines 列表，直接比较会得到空 diff。
+
+        Args:
+            data: 完整数据字典
+            version: 变更后的版本
+            event: created / updated
+            changed_by: 操作人
+            previous: 变更前的版本字段 (用于无历史快照的旧版本及头部字段比较)
+        Returns:
+            追加的记录；无实际变化时返回 None
+        """
+        history = data.setdefault(DataCategory.BOM_HISTORY.value, [])
+        version_id = version.get("id")
+        new_lines = version.get("lines", []) or []
+
+        last_entry = BOMHistoryService.find_last_entry(history, version_id)
+        if last_entry is not None:
+            old_lines = last_entry.get("lines", [])
+        elif previous is not None:
+            old_lines = previous.get("lines", []) or []
+        else:
+            old_lines = []
+
+        diffs = BOMHistoryService.diff_lines(old_lines, new_lines)
+
+        fields = {}
+        if previous is not None:
+            for field in TRACKED_VERSION_FIELDS:
+                old_val, new_val = previous.get(field), version.get(field)
+                if old_val != new_val:
+                    fields[field] = [old_val, new_val]
+
+        if event != "created" and not diffs and not fields:
+            return None
+
+        entry = {
+            "id": (history[-1].get("id", 0) if history else 0) + 1,
+            "bom_id": version.get("bom_id"),
+            "bom_version_id": version_id,
+            "version": version.get("version"),
+            "event": event,
+            "changed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "changed_by": changed_by,
+            "diffs": diffs,
+            "fields": fields,
+            "lines": copy.deepcopy(new_lines)
+        }
+        history.append(entry)
+        return entry
+
+    # -------------------- Index --------------------
+    def _reset_index(self):
+        self._indexed_count = 0
+        self._last_indexed_id = None
+        self._entries: List[Dict[str, Any]] = []
+        self._material_index: Dict[Tuple[str, Any], List[Tuple[str, int, int]]] = {}
+        self._latest_by_version: Dict[Any, Dict[str, Any]] = {}
+
+    def _load_history(self) -> List[Dict[str, Any]]:
+        if not self.data_service:
+            return []
+        data = self.data_service.load_data()
+        return data.get(DataCategory.BOM_HISTORY.value, []) or []
+
+    def _sync_index(self) -> None:
+        """
+        增量同步索引
+
+        历史只追加，因此只需处理新增尾部；若检测到截断或替换 (如 JSON 维护后)，
+        则整体重建。
+        """
+        history = self._load_history()
+        n = len(history)
+        if n < self._indexed_count or (
+            self._indexed_count and history[self._indexed_count - 1].get("id") != self._last_indexed_id
+        ):
+            self._reset_index()
+            self._diff_cache.clear()
+
+        for pos in range(self._indexed_count, n):
+            entry = history[pos]
+            self._entries.append(entry)
+            entry_pos = len(self._entries) - 1
+            changed_at = str(entry.get("changed_at") or "")
+            for diff_pos, diff in enumerate(entry.get("diffs", []) or []):
+                key = (diff.get("item_type") or MaterialType.RAW_MATERIAL.value, diff.get("item_id"))
+                insort(self._material_index.setdefault(key, []), (changed_at, entry_pos, diff_pos))
+            self._latest_by_version[entry.get("bom_version_id")] = entry
+
+        self._indexed_count = n
+        self._last_indexed_id = history[-1].get("id") if n else None
+
+    # -------------------- Queries --------------------
+    def get_history(self, bom_id: Optional[int] = None, version_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取 BOM / 版本的变更历史 (按时间倒序)"""
+        self._sync_index()
+        result = [
+            e for e in self._entries
+            if (bom_id is None or e.get("bom_id") == bom_id)
+            and (version_id is None or e.get("bom_version_id") == version_id)
+        ]
+        result.reverse()
+        return result
+
+    def get_material_changes(self,
+                             item_id: Any,
+                             item_type: str = MaterialType.RAW_MATERIAL.value,
+                             since: Optional[Union[date, datetime, str]] = None,
+                             bom_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        查询某物料在所有 BOM 中的用量变更
+        Args:
+            item_id: 物料ID
+            item_type: raw_material / product
+            since: 起始日期 (含)
+            bom_id: 可选，仅限某个 BOM
+        Returns:
+            list: [{changed_at, changed_by, bom_id, bom_version_id, version, event, type, item_name, uom, old_qty, new_qty, qty}]
+        """
+        self._sync_index()
+        postings = self._material_index.get((item_type, item_id), [])
+
+        start = 0
+        if since:
+            if isinstance(since, datetime):
+                since_key = since.strftime("%Y-%m-%d %H:%M:%S")
+            else:
+                since_key = str(since)
+            start = bisect_left(postings, (since_key,))
+
+        rows = []
+        for changed_at, entry_pos, diff_pos in postings[start:]:
+            entry = self._entries[entry_pos]
+            if bom_id is not None and entry.get("bom_id") != bom_id:
+                continue
+            diff = entry["diffs"][diff_pos]
+            rows.append({
+                "changed_at": changed_at,
+                "changed_by": entry.get("changed_by"),
+                "bom_id": entry.get("bom_id"),
+                "bom_version_id": entry.get("bom_version_id"),
+                "version": entry.get("version"),
+                "event": entry.get("event"),
+                "type": diff.get("type"),
+                "item_name": diff.get("item_name"),
+                "uom": diff.get("uom"),
+                "old_qty": diff.get("old_qty"),
+                "new_qty": diff.get("new_qty"),
+                "qty": diff.get("qty")
+            })
+        return rows
+
+    def get_version_diff(self, version_a: Dict[str, Any], version_b: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        比较两个 BOM 版本的差异 (带缓存)
+
+        缓存键包含两版本各自最新的历史记录ID及 bom_versions 集合代数，
+        版本经 DataService、导入或记录维护修改后均自动失效。返回副本，调用方可自由修改。
+        """
+        self._sync_index()
+
+        def _rev(v):
+            entry = self._latest_by_version.get(v.get("id"))
+            return entry.get("id") if entry else None
+
+        id_a, id_b = version_a.get("id"), version_b.get("id")
+        if id_a is None or id_b is None:
+            return self.diff_lines(version_a.get("lines"), version_b.get("lines"))
+
+        generation = self.data_service.get_generation(DataCategory.BOM_VERSIONS.value) if self.data_service else None
+        cache_key = (id_a, id_b, _rev(version_a), _rev(version_b), generation)
+        cached = self._diff_cache.get(cache_key)
+        if cached is not None:
+            self._diff_cache.move_to_end(cache_key)
+            return copy.deepcopy(cached)
+
+        diffs = self.diff_lines(version_a.get("lines"), version_b.get("lines"))
+        self._diff_cache[cache_key] = diffs
+        if len(self._diff_cache) > self._DIFF_CACHE_SIZE:
+            self._diff_cache.popitem(last=False)
+        return copy.deepcopy(diffs)
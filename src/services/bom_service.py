@@ -5,12 +5,14 @@ from datetime import datetime
 from schemas.bom import BOMItem
 from core.enums import DataCategory, UnitType, MaterialType
 from services.data_service import DataService
+from services.bom_history_service import BOMHistoryService
 
 logger = logging.getLogger(__name__)
 
 class BOMService:
     def __init__(self, data_service: DataService = None):
         self.data_service = data_service or DataService()
+        self.history_service = BOMHistoryService(self.data_service)
 
     def explode_bom(self, bom_version_id: Union[int, str], target_qty: float = 1000.0) -> List[Dict[str, Any]]:
         """
@@ -23,6 +25,21 @@ class BOMService:
         """
         return self.data_service.explode_bom(bom_version_id, target_qty)
 
+    def allocate_orders(self, order_ids: List[int], strategy: str = "primary_first") -> List[Dict[str, Any]]:
+        """
+        替代料感知的批量展开：按当前库存在主料与替代料之间分配需求
+        Returns:
+            list: [{order_id, order_code, lines, shortages, substituted, feasible, message}]
+        """
+        return self.data_service.mrp_service.allocate_orders(order_ids, strategy=strategy)
+
+    def create_issues_from_orders(self, order_ids: List[int], strategy: str = "primary_first",
+                                  allow_shortage: bool = True) -> List[Dict[str, Any]]:
+        """按替代料分配结果为已下达的生产单批量生成领料单 (一次保存)"""
+        return self.data_service.mrp_service.create_issues_from_orders(
+            order_ids, strategy=strategy, allow_shortage=allow_shortage
+        )
+
     def get_bom_tree_structure(self, bom_id: int, depth: int = 0, max_depth: int = 5) -> Optional[Dict[str, Any]]:
         """
         构建 BOM 多级树状结构
@@ -65,6 +82,7 @@ class BOMService:
                     "uom": line.get("uom"),
                     "phase": line.get("phase"),
                     "substitutes": line.get("substitutes"),
+                    "substitutes_note": line.get("substitutes_note"),
                     "level": depth + 1
                 }
 
@@ -94,58 +112,16 @@ class BOMService:
     def get_bom_version_diff(self, version_a: Dict[str, Any], version_b: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         比较两个 BOM 版本的差异
+        结果按版本最新变更记录缓存，重复渲染不再重新计算。
         Returns: List of diffs
         """
-        lines_a = version_a.get("lines", []) or []
-        lines_b = version_b.get("lines", []) or []
-        
-        # Map by (item_type, item_id)
-        map_a = {}
-        for l in lines_a:
-            key = (l.get("item_type"), l.get("item_id"))
-            map_a[key] = l
-            
-        map_b = {}
-        for l in lines_b:
-            key = (l.get("item_type"), l.get("item_id"))
-            map_b[key] = l
-            
-        diffs = []
-        all_keys = set(map_a.keys()) | set(map_b.keys())
-        
-        for key in all_keys:
-            la = map_a.get(key)
-            lb = map_b.get(key)
-            
-            if la and not lb:
-                diffs.append({
-                    "type": "deleted",
-                    "item_name": la.get("item_name"),
-                    "uom": la.get("uom"),
-                    "qty": float(la.get("qty", 0)),
-                    "old_qty": float(la.get("qty", 0)),
-                    "new_qty": 0
-                })
-            elif not la and lb:
-                diffs.append({
-                    "type": "added",
-                    "item_name": lb.get("item_name"),
-                    "uom": lb.get("uom"),
-                    "qty": float(lb.get("qty", 0)),
-                    "old_qty": 0,
-                    "new_qty": float(lb.get("qty", 0))
-                })
-            else:
-                qty_a = float(la.get("qty", 0))
-                qty_b = float(lb.get("qty", 0))
-                if abs(qty_a - qty_b) > 1e-6:
-                     diffs.append({
-                        "type": "modified",
-                        "item_name": lb.get("item_name"),
-                        "uom": lb.get("uom"),
-                        "qty": qty_b - qty_a,
-                        "old_qty": qty_a,
-                        "new_qty": qty_b
-                    })
-        
-        return diffs
+        return self.history_service.get_version_diff(version_a, version_b)
+
+    def get_bom_history(self, bom_id: int, version_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取 BOM 变更历史 (按时间倒序)"""
+        return self.history_service.get_history(bom_id=bom_id, version_id=version_id)
+
+    def get_material_changes(self, item_id: Any, item_type: str = MaterialType.RAW_MATERIAL.value,
+                             since: Optional[Any] = None) -> List[Dict[str, Any]]:
+        """查询某物料自指定日期以来在所有 BOM 中的用量变更"""
+        return self.history_service.get_material_changes(item_id, item_type=item_type, since=since)
@@ -0,0 +1,200 @@
+"""
+Chart Pipeline Module
+图表数据的服务端降采样/预聚合：折线用 LTTB (Largest-Triangle-Three-Buckets) 保留形状，
+散点按二维网格分箱取均值并带计数，直方图与柱状图在服务端分箱/汇总，
+使传给 Plotly 的点数控制在预算内。
+"""
+
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LINE_POINTS = 2000
+DEFAULT_SCATTER_POINTS = 5000
+DEFAULT_BAR_CATEGORIES = 200
+COUNT_COLUMN = "点数"
+
+
+def _axis_values(series: pd.Series) -> Optional[np.ndarray]:
+    """数值/日期列转 float64 坐标，其他类型返回 None"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+        values[series.isna().to_numpy()] = np.nan
+        return values
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return None
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    LTTB 降采样，返回保留点的下标 (x 须已升序)
+    首尾点总保留；中间每个桶选出与前一保留点、下一桶均值构成三角形面积最大的点。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        next_stop = max(next_stop, next_start + 1)
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        bx, by = x[start:stop], y[start:stop]
+        area = np.abs((x[prev] - avg_x) * (by - y[prev]) - (x[prev] - bx) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def downsample_line(df: pd.DataFrame, x: Optional[str], y: str, color: Optional[str] = None,
+                    max_points: int = DEFAULT_LINE_POINTS) -> pd.DataFrame:
+    """
+    折线图降采样 (按颜色分组各自 LTTB，点数预算按组大小分配)
+    Args:
+        x: 横轴列；None 时按行号
+    """
+    if len(df) <= max_points:
+        return df
+    groups = [df] if color is None else [g for _, g in df.groupby(color, sort=False, observed=True)]
+    parts = []
+    for group in groups:
+        budget = max(3, int(max_points * len(group) / len(df)))
+        xs = np.arange(len(group), dtype=np.float64) if x is None else _axis_values(group[x])
+        ys = _axis_values(group[y])
+        if xs is None or ys is None:
+            parts.append(group.iloc[np.linspace(0, len(group) - 1, min(budget, len(group))).astype(np.int64)])
+            continue
+        valid = ~(np.isnan(xs) | np.isnan(ys))
+        order = np.flatnonzero(valid)[np.argsort(xs[valid], kind="stable")]
+        keep = lttb_indices(xs[order], ys[order], budget)
+        parts.append(group.iloc[order[keep]])
+    return pd.concat(parts) if parts else df.iloc[0:0]
+
+
+def bin_scatter(df: pd.DataFrame, x: str, y: str, color: Optional[str] = None,
+                max_points: int = DEFAULT_SCATTER_POINTS) -> pd.DataFrame:
+    """
+    散点图二维分箱：每个 (颜色, x箱, y箱) 输出一个点，坐标为箱内均值，COUNT_COLUMN 为原始点数
+    非数值坐标时退化为等间隔抽样。
+    """
+    if len(df) <= max_points:
+        return df
+    xs, ys = _axis_values(df[x]), _axis_values(df[y])
+    if xs is None or ys is None:
+        return df.iloc[np.linspace(0, len(df) - 1, max_points).astype(np.int64)]
+    n_groups = df[color].nunique() if color else 1
+    bins = max(int(np.sqrt(max_points / max(n_groups, 1))), 2)
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    frame = pd.DataFrame({
+        "_x": xs[valid], "_y": ys[valid],
+        "_bx": _bin_codes(xs[valid], bins), "_by": _bin_codes(ys[valid], bins),
+    })
+    keys = ["_bx", "_by"]
+    if color:
+        frame[color] = df[color].to_numpy()[valid]
+        keys = [color] + keys
+    binned = frame.groupby(keys, observed=True, sort=False).agg(
+        _x=("_x", "mean"), _y=("_y", "mean"), **{COUNT_COLUMN: ("_x", "size")}
+    ).reset_index()
+    out = pd.DataFrame({
+        x: _restore_axis(binned["_x"].to_numpy(), df[x]),
+        y: _restore_axis(binned["_y"].to_numpy(), df[y]),
+        COUNT_COLUMN: binned[COUNT_COLUMN].to_numpy(),
+    })
+    if color:
+        out[color] = binned[color].to_numpy()
+    return out
+
+
+def _bin_codes(values: np.ndarray, bins: int) -> np.ndarray:
+    lo, hi = values.min(), values.max()
+    if hi <= lo:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.minimum(((values - lo) / (hi - lo) * bins).astype(np.int64), bins - 1)
+
+
+def _restore_axis(values: np.ndarray, original: pd.Series):
+    if pd.api.types.is_datetime64_any_dtype(original):
+        return pd.to_datetime(values.astype(np.int64))
+    return values
+
+
+def histogram_bins(series: pd.Series, nbins: int = 20) -> pd.DataFrame:
+    """
+    服务端直方图分箱
+    Returns:
+        DataFrame: [bin_left, bin_right, bin_center, count]
+    """
+    values = pd.to_numeric(series, errors="coerce").dropna().to_numpy(dtype=np.float64)
+    if values.size == 0:
+        return pd.DataFrame(columns=["bin_left", "bin_right", "bin_center", "count"])
+    counts, edges = np.histogram(values, bins=nbins)
+    return pd.DataFrame({
+        "bin_left": edges[:-1], "bin_right": edges[1:],
+        "bin_center": (edges[:-1] + edges[1:]) / 2, "count": counts,
+    })
+
+
+def aggregate_bar(df: pd.DataFrame, x: str, y: str, color: Optional[str] = None,
+                  max_categories: int = DEFAULT_BAR_CATEGORIES) -> pd.DataFrame:
+    """
+    柱状图预汇总：按 (x, 颜色) 求和 (与 Plotly 堆叠柱的显示一致)；数值 x 的类别过多时先等宽分箱
+    """
+    keys = [x] + ([color] if color and color != x else [])
+    data = df[keys + ([y] if y not in keys else [])].copy()
+    xs = _axis_values(data[x])
+    if xs is not None and data[x].nunique() > max_categories:
+        valid = ~np.isnan(xs)
+        data = data[valid]
+        codes = _bin_codes(xs[valid], max_categories)
+        lo, hi = np.nanmin(xs), np.nanmax(xs)
+        centers = lo + (codes + 0.5) * (hi - lo) / max_categories
+        data[x] = _restore_axis(centers, df[x])
+    return data.groupby(keys, observed=True, sort=True, dropna=False)[y].sum().reset_index()
+
+
+def prepare_chart_data(df: pd.DataFrame, kind: str, x: Optional[str], y: str,
+                       color: Optional[str] = None,
+                       max_points: Optional[int] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    图表数据统一入口
+    Args:
+        kind: line / scatter / bar
+        max_points: 点数预算，默认按图表类型
+    Returns:
+        (图表数据, {"original": 原始行数, "rendered": 输出行数, "reduced": 是否经过降采样/汇总})
+    """
+    if kind == "line":
+        out = downsample_line(df, x, y, color, max_points or DEFAULT_LINE_POINTS)
+    elif kind == "scatter":
+        out = bin_scatter(df, x, y, color, max_points or DEFAULT_SCATTER_POINTS)
+    elif kind == "bar":
+        out = aggregate_bar(df, x, y, color, max_points or DEFAULT_BAR_CATEGORIES)
+    else:
+        raise ValueError(f"未知的图表类型: {kind}")
+    info = {"original": len(df), "rendered": len(out), "reduced": len(out) < len(df)}
+    if info["reduced"]:
+        logger.debug(f"Chart {kind} reduced {info['original']} -> {info['rendered']} points")
+    return out, info
+
+
+def linear_fit(df: pd.DataFrame, x: str, y: str) -> Optional[pd.DataFrame]:
+    """在全部原始数据上做最小二乘直线拟合 (降采样后的趋势线用)，返回两端点"""
+    xs, ys = _axis_values(df[x]), _axis_values(df[y])
+    if xs is None or ys is None:
+        return None
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    if valid.sum() < 2 or np.ptp(xs[valid]) == 0:
+        return None
+    slope, intercept = np.polyfit(xs[valid], ys[valid], 1)
+    ends = np.array([xs[valid].min(), xs[valid].max()])
+    return pd.DataFrame({x: _restore_axis(ends, df[x]), y: slope * ends + intercept})
@@ -13,8 +13,12 @@ from typing import Dict, List, Any, Optional, Union, Tuple
 from pathlib import Path
 import streamlit as st
 
-from config import DATA_FILE, BACKUP_DIR
+from config import DATA_FILE, BACKUP_DIR, DATA_FILE_FORMAT
 from .timeline_service import TimelineService
+from .bom_history_service import BOMHistoryService
+from .where_used_service import WhereUsedService
+from .production_service import ProductionService
+from .mrp_service import MRPService
 from utils.unit_helper import convert_quantity, normalize_unit
 from core.models import (
     Project, Experiment, User, BaseModelWithConfig, TimelineInfo,
@@ -29,10 +33,11 @@ from core.enums import (
 )
 from core.constants import (
     DATE_FORMAT, DATETIME_FORMAT, DEFAULT_UNIT_KG, WATER_MATERIAL_ALIASES, 
-    PRODUCT_NAME_WJSNJ, PRODUCT_NAME_YJSNJ, BACKUP_INTERVAL_SECONDS,
+    BACKUP_INTERVAL_SECONDS,
     RAW_MATERIAL_CATEGORIES
 )
 from utils.file_lock import file_lock
+from utils.data_codec import encode_data, read_data_file, read_json_text
 
 logger = logging.getLogger(__name__)
 
@@ -41,9 +46,17 @@ class DataService:
     
     def __init__(self):
         self.data_file = DATA_FILE
+        self.data_format = DATA_FILE_FORMAT
         self.backup_dir = BACKUP_DIR
         self._data_cache = None  # 运行时缓存
         self._last_load_time = 0
+        self._revision = 0  # 数据修订号，每次内容可能变化时递增，供派生索引判断失效
+        self._file_signature = None
+        self._global_generation = 0  # 未指明变更集合的保存 / 外部修改会使所有集合失效
+        self._generations: Dict[str, int] = {}  # 集合级代数，供分析缓存等按集合判断失效
+        self.where_used_service = WhereUsedService(self)
+        self.production_service = ProductionService(self)
+        self.mrp_service = MRPService(self)
         
         self._ensure_valid_data_file()
         
@@ -55,8 +68,7 @@ class DataService:
         """Ensure data file exists and has valid format."""
         try:
             if self.data_file.exists():
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = read_data_file(self.data_file)
                 
                 if not isinstance(data, dict):
                     raise ValueError("Data format is incorrect (not a dict)")
@@ -115,35 +127,40 @@ class DataService:
 
         try:
             if self.data_file.exists():
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = read_data_file(self.data_file)
                 data = self._ensure_data_structure(data)
                 
-        # 2. 数据迁移逻辑：使用版本标记，避免重复全量扫描
-        migrations = data.get("_migrations", {})
-        if not migrations.get("raw_material_usage_v1", False):
-            if DataCategory.RAW_MATERIALS.value in data:
-                materials = data[DataCategory.RAW_MATERIALS.value]
-                migrated = False
-                for m in materials:
-                    if "usage_category" not in m or ("usage" in m):
-                        old_usage = m.pop("usage", "")
-                        if "usage_category" not in m:
-                            m["usage_category"] = old_usage or "其他"
-                        migrated = True
-                
-                # 标记迁移已完成
-                if "_migrations" not in data:
-                    data["_migrations"] = {}
-                data["_migrations"]["raw_material_usage_v1"] = True
-                
-                if migrated:
-                    logger.info("Migrated raw material data to use 'usage_category' field.")
-                    self.save_data(data)
-                else:
-                    # 即使没有实际条目被修改，也标记已检查过，避免下次加载再扫描
-                    self.save_data(data)
+                # 2. 数据迁移逻辑：使用版本标记，避免重复全量扫描
+                migrations = data.get("_migrations", {})
+                if not migrations.get("raw_material_usage_v1", False):
+                    if DataCategory.RAW_MATERIALS.value in data:
+                        materials = data[DataCategory.RAW_MATERIALS.value]
+                        migrated = False
+                        for m in materials:
+                            if "usage_category" not in m or ("usage" in m):
+                                old_usage = m.pop("usage", "")
+                                if "usage_category" not in m:
+                                    m["usage_category"] = old_usage or "其他"
+                                migrated = True
+                        
+                        # 标记迁移已完成
+                        if "_migrations" not in data:
+                            data["_migrations"] = {}
+                        data["_migrations"]["raw_material_usage_v1"] = True
+                        
+                        if migrated:
+                            logger.info("Migrated raw material data to use 'usage_category' field.")
+                            self.save_data(data)
+                        else:
+                            # 即使没有实际条目被修改，也标记已检查过，避免下次加载再扫描
+                            self.save_data(data)
                 
+                signature = self._get_file_signature()
+                if signature != self._file_signature:
+                    self._file_signature = signature
+                    self._revision += 1
+                    self._global_generation += 1
+
                 self._data_cache = data
                 self._last_load_time = current_time
                 return data
@@ -154,8 +171,27 @@ class DataService:
             st.error(f"读取数据失败: {e}")
             return self.get_initial_data()
 
-    def save_data(self, data: Dict[str, Any]) -> bool:
-        """Save data to JSON file with atomic write and locking."""
+    def _get_file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.data_file.stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def get_revision(self) -> int:
+        """当前数据修订号 (保存或外部修改文件后递增)"""
+        return self._revision
+
+    def get_generation(self, key: str) -> int:
+        """集合代数：该集合可能发生变化时单调递增，未变化时保持不变"""
+        return self._global_generation + self._generations.get(key, 0)
+
+    def save_data(self, data: Dict[str, Any], changed: Optional[List[str]] = None) -> bool:
+        """
+        Save data to JSON file with atomic write and locking.
+        Args:
+            changed: 本次修改涉及的集合；为空时视为所有集合都可能变化
+        """
         try:
             self.data_file.parent.mkdir(parents=True, exist_ok=True)
             
@@ -167,8 +203,8 @@ class DataService:
                 # 2. Atomic Write
                 temp_file = self.data_file.with_suffix('.tmp')
                 
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
+                with open(temp_file, 'wb') as f:
+                    f.write(encode_data(data, self.data_format))
                     f.flush()
                     os.fsync(f.fileno())
                 
@@ -190,6 +226,13 @@ class DataService:
             self._data_cache = data
             import time
             self._last_load_time = time.time()
+            self._revision += 1
+            self._file_signature = self._get_file_signature()
+            if changed is None:
+                self._global_generation += 1
+            else:
+                for key in changed:
+                    self._generations[key] = self._generations.get(key, 0) + 1
             
             return True
         except Exception as e:
@@ -218,6 +261,17 @@ class DataService:
         except Exception as e:
             logger.error(f"Auto backup check failed: {e}")
 
+    def export_to_excel(self) -> Tuple[bool, str]:
+        """将所有数据 (含 SAP 台账) 导出到临时 Excel 文件，返回 (成功与否, 文件路径或错误信息)"""
+        from .export_service import ExportService
+        return ExportService(self).export_to_excel()
+
+    def import_from_excel(self, uploaded_file, mode: str = "merge", conflict: str = "skip",
+                          dry_run: bool = False) -> Tuple[bool, str]:
+        """从 Excel 导入数据 (按 ID / 业务键合并或替换，一次保存提交)，返回 (成功与否, 差异摘要或错误信息)"""
+        from .import_service import ImportService
+        return ImportService(self).import_excel(uploaded_file, mode, conflict, dry_run)
+
     def create_backup(self, force: bool = False) -> bool:
         """Create a manual backup of the data file."""
         try:
@@ -284,6 +338,7 @@ class DataService:
             DataCategory.INVENTORY_RECORDS.value: [],
             DataCategory.PRODUCTION_ORDERS.value: [],
             DataCategory.BOMS.value: [],
+            DataCategory.BOM_HISTORY.value: [],
             DataCategory.MOTHER_LIQUORS.value: [],
             DataCategory.MATERIAL_ISSUES.value: [],
             DataCategory.PRODUCT_INVENTORY.value: [],
@@ -319,7 +374,7 @@ class DataService:
         
         items.append(item)
         data[key] = items
-        return self.save_data(data)
+        return self.save_data(data, changed=[key])
 
     def _update_item(self, key: str, item_id: int, updates: Dict[str, Any]) -> bool:
         data = self.load_data()
@@ -334,7 +389,7 @@ class DataService:
         
         if updated:
             data[key] = items
-            return self.save_data(data)
+            return self.save_data(data, changed=[key])
         return False
 
     def _delete_item(self, key: str, item_id: int) -> bool:
@@ -344,7 +399,7 @@ class DataService:
         
         if len(new_items) < len(items):
             data[key] = new_items
-            return self.save_data(data)
+            return self.save_data(data, changed=[key])
         return False
 
     # -------------------- Project Methods --------------------
@@ -747,6 +802,9 @@ class DataService:
         
         versions.append(final_ver)
         data[DataCategory.BOM_VERSIONS.value] = versions
+        BOMHistoryService.record_change(
+            data, final_ver, "created", changed_by=user.get("username") if user else None
+        )
         if self.save_data(data):
             return new_id
         return None
@@ -757,11 +815,24 @@ class DataService:
         updated = False
         for i, v in enumerate(versions):
             if v.get("id") == version_id:
+                previous = dict(v)
                 versions[i].update(updated_fields)
                 updated = True
                 break
         if updated:
             data[DataCategory.BOM_VERSIONS.value] = versions
+            user = None
+            try:
+                if hasattr(st, "session_state"):
+                    user = st.session_state.get("user")
+            except Exception:
+                user = None
+            # 记录变更历史 (行 diff 基于上一次快照，与保存在同一次写入中)
+            BOMHistoryService.record_change(
+                data, versions[i], "updated",
+                changed_by=user.get("username") if user else None,
+                previous=previous
+            )
             return self.save_data(data)
         return False
 
@@ -955,117 +1026,10 @@ class DataService:
         2. 根据 BOM 自动生成/更新成品库存 (单位转换: kg -> 吨)
         3. 记录成品入库流水
         """
-        data = self.load_data()
-        orders = data.get(DataCategory.PRODUCTION_ORDERS.value, [])
-        boms = data.get(DataCategory.BOMS.value, [])
-        inventory = data.get(DataCategory.PRODUCT_INVENTORY.value, [])
-        records = data.get(DataCategory.PRODUCT_INVENTORY_RECORDS.value, [])
-        
-        target_order = None
-        target_idx = -1
-        for i, o in enumerate(orders):
-            if o.get("id") == order_id:
-                target_order = o
-                target_idx = i
-                break
-        
-        if not target_order: return False, "生产单不存在"
-        if target_order.get("status") == ProductionOrderStatus.FINISHED.value: return False, "生产单已完工"
-        
-        # 获取计划产量 (这里简化为实际产量=计划产量)
-        plan_qty = float(target_order.get("plan_qty", 0.0))
-        if plan_qty <= 0: return False, "计划产量无效"
-        
-        # 查找对应的 BOM 信息以确定产品名称和类型
-        bom_id = target_order.get("bom_id")
-        target_bom = next((b for b in boms if b.get("id") == bom_id), None)
-        
-        if not target_bom: return False, "关联 BOM 不存在"
-        
-        # 构造产品名称
-        bom_code = target_bom.get("bom_code", "").strip()
-        bom_name = target_bom.get("bom_name", "").strip()
-        
-        if bom_code:
-            product_name = f"{bom_code}-{bom_name}"
-        else:
-            product_name = bom_name
-
-        product_type = target_bom.get("bom_type", "其他")
-        
-        # 在 product_inventory 中查找对应产品
-        target_prod_idx = -1
-        
-        # 智能匹配
-        candidate_names = [product_name]
-        if "-" in product_name:
-            candidate_names.append(product_name.split("-", 1)[1])
-        
-        if product_name == "无碱速凝剂":
-            candidate_names.append(PRODUCT_NAME_WJSNJ)
-        elif product_name == "有碱速凝剂":
-            candidate_names.append(PRODUCT_NAME_YJSNJ)
-            
-        for i, p in enumerate(inventory):
-            p_name = p.get("product_name") or p.get("name")
-            if p_name in candidate_names:
-                target_prod_idx = i
-                break
-        
-        # 如果产品不存在，自动创建
-        if target_prod_idx == -1:
-            new_prod_id = self._get_next_id(inventory)
-            new_prod = {
-                "id": new_prod_id,
-                "name": product_name,
-                "type": product_type,
-                "stock_quantity": 0.0,
-                "unit": "吨", # 默认单位
-                "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            inventory.append(new_prod)
-            target_prod_idx = len(inventory) - 1
-        
-        # 更新库存
-        prod_unit = inventory[target_prod_idx].get("unit", "吨")
-        final_qty, success = convert_quantity(plan_qty, "kg", prod_unit)
-        
-        if not success:
-             logger.warning(f"Finish production unit conversion failed: {plan_qty} kg -> {prod_unit}")
-             final_qty = plan_qty
-        
-        current_stock = float(inventory[target_prod_idx].get("stock_quantity", 0.0))
-        new_stock = current_stock + final_qty
-        inventory[target_prod_idx]["stock_quantity"] = new_stock
-        inventory[target_prod_idx]["last_update"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 记录流水
-        new_rec_id = self._get_next_id(records)
-        records.append({
-            "id": new_rec_id,
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "product_name": inventory[target_prod_idx].get("product_name") or inventory[target_prod_idx].get("name"),
-            "product_type": product_type,
-            "type": StockMovementType.PRODUCE_IN.value,
-            "quantity": final_qty,
-            "reason": f"生产完工: {target_order.get('order_code')}",
-            "operator": operator,
-            "snapshot_stock": new_stock,
-            "batch_number": target_order.get('order_code')
-        })
-        
-        # 更新订单状态
-        orders[target_idx]["status"] = ProductionOrderStatus.FINISHED.value
-        orders[target_idx]["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        data[DataCategory.PRODUCTION_ORDERS.value] = orders
-        data[DataCategory.PRODUCT_INVENTORY.value] = inventory
-        data[DataCategory.PRODUCT_INVENTORY_RECORDS.value] = records
-        
-        if self.save_data(data):
-            return True, f"完工入库成功，库存增加 {final_qty:.3f} {prod_unit}"
-        return False, "保存失败"
+        outcome = self.production_service.finish_orders(
+            [order_id], operator=operator, require_posted_issues=False
+        )[0]
+        return outcome["success"], outcome["message"]
 
     def create_issue_from_order(self, order_id: int) -> Optional[int]:
         """根据生产单创建领料单"""
@@ -1075,11 +1039,8 @@ class DataService:
         
         if not order: return None
         
-        bom_version_id = order.get("bom_version_id")
-        plan_qty = float(order.get("plan_qty", 0.0))
-        
-        # 计算物料需求
-        lines = self.explode_bom(bom_version_id, plan_qty)
+        # 计算物料需求 (主料库存不足时按 BOM 行替代料补足)
+        lines = self.mrp_service.allocate_orders([order_id], data=data)[0]["lines"]
         
         # 创建领料单
         issues = data.get(DataCategory.MATERIAL_ISSUES.value, [])
@@ -1491,6 +1452,10 @@ class DataService:
                         logger.warning(f"Update failed: {msg}")
                         return False, msg
             
+            if new_name:
+                # 改名前构建反向索引，旧名称引用才能解析到该原材料
+                self.where_used_service.get_index(data)
+
             old_name = None
             updated = False
             for i, material in enumerate(materials):
@@ -1505,7 +1470,7 @@ class DataService:
                 # 如果名称发生了变化，更新所有引用该名称的记录
                 if new_name and old_name and new_name != old_name:
                     logger.info(f"Raw material renamed from '{old_name}' to '{new_name}'. Updating references...")
-                    self._update_raw_material_references(data, old_name, new_name)
+                    self._update_raw_material_references(data, material_id, old_name, new_name)
                 
                 data[DataCategory.RAW_MATERIALS.value] = materials
                 if self.save_data(data):
@@ -1524,51 +1489,26 @@ class DataService:
             logger.error(f"Error updating raw material {material_id}: {e}")
             return False, msg
     
-    def _update_raw_material_references(self, data: Dict[str, Any], old_name: str, new_name: str) -> None:
-        """更新所有引用旧原材料名称的记录"""
+    def _update_raw_material_references(self, data: Dict[str, Any], material_id: int, old_name: str, new_name: str) -> None:
+        """更新所有按名称引用该原材料的记录 (经反向索引定位，仅访问实际引用处)"""
         try:
-            count = 0
-            # 1. 更新合成实验记录
-            records = data.get(DataCategory.SYNTHESIS_RECORDS.value, [])
-            for record in records:
-                modified = False
-                # 检查所有物料列表
-                for key in ["reactor_materials", "a_materials", "b_materials"]:
-                    items = record.get(key, [])
-                    if items:
-                        for item in items:
-                            if item.get("material_name") == old_name:
-                                item["material_name"] = new_name
-                                modified = True
-                                count += 1
-                
-                if modified:
-                    record["last_modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # 2. 更新成品减水剂配方
-            products = data.get(DataCategory.PRODUCTS.value, [])
-            for product in products:
-                modified = False
-                # Check "ingredients" (standard) and "composition" (legacy)
-                for key in ["ingredients", "composition"]:
-                    items = product.get(key, [])
-                    if items:
-                        for item in items:
-                            if item.get("name") == old_name:
-                                item["name"] = new_name
-                                modified = True
-                                count += 1
-                
-                if modified:
-                    product["last_modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            if count > 0:
-                logger.info(f"Updated {count} references from '{old_name}' to '{new_name}'")
+            touched = self.where_used_service.rename_references(data, material_id, old_name, new_name)
+            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for record in touched:
+                if "lines" not in record:
+                    record["last_modified"] = now_str
+
+            if touched:
+                logger.info(f"Updated {len(touched)} records referencing '{old_name}' -> '{new_name}'")
             else:
                 logger.info(f"No references found for '{old_name}'")
                 
         except Exception as e:
             logger.error(f"Error updating references: {e}")
+
+    def get_where_used(self, item_id: int, item_type: str = MaterialType.RAW_MATERIAL.value) -> List[Dict[str, Any]]:
+        """查询物料在 BOM、合成实验、成品配方、母液、领料单及台账中的引用"""
+        return self.where_used_service.get_references(item_id, item_type)
     
     def delete_raw_material(self, material_id: int) -> tuple[bool, str]:
         """删除原材料"""
@@ -1584,36 +1524,22 @@ class DataService:
             
             material_name = material_to_delete.get("name")
             
-            # 检查引用
-            # 1. 检查合成实验记录
-            records = data.get(DataCategory.SYNTHESIS_RECORDS.value, [])
-            for record in records:
-                for key in ["reactor_materials", "a_materials", "b_materials"]:
-                    items = record.get(key, [])
-                    for item in items:
-                        if item.get("material_name") == material_name:
-                            msg = f"无法删除：该原材料在合成实验配方 {record.get('formula_id', '未知')} 中被使用"
-                            logger.warning(f"Delete blocked: {msg}")
-                            return False, msg
-            
-            # 2. 检查成品减水剂
-            products = data.get(DataCategory.PRODUCTS.value, [])
-            for product in products:
-                # 检查 ingredients
-                ingredients = product.get("ingredients", [])
-                for item in ingredients:
-                    if item.get("name") == material_name:
-                        msg = f"无法删除：该原材料在成品 {product.get('product_name', '未知')} 中被使用"
-                        logger.warning(f"Delete blocked: {msg}")
-                        return False, msg
-                
-                # 检查 composition (兼容旧数据)
-                composition = product.get("composition", [])
-                for item in composition:
-                    if item.get("name") == material_name:
-                        msg = f"无法删除：该原材料在成品 {product.get('product_name', '未知')} 中被使用"
-                        logger.warning(f"Delete blocked: {msg}")
-                        return False, msg
+            # 检查引用 (BOM、合成实验、成品配方)
+            blocking = self.where_used_service.get_references(
+                material_id, categories=("bom_lines", "synthesis_records", "products"), data=data
+            )
+            if blocking:
+                ref = blocking[0]
+                if ref["category"] == "synthesis_records":
+                    msg = f"无法删除：该原材料在合成实验配方 {ref['label']} 中被使用"
+                elif ref["category"] == "products":
+                    msg = f"无法删除：该原材料在成品 {ref['label']} 中被使用"
+                else:
+                    msg = f"无法删除：该原材料在 {ref['label']} 中被使用"
+                if len(blocking) > 1:
+                    msg += f" (共 {len(blocking)} 处引用)"
+                logger.warning(f"Delete blocked: {msg}")
+                return False, msg
 
             new_materials = [m for m in materials if m.get("id") != material_id]
             
@@ -1942,14 +1868,19 @@ class DataService:
         records = data.get(DataCategory.INVENTORY_RECORDS.value, [])
         name_set = set(str(n).strip() for n in names if n)
         target_ids = [m.get("id") for m in materials if str(m.get("name", "")).strip() in name_set]
+        drop_records = set()
+        for mid in target_ids:
+            for ref in self.where_used_service.get_references(mid, categories=("ledger",), data=data):
+                if ref["collection"] != DataCategory.INVENTORY_RECORDS.value:
+                    continue
+                # 按 ID 重新取回记录并确认仍属于该物料，索引下标可能已过期
+                record = self.where_used_service.resolve_record(data, ref)
+                if record is None or record.get("material_id") != mid:
+                    continue
+                if str(record.get("reason", "") or "").startswith("迁移自成品库存:"):
+                    drop_records.add(id(record))
         new_materials = [m for m in materials if str(m.get("name", "")).strip() not in name_set]
-        new_records = []
-        for r in records:
-            mid = r.get("material_id")
-            reason = str(r.get("reason", "") or "")
-            if mid in target_ids and reason.startswith("迁移自成品库存:"):
-                continue
-            new_records.append(r)
+        new_records = [r for r in records if id(r) not in drop_records]
         data[DataCategory.RAW_MATERIALS.value] = new_materials
         data[DataCategory.INVENTORY_RECORDS.value] = new_records
         self.save_data(data)
@@ -2256,8 +2187,7 @@ class DataService:
         """获取原始 JSON 字符串（用于数据维护）"""
         try:
             if self.data_file.exists():
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return f.read()
+                return read_json_text(self.data_file)
             return "{}"
         except Exception as e:
             logger.error(f"Error reading JSON content: {e}")
@@ -0,0 +1,227 @@
+"""
+Dataset Builder Module
+可复现的训练数据集导出：按种子确定的 (可分层) 训练/测试划分，分块写出 Parquet
+及 NumPy memmap (.npy)，并生成 manifest.json 供训练代码流式读取。
+"""
+
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATASET_DIRNAME = "datasets"
+MANIFEST_FILE = "manifest.json"
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_ROWS = 50_000
+ROW_KEY_COLUMNS = ("id", "recipe_id")
+FILL_STRATEGIES = {"mean": "训练集均值", "zero": "填 0"}
+
+
+def row_keys(df: pd.DataFrame) -> pd.Series:
+    """行的稳定标识 (id + recipe_id)，缺失时退化为行号"""
+    cols = [c for c in ROW_KEY_COLUMNS if c in df.columns]
+    if not cols:
+        return pd.Series(df.index.astype(str), index=df.index)
+    keys = df[cols[0]].astype(str)
+    for col in cols[1:]:
+        keys = keys + "|" + df[col].astype(str)
+    return keys
+
+
+def split_mask(keys: pd.Series,
+               split_ratio: float = 0.8,
+               seed: int = DEFAULT_SEED,
+               groups: Optional[pd.Series] = None) -> np.ndarray:
+    """
+    由行标识和种子确定训练集掩码
+
+    每行的随机数是 (seed, 行标识) 的哈希，与行顺序无关；新增数据不会改变已有行的归属。
+    指定 groups 时按组分层：每组内按哈希排序，取前 round(组大小 × split_ratio) 行为训练集。
+    Returns:
+        bool 数组，True 为训练集
+    """
+    hash_key = f"{seed:016d}"[-16:]
+    hashes = pd.util.hash_pandas_object(keys.astype(str).reset_index(drop=True), index=False,
+                                        hash_key=hash_key).to_numpy()
+    u = (hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+    if groups is None:
+        return u < split_ratio
+
+    group_codes = pd.Series(groups).astype(str).reset_index(drop=True)
+    mask = np.zeros(len(u), dtype=bool)
+    frame = pd.DataFrame({"u": u, "g": group_codes})
+    frame["rank"] = frame.groupby("g")["u"].rank(method="first")
+    sizes = frame.groupby("g")["u"].transform("size")
+    mask[:] = (frame["rank"] <= np.round(sizes * split_ratio)).to_numpy()
+    return mask
+
+
+class DatasetBuilder:
+    """
+    训练数据集构建器
+
+    同样的数据与参数总是得到同样的 dataset_id 与划分；已存在的数据集直接复用。
+    输出目录结构:
+        <dataset_id>/manifest.json
+        <dataset_id>/train/part-00000.parquet ...   (特征 + 目标 + 行标识)
+        <dataset_id>/train_X.npy, train_y.npy       (float32，可 np.load(..., mmap_mode='r'))
+        <dataset_id>/test/..., test_X.npy, test_y.npy
+    """
+
+    def __init__(self, output_root: Path):
+        self.output_root = Path(output_root)
+
+    @staticmethod
+    def dataset_id(df: pd.DataFrame, params: Dict[str, Any]) -> str:
+        """数据内容 + 参数的哈希"""
+        content = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        digest = hashlib.sha1(content.tobytes())
+        digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def build(self,
+              df: pd.DataFrame,
+              target: str,
+              features: Sequence[str],
+              split_ratio: float = 0.8,
+              seed: int = DEFAULT_SEED,
+              stratify_by: Optional[str] = None,
+              fill: str = "mean",
+              chunk_rows: int = DEFAULT_CHUNK_ROWS,
+              source: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        构建并写出数据集
+        Args:
+            df: 源数据 (扁平化后的 DataFrame)
+            target: 目标列；目标缺失的行不参与训练
+            features: 特征列
+            split_ratio: 训练集比例
+            seed: 划分种子
+            stratify_by: 分层列 (如 formula_name)，None 为不分层
+            fill: 特征缺失值处理 mean (训练集均值) / zero
+            chunk_rows: 每个 Parquet 分块的行数
+            source: 写入 manifest 的来源信息
+        Returns:
+            manifest 字典 (含 path)
+        """
+        features = [c for c in features if c != target]
+        missing = [c for c in [target, *features] if c not in df.columns]
+        if missing:
+            raise ValueError(f"列不存在: {', '.join(missing)}")
+        if stratify_by and stratify_by not in df.columns:
+            raise ValueError(f"分层列不存在: {stratify_by}")
+        if fill not in FILL_STRATEGIES:
+            raise ValueError(f"未知的缺失值处理方式: {fill}")
+
+        data = df[df[target].notna()].reset_index(drop=True)
+        keys = row_keys(data)
+        params = {
+            "target": target, "features": list(features), "split_ratio": split_ratio, "seed": seed,
+            "stratify_by": stratify_by, "fill": fill,
+        }
+        dataset_id = self.dataset_id(pd.concat([keys.rename("_key"), data[[target, *features]]], axis=1), params)
+        out_dir = self.output_root / dataset_id
+        manifest_path = out_dir / MANIFEST_FILE
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest["path"] = str(out_dir)
+            manifest["reused"] = True
+            return manifest
+
+        groups = data[stratify_by] if stratify_by else None
+        train_mask = split_mask(keys, split_ratio, seed, groups)
+
+        X = data[list(features)].apply(pd.to_numeric, errors="coerce").astype(np.float32)
+        y = pd.to_numeric(data[target], errors="coerce").astype(np.float32)
+        # 填充值只由训练集计算，避免测试集信息泄漏
+        fill_values = X[train_mask].mean() if fill == "mean" else pd.Series(0.0, index=X.columns)
+        fill_values = fill_values.fillna(0.0).astype(np.float32)
+        X = X.fillna(fill_values)
+
+        tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+        splits = {}
+        for split, mask in (("train", train_mask), ("test", ~train_mask)):
+            splits[split] = self._write_split(tmp_dir, split, keys[mask], X[mask], y[mask], chunk_rows)
+
+        manifest = {
+            "dataset_id": dataset_id,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **params,
+            "fill_values": {k: float(v) for k, v in fill_values.items()},
+            "feature_stats": {
+                "mean": {k: float(v) for k, v in X[train_mask].mean().fillna(0.0).items()},
+                "std": {k: float(v) for k, v in X[train_mask].std().fillna(0.0).items()},
+            },
+            "dtype": "float32",
+            "splits": splits,
+            "source": source or {},
+        }
+        with open(tmp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        tmp_dir.replace(out_dir)
+        logger.info(f"Dataset {dataset_id} written: {splits['train']['rows']} train / {splits['test']['rows']} test")
+
+        manifest["path"] = str(out_dir)
+        manifest["reused"] = False
+        return manifest
+
+    @staticmethod
+    def _write_split(out_dir: Path, split: str, keys: pd.Series, X: pd.DataFrame, y: pd.Series,
+                     chunk_rows: int) -> Dict[str, Any]:
+        n_rows, n_features = X.shape
+        x_file, y_file = f"{split}_X.npy", f"{split}_y.npy"
+        part_dir = out_dir / split
+        part_dir.mkdir(exist_ok=True)
+        if n_rows == 0:
+            # 空文件无法 mmap，直接保存空数组
+            np.save(out_dir / x_file, np.empty((0, n_features), dtype=np.float32))
+            np.save(out_dir / y_file, np.empty((0,), dtype=np.float32))
+            return {"rows": 0, "X": x_file, "y": y_file, "parquet": []}
+        x_map = np.lib.format.open_memmap(out_dir / x_file, mode="w+", dtype=np.float32, shape=(n_rows, n_features))
+        y_map = np.lib.format.open_memmap(out_dir / y_file, mode="w+", dtype=np.float32, shape=(n_rows,))
+
+        parts: List[str] = []
+        chunk_rows = max(int(chunk_rows), 1)
+        for i, start in enumerate(range(0, n_rows, chunk_rows)):
+            stop = min(start + chunk_rows, n_rows)
+            x_chunk = X.iloc[start:stop]
+            x_map[start:stop] = x_chunk.to_numpy(dtype=np.float32)
+            y_map[start:stop] = y.iloc[start:stop].to_numpy(dtype=np.float32)
+            part = x_chunk.copy()
+            part[y.name] = y.iloc[start:stop].to_numpy()
+            part.insert(0, "row_key", keys.iloc[start:stop].to_numpy())
+            name = f"part-{i:05d}.parquet"
+            part.to_parquet(part_dir / name, index=False)
+            parts.append(f"{split}/{name}")
+        x_map.flush()
+        y_map.flush()
+        del x_map, y_map
+        return {"rows": int(n_rows), "X": x_file, "y": y_file, "parquet": parts}
+
+
+def load_split(dataset_dir: Path, split: str = "train", mmap: bool = True):
+    """
+    读取数据集的某个划分
+    Returns:
+        (X, y, manifest)，mmap=True 时 X/y 为只读 memmap，不整体载入内存
+    """
+    dataset_dir = Path(dataset_dir)
+    with open(dataset_dir / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    info = manifest["splits"][split]
+    mode = "r" if mmap else None
+    X = np.load(dataset_dir / info["X"], mmap_mode=mode)
+    y = np.load(dataset_dir / info["y"], mmap_mode=mode)
+    return X, y, manifest
@@ -0,0 +1,493 @@
+"""
+Experiment Report Module
+砂浆/混凝土实验报告工作簿 (含强度发展曲线与配合比参数图表)。
+"""
+
+import io
+import re
+import time
+import logging
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, date
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterable, Callable, Tuple
+
+from openpyxl import Workbook
+from openpyxl.chart import LineChart, BarChart, Reference
+from openpyxl.styles import Font, Alignment
+
+from core.enums import DataCategory
+from utils.parallel import choose_workers, transfer_seconds
+
+logger = logging.getLogger(__name__)
+
+BATCH_MODE_WORKBOOK = "workbook"
+BATCH_MODE_ZIP = "zip"
+BATCH_MODES = {BATCH_MODE_WORKBOOK: "单个工作簿 (每个实验一个工作表)", BATCH_MODE_ZIP: "ZIP 压缩包 (每个实验一个文件)"}
+# 先串行生成的报告数，据此实测单份耗时再决定其余报告是否使用进程池
+REPORT_SAMPLE = 2
+_SHEET_TITLE_INVALID = re.compile(r"[\\/*?:\[\]]")
+
+# 样式对象在所有报告间共享 (openpyxl 按值登记样式，复用可避免每份报告重复构造)
+TITLE_FONT = Font(size=16, bold=True)
+HEADER_FONT = Font(bold=True)
+CENTER_ALIGN = Alignment(horizontal="center", vertical="center")
+
+
+def new_chart(chart_type: str, title: str, y_title: str, x_title: str, y_max: Optional[float] = None):
+    """按统一模板创建折线/柱状图"""
+    chart = BarChart() if chart_type == "bar" else LineChart()
+    chart.title = title
+    chart.y_axis.title = y_title
+    chart.x_axis.title = x_title
+    if y_max and y_max > 0:
+        chart.y_axis.scaling.max = float(y_max)
+    return chart
+
+
+def fill_mortar_report_sheet(ws, experiment, strength_y_max=None, strength_chart_type="line"):
+    title_font, header_font, center_align = TITLE_FONT, HEADER_FONT, CENTER_ALIGN
+    row = 1
+    ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=8)
+    cell = ws.cell(row=row, column=1, value="混凝土外加剂匀质性试验报告（砂浆）")
+    cell.font = title_font
+    cell.alignment = center_align
+    row += 1
+    ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=8)
+    std_cell = ws.cell(row=row, column=1, value="执行标准：GB/T 8077-2023，产品标准：GB/T 8076-2025")
+    std_cell.alignment = center_align
+    row += 2
+    headers = ["实验ID", "关联配方/外加剂名称", "试验日期", "试验人员", "水灰比", "外加剂掺量(%)", "砂含水率(%)", "备注"]
+    values = [
+        experiment.get("id"),
+        experiment.get("formula_name"),
+        experiment.get("test_date"),
+        experiment.get("operator"),
+        experiment.get("water_cement_ratio"),
+        experiment.get("admixture_dosage"),
+        experiment.get("sand_moisture"),
+        experiment.get("notes"),
+    ]
+    for col, h in enumerate(headers, start=1):
+        cell = ws.cell(row=row, column=col, value=h)
+        cell.font = header_font
+        cell.alignment = center_align
+    row += 1
+    for col, v in enumerate(values, start=1):
+        ws.cell(row=row, column=col, value=v)
+    row += 2
+    binders = ((experiment.get("materials") or {}).get("binders") or [])
+    aggregates = ((experiment.get("materials") or {}).get("aggregates") or [])
+    ws.cell(row=row, column=1, value="材料类型").font = header_font
+    ws.cell(row=row, column=2, value="材料名称").font = header_font
+    ws.cell(row=row, column=3, value="用量(g)").font = header_font
+    ws.cell(row=row, column=4, value="备注").font = header_font
+    row += 1
+    for item in binders:
+        ws.cell(row=row, column=1, value="胶凝材料")
+        ws.cell(row=row, column=2, value=item.get("name"))
+        ws.cell(row=row, column=3, value=item.get("dosage"))
+        row += 1
+    for item in aggregates:
+        ws.cell(row=row, column=1, value="细骨料")
+        ws.cell(row=row, column=2, value=item.get("name"))
+        ws.cell(row=row, column=3, value=item.get("dosage"))
+        row += 1
+    row += 2
+    recipes = experiment.get("test_recipes") or []
+    def age_sort_key(age):
+        s = str(age)
+        digits = "".join(ch for ch in s if ch.isdigit())
+        if digits:
+            try:
+                return int(digits)
+            except Exception:
+                return 0
+        return 0
+    ages_set = set()
+    for r in recipes:
+        perf = r.get("performance") or {}
+        cs = perf.get("compressive_strengths") or {}
+        for k in cs.keys():
+            ages_set.add(k)
+    ages = sorted(list(ages_set), key=age_sort_key)
+    if ages and recipes:
+        ws.cell(row=row, column=1, value="龄期").font = header_font
+        col_offset = 2
+        for idx, r in enumerate(recipes):
+            name = r.get("name") or f"配方{idx + 1}"
+            ws.cell(row=row, column=col_offset + idx, value=name).font = header_font
+        start_data_row = row + 1
+        for r_idx, age in enumerate(ages):
+            ws.cell(row=start_data_row + r_idx, column=1, value=str(age))
+            for c_idx, r in enumerate(recipes):
+                perf = r.get("performance") or {}
+                cs = perf.get("compressive_strengths") or {}
+                val = cs.get(age)
+                if val is not None:
+                    ws.cell(row=start_data_row + r_idx, column=col_offset + c_idx, value=float(val))
+        chart = new_chart(strength_chart_type, "砂浆抗压强度发展曲线", "抗压强度(MPa)", "龄期", strength_y_max)
+        data_ref = Reference(ws, min_col=2, max_col=1 + len(recipes), min_row=row, max_row=start_data_row + len(ages) - 1)
+        chart.add_data(data_ref, titles_from_data=True)
+        cats_ref = Reference(ws, min_col=1, min_row=start_data_row, max_row=start_data_row + len(ages) - 1)
+        chart.set_categories(cats_ref)
+        chart.legend.title = "配方"
+        chart_row = start_data_row + len(ages) + 2
+        ws.add_chart(chart, f"A{chart_row}")
+        ratio_header_row = chart_row + 15
+    else:
+        ratio_header_row = row + 2
+    ws.cell(row=ratio_header_row, column=1, value="指标").font = header_font
+    ws.cell(row=ratio_header_row, column=2, value="数值").font = header_font
+    ratio_data = [
+        ("水灰比", experiment.get("water_cement_ratio")),
+        ("外加剂掺量(%)", experiment.get("admixture_dosage")),
+        ("砂含水率(%)", experiment.get("sand_moisture")),
+    ]
+    for idx, (name, val) in enumerate(ratio_data, start=1):
+        ws.cell(row=ratio_header_row + idx, column=1, value=name)
+        ws.cell(row=ratio_header_row + idx, column=2, value=val)
+    bar = new_chart("bar", "砂浆配合比关键参数", "数值", "参数")
+    data_ref = Reference(ws, min_col=2, min_row=ratio_header_row, max_row=ratio_header_row + len(ratio_data))
+    bar.add_data(data_ref, titles_from_data=True)
+    cats_ref = Reference(ws, min_col=1, min_row=ratio_header_row + 1, max_row=ratio_header_row + len(ratio_data))
+    bar.set_categories(cats_ref)
+    ws.add_chart(bar, f"E{ratio_header_row}")
+
+
+def fill_concrete_report_sheet(ws, experiment, strength_y_max=None, strength_chart_type="line"):
+    title_font, header_font, center_align = TITLE_FONT, HEADER_FONT, CENTER_ALIGN
+    row = 1
+    ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=10)
+    cell = ws.cell(row=row, column=1, value="混凝土外加剂性能试验报告（拌和物与强度）")
+    cell.font = title_font
+    cell.alignment = center_align
+    row += 1
+    ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=10)
+    std_cell = ws.cell(row=row, column=1, value="执行标准：GB/T 8076-2025，试验方法：GB/T 8077-2023 相关条款")
+    std_cell.alignment = center_align
+    row += 2
+    headers = [
+        "实验ID",
+        "关联配方",
+        "测试日期",
+        "操作人",
+        "水灰比",
+        "砂率(%)",
+        "单位用量(kg/m³)",
+        "外加剂掺量(%)",
+        "砂含水率(%)",
+        "石子含水率(%)",
+    ]
+    values = [
+        experiment.get("id"),
+        experiment.get("formula_name"),
+        experiment.get("test_date"),
+        experiment.get("operator"),
+        experiment.get("water_cement_ratio"),
+        experiment.get("sand_ratio"),
+        experiment.get("unit_weight"),
+        experiment.get("admixture_dosage"),
+        experiment.get("sand_moisture"),
+        experiment.get("stone_moisture"),
+    ]
+    for col, h in enumerate(headers, start=1):
+        cell = ws.cell(row=row, column=col, value=h)
+        cell.font = header_font
+        cell.alignment = center_align
+    row += 1
+    for col, v in enumerate(values, start=1):
+        ws.cell(row=row, column=col, value=v)
+    row += 2
+    binders = ((experiment.get("materials") or {}).get("binders") or [])
+    aggregates = ((experiment.get("materials") or {}).get("aggregates") or [])
+    ws.cell(row=row, column=1, value="材料类型").font = header_font
+    ws.cell(row=row, column=2, value="材料名称").font = header_font
+    ws.cell(row=row, column=3, value="用量(kg/m³)").font = header_font
+    row += 1
+    for item in binders:
+        ws.cell(row=row, column=1, value="胶凝材料")
+        ws.cell(row=row, column=2, value=item.get("name"))
+        ws.cell(row=row, column=3, value=item.get("dosage"))
+        row += 1
+    for item in aggregates:
+        ws.cell(row=row, column=1, value="骨料")
+        ws.cell(row=row, column=2, value=item.get("name"))
+        ws.cell(row=row, column=3, value=item.get("dosage"))
+        row += 1
+    row += 2
+    recipes = experiment.get("test_recipes") or []
+    def age_sort_key(age):
+        s = str(age)
+        digits = "".join(ch for ch in s if ch.isdigit())
+        if digits:
+            try:
+                return int(digits)
+            except Exception:
+                return 0
+        return 0
+    ages_set = set()
+    for r in recipes:
+        perf = r.get("performance") or {}
+        strengths = perf.get("strengths") or {}
+        for k in strengths.keys():
+            ages_set.add(k)
+    ages = sorted(list(ages_set), key=age_sort_key)
+    if ages and recipes:
+        ws.cell(row=row, column=1, value="龄期").font = header_font
+        col_offset = 2
+        for idx, r in enumerate(recipes):
+            name = r.get("name") or f"配方{idx + 1}"
+            ws.cell(row=row, column=col_offset + idx, value=name).font = header_font
+        start_data_row = row + 1
+        for r_idx, age in enumerate(ages):
+            ws.cell(row=start_data_row + r_idx, column=1, value=str(age))
+            for c_idx, r in enumerate(recipes):
+                perf = r.get("performance") or {}
+                strengths = perf.get("strengths") or {}
+                val = strengths.get(age)
+                if val is not None:
+                    ws.cell(row=start_data_row + r_idx, column=col_offset + c_idx, value=float(val))
+        chart = new_chart(strength_chart_type, "混凝土抗压强度发展曲线", "抗压强度(MPa)", "龄期", strength_y_max)
+        data_ref = Reference(ws, min_col=2, max_col=1 + len(recipes), min_row=row, max_row=start_data_row + len(ages) - 1)
+        chart.add_data(data_ref, titles_from_data=True)
+        cats_ref = Reference(ws, min_col=1, min_row=start_data_row, max_row=start_data_row + len(ages) - 1)
+        chart.set_categories(cats_ref)
+        chart.legend.title = "配方"
+        chart_row = start_data_row + len(ages) + 2
+        ws.add_chart(chart, f"A{chart_row}")
+        ratio_header_row = chart_row + 15
+    else:
+        ratio_header_row = row + 2
+    ws.cell(row=ratio_header_row, column=1, value="指标").font = header_font
+    ws.cell(row=ratio_header_row, column=2, value="数值").font = header_font
+    ratio_data = [
+        ("水灰比", experiment.get("water_cement_ratio")),
+        ("砂率(%)", experiment.get("sand_ratio")),
+        ("单位用量(kg/m³)", experiment.get("unit_weight")),
+        ("外加剂掺量(%)", experiment.get("admixture_dosage")),
+    ]
+    for idx, (name, val) in enumerate(ratio_data, start=1):
+        ws.cell(row=ratio_header_row + idx, column=1, value=name)
+        ws.cell(row=ratio_header_row + idx, column=2, value=val)
+    bar = new_chart("bar", "混凝土配合比关键参数", "数值", "参数")
+    data_ref = Reference(ws, min_col=2, min_row=ratio_header_row, max_row=ratio_header_row + len(ratio_data))
+    bar.add_data(data_ref, titles_from_data=True)
+    cats_ref = Reference(ws, min_col=1, min_row=ratio_header_row + 1, max_row=ratio_header_row + len(ratio_data))
+    bar.set_categories(cats_ref)
+    ws.add_chart(bar, f"E{ratio_header_row}")
+
+
+# 实验类型 -> (集合, 报告标题, 填充函数)
+REPORT_TYPES = {
+    "mortar": (DataCategory.MORTAR_EXPERIMENTS.value, "砂浆实验报告", fill_mortar_report_sheet),
+    "concrete": (DataCategory.CONCRETE_EXPERIMENTS.value, "混凝土实验报告", fill_concrete_report_sheet),
+}
+
+
+def report_file_name(experiment_type: str, experiment_id: Any) -> str:
+    """报告下载文件名"""
+    sheet_title = REPORT_TYPES[experiment_type][1]
+    return f"{sheet_title}_{experiment_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+
+def find_experiment(data: Dict[str, Any], experiment_type: str, experiment_id: Any) -> Optional[Dict[str, Any]]:
+    """按类型和ID查找实验记录"""
+    collection = REPORT_TYPES[experiment_type][0]
+    return next((r for r in data.get(collection, []) if r.get("id") == experiment_id), None)
+
+
+def build_report_workbook(experiment_type: str, experiment: Dict[str, Any],
+                          strength_y_max: Optional[float] = None, strength_chart_type: str = "line") -> Workbook:
+    """生成单个实验的报告工作簿"""
+    if experiment_type not in REPORT_TYPES:
+        raise ValueError(f"不支持的实验类型: {experiment_type}")
+    _, sheet_title, fill = REPORT_TYPES[experiment_type]
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_title
+    fill(ws, experiment, strength_y_max, strength_chart_type)
+    return wb
+
+
+def write_experiment_report(experiment_type: str, experiment: Dict[str, Any], path: Path,
+                            strength_y_max: Optional[float] = None, strength_chart_type: str = "line") -> Path:
+    """生成报告并写入文件 (先写临时文件再原子替换)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb = build_report_workbook(experiment_type, experiment, strength_y_max, strength_chart_type)
+    tmp_path = path.with_name(path.name + ".tmp")
+    wb.save(tmp_path)
+    tmp_path.replace(path)
+    return path
+
+
+def _record_date(record: Dict[str, Any]) -> Optional[date]:
+    """实验日期：优先 test_date，缺失时取 created_at 的日期部分"""
+    for field in ("test_date", "created_at"):
+        text = str(record.get(field) or "").strip()[:10].replace("/", "-")
+        if text:
+            try:
+                return date.fromisoformat(text)
+            except ValueError:
+                continue
+    return None
+
+
+def filter_experiments(records: Iterable[Dict[str, Any]], date_from: Optional[date] = None,
+                       date_to: Optional[date] = None, formula_name: Optional[str] = None,
+                       operator: Optional[str] = None, experiment_ids: Optional[Iterable[Any]] = None
+                       ) -> List[Dict[str, Any]]:
+    """
+    按条件筛选实验记录 (条件为空时不限制)
+    Args:
+        date_from / date_to: 实验日期范围 (含端点)，无法解析日期的记录在限定范围时被排除
+        formula_name: 关联配方名称 (精确匹配)
+        operator: 试验人员 (精确匹配)
+        experiment_ids: 限定的实验ID
+    """
+    ids = {str(i) for i in experiment_ids} if experiment_ids is not None else None
+    formula_name = str(formula_name).strip() if formula_name else ""
+    operator = str(operator).strip() if operator else ""
+    result = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        if ids is not None and str(record.get("id")) not in ids:
+            continue
+        if formula_name and str(record.get("formula_name", "")).strip() != formula_name:
+            continue
+        if operator and str(record.get("operator", "")).strip() != operator:
+            continue
+        if date_from or date_to:
+            day = _record_date(record)
+            if day is None or (date_from and day < date_from) or (date_to and day > date_to):
+                continue
+        result.append(record)
+    return result
+
+
+def batch_report_file_name(experiment_type: str, mode: str = BATCH_MODE_WORKBOOK) -> str:
+    """批量报告下载文件名"""
+    suffix = "zip" if mode == BATCH_MODE_ZIP else "xlsx"
+    return f"{REPORT_TYPES[experiment_type][1]}_批量_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{suffix}"
+
+
+def report_sheet_title(experiment: Dict[str, Any], used: set) -> str:
+    """批量工作簿中的工作表名：ID_配方名，去除非法字符、截断到 31 字符并保证唯一"""
+    base = _SHEET_TITLE_INVALID.sub("_", f"{experiment.get('id')}_{experiment.get('formula_name') or ''}").strip("_'")
+    base = base[:31] or "报告"
+    title, n = base, 2
+    while title in used:
+        tail = f"_{n}"
+        title, n = base[:31 - len(tail)] + tail, n + 1
+    used.add(title)
+    return title
+
+
+def _render_report_bytes(task: Tuple[str, Dict[str, Any], Optional[float], str]) -> bytes:
+    """子进程入口：生成单份报告并返回 xlsx 字节"""
+    experiment_type, experiment, strength_y_max, strength_chart_type = task
+    buffer = io.BytesIO()
+    build_report_workbook(experiment_type, experiment, strength_y_max, strength_chart_type).save(buffer)
+    return buffer.getvalue()
+
+
+def _render_reports(tasks: List[Tuple[str, Dict[str, Any], Optional[float], str]],
+                    max_workers: Optional[int], progress: Optional[Callable[[float, str], None]]) -> Iterable[bytes]:
+    """
+    按顺序产出各报告字节
+    先串行生成 REPORT_SAMPLE 份实测单份耗时，预计进程池 (按 CPU 数量) 明显更快时其余报告并行生成；
+    进程池不可用时回退为串行
+    """
+    total = max(len(tasks), 1)
+    done = 0
+    elapsed, sample = 0.0, []
+    for task in tasks[:REPORT_SAMPLE]:
+        start = time.perf_counter()
+        content = _render_report_bytes(task)
+        elapsed += time.perf_counter() - start
+        sample.append((task, content))
+        done += 1
+        if progress:
+            progress(done / total, f"生成报告 {done}/{len(tasks)}")
+        yield content
+    rest = tasks[done:]
+    workers = 1
+    if rest and max_workers != 1:
+        workers = choose_workers(len(rest), elapsed / done, max_workers, transfer_seconds(sample) / done)
+    if workers > 1:
+        try:
+            # 报告在导出线程中生成：fork 多线程的 Streamlit 进程可能继承被占用的锁而死锁，须用 spawn
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                chunksize = max(1, len(rest) // (workers * 4))
+                for content in pool.map(_render_report_bytes, rest, chunksize=chunksize):
+                    done += 1
+                    if progress:
+                        progress(done / total, f"生成报告 {done}/{len(tasks)}")
+                    yield content
+            return
+        except (OSError, BrokenProcessPool) as e:
+            # pool.map 按顺序返回，已产出的报告不重复生成
+            logger.warning(f"Report process pool unavailable, rendering serially: {e}")
+    for task in tasks[done:]:
+        done += 1
+        if progress:
+            progress(done / total, f"生成报告 {done}/{len(tasks)}")
+        yield _render_report_bytes(task)
+
+
+def write_batch_report(experiment_type: str, experiments: List[Dict[str, Any]], path: Path,
+                       mode: str = BATCH_MODE_WORKBOOK, strength_y_max: Optional[float] = None,
+                       strength_chart_type: str = "line", max_workers: Optional[int] = None,
+                       progress: Optional[Callable[[float, str], None]] = None) -> int:
+    """
+    批量生成实验报告 (先写临时文件再原子替换)
+    workbook 模式：一个工作簿，首页为报告目录，每个实验一个工作表；
+    zip 模式：每个实验一个 xlsx 文件，按实测耗时与 CPU 数量决定是否多进程并行生成。
+    Returns:
+        报告数量
+    """
+    if experiment_type not in REPORT_TYPES:
+        raise ValueError(f"不支持的实验类型: {experiment_type}")
+    if mode not in BATCH_MODES:
+        raise ValueError(f"不支持的批量导出方式: {mode}")
+    if not experiments:
+        raise ValueError("没有符合条件的实验记录")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    fill = REPORT_TYPES[experiment_type][2]
+    total = len(experiments)
+
+    if mode == BATCH_MODE_ZIP:
+        tasks = [(experiment_type, e, strength_y_max, strength_chart_type) for e in experiments]
+        sheet_title = REPORT_TYPES[experiment_type][1]
+        used: set = set()
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for experiment, content in zip(experiments, _render_reports(tasks, max_workers, progress)):
+                zf.writestr(f"{sheet_title}_{report_sheet_title(experiment, used)}.xlsx", content)
+    else:
+        # openpyxl 工作簿不能跨进程合并，单工作簿模式串行填充
+        wb = Workbook()
+        index = wb.active
+        index.title = "报告目录"
+        index.append(["实验ID", "关联配方", "试验日期", "试验人员", "工作表"])
+        for cell in index[1]:
+            cell.font = HEADER_FONT
+        used = {index.title}
+        for i, experiment in enumerate(experiments):
+            if progress:
+                progress(i / total, f"生成报告 {i + 1}/{total}")
+            title = report_sheet_title(experiment, used)
+            fill(wb.create_sheet(title), experiment, strength_y_max, strength_chart_type)
+            index.append([experiment.get("id"), experiment.get("formula_name"), experiment.get("test_date"),
+                          experiment.get("operator"), title])
+        wb.save(tmp_path)
+    if progress:
+        progress(1.0, "完成")
+    tmp_path.replace(path)
+    return total
@@ -0,0 +1,348 @@
+"""
+Experiment Schema Module
+净浆 / 砂浆 / 混凝土实验记录的声明式结构，按结构直接扁平化为带类型的列
+(float32 / category / datetime)，并派生强度-龄期、流动度-时间长表。
+"""
+
+import re
+import logging
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple, Iterable
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 龄期单位 -> 天数 (月为 "mo"，与流动度的分钟 "min" 区分，不接受有歧义的 "m")
+AGE_UNIT_DAYS = {"h": 1 / 24, "d": 1, "天": 1, "w": 7, "周": 7, "mo": 30, "月": 30, "y": 365, "年": 365}
+# 流动度时间点单位 -> 分钟
+FLOW_UNIT_MINUTES = {"min": 1, "分钟": 1, "h": 60, "小时": 60}
+INITIAL_FLOW_LABELS = {"初始", "initial", "Initial", "0", "0min"}
+
+_AGE_PATTERN = re.compile(r"^\s*(\d+(?:[._]\d+)?)\s*([a-zA-Z一-鿿]*)\s*$")
+STRENGTH_COLUMN = re.compile(r"^strength_(.+)$")
+FLOW_COLUMN = re.compile(r"^flow_(.+)_mm$")
+
+
+def parse_age_days(age: Any) -> float:
+    """
+    解析龄期为天数
+    支持 "7d"、"1y"、"12h"、"28天" 及纯数字 (按天)；无法解析时返回 0。
+    """
+    if age is None or age == "":
+        return 0
+    if isinstance(age, (int, float)):
+        return age
+    match = _AGE_PATTERN.match(str(age))
+    if not match:
+        return 0
+    value = float(match.group(1).replace("_", "."))
+    factor = AGE_UNIT_DAYS.get(match.group(2) or "d")
+    if factor is None:
+        return 0
+    days = value * factor
+    return int(days) if float(days).is_integer() else days
+
+
+def parse_flow_minutes(label: Any) -> float:
+    """解析流动度时间点为分钟数 ("初始"=0, "30min"=30, "1_5h"=90)；无法解析时返回 NaN"""
+    label = str(label or "").strip()
+    if label in INITIAL_FLOW_LABELS:
+        return 0.0
+    match = _AGE_PATTERN.match(label)
+    if not match:
+        return np.nan
+    factor = FLOW_UNIT_MINUTES.get(match.group(2) or "min")
+    if factor is None:
+        return np.nan
+    return float(match.group(1).replace("_", ".")) * factor
+
+
+def normalize_time_label(label: Any) -> str:
+    """时间点标签规范化为列名片段 (与 PasteFluidityWidget 的 safe_label 规则一致)"""
+    label = str(label or "").strip()
+    if label in INITIAL_FLOW_LABELS:
+        return "initial"
+    return "".join(c for c in label if c.isalnum() or c == "_")
+
+
+def _dig(obj: Any, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def _to_float(value: Any) -> float:
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class FieldSpec(NamedTuple):
+    """声明字段: 列名、候选路径 (按顺序取第一个非空值)、类型 float/int/category/datetime"""
+    column: str
+    paths: Tuple[Tuple[str, ...], ...]
+    kind: str = "float"
+
+
+class ExperimentSchema:
+    """
+    实验记录结构
+
+    记录级字段来自 fields；若声明了 recipe_list，则每个测试配方展开为一行
+    (无配方的旧记录以记录自身作为唯一配方)。性能数据按以下约定展开为 float32 列:
+    - strength_paths: {龄期: 强度} -> strength_{龄期}
+    - flow_list_paths: [{time, value}] -> flow_{时间}_mm
+    - flow_map_paths: 已是 flow_x_mm / std_flow_x_mm 的字典 (净浆)
+    - timepoint_paths: {p_时间: {slump, spread}} -> slump_{时间}_mm / spread_{时间}_mm
+    - dosage_lists: [{name, dosage}] -> {prefix}_{name}
+    """
+
+    def __init__(self,
+                 name: str,
+                 fields: Iterable[FieldSpec],
+                 recipe_list: Optional[str] = None,
+                 recipe_fields: Iterable[FieldSpec] = (),
+                 strength_paths: Iterable[Tuple[str, ...]] = (),
+                 flow_list_paths: Iterable[Tuple[str, ...]] = (),
+                 flow_map_paths: Iterable[Tuple[str, ...]] = (),
+                 timepoint_paths: Iterable[Tuple[str, ...]] = (),
+                 dosage_lists: Iterable[Tuple[Tuple[str, ...], str]] = ()):
+        self.name = name
+        self.fields = list(fields)
+        self.recipe_list = recipe_list
+        self.recipe_fields = list(recipe_fields)
+        self.strength_paths = list(strength_paths)
+        self.flow_list_paths = list(flow_list_paths)
+        self.flow_map_paths = list(flow_map_paths)
+        self.timepoint_paths = list(timepoint_paths)
+        self.dosage_lists = list(dosage_lists)
+        self.kinds = {f.column: f.kind for f in self.fields + self.recipe_fields}
+
+    @staticmethod
+    def _read_fields(source: Dict[str, Any], specs: List[FieldSpec], row: Dict[str, Any]) -> None:
+        for spec in specs:
+            for path in spec.paths:
+                value = _dig(source, path)
+                if value is not None and value != "":
+                    row[spec.column] = value
+                    break
+
+    def _read_performance(self, source: Dict[str, Any], row: Dict[str, Any]) -> None:
+        for path in self.strength_paths:
+            strengths = _dig(source, path)
+            if isinstance(strengths, dict):
+                for age, value in strengths.items():
+                    row.setdefault(f"strength_{age}", value)
+        for path in self.flow_list_paths:
+            for point in _dig(source, path) or []:
+                if isinstance(point, dict):
+                    row.setdefault(f"flow_{normalize_time_label(point.get('time'))}_mm", point.get("value"))
+        for path in self.flow_map_paths:
+            flows = _dig(source, path)
+            if isinstance(flows, dict):
+                for key, value in flows.items():
+                    if key.endswith("_mm") and (key.startswith("flow_") or key.startswith("std_flow_")):
+                        row.setdefault(key, value)
+        for path in self.timepoint_paths:
+            perf = _dig(source, path)
+            if isinstance(perf, dict):
+                for key, value in perf.items():
+                    if key.startswith("p_") and isinstance(value, dict):
+                        label = normalize_time_label(key[2:])
+                        row.setdefault(f"slump_{label}_mm", value.get("slump"))
+                        row.setdefault(f"spread_{label}_mm", value.get("spread"))
+        for path, prefix in self.dosage_lists:
+            for item in _dig(source, path) or []:
+                if isinstance(item, dict) and item.get("name"):
+                    key = f"{prefix}_{item['name']}"
+                    row[key] = _to_float(row.get(key, 0.0)) + _to_float(item.get("dosage"))
+
+    def iter_rows(self, records: List[Dict[str, Any]]):
+        """按结构逐行展开 (每个测试配方一行，记录至少一行)"""
+        for record in records:
+            base: Dict[str, Any] = {}
+            self._read_fields(record, self.fields, base)
+            recipes = record.get(self.recipe_list) if self.recipe_list else None
+            if not isinstance(recipes, list) or not recipes:
+                recipes = [record]
+            for recipe in recipes:
+                row = dict(base)
+                if recipe is not record:
+                    self._read_fields(recipe, self.recipe_fields, row)
+                    self._read_performance(recipe, row)
+                else:
+                    # 无配方的旧记录：记录自身即配方，但不伪造配方标识
+                    self._read_fields(record, [f for f in self.recipe_fields if f not in _RECIPE_FIELDS], row)
+                # 记录级性能 (旧数据) 作为配方缺失时的补充
+                self._read_performance(record, row)
+                yield row
+
+    def flatten(self, records: List[Dict[str, Any]]) -> pd.DataFrame:
+        """扁平化为带类型的 DataFrame (声明字段按声明类型，其余性能/配比列为 float32)"""
+        rows = list(self.iter_rows(records))
+        if not rows:
+            return pd.DataFrame()
+        columns = [f.column for f in self.fields + self.recipe_fields]
+        seen = set(columns)
+        for row in rows:
+            for key in row:
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+        data = {col: [row.get(col) for row in rows] for col in columns}
+        return self.apply_dtypes(pd.DataFrame(data, columns=columns))
+
+    def apply_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """按声明类型转换列 (增量拼接后也用于恢复 category 等类型)"""
+        for col in df.columns:
+            kind = self.kinds.get(col, "float")
+            series = df[col]
+            if kind == "int":
+                df[col] = pd.to_numeric(series, errors="coerce").astype("Int64")
+            elif kind == "category":
+                if not isinstance(series.dtype, pd.CategoricalDtype):
+                    df[col] = series.map(lambda v: None if v is None or v != v else str(v)).astype("category")
+            elif kind == "datetime":
+                df[col] = pd.to_datetime(series, errors="coerce")
+            elif series.dtype != np.float32:
+                if series.dtype == object:
+                    series = series.map(_to_float)
+                df[col] = series.astype(np.float32)
+        return df
+
+
+_COMMON_FIELDS = (
+    FieldSpec("id", (("id",),), "int"),
+    FieldSpec("formula_name", (("formula_name",),), "category"),
+    FieldSpec("operator", (("operator",),), "category"),
+    FieldSpec("test_date", (("test_date",), ("experiment_date",), ("created_at",)), "datetime"),
+    FieldSpec("water_cement_ratio", (("water_cement_ratio",),)),
+)
+
+_RECIPE_FIELDS = (
+    FieldSpec("recipe_id", (("id",),), "category"),
+    FieldSpec("recipe_name", (("name",),), "category"),
+)
+
+EXPERIMENT_SCHEMAS: Dict[str, ExperimentSchema] = {
+    "paste": ExperimentSchema(
+        "paste",
+        _COMMON_FIELDS + (
+            FieldSpec("experiment_purpose", (("experiment_purpose",),), "category"),
+            FieldSpec("standard_sample_name", (("performance", "standard_sample_name"),), "category"),
+            FieldSpec("cement_amount_g", (("cement_amount_g",),)),
+            FieldSpec("water_amount_g", (("water_amount_g",),)),
+            FieldSpec("admixture_dosage_g", (("admixture_dosage_g",),)),
+        ),
+        strength_paths=[("performance", "compressive_strengths")],
+        flow_map_paths=[("performance",)],
+    ),
+    "mortar": ExperimentSchema(
+        "mortar",
+        _COMMON_FIELDS + (
+            FieldSpec("admixture_dosage", (("admixture_dosage",),)),
+            FieldSpec("sand_moisture", (("sand_moisture",),)),
+            FieldSpec("unit_weight", (("unit_weight",),)),
+            FieldSpec("water", (("materials", "water"),)),
+            FieldSpec("actual_water", (("materials", "actual_water"),)),
+            FieldSpec("total_binder", (("materials", "total_binder"), ("materials", "cement"))),
+            FieldSpec("total_aggregate", (("materials", "total_aggregate"),)),
+        ),
+        recipe_list="test_recipes",
+        recipe_fields=_RECIPE_FIELDS + (
+            FieldSpec("flow_initial_mm", (("performance", "flow"),)),
+            FieldSpec("air_content", (("performance", "air_content"),)),
+            FieldSpec("setting_initial_min", (("performance", "setting_time", "initial"),)),
+            FieldSpec("setting_final_min", (("performance", "setting_time", "final"),)),
+        ),
+        strength_paths=[("performance", "compressive_strengths")],
+        flow_list_paths=[("performance", "flows")],
+        dosage_lists=[(("materials", "binders"), "binder"), (("materials", "aggregates"), "aggregate"),
+                      (("components",), "component")],
+    ),
+    "concrete": ExperimentSchema(
+        "concrete",
+        _COMMON_FIELDS + (
+            FieldSpec("sand_ratio", (("sand_ratio",),)),
+            FieldSpec("unit_weight", (("unit_weight",),)),
+            FieldSpec("admixture_dosage", (("admixture_dosage",),)),
+            FieldSpec("sand_moisture", (("sand_moisture",),)),
+            FieldSpec("stone_moisture", (("stone_moisture",),)),
+            FieldSpec("water", (("materials", "water"),)),
+            FieldSpec("actual_water", (("materials", "actual_water"),)),
+            FieldSpec("total_binder", (("materials", "total_binder"),)),
+            FieldSpec("total_aggregate", (("materials", "total_aggregate"),)),
+        ),
+        recipe_list="test_recipes",
+        recipe_fields=_RECIPE_FIELDS + (
+            FieldSpec("air_content", (("performance", "air_content"),)),
+            FieldSpec("setting_initial_min", (("performance", "setting_initial"),)),
+            FieldSpec("setting_final_min", (("performance", "setting_final"),)),
+        ),
+        strength_paths=[("performance", "strengths"), ("performance", "compressive_strengths")],
+        timepoint_paths=[("performance",)],
+        dosage_lists=[(("materials", "binders"), "binder"), (("materials", "aggregates"), "aggregate"),
+                      (("components",), "component")],
+    ),
+}
+
+_ID_COLUMNS = ("id", "recipe_id", "recipe_name", "formula_name", "test_date")
+
+
+def strength_long(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    强度-龄期长表
+    Returns:
+        DataFrame: [id, recipe_id, recipe_name, formula_name, test_date, age, age_days, strength]
+        未录入 (<=0) 的强度不计入
+    """
+    value_cols = [c for c in df.columns if STRENGTH_COLUMN.match(c)]
+    id_cols = [c for c in _ID_COLUMNS if c in df.columns]
+    if df.empty or not value_cols:
+        return pd.DataFrame(columns=id_cols + ["age", "age_days", "strength"])
+    long = df.melt(id_vars=id_cols, value_vars=value_cols, var_name="age", value_name="strength")
+    long = long[long["strength"] > 0]
+    long["age"] = long["age"].str.slice(len("strength_"))
+    ages = sorted(long["age"].unique(), key=parse_age_days)
+    long["age_days"] = long["age"].map(parse_age_days).astype(np.float32)
+    long["age"] = pd.Categorical(long["age"], categories=ages, ordered=True)
+    long = long.sort_values(id_cols[:1] + ["age_days"], kind="stable").reset_index(drop=True)
+    return long[id_cols + ["age", "age_days", "strength"]]
+
+
+def fluidity_long(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    流动度-时间长表
+    Returns:
+        DataFrame: [id, recipe_id, recipe_name, formula_name, test_date, time_label, minutes, flow_mm, std_flow_mm]
+        未录入 (<=0) 的流动度不计入
+    """
+    labels = [FLOW_COLUMN.match(c).group(1) for c in df.columns if FLOW_COLUMN.match(c)]
+    id_cols = [c for c in _ID_COLUMNS if c in df.columns]
+    columns = id_cols + ["time_label", "minutes", "flow_mm", "std_flow_mm"]
+    if df.empty or not labels:
+        return pd.DataFrame(columns=columns)
+    parts = []
+    for label in labels:
+        part = df[id_cols].copy()
+        part["time_label"] = label
+        part["minutes"] = np.float32(parse_flow_minutes(label))
+        part["flow_mm"] = df[f"flow_{label}_mm"].to_numpy(dtype=np.float32)
+        std_col = f"std_flow_{label}_mm"
+        # 缺少标准差列时也用 float32 全 NaN，各段 dtype 一致，避免 concat 的全 NA 列推断
+        part["std_flow_mm"] = (df[std_col].to_numpy(dtype=np.float32) if std_col in df.columns
+                               else np.full(len(df), np.nan, dtype=np.float32))
+        part = part[part["flow_mm"] > 0]
+        if not part.empty:
+            parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    long = pd.concat(parts, ignore_index=True)
+    long["std_flow_mm"] = long["std_flow_mm"].astype(np.float32)
+    return long.sort_values(id_cols[:1] + ["minutes"], kind="stable").reset_index(drop=True)[columns]
@@ -0,0 +1,208 @@
+"""
+Export Jobs Module
+后台导出任务：全量 Excel 导出与砂浆/混凝土实验报告在线程池中异步执行并报告进度，
+生成的文件按 (导出类型, 参数, 数据代数) 缓存，数据未变化时重复下载直接复用。
+"""
+
+import copy
+import json
+import uuid
+import hashlib
+import logging
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple, Callable
+
+from config import TEMP_DIR
+from services.job_registry import JobRegistry
+from services.export_service import ExportService, EXPORT_FILE_PREFIX, write_excel_export, export_file_name
+from services.experiment_report import (
+    REPORT_TYPES, BATCH_MODES, BATCH_MODE_ZIP, find_experiment, write_experiment_report, report_file_name,
+    filter_experiments, write_batch_report, batch_report_file_name
+)
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FULL = "full_excel"
+EXPORT_REPORT = "experiment_report"
+EXPORT_BATCH_REPORT = "batch_report"
+EXPORT_KINDS = {EXPORT_FULL: "全量数据导出", EXPORT_REPORT: "实验报告", EXPORT_BATCH_REPORT: "批量实验报告"}
+JOB_STATUS_LABELS = {"pending": "排队中", "running": "进行中", "done": "已完成", "failed": "失败"}
+
+
+def _as_date(value: Any) -> Optional[date]:
+    """任务参数中的日期 (date 或 ISO 字符串)"""
+    if not value or isinstance(value, date):
+        return value or None
+    return date.fromisoformat(str(value)[:10])
+
+
+class ExportJobRegistry(JobRegistry):
+    """每个 DataService 一份：导出任务状态及已生成的文件 (缓存键 -> 文件信息)"""
+
+    def __init__(self, max_jobs: int = 64):
+        super().__init__(max_jobs)
+        self.artifacts: Dict[str, Dict[str, Any]] = {}
+
+
+# 导出以 I/O 为主，两个线程即可；不占用模型训练线程
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+_registries: "weakref.WeakKeyDictionary[Any, ExportJobRegistry]" = weakref.WeakKeyDictionary()
+
+
+class ExportJobService:
+    """后台导出任务服务"""
+
+    def __init__(self, data_service, output_dir: Optional[Path] = None):
+        """
+        Args:
+            data_service: DataService 实例 (任务与文件缓存挂在其生命周期上)。
+            output_dir: 导出文件目录，默认 TEMP_DIR。
+        """
+        self.data_service = data_service
+        self.output_dir = Path(output_dir or TEMP_DIR)
+        self.registry = _registries.get(data_service)
+        if self.registry is None:
+            self.registry = ExportJobRegistry()
+            _registries[data_service] = self.registry
+
+    def _data_version(self, kind: str, params: Dict[str, Any]) -> Any:
+        """缓存键中的数据版本：实验报告取所属集合代数，全量导出取数据修订号"""
+        if kind in (EXPORT_REPORT, EXPORT_BATCH_REPORT) and hasattr(self.data_service, "get_generation"):
+            return self.data_service.get_generation(REPORT_TYPES[params["experiment_type"]][0])
+        if hasattr(self.data_service, "get_revision"):
+            return self.data_service.get_revision()
+        return None
+
+    def artifact_key(self, kind: str, params: Dict[str, Any]) -> Optional[str]:
+        """导出类型 + 参数 + 数据版本的哈希；数据源不支持版本号时返回 None (不缓存)"""
+        version = self._data_version(kind, params)
+        if version is None:
+            return None
+        payload = json.dumps({"kind": kind, "params": params, "version": version},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _snapshot(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        在提交线程中复制导出所需数据；load_data 返回共享的缓存字典，
+        页面代码会就地修改，后台线程不能直接遍历
+        """
+        data = self.data_service.load_data()
+        if kind == EXPORT_REPORT:
+            experiment = find_experiment(data, params["experiment_type"], params["experiment_id"])
+            return {REPORT_TYPES[params["experiment_type"]][0]: [copy.deepcopy(experiment)] if experiment else []}
+        if kind == EXPORT_BATCH_REPORT:
+            collection = REPORT_TYPES[params["experiment_type"]][0]
+            return {collection: copy.deepcopy(data.get(collection, []))}
+        return copy.deepcopy(data)
+
+    def _build(self, kind: str, params: Dict[str, Any], path: Path,
+               progress: Callable[[float, str], None], data: Dict[str, Any]) -> str:
+        """由数据快照生成导出文件，返回下载文件名"""
+        if kind == EXPORT_FULL:
+            write_excel_export(data, path, progress=progress)
+            return export_file_name()
+        experiment_type = params["experiment_type"]
+        if kind == EXPORT_BATCH_REPORT:
+            experiments = filter_experiments(
+                data.get(REPORT_TYPES[experiment_type][0], []),
+                date_from=_as_date(params.get("date_from")), date_to=_as_date(params.get("date_to")),
+                formula_name=params.get("formula_name"), operator=params.get("operator"),
+                experiment_ids=params.get("experiment_ids"),
+            )
+            mode = params.get("mode", "workbook")
+            write_batch_report(experiment_type, experiments, path, mode, params.get("strength_y_max"),
+                               params.get("strength_chart_type", "line"), progress=progress)
+            return batch_report_file_name(experiment_type, mode)
+        experiment = find_experiment(data, experiment_type, params["experiment_id"])
+        if experiment is None:
+            raise ValueError("未找到指定实验记录")
+        progress(0.1, "生成报告")
+        write_experiment_report(experiment_type, experiment, path,
+                                params.get("strength_y_max"), params.get("strength_chart_type", "line"))
+        return report_file_name(experiment_type, params["experiment_id"])
+
+    def submit(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Tuple[bool, str]:
+        """
+        提交后台导出任务
+        相同类型 + 参数且数据未变化时直接命中已生成的文件。
+        Args:
+            kind: full_excel / experiment_report / batch_report
+            params: 实验报告需 experiment_type, experiment_id，可选 strength_y_max, strength_chart_type；
+                批量报告需 experiment_type，可选 date_from, date_to, formula_name, operator, experiment_ids,
+                mode (workbook/zip) 及图表参数
+        Returns:
+            (是否成功提交, 任务ID 或错误信息)
+        """
+        if kind not in EXPORT_KINDS:
+            return False, f"未知的导出类型: {kind}"
+        params = dict(params or {})
+        if kind in (EXPORT_REPORT, EXPORT_BATCH_REPORT) and params.get("experiment_type") not in REPORT_TYPES:
+            return False, "不支持的实验类型"
+        if kind == EXPORT_BATCH_REPORT and params.get("mode", "workbook") not in BATCH_MODES:
+            return False, "不支持的批量导出方式"
+
+        key = self.artifact_key(kind, params)
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "job_id": job_id, "kind": kind, "artifact_key": key, "status": "pending", "progress": 0.0,
+            "message": "", "path": None, "file_name": None,
+            "submitted_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with self.registry.lock:
+            artifact = self.registry.artifacts.get(key) if key else None
+            running = next((j for j in self.registry.jobs.values()
+                            if key and j["artifact_key"] == key and j["status"] in ("pending", "running")), None)
+            if running is not None:
+                # 同一导出正在进行 (无论缓存文件是否仍在)，复用该任务，避免两个任务写同一文件
+                return True, running["job_id"]
+            self.registry.add_job(job)
+        if artifact and Path(artifact["path"]).exists():
+            job.update(status="done", progress=1.0, message="命中缓存", path=artifact["path"],
+                       file_name=artifact["file_name"])
+            return True, job_id
+        try:
+            data = self._snapshot(kind, params)
+        except Exception as e:
+            logger.error(f"Export job {job_id} ({kind}) failed: {e}")
+            job.update(status="failed", message=f"导出失败: {e}")
+            return True, job_id
+
+        def _progress(fraction: float, stage: str):
+            job.update(progress=min(max(float(fraction), 0.0), 1.0), message=stage)
+
+        def _run():
+            job["status"] = "running"
+            try:
+                ExportService(self.data_service, self.output_dir).cleanup_exports()
+                suffix = ".zip" if params.get("mode") == BATCH_MODE_ZIP else ".xlsx"
+                path = self.output_dir / f"{EXPORT_FILE_PREFIX}{key or job_id}{suffix}"
+                file_name = self._build(kind, params, path, _progress, data)
+                job.update(status="done", progress=1.0, message="导出完成", path=str(path), file_name=file_name)
+                # 生成期间数据有变化时不缓存，避免旧内容挂在新键上
+                if key and self.artifact_key(kind, params) == key:
+                    with self.registry.lock:
+                        self.registry.artifacts[key] = {"path": str(path), "file_name": file_name}
+            except Exception as e:
+                logger.error(f"Export job {job_id} ({kind}) failed: {e}")
+                job.update(status="failed", message=f"导出失败: {e}")
+
+        job["future"] = _executor.submit(_run)
+        return True, job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询导出任务 {job_id, kind, status, progress, message, path, file_name}"""
+        job = self.registry.jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != "future"}
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """等待导出任务结束 (测试及脚本使用)"""
+        job = self.registry.jobs.get(job_id)
+        if job and job.get("future") is not None:
+            job["future"].result(timeout=timeout)
+        return self.get_job(job_id)
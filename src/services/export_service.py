@@ -0,0 +1,184 @@
+"""
+Export Service Module
+Excel 全量导出：openpyxl write-only 模式逐行写入 TEMP_DIR 下的临时文件，
+页面通过 st.download_button 读取文件下载，不再在内存中拼装整个工作簿再 base64 内嵌到 HTML。
+"""
+
+import json
+import time
+import uuid
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Iterable, Callable
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from config import TEMP_DIR
+from core.enums import DataCategory
+
+logger = logging.getLogger(__name__)
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MIME = "application/zip"
+EXPORT_FILE_PREFIX = "export_"
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_MAX_CELL_CHARS = 32_767
+EXPORT_MAX_AGE_HOURS = 24
+
+# (Sheet 名称, 集合路径, 描述)；用户与审计日志不导出
+EXPORT_SHEETS: List[Tuple[str, Tuple[str, ...], str]] = [
+    ("项目", (DataCategory.PROJECTS.value,), "项目基本信息和管理信息"),
+    ("实验", (DataCategory.EXPERIMENTS.value,), "实验计划和执行信息"),
+    ("原材料", (DataCategory.RAW_MATERIALS.value,), "原材料库管理信息"),
+    ("合成实验", (DataCategory.SYNTHESIS_RECORDS.value,), "合成实验详细记录"),
+    ("成品减水剂", (DataCategory.PRODUCTS.value,), "成品减水剂信息"),
+    ("净浆实验", (DataCategory.PASTE_EXPERIMENTS.value,), "净浆实验测试数据"),
+    ("砂浆实验", (DataCategory.MORTAR_EXPERIMENTS.value,), "砂浆实验测试数据"),
+    ("混凝土实验", (DataCategory.CONCRETE_EXPERIMENTS.value,), "混凝土实验测试数据"),
+    ("合成性能数据", (DataCategory.PERFORMANCE_DATA.value, "synthesis"), "合成性能测试数据"),
+    ("母液", (DataCategory.MOTHER_LIQUORS.value,), "母液信息"),
+    ("BOM", (DataCategory.BOMS.value,), "BOM 主数据"),
+    ("BOM版本", (DataCategory.BOM_VERSIONS.value,), "BOM 版本及物料行"),
+    ("生产订单", (DataCategory.PRODUCTION_ORDERS.value,), "生产订单"),
+    ("领料单", (DataCategory.MATERIAL_ISSUES.value,), "生产领料单"),
+    ("采购收货", (DataCategory.GOODS_RECEIPTS.value,), "采购收货单"),
+    ("销售发货", (DataCategory.SHIPPING_ORDERS.value,), "销售发货单"),
+    ("原材料台账", (DataCategory.INVENTORY_RECORDS.value,), "原材料库存流水台账"),
+    ("成品库存", (DataCategory.PRODUCT_INVENTORY.value,), "成品库存余额"),
+    ("成品台账", (DataCategory.PRODUCT_INVENTORY_RECORDS.value,), "成品库存流水台账"),
+]
+
+
+def export_file_name(prefix: str = "聚羧酸减水剂研发数据") -> str:
+    """下载文件名"""
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+
+
+def _resolve(data: Dict[str, Any], path: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    node: Any = data
+    for key in path:
+        node = node.get(key) if isinstance(node, dict) else None
+    return node if isinstance(node, list) else []
+
+
+def collect_columns(records: Iterable[Dict[str, Any]]) -> List[str]:
+    """所有记录字段的并集，按首次出现顺序"""
+    columns: Dict[str, None] = {}
+    for record in records:
+        if isinstance(record, dict):
+            for key in record:
+                columns.setdefault(str(key), None)
+    return list(columns)
+
+
+def excel_cell(value: Any) -> Any:
+    """转换为 Excel 可写的单元格值：嵌套结构转 JSON，去除非法控制字符，超长截断"""
+    if value is None or isinstance(value, (bool, int, float, datetime)):
+        return value
+    if isinstance(value, (dict, list, tuple)):
+        value = json.dumps(value, ensure_ascii=False, default=str)
+    text = ILLEGAL_CHARACTERS_RE.sub("", str(value))
+    return text[:EXCEL_MAX_CELL_CHARS]
+
+
+def write_records_sheet(workbook: Workbook, title: str, records: List[Dict[str, Any]]) -> int:
+    """
+    写出一个集合 (write-only 工作表逐行追加)；超过 Excel 行数上限时续写到 "名称_2" 等工作表
+    Returns:
+        写出的记录数
+    """
+    columns = collect_columns(records)
+    per_sheet = EXCEL_MAX_ROWS - 1
+    written = 0
+    for part, start in enumerate(range(0, max(len(records), 1), per_sheet)):
+        ws = workbook.create_sheet(title if part == 0 else f"{title}_{part + 1}")
+        ws.append(columns)
+        for record in records[start:start + per_sheet]:
+            if isinstance(record, dict):
+                ws.append([excel_cell(record.get(col)) for col in columns])
+                written += 1
+    return written
+
+
+def write_excel_export(data: Dict[str, Any], path: Path,
+                       sheets: List[Tuple[str, Tuple[str, ...], str]] = EXPORT_SHEETS,
+                       progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, int]:
+    """
+    把数据写为 Excel 文件 (先写临时文件再原子替换)
+    空集合不生成工作表；最后附加 "数据字典" 说明各工作表。
+    Args:
+        progress: 进度回调 (0~1 的完成比例, 当前工作表)，按记录数计
+    Returns:
+        {Sheet 名称: 记录数}
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    workbook = Workbook(write_only=True)
+    counts: Dict[str, int] = {}
+    resolved = [(title, _resolve(data, collection_path)) for title, collection_path, _ in sheets]
+    total = max(sum(len(records) for _, records in resolved), 1)
+    done = 0
+    for title, records in resolved:
+        if records:
+            if progress:
+                progress(done / total, title)
+            counts[title] = write_records_sheet(workbook, title, records)
+            done += len(records)
+
+    ws = workbook.create_sheet("数据字典")
+    ws.append(["Sheet名称", "描述", "记录数"])
+    for title, _, description in sheets:
+        ws.append([title, description, counts.get(title, 0)])
+
+    if progress:
+        progress(1.0, "数据字典")
+    tmp_path = path.with_name(path.name + ".tmp")
+    workbook.save(tmp_path)
+    tmp_path.replace(path)
+    return counts
+
+
+class ExportService:
+    """数据导出服务"""
+
+    def __init__(self, data_service, output_dir: Optional[Path] = None):
+        """
+        Args:
+            data_service: DataService 实例。
+            output_dir: 导出文件目录，默认 TEMP_DIR。
+        """
+        self.data_service = data_service
+        self.output_dir = Path(output_dir or TEMP_DIR)
+
+    def cleanup_exports(self, max_age_hours: float = EXPORT_MAX_AGE_HOURS) -> int:
+        """删除过期的导出文件，返回删除数量"""
+        if not self.output_dir.exists():
+            return 0
+        cutoff = time.time() - max_age_hours * 3600
+        removed = 0
+        for f in self.output_dir.glob(f"{EXPORT_FILE_PREFIX}*"):
+            try:
+                if f.stat().st_mtime < cutoff:
+                    f.unlink()
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"Failed to remove old export {f}: {e}")
+        return removed
+
+    def export_to_excel(self) -> Tuple[bool, str]:
+        """
+        导出全部数据 (含 SAP 台账) 到 TEMP_DIR 下的 Excel 文件
+        Returns:
+            (成功与否, 文件路径或错误信息)
+        """
+        try:
+            self.cleanup_exports()
+            path = self.output_dir / f"{EXPORT_FILE_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.xlsx"
+            counts = write_excel_export(self.data_service.load_data(), path)
+            logger.info(f"Excel export written to {path}: {sum(counts.values())} records in {len(counts)} sheets")
+            return True, str(path)
+        except Exception as e:
+            logger.error(f"Excel export failed: {e}")
+            return False, f"导出数据失败: {e}"
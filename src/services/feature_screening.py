@@ -0,0 +1,211 @@
+"""
+Feature Screening Module
+配方数据的相关性与特征筛选：对目标变量计算 Pearson / Spearman 相关系数及互信息，
+成对缺失处理 (每个特征只使用与目标同时存在的样本)，按列分块的 NumPy 运算。
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SCREENING_METHODS = {
+    "pearson": "Pearson 相关",
+    "spearman": "Spearman 秩相关",
+    "mutual_info": "互信息",
+}
+DEFAULT_CHUNK_SIZE = 256
+DEFAULT_MIN_PERIODS = 3
+
+
+def _is_identifier(column: str) -> bool:
+    return column == "id" or str(column).endswith("_id")
+
+
+def _numeric_matrix(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """取数值列为 float64 矩阵 (缺失为 NaN)"""
+    if not len(columns):
+        return np.empty((len(df), 0))
+    return df[list(columns)].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _masked_pearson(x: np.ndarray, y: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    成对缺失的 Pearson 相关 (按列)
+    Args:
+        x: (n, k) 特征块
+        y: (n, k) 或 (n, 1) 目标
+        mask: (n, k) 成对有效标记
+    Returns:
+        (r, n_obs)
+    """
+    w = mask.astype(np.float64)
+    n_obs = w.sum(axis=0)
+    safe_n = np.where(n_obs > 0, n_obs, 1.0)
+    x0 = np.where(mask, x, 0.0)
+    y0 = np.where(mask, y, 0.0)
+    # 先中心化再求积，避免大数相减的精度损失
+    xc = np.where(mask, x0 - x0.sum(axis=0) / safe_n, 0.0)
+    yc = np.where(mask, y0 - y0.sum(axis=0) / safe_n, 0.0)
+    sxy = (xc * yc).sum(axis=0)
+    sxx = (xc * xc).sum(axis=0)
+    syy = (yc * yc).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = sxy / np.sqrt(sxx * syy)
+    r[(sxx <= 0) | (syy <= 0)] = np.nan
+    return np.clip(r, -1.0, 1.0), n_obs.astype(np.int64)
+
+
+def _masked_rank(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """按列在有效样本内求平均秩 (无效位置为 NaN)"""
+    return pd.DataFrame(np.where(mask, values, np.nan)).rank(method="average").to_numpy()
+
+
+def _quantile_bins(values: np.ndarray, mask: np.ndarray, n_bins: np.ndarray) -> np.ndarray:
+    """按列等频分箱 (基于有效样本内的秩)，返回 int 箱号，无效位置为 0"""
+    ranks = _masked_rank(values, mask)
+    counts = mask.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = (ranks - 1) / np.where(counts > 1, counts - 1, 1)
+    bins = np.floor(np.nan_to_num(pct) * n_bins).astype(np.int64)
+    return np.minimum(bins, n_bins - 1)
+
+
+def _mutual_information(x: np.ndarray, y: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    基于等频分箱的互信息 (nats)，按列成对缺失
+    箱数取 clip(sqrt(n/5), 2, 10)，联合频数通过一次 bincount 对整个块计算。
+    """
+    n, k = x.shape
+    n_obs = mask.sum(axis=0)
+    n_bins = np.clip(np.floor(np.sqrt(n_obs / 5.0)), 2, 10).astype(np.int64)
+    max_bins = int(n_bins.max()) if k else 2
+    yy = np.broadcast_to(y, (n, k))
+    xb = _quantile_bins(x, mask, n_bins)
+    yb = _quantile_bins(yy, mask, n_bins)
+
+    cells = max_bins * max_bins
+    flat = np.arange(k)[None, :] * cells + xb * max_bins + yb
+    joint = np.bincount(flat[mask], minlength=k * cells).reshape(k, max_bins, max_bins).astype(np.float64)
+    total = joint.sum(axis=(1, 2), keepdims=True)
+    total[total == 0] = 1.0
+    pxy = joint / total
+    px = pxy.sum(axis=2, keepdims=True)
+    py = pxy.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        terms = np.where(pxy > 0, pxy * np.log(pxy / (px * py)), 0.0)
+    mi = terms.sum(axis=(1, 2))
+    mi[n_obs < DEFAULT_MIN_PERIODS] = np.nan
+    return mi
+
+
+def correlate_with_target(df: pd.DataFrame,
+                          target: str,
+                          features: Optional[Sequence[str]] = None,
+                          methods: Sequence[str] = ("pearson", "spearman"),
+                          min_periods: int = DEFAULT_MIN_PERIODS,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    计算每个特征与目标的相关指标
+    Args:
+        df: 数据
+        target: 目标列
+        features: 特征列，默认全部数值列 (不含目标及 id / *_id 标识列)
+        methods: pearson / spearman / mutual_info 的任意组合
+        min_periods: 成对有效样本少于该值时结果为 NaN
+        chunk_size: 每块处理的特征数 (控制 n x chunk 临时矩阵的内存)
+    Returns:
+        DataFrame: [feature, n_obs, <method>...]，顺序与 features 一致
+    """
+    unknown = [m for m in methods if m not in SCREENING_METHODS]
+    if unknown:
+        raise ValueError(f"未知的筛选方法: {', '.join(unknown)}")
+    if target not in df.columns:
+        raise ValueError(f"目标列不存在: {target}")
+    if features is None:
+        features = [c for c in df.select_dtypes(include="number").columns
+                    if c != target and not _is_identifier(c)]
+    features = [c for c in features if c != target]
+
+    y = _numeric_matrix(df, [target])
+    y_valid = ~np.isnan(y)
+    results: Dict[str, List[np.ndarray]] = {m: [] for m in methods}
+    counts: List[np.ndarray] = []
+
+    for start in range(0, len(features), chunk_size):
+        x = _numeric_matrix(df, features[start:start + chunk_size])
+        mask = ~np.isnan(x) & y_valid
+        r, n_obs = _masked_pearson(x, y, mask)
+        counts.append(n_obs)
+        too_few = n_obs < min_periods
+        if "pearson" in results:
+            r[too_few] = np.nan
+            results["pearson"].append(r)
+        if "spearman" in results:
+            x_rank = _masked_rank(x, mask)
+            y_rank = _masked_rank(np.broadcast_to(y, x.shape), mask)
+            rho, _ = _masked_pearson(x_rank, y_rank, mask)
+            rho[too_few] = np.nan
+            results["spearman"].append(rho)
+        if "mutual_info" in results:
+            results["mutual_info"].append(_mutual_information(x, y, mask))
+
+    out = pd.DataFrame({
+        "feature": features,
+        "n_obs": np.concatenate(counts) if counts else np.empty(0, dtype=np.int64),
+    })
+    for method, parts in results.items():
+        out[method] = np.concatenate(parts) if parts else np.empty(0)
+    return out
+
+
+def screen_features(df: pd.DataFrame,
+                    target: str,
+                    features: Optional[Sequence[str]] = None,
+                    rank_by: str = "pearson",
+                    top_k: int = 20,
+                    methods: Optional[Sequence[str]] = None,
+                    min_periods: int = DEFAULT_MIN_PERIODS,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    特征筛选：按 rank_by 指标 (相关系数取绝对值) 排序取前 top_k 个特征
+    Returns:
+        DataFrame: [feature, n_obs, <method>..., score]，score 为排序依据
+    """
+    if rank_by not in SCREENING_METHODS:
+        raise ValueError(f"未知的排序指标: {rank_by}")
+    methods = list(methods or ("pearson", "spearman"))
+    if rank_by not in methods:
+        methods.append(rank_by)
+    result = correlate_with_target(df, target, features, methods, min_periods, chunk_size)
+    result["score"] = result[rank_by].abs() if rank_by != "mutual_info" else result[rank_by]
+    result = result.dropna(subset=["score"])
+    result = result.sort_values("score", ascending=False, kind="stable")
+    return result.head(top_k).reset_index(drop=True)
+
+
+def correlation_matrix(df: pd.DataFrame,
+                       columns: Optional[Sequence[str]] = None,
+                       method: str = "pearson",
+                       min_periods: int = DEFAULT_MIN_PERIODS) -> pd.DataFrame:
+    """
+    成对缺失的相关系数矩阵 (用于少量已筛选特征的热力图)
+    以 pearson / spearman 对每一列作为目标调用 correlate_with_target。
+    """
+    if method not in ("pearson", "spearman"):
+        raise ValueError(f"相关矩阵不支持的方法: {method}")
+    if columns is None:
+        columns = df.select_dtypes(include="number").columns.tolist()
+    columns = list(columns)
+    if not columns:
+        return pd.DataFrame()
+    matrix = np.eye(len(columns))
+    for i, col in enumerate(columns[:-1]):
+        rest = columns[i + 1:]
+        values = correlate_with_target(df, col, rest, (method,), min_periods)[method].to_numpy()
+        matrix[i, i + 1:] = values
+        matrix[i + 1:, i] = values
+    return pd.DataFrame(matrix, index=columns, columns=columns)
@@ -0,0 +1,276 @@
+"""
+Import Service Module
+Excel 导入：按 ID 或业务键 (物料编号/名称、配方编号等) 匹配已有记录，
+一次哈希索引遍历得到 新增/更新/未变化/跳过 差异，可先预演再在一次保存中提交。
+"""
+
+import json
+import math
+import logging
+from datetime import datetime, date
+from typing import Dict, Any, List, Optional, Tuple
+
+from openpyxl import load_workbook
+
+from core.constants import DATE_FORMAT, DATETIME_FORMAT
+from core.enums import DataCategory
+
+logger = logging.getLogger(__name__)
+
+IMPORT_MODE_REPLACE = "replace"
+IMPORT_MODE_MERGE = "merge"
+IMPORT_MODES = {IMPORT_MODE_REPLACE: "替换现有数据", IMPORT_MODE_MERGE: "合并数据（不重复）"}
+CONFLICT_SKIP = "skip"
+CONFLICT_OVERWRITE = "overwrite"
+CONFLICT_MODES = {CONFLICT_SKIP: "跳过重复数据", CONFLICT_OVERWRITE: "覆盖重复数据"}
+
+# (Sheet 名称, 集合路径, 业务键候选)；与导出的 Sheet 名称一致。
+# 台账类集合的库存余额由流水推导，不支持从 Excel 导入
+IMPORT_SHEETS: List[Tuple[str, Tuple[str, ...], Tuple[Tuple[str, ...], ...]]] = [
+    ("项目", (DataCategory.PROJECTS.value,), (("name",),)),
+    ("实验", (DataCategory.EXPERIMENTS.value,), ()),
+    ("原材料", (DataCategory.RAW_MATERIALS.value,), (("material_number",), ("name",))),
+    ("合成实验", (DataCategory.SYNTHESIS_RECORDS.value,), (("formula_id",),)),
+    ("成品减水剂", (DataCategory.PRODUCTS.value,), (("product_code",), ("product_name",))),
+    ("净浆实验", (DataCategory.PASTE_EXPERIMENTS.value,), ()),
+    ("砂浆实验", (DataCategory.MORTAR_EXPERIMENTS.value,), ()),
+    ("混凝土实验", (DataCategory.CONCRETE_EXPERIMENTS.value,), ()),
+    ("合成性能数据", (DataCategory.PERFORMANCE_DATA.value, "synthesis"), ()),
+]
+
+
+def import_cell(value: Any) -> Any:
+    """Excel 单元格值转为记录字段：日期转字符串，JSON 文本还原为嵌套结构，空白为 None"""
+    if isinstance(value, datetime):
+        if value.time() == datetime.min.time():
+            return value.strftime(DATE_FORMAT)
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if value[0] in "[{":
+            try:
+                return json.loads(value)
+            except ValueError:
+                pass
+    return value
+
+
+def _normalize_id(value: Any) -> Any:
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def read_import_sheets(uploaded_file) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    读取工作簿中可导入的工作表 (只读流式)，超行数拆分的 "名称_2" 等工作表并入同一集合
+    空单元格不写入记录 (合并时不覆盖已有字段)
+    Returns:
+        {Sheet 名称: 记录列表}
+    """
+    titles = {title for title, _, _ in IMPORT_SHEETS}
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        sheets: Dict[str, List[Dict[str, Any]]] = {}
+        for ws in wb.worksheets:
+            base = ws.title.rsplit("_", 1)[0] if ws.title not in titles and "_" in ws.title else ws.title
+            if base not in titles:
+                continue
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                continue
+            columns = [(i, str(h).strip()) for i, h in enumerate(header) if h is not None and str(h).strip()]
+            records = sheets.setdefault(base, [])
+            for row in rows:
+                record = {}
+                for i, col in columns:
+                    value = import_cell(row[i]) if i < len(row) else None
+                    if value is not None:
+                        record[col] = value
+                if record:
+                    if "id" in record:
+                        record["id"] = _normalize_id(record["id"])
+                    records.append(record)
+        return sheets
+    finally:
+        wb.close()
+
+
+def _same_value(current: Any, incoming: Any) -> bool:
+    """字段值是否相同；Excel 只保存 15 位有效数字，数值按相对误差比较"""
+    if isinstance(current, (int, float)) and isinstance(incoming, (int, float)) \
+            and not isinstance(current, bool) and not isinstance(incoming, bool):
+        return math.isclose(current, incoming, rel_tol=1e-12, abs_tol=1e-12)
+    return current == incoming
+
+
+def _next_id(records: List[Dict[str, Any]]) -> int:
+    ids = [_normalize_id(r.get("id")) for r in records]
+    return max((i for i in ids if isinstance(i, int)), default=0) + 1
+
+
+class _KeyIndex:
+    """ID 与业务键 -> 记录位置 的哈希索引"""
+
+    def __init__(self, key_fields: Tuple[Tuple[str, ...], ...]):
+        self.key_fields = key_fields
+        self.index: Dict[Tuple, int] = {}
+
+    def keys(self, record: Dict[str, Any]) -> List[Tuple]:
+        keys = []
+        record_id = _normalize_id(record.get("id"))
+        if record_id is not None:
+            keys.append(("id", record_id))
+        for fields in self.key_fields:
+            values = tuple(str(record.get(f) or "").strip() for f in fields)
+            if all(values):
+                keys.append((fields, values))
+        return keys
+
+    def find(self, record: Dict[str, Any]) -> Optional[int]:
+        for key in self.keys(record):
+            pos = self.index.get(key)
+            if pos is not None:
+                return pos
+        return None
+
+    def add(self, record: Dict[str, Any], pos: int):
+        for key in self.keys(record):
+            self.index.setdefault(key, pos)
+
+
+def plan_collection(existing: List[Dict[str, Any]], rows: List[Dict[str, Any]],
+                    key_fields: Tuple[Tuple[str, ...], ...], mode: str = IMPORT_MODE_MERGE,
+                    conflict: str = CONFLICT_SKIP) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    计算单个集合的导入结果 (不修改 existing)
+    合并模式：按 ID 再按业务键匹配；内容相同记为未变化，不同则按冲突策略覆盖或跳过；未匹配的新增
+    (缺 ID 或 ID 已被占用时分配新 ID)。文件内重复行与先出现的行合并。
+    替换模式：以文件内容替换整个集合，缺 ID 的行按现有最大 ID 之后分配。
+    Returns:
+        (新的记录列表, {insert, update, unchanged, skip, delete})
+    """
+    stats = {"insert": 0, "update": 0, "unchanged": 0, "skip": 0, "delete": 0}
+    if mode == IMPORT_MODE_REPLACE:
+        result = [dict(r) for r in rows]
+        next_id = _next_id(result)
+        for record in result:
+            if record.get("id") is None:
+                record["id"] = next_id
+                next_id += 1
+        stats["insert"] = len(result)
+        stats["delete"] = len(existing)
+        return result, stats
+
+    result = list(existing)
+    index = _KeyIndex(key_fields)
+    ids = set()
+    for pos, record in enumerate(result):
+        if isinstance(record, dict):
+            index.add(record, pos)
+            ids.add(_normalize_id(record.get("id")))
+    next_id = _next_id(result)
+    for row in rows:
+        pos = index.find(row)
+        if pos is None:
+            record = dict(row)
+            if record.get("id") is None or record["id"] in ids:
+                record["id"] = next_id
+            next_id = max(next_id, record["id"] + 1) if isinstance(record["id"], int) else next_id
+            ids.add(record["id"])
+            index.add(record, len(result))
+            result.append(record)
+            stats["insert"] += 1
+            continue
+        current = result[pos]
+        changes = {k: v for k, v in row.items() if k != "id" and not _same_value(current.get(k), v)}
+        if not changes:
+            stats["unchanged"] += 1
+        elif conflict == CONFLICT_OVERWRITE:
+            result[pos] = {**current, **changes}
+            stats["update"] += 1
+        else:
+            stats["skip"] += 1
+    return result, stats
+
+
+class ImportService:
+    """Excel 导入服务"""
+
+    def __init__(self, data_service):
+        self.data_service = data_service
+
+    def plan(self, uploaded_file, mode: str = IMPORT_MODE_MERGE,
+             conflict: str = CONFLICT_SKIP) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[str]]:
+        """
+        预演导入
+        Returns:
+            (导入后的完整数据, 各工作表差异 [{sheet, rows, insert, update, unchanged, skip, delete}], 变化的集合)
+        """
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"未知的导入模式: {mode}")
+        if conflict not in CONFLICT_MODES:
+            raise ValueError(f"未知的冲突处理方式: {conflict}")
+        sheets = read_import_sheets(uploaded_file)
+        data = self.data_service.load_data()
+        new_data = dict(data)
+        summary, changed = [], []
+        for title, path, key_fields in IMPORT_SHEETS:
+            rows = sheets.get(title)
+            if not rows:
+                continue
+            parent = new_data
+            for key in path[:-1]:
+                parent[key] = dict(parent.get(key) or {})
+                parent = parent[key]
+            existing = [r for r in (parent.get(path[-1]) or []) if isinstance(r, dict)]
+            records, stats = plan_collection(existing, rows, key_fields, mode, conflict)
+            parent[path[-1]] = records
+            summary.append({"sheet": title, "rows": len(rows), **stats})
+            if stats["insert"] or stats["update"] or stats["delete"]:
+                changed.append(path[0])
+        return new_data, summary, list(dict.fromkeys(changed))
+
+    def import_excel(self, uploaded_file, mode: str = IMPORT_MODE_MERGE, conflict: str = CONFLICT_SKIP,
+                     dry_run: bool = False) -> Tuple[bool, str]:
+        """
+        从 Excel 导入数据，全部工作表在一次保存中提交
+        Args:
+            dry_run: 只返回差异摘要，不保存
+        Returns:
+            (成功与否, 差异摘要或错误信息)
+        """
+        try:
+            new_data, summary, changed = self.plan(uploaded_file, mode, conflict)
+        except Exception as e:
+            logger.error(f"Excel import planning failed: {e}")
+            return False, f"导入数据失败: {e}"
+        if not summary:
+            return False, "未找到可导入的工作表"
+        message = format_import_summary(summary)
+        if dry_run or not changed:
+            return True, message
+        if not self.data_service.save_data(new_data, changed=changed):
+            return False, "保存导入数据失败"
+        logger.info(f"Excel import committed ({mode}/{conflict}): {message}")
+        return True, message
+
+
+def format_import_summary(summary: List[Dict[str, Any]]) -> str:
+    """差异摘要文本"""
+    parts = []
+    for row in summary:
+        text = f"新增 {row['insert']}，更新 {row['update']}，未变化 {row['unchanged']}，跳过 {row['skip']}"
+        if row["delete"]:
+            text += f"，替换原有 {row['delete']}"
+        parts.append(f"{row['sheet']}: {text}")
+    return "；".join(parts)
@@ -0,0 +1,330 @@
+"""
+Integrity Service Module
+数据完整性检查：一次遍历数据建立共享索引，再由可插拔的检查项在索引上完成各自的核对，
+输出机器可读的检查报告 (JSON)。取代 scripts/diagnose_* 中各自加载数据、嵌套循环的诊断脚本。
+
+新增检查项：
+    @register_check("my_check", "说明")
+    def _check_my_check(index: IntegrityIndex) -> List[Dict[str, Any]]:
+        return [make_issue("my_check", SEVERITY_WARNING, collection, record_id, "描述", key=value)]
+"""
+
+import json
+import time
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Iterable, Tuple
+
+from core.constants import WATER_MATERIAL_ALIASES
+from core.enums import DataCategory, StockMovementType
+from utils.unit_helper import get_conversion_factor, normalize_unit, BASE_UNIT_RAW_MATERIAL
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_ERROR = "error"
+SEVERITY_WARNING = "warning"
+
+STOCK_TOLERANCE = 1e-3
+CHAIN_TOLERANCE = 1e-4
+SUSPECT_TON_STOCK = 0.1     # 原材料 (kg) 库存小于该值且非 0，疑似误存为吨
+SUSPECT_TON_ISSUE = 10.0    # 领料数量小于该值且未标注 kg，疑似误填为吨
+
+INBOUND_TYPES = {t.value for t in (StockMovementType.IN, StockMovementType.PRODUCE_IN,
+                                   StockMovementType.ADJUST_IN, StockMovementType.RETURN_IN)}
+OUTBOUND_TYPES = {t.value for t in (StockMovementType.OUT, StockMovementType.CONSUME_OUT, StockMovementType.ADJUST_OUT,
+                                    StockMovementType.RETURN_OUT, StockMovementType.SHIP_OUT)}
+CHAIN_TYPES = (StockMovementType.CONSUME_OUT.value, StockMovementType.RETURN_IN.value)
+
+# 检查 ID 是否重复的集合 (用户、审计日志由各自模块维护)
+ID_COLLECTIONS = [c.value for c in DataCategory
+                  if c not in (DataCategory.PERFORMANCE_DATA, DataCategory.USERS, DataCategory.AUDIT_LOGS)]
+
+
+def make_issue(check: str, severity: str, collection: str, record_id: Any, message: str, **details) -> Dict[str, Any]:
+    return {"check": check, "severity": severity, "collection": collection, "record_id": record_id,
+            "message": message, "details": details}
+
+
+def _float(value: Any) -> float:
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def movement_sign(record_type: Any) -> int:
+    """流水类型对库存的方向：入库 1，出库 -1，其他 0 (兼容大小写不一致的历史数据)"""
+    rtype = str(record_type or "").lower()
+    if rtype in INBOUND_TYPES:
+        return 1
+    if rtype in OUTBOUND_TYPES:
+        return -1
+    return 0
+
+
+class IntegrityIndex:
+    """所有检查共享的索引，每个集合只遍历一次"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.records: Dict[str, List[Dict[str, Any]]] = {
+            name: [r for r in (data.get(name) or []) if isinstance(r, dict)]
+            for name in ID_COLLECTIONS if isinstance(data.get(name), list)
+        }
+        self.ids = {name: {r.get("id") for r in records} for name, records in self.records.items()}
+
+        self.materials = {m.get("id"): m for m in self.records.get(DataCategory.RAW_MATERIALS.value, [])}
+        self.material_ledger = defaultdict(list)
+        for r in self.records.get(DataCategory.INVENTORY_RECORDS.value, []):
+            self.material_ledger[r.get("material_id")].append(r)
+
+        # 成品流水按名称关联主库存 (与 add_product_inventory_record 相同：也匹配 "前缀-名称" 中的名称)
+        self.products = {}
+        for p in self.records.get(DataCategory.PRODUCT_INVENTORY.value, []):
+            name = p.get("product_name") or p.get("name")
+            if name is not None:
+                self.products.setdefault(name, p)
+        self.product_ledger = defaultdict(list)
+        self.unmatched_product_records = []
+        for r in self.records.get(DataCategory.PRODUCT_INVENTORY_RECORDS.value, []):
+            name = self.match_product(r.get("product_name"))
+            if name is None:
+                self.unmatched_product_records.append(r)
+            else:
+                self.product_ledger[name].append(r)
+
+        # 领料 / 撤销链：按领料单 ID (无则按生产单) 与物料分组
+        self.chains = defaultdict(lambda: defaultdict(lambda: {"issues": [], "returns": []}))
+        for collection, item_key in ((DataCategory.INVENTORY_RECORDS.value, "material_id"),
+                                     (DataCategory.PRODUCT_INVENTORY_RECORDS.value, "product_name")):
+            for r in self.records.get(collection, []):
+                rtype = str(r.get("type") or "").lower()
+                if rtype not in CHAIN_TYPES:
+                    continue
+                group = r.get("related_doc_id") or f"order_{r.get('related_order_id')}"
+                side = "issues" if rtype == StockMovementType.CONSUME_OUT.value else "returns"
+                self.chains[group][(collection, r.get(item_key))][side].append(r)
+
+    def match_product(self, name: Any) -> Optional[str]:
+        if not name:
+            return None
+        if name in self.products:
+            return name
+        if isinstance(name, str) and "-" in name and name.split("-", 1)[1] in self.products:
+            return name.split("-", 1)[1]
+        return None
+
+    def material_name(self, material_id: Any) -> str:
+        material = self.materials.get(material_id)
+        return material.get("name", "") if material else f"未知物料(ID:{material_id})"
+
+
+CheckFunc = Callable[[IntegrityIndex], List[Dict[str, Any]]]
+CHECKS: Dict[str, Tuple[str, CheckFunc]] = {}
+
+
+def register_check(name: str, title: str):
+    """注册检查项 (装饰器)"""
+    def decorator(func: CheckFunc) -> CheckFunc:
+        CHECKS[name] = (title, func)
+        return func
+    return decorator
+
+
+@register_check("duplicate_ids", "ID 重复")
+def _check_duplicate_ids(index: IntegrityIndex) -> List[Dict[str, Any]]:
+    issues = []
+    for collection, records in index.records.items():
+        counts = Counter(r.get("id") for r in records if r.get("id") is not None)
+        missing = sum(1 for r in records if r.get("id") is None)
+        for record_id, count in counts.items():
+            if count > 1:
+                issues.append(make_issue("duplicate_ids", SEVERITY_ERROR, collection, record_id,
+                                         f"ID {record_id} 出现 {count} 次", count=count))
+        if missing:
+            issues.append(make_issue("duplicate_ids", SEVERITY_ERROR, collection, None,
+                                     f"{missing} 条记录缺少 ID", count=missing))
+    return issues
+
+
+@register_check("orphan_references", "孤立引用")
+def _check_orphan_references(index: IntegrityIndex) -> List[Dict[str, Any]]:
+    issues = []
+
+    def orphan(collection, record, field, target):
+        value = record.get(field)
+        if value is not None and value not in index.ids.get(target, ()):
+            issues.append(make_issue("orphan_references", SEVERITY_ERROR, collection, record.get("id"),
+                                     f"{field}={value} 在 {target} 中不存在", field=field, target=target, value=value))
+
+    for r in index.records.get(DataCategory.INVENTORY_RECORDS.value, []):
+        orphan(DataCategory.INVENTORY_RECORDS.value, r, "material_id", DataCategory.RAW_MATERIALS.value)
+    for r in index.records.get(DataCategory.BOM_VERSIONS.value, []):
+        orphan(DataCategory.BOM_VERSIONS.value, r, "bom_id", DataCategory.BOMS.value)
+    for r in index.records.get(DataCategory.PRODUCTION_ORDERS.value, []):
+        orphan(DataCategory.PRODUCTION_ORDERS.value, r, "bom_id", DataCategory.BOMS.value)
+        orphan(DataCategory.PRODUCTION_ORDERS.value, r, "bom_version_id", DataCategory.BOM_VERSIONS.value)
+    for r in index.records.get(DataCategory.MATERIAL_ISSUES.value, []):
+        orphan(DataCategory.MATERIAL_ISSUES.value, r, "production_order_id", DataCategory.PRODUCTION_ORDERS.value)
+        for line in r.get("lines") or []:
+            if isinstance(line, dict) and line.get("item_type", "raw_material") == "raw_material" \
+                    and line.get("item_id") not in index.materials:
+                issues.append(make_issue("orphan_references", SEVERITY_ERROR, DataCategory.MATERIAL_ISSUES.value,
+                                         r.get("id"), f"领料行物料 {line.get('item_name')} (ID:{line.get('item_id')}) 不存在",
+                                         field="lines.item_id", target=DataCategory.RAW_MATERIALS.value,
+                                         value=line.get("item_id")))
+    for r in index.unmatched_product_records:
+        issues.append(make_issue("orphan_references", SEVERITY_WARNING, DataCategory.PRODUCT_INVENTORY_RECORDS.value,
+                                 r.get("id"), f"成品 {r.get('product_name')} 在成品库存中不存在",
+                                 field="product_name", target=DataCategory.PRODUCT_INVENTORY.value,
+                                 value=r.get("product_name")))
+    return issues
+
+
+@register_check("ledger_vs_stock", "台账与主库存不一致")
+def _check_ledger_vs_stock(index: IntegrityIndex) -> List[Dict[str, Any]]:
+    issues = []
+    for material_id, material in index.materials.items():
+        if material.get("name") in WATER_MATERIAL_ALIASES:
+            continue
+        base_unit = normalize_unit(material.get("unit") or BASE_UNIT_RAW_MATERIAL)
+        calculated = 0.0
+        for r in index.material_ledger.get(material_id, ()):
+            factor = get_conversion_factor(r.get("unit"), base_unit) if r.get("unit") else None
+            calculated += movement_sign(r.get("type")) * _float(r.get("quantity")) * (factor or 1.0)
+        current = _float(material.get("stock_quantity"))
+        if abs(calculated - current) > STOCK_TOLERANCE:
+            issues.append(make_issue("ledger_vs_stock", SEVERITY_ERROR, DataCategory.RAW_MATERIALS.value, material_id,
+                                     f"原材料 {material.get('name')}: 主库存 {current:g}，台账合计 {calculated:g}",
+                                     stock=current, ledger=calculated, diff=current - calculated))
+    for name, product in index.products.items():
+        calculated = sum(movement_sign(r.get("type")) * _float(r.get("quantity")) for r in index.product_ledger.get(name, ()))
+        current = _float(product.get("stock_quantity") or product.get("current_stock"))
+        if abs(calculated - current) > STOCK_TOLERANCE:
+            issues.append(make_issue("ledger_vs_stock", SEVERITY_ERROR, DataCategory.PRODUCT_INVENTORY.value,
+                                     product.get("id"), f"成品 {name}: 主库存 {current:g}，台账合计 {calculated:g}",
+                                     stock=current, ledger=calculated, diff=current - calculated))
+    return issues
+
+
+@register_check("unit_mismatch", "单位异常")
+def _check_unit_mismatch(index: IntegrityIndex) -> List[Dict[str, Any]]:
+    issues = []
+    for material_id, material in index.materials.items():
+        unit = normalize_unit(material.get("unit"))
+        if get_conversion_factor(unit, BASE_UNIT_RAW_MATERIAL) != 1.0:
+            issues.append(make_issue("unit_mismatch", SEVERITY_WARNING, DataCategory.RAW_MATERIALS.value, material_id,
+                                     f"原材料 {material.get('name')} 单位为 '{material.get('unit')}'，应为 kg",
+                                     unit=material.get("unit")))
+        stock = _float(material.get("stock_quantity"))
+        if 0 < stock < SUSPECT_TON_STOCK:
+            issues.append(make_issue("unit_mismatch", SEVERITY_WARNING, DataCategory.RAW_MATERIALS.value, material_id,
+                                     f"原材料 {material.get('name')} 库存 {stock:g}，疑似误存为吨", stock=stock))
+
+        base_unit = unit or BASE_UNIT_RAW_MATERIAL
+        for r in index.material_ledger.get(material_id, ()):
+            record_unit = r.get("unit")
+            if record_unit and get_conversion_factor(record_unit, base_unit) is None:
+                issues.append(make_issue("unit_mismatch", SEVERITY_ERROR, DataCategory.INVENTORY_RECORDS.value, r.get("id"),
+                                         f"流水单位 '{record_unit}' 无法换算为物料单位 '{base_unit}'",
+                                         unit=record_unit, material_unit=base_unit))
+            elif str(r.get("type") or "").lower() == StockMovementType.CONSUME_OUT.value \
+                    and normalize_unit(record_unit) != "kg" and _float(r.get("quantity")) < SUSPECT_TON_ISSUE:
+                issues.append(make_issue("unit_mismatch", SEVERITY_WARNING, DataCategory.INVENTORY_RECORDS.value, r.get("id"),
+                                         f"{index.material_name(material_id)} 领料数量 {_float(r.get('quantity')):g} "
+                                         f"单位为 {record_unit or '空'}，疑似误填为吨",
+                                         quantity=_float(r.get("quantity")), unit=record_unit))
+    return issues
+
+
+@register_check("issue_return_chains", "领料 / 撤销链异常")
+def _check_issue_return_chains(index: IntegrityIndex) -> List[Dict[str, Any]]:
+    issues = []
+    for group, items in index.chains.items():
+        for (collection, item), chain in items.items():
+            if not chain["returns"]:
+                continue
+            item_name = item if collection == DataCategory.PRODUCT_INVENTORY_RECORDS.value else index.material_name(item)
+            issue_qty = sum(_float(r.get("quantity")) for r in chain["issues"])
+            return_qty = sum(_float(r.get("quantity")) for r in chain["returns"])
+            details = {"group": group, "item": item_name, "issued": issue_qty, "returned": return_qty,
+                       "issue_ids": [r.get("id") for r in chain["issues"]],
+                       "return_ids": [r.get("id") for r in chain["returns"]]}
+            record_id = chain["returns"][0].get("id")
+            if not chain["issues"]:
+                issues.append(make_issue("issue_return_chains", SEVERITY_ERROR, collection, record_id,
+                                         f"单据 {group} 的 {item_name} 有撤销但无领料记录", **details))
+                continue
+            if return_qty - issue_qty > CHAIN_TOLERANCE:
+                issues.append(make_issue("issue_return_chains", SEVERITY_ERROR, collection, record_id,
+                                         f"单据 {group} 的 {item_name} 撤销 {return_qty:g} 超过领料 {issue_qty:g}", **details))
+            elif abs(issue_qty - return_qty) > CHAIN_TOLERANCE:
+                issues.append(make_issue("issue_return_chains", SEVERITY_WARNING, collection, record_id,
+                                         f"单据 {group} 的 {item_name} 领料 {issue_qty:g} 与撤销 {return_qty:g} 不一致", **details))
+            issue_units = {r.get("unit") for r in chain["issues"]}
+            return_units = {r.get("unit") for r in chain["returns"]}
+            if issue_units != return_units:
+                issues.append(make_issue("issue_return_chains", SEVERITY_WARNING, collection, record_id,
+                                         f"单据 {group} 的 {item_name} 领料单位 {sorted(map(str, issue_units))} "
+                                         f"与撤销单位 {sorted(map(str, return_units))} 不一致", **details))
+    return issues
+
+
+def run_integrity_checks(data: Dict[str, Any], checks: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    运行完整性检查
+    Args:
+        checks: 要运行的检查项名称，为空时运行全部
+    Returns:
+        检查报告 (可直接 JSON 序列化)
+    """
+    names = list(checks) if checks else list(CHECKS)
+    unknown = [n for n in names if n not in CHECKS]
+    if unknown:
+        raise ValueError(f"未知的检查项: {', '.join(unknown)}")
+
+    start = time.perf_counter()
+    index = IntegrityIndex(data)
+    index_ms = (time.perf_counter() - start) * 1000
+
+    all_issues, results = [], {}
+    for name in names:
+        title, func = CHECKS[name]
+        check_start = time.perf_counter()
+        found = func(index)
+        all_issues.extend(found)
+        results[name] = {"title": title, "issues": len(found),
+                         "errors": sum(1 for i in found if i["severity"] == SEVERITY_ERROR),
+                         "duration_ms": round((time.perf_counter() - check_start) * 1000, 2)}
+
+    severities = Counter(i["severity"] for i in all_issues)
+    report = {
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        "index_ms": round(index_ms, 2),
+        "record_counts": {name: len(records) for name, records in index.records.items()},
+        "summary": {"total": len(all_issues), SEVERITY_ERROR: severities.get(SEVERITY_ERROR, 0),
+                    SEVERITY_WARNING: severities.get(SEVERITY_WARNING, 0)},
+        "checks": results,
+        "issues": all_issues,
+    }
+    logger.info(f"Integrity check finished in {report['duration_ms']} ms: {report['summary']}")
+    return report
+
+
+def report_to_json(report: Dict[str, Any]) -> str:
+    return json.dumps(report, ensure_ascii=False, indent=2, default=str)
+
+
+class IntegrityService:
+    """对当前数据运行完整性检查"""
+
+    def __init__(self, data_service):
+        self.data_service = data_service
+
+    def list_checks(self) -> Dict[str, str]:
+        return {name: title for name, (title, _) in CHECKS.items()}
+
+    def run(self, checks: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        return run_integrity_checks(self.data_service.load_data(), checks)
@@ -0,0 +1,178 @@
+"""
+Inventory Report Service Module
+库存台账周期统计：一次性向量化解析时间戳，按周/月/年分桶汇总
+原材料消耗、生产产出与发货出库，结果按台账代数缓存。
+"""
+
+import logging
+import weakref
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.enums import DataCategory
+from utils.unit_helper import get_conversion_factor
+
+logger = logging.getLogger(__name__)
+
+# 台账中的时间戳格式 (created_at 带时分秒，date 仅日期)
+DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y-%m-%d %H:%M")
+PERIOD_GRANULARITIES = ("周", "月", "年度")
+REPORT_COLLECTIONS = (
+    DataCategory.INVENTORY_RECORDS.value,
+    DataCategory.PRODUCT_INVENTORY_RECORDS.value,
+    DataCategory.RAW_MATERIALS.value,
+)
+
+
+def parse_datetimes(values: pd.Series) -> pd.Series:
+    """
+    向量化解析时间戳
+    依次按已知格式整列解析，只对仍未解析的非空值使用 format="mixed"；无法解析为 NaT。
+    """
+    raw = values.where(values.notna() & (values.astype(str).str.strip() != ""))
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    pending = raw.notna()
+    for fmt in DATETIME_FORMATS:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(raw[pending], format=fmt, errors="coerce")
+        parsed[attempt.index] = attempt
+        pending &= parsed.isna()
+    if pending.any():
+        parsed[pending] = pd.to_datetime(raw[pending].astype(str), format="mixed", errors="coerce")
+    return parsed
+
+
+def record_datetimes(df: pd.DataFrame, primary: str = "created_at", fallback: str = "date") -> pd.Series:
+    """记录时间：优先 created_at，缺失或无法解析时用 date"""
+    parsed = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    for col in (primary, fallback):
+        if col in df.columns:
+            missing = parsed.isna()
+            if missing.any():
+                parsed[missing] = parse_datetimes(df.loc[missing, col])
+    return parsed
+
+
+def period_labels(dt: pd.Series, granularity: str) -> pd.Series:
+    """
+    向量化周期标签：周 "2024-W05" (ISO 周)、月 "2024-01"、年度 "2024"；NaT 为空字符串
+    """
+    if granularity not in PERIOD_GRANULARITIES:
+        raise ValueError(f"未知的统计周期: {granularity}")
+    valid = dt.notna()
+    labels = pd.Series("", index=dt.index, dtype=object)
+    if not valid.any():
+        return labels
+    d = dt[valid]
+    if granularity == "周":
+        iso = d.dt.isocalendar()
+        labels[valid] = iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+    elif granularity == "月":
+        labels[valid] = d.dt.year.astype(str) + "-" + d.dt.month.astype(str).str.zfill(2)
+    else:
+        labels[valid] = d.dt.year.astype(str)
+    return labels
+
+
+def _to_kg_factors(units: pd.Series) -> pd.Series:
+    """每种单位换算到 kg 的系数 (无法换算的保持原值，系数 1)"""
+    factors = {}
+    for unit in units.dropna().unique():
+        factor = get_conversion_factor(unit, "kg")
+        factors[unit] = factor if factor is not None else 1.0
+    return units.map(factors).fillna(1.0).astype(np.float64)
+
+
+def _sum_by_period(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return pd.DataFrame(columns=["period", "quantity"])
+    return df.groupby("period", sort=True)["quantity"].sum().reset_index()
+
+
+def build_period_statistics(inventory_records, product_records, raw_materials,
+                            granularity: str) -> Dict[str, pd.DataFrame]:
+    """
+    计算周期统计
+    Returns:
+        dict: mat_agg / prod_agg / ship_agg ([period, quantity])，
+              mat_by_type (原材料名称 × 周期的 kg 透视表)
+    """
+    df_m = pd.DataFrame(inventory_records)
+    if not df_m.empty and "type" in df_m.columns:
+        df_m["period"] = period_labels(record_datetimes(df_m), granularity)
+        df_m["quantity"] = pd.to_numeric(df_m.get("quantity"), errors="coerce").fillna(0.0)
+        cons = df_m[df_m["type"] == "consume_out"].copy()
+    else:
+        cons = pd.DataFrame(columns=["period", "quantity", "material_id"])
+    mat_agg = _sum_by_period(cons)
+
+    mat_by_type = pd.DataFrame()
+    if not cons.empty:
+        names = {m.get("id"): m.get("name") for m in raw_materials}
+        cons["原材料名称"] = cons["material_id"].map(names) if "material_id" in cons.columns else None
+        factors = _to_kg_factors(cons["unit"]) if "unit" in cons.columns else 1.0
+        cons["qty_kg"] = cons["quantity"].astype(np.float64) * factors
+        mat_by_type = cons.pivot_table(index="原材料名称", columns="period", values="qty_kg",
+                                       aggfunc="sum", fill_value=0.0)
+
+    df_p = pd.DataFrame(product_records)
+    if not df_p.empty and "type" in df_p.columns:
+        df_p["period"] = period_labels(record_datetimes(df_p), granularity)
+        df_p["quantity"] = pd.to_numeric(df_p.get("quantity"), errors="coerce").fillna(0.0)
+        doc_type = df_p["related_doc_type"] if "related_doc_type" in df_p.columns else pd.Series(None, index=df_p.index)
+        prod_agg = _sum_by_period(df_p[df_p["type"] == "in"])
+        ship_agg = _sum_by_period(df_p[(df_p["type"] == "out") & (doc_type == "SHIPPING")])
+    else:
+        prod_agg = _sum_by_period(pd.DataFrame())
+        ship_agg = _sum_by_period(pd.DataFrame())
+
+    return {"mat_agg": mat_agg, "mat_by_type": mat_by_type, "prod_agg": prod_agg, "ship_agg": ship_agg}
+
+
+# 每个 DataService 一份缓存：{周期: (台账代数, 统计结果)}
+_report_caches: "weakref.WeakKeyDictionary[Any, Dict[str, Tuple[Any, Dict[str, pd.DataFrame]]]]" = weakref.WeakKeyDictionary()
+
+
+class InventoryReportService:
+    """库存台账周期统计服务"""
+
+    def __init__(self, data_service):
+        """
+        Args:
+            data_service: DataService 实例。
+        """
+        self.data_service = data_service
+
+    def _generations(self) -> Optional[tuple]:
+        if not hasattr(self.data_service, "get_generation"):
+            return None
+        return tuple(self.data_service.get_generation(c) for c in REPORT_COLLECTIONS)
+
+    def get_period_statistics(self, granularity: str = "月") -> Dict[str, pd.DataFrame]:
+        """
+        周期统计 (台账未变化时直接返回缓存结果)
+        Args:
+            granularity: 周 / 月 / 年度
+        """
+        generations = self._generations()
+        cache = _report_caches.get(self.data_service)
+        if cache is None:
+            cache = {}
+            _report_caches[self.data_service] = cache
+        cached = cache.get(granularity)
+        if generations is not None and cached is not None and cached[0] == generations:
+            return cached[1]
+
+        data = self.data_service.load_data()
+        result = build_period_statistics(
+            data.get(DataCategory.INVENTORY_RECORDS.value, []),
+            data.get(DataCategory.PRODUCT_INVENTORY_RECORDS.value, []),
+            data.get(DataCategory.RAW_MATERIALS.value, []),
+            granularity,
+        )
+        if generations is not None and self._generations() == generations:
+            cache[granularity] = (generations, result)
+        return result
@@ -492,7 +492,50 @@ class InventoryService:
     def post_issue(self, issue_id: int, operator: str = "System") -> Tuple[bool, str]:
         """
         领料过账
-        强制将所有消耗转换为基准单位 (Raw->kg, Product->Ton)
+        强制将所有消耗转换为基准单位 (Raw->kg, Product->kg)
+        单张过账允许扣减到负库存，与历史行为保持一致。
+        """
+        outcome = self.post_issues([issue_id], operator=operator, allow_negative_stock=True)[0]
+        return outcome["success"], outcome["message"]
+
+    @staticmethod
+    def _build_item_indexes(materials: List[Dict[str, Any]], products: List[Dict[str, Any]]) -> Dict[str, Dict[Any, int]]:
+        """
+        为原材料/成品建立 id 与名称索引 (值为列表下标)
+        名称索引仅用于成品的容错匹配，先出现者优先，与线性扫描的命中顺序一致。
+        """
+        material_by_id: Dict[Any, int] = {}
+        for idx, m in enumerate(materials):
+            material_by_id.setdefault(m.get("id"), idx)
+
+        product_by_id: Dict[Any, int] = {}
+        product_by_name: Dict[str, int] = {}
+        for idx, p in enumerate(products):
+            product_by_id.setdefault(p.get("id"), idx)
+            p_name = str(p.get("product_name") or p.get("name") or "").strip()
+            if p_name:
+                product_by_name.setdefault(p_name, idx)
+
+        return {
+            "material_by_id": material_by_id,
+            "product_by_id": product_by_id,
+            "product_by_name": product_by_name,
+        }
+
+    def post_issues(self, issue_ids: List[int], operator: str = "System", allow_negative_stock: bool = False) -> List[Dict[str, Any]]:
+        """
+        批量领料过账
+        1. 一次性加载数据并建立 id/名称索引
+        2. 逐单解析行项目并换算为基准单位 (kg)，任一行失败则该单整体跳过
+        3. 按批次累计校验库存 (前序单据的扣减计入后续单据的可用量)
+        4. 所有台账与库存变更在一次保存中提交
+
+        Args:
+            issue_ids: 领料单ID列表 (按顺序处理)
+            operator: 操作人
+            allow_negative_stock: 是否允许扣减到负库存；为 False 时库存不足的单据不过账
+        Returns:
+            list: 每张领料单的结果 [{issue_id, issue_code, success, message}]
         """
         data = self.data_service.load_data()
         issues = data.get(DataCategory.MATERIAL_ISSUES.value, [])
@@ -501,83 +544,157 @@ class InventoryService:
         products = data.get(DataCategory.PRODUCT_INVENTORY.value, [])
         product_records = data.get(DataCategory.PRODUCT_INVENTORY_RECORDS.value, [])
         orders = data.get(DataCategory.PRODUCTION_ORDERS.value, [])
-        
-        target_issue = None
+
+        issue_map = {}
         for issue in issues:
-            if issue.get("id") == issue_id:
-                target_issue = issue
-                break
-        
-        if not target_issue: return False, "领料单不存在"
-        if target_issue.get("status") == IssueStatus.POSTED.value: return False, "领料单已过账"
-        
-        lines = target_issue.get("lines", [])
-        if not lines: return False, "领料单明细为空"
-        
-        # 关联信息
-        rel_order_id = target_issue.get("production_order_id")
-        rel_bom_id = None
-        rel_bom_ver = None
-        if rel_order_id:
-            ord_obj = next((o for o in orders if o.get("id") == rel_order_id), None)
+            issue_map.setdefault(issue.get("id"), issue)
+        order_map = {}
+        for o in orders:
+            order_map.setdefault(o.get("id"), o)
+        indexes = self._build_item_indexes(materials, products)
+
+        # 批次内运行中的库存 (下标 -> 当前库存)，保证同一物料在多张单据间累计扣减
+        mat_stock: Dict[int, float] = {}
+        prod_stock: Dict[int, float] = {}
+
+        def _mat_stock(idx: int) -> float:
+            if idx not in mat_stock:
+                mat_stock[idx] = float(materials[idx].get("stock_quantity", 0.0) or 0.0)
+            return mat_stock[idx]
+
+        def _prod_stock(idx: int) -> float:
+            if idx not in prod_stock:
+                prod_stock[idx] = float(products[idx].get("stock_quantity", 0.0) or 0.0)
+            return prod_stock[idx]
+
+        next_rec_id = self.data_service._get_next_id(records)
+        next_prod_rec_id = self.data_service._get_next_id(product_records)
+        now = datetime.now()
+        now_str = now.strftime("%Y-%m-%d %H:%M:%S")
+        today_str = now.strftime("%Y-%m-%d")
+
+        outcomes: List[Dict[str, Any]] = []
+        posted_issues: List[Dict[str, Any]] = []
+        seen_ids = set()
+
+        for issue_id in issue_ids:
+            target_issue = issue_map.get(issue_id)
+            outcome = {
+                "issue_id": issue_id,
+                "issue_code": target_issue.get("issue_code") if target_issue else None,
+                "success": False,
+                "message": ""
+            }
+            outcomes.append(outcome)
+
+            if not target_issue:
+                outcome["message"] = "领料单不存在"
+                continue
+            if issue_id in seen_ids or target_issue.get("status") == IssueStatus.POSTED.value:
+                outcome["message"] = "领料单已过账"
+                continue
+
+            lines = target_issue.get("lines", [])
+            if not lines:
+                outcome["message"] = "领料单明细为空"
+                continue
+
+            # 关联信息
+            rel_order_id = target_issue.get("production_order_id")
+            rel_bom_id = None
+            rel_bom_ver = None
+            ord_obj = order_map.get(rel_order_id) if rel_order_id else None
             if ord_obj:
                 rel_bom_id = ord_obj.get("bom_id")
                 rel_bom_ver = ord_obj.get("bom_version_id")
-        
-        for line in lines:
-            raw_qty = float(line.get("required_qty", 0.0))
-            if raw_qty <= 0: continue
-            
-            mid = line.get("item_id")
-            line_uom = line.get("uom", UnitType.KG.value)
-            item_type = line.get("item_type", MaterialType.RAW_MATERIAL.value)
-            
-            if item_type == MaterialType.PRODUCT.value:
-                # ---------------- 成品扣减 (基准单位: kg) ----------------
-                prod_idx = -1
-                current_stock = 0.0
-                
-                # ID Match
-                for idx, p in enumerate(products):
-                    if p.get("id") == mid:
-                        prod_idx = idx
-                        current_stock = float(p.get("stock_quantity", 0.0))
-                        break
-                
-                # Name Match Fallback
-                if prod_idx == -1:
-                    expected_name = str(line.get("item_name", "") or "").strip()
-                    if expected_name:
-                        for idx, p in enumerate(products):
-                            if str(p.get("name", "") or "").strip() == expected_name:
-                                prod_idx = idx
-                                current_stock = float(p.get("stock_quantity", 0.0))
-                                break
-                
-                if prod_idx != -1:
-                    # Convert to Base Unit (kg)
+
+            # ---------- 解析与换算 (不修改任何数据) ----------
+            planned = []
+            error_msg = None
+            for line in lines:
+                raw_qty = float(line.get("required_qty", 0.0))
+                if raw_qty <= 0: continue
+
+                mid = line.get("item_id")
+                line_uom = line.get("uom", UnitType.KG.value)
+                item_type = line.get("item_type", MaterialType.RAW_MATERIAL.value)
+
+                if item_type == MaterialType.PRODUCT.value:
+                    prod_idx = indexes["product_by_id"].get(mid, -1)
+                    if prod_idx == -1:
+                        expected_name = str(line.get("item_name", "") or "").strip()
+                        if expected_name:
+                            prod_idx = indexes["product_by_name"].get(expected_name, -1)
+                    if prod_idx == -1:
+                        logger.warning(f"Post issue: Product item {mid} ({line.get('item_name')}) not found in inventory. Skipping stock deduction.")
+                        continue
+
                     final_qty, success = convert_to_base_unit(raw_qty, line_uom, 'product')
-                    
                     if not success:
                         logger.warning(f"Unit conversion failed (product): {raw_qty} {line_uom} -> {BASE_UNIT_PRODUCT}")
-                        return False, f"单位转换失败: {line_uom} -> {BASE_UNIT_PRODUCT}"
-                    
-                    new_stock = current_stock - final_qty
-                    products[prod_idx]["stock_quantity"] = new_stock
-                    products[prod_idx]["last_update"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    # Record
+                        error_msg = f"单位转换失败: {line_uom} -> {BASE_UNIT_PRODUCT}"
+                        break
+                    planned.append((MaterialType.PRODUCT.value, prod_idx, final_qty, raw_qty, line_uom))
+                else:
+                    mat_idx = indexes["material_by_id"].get(mid, -1)
+                    if mat_idx == -1:
+                        continue
+
+                    final_qty, success = convert_to_base_unit(raw_qty, line_uom, 'raw_material')
+                    if not success:
+                        error_msg = f"单位转换失败: {line_uom} -> {BASE_UNIT_RAW_MATERIAL}"
+                        break
+                    planned.append((MaterialType.RAW_MATERIAL.value, mat_idx, final_qty, raw_qty, line_uom))
+
+            if error_msg:
+                outcome["message"] = error_msg
+                continue
+
+            # ---------- 批次库存校验 ----------
+            if not allow_negative_stock:
+                demand: Dict[Tuple[str, int], float] = {}
+                for kind, idx, final_qty, _, _ in planned:
+                    if kind == MaterialType.RAW_MATERIAL.value:
+                        mat_name = str(materials[idx].get("name", "") or "").strip()
+                        if mat_name in self.UNTRACKED_MATERIALS:
+                            continue
+                    demand[(kind, idx)] = demand.get((kind, idx), 0.0) + final_qty
+
+                shortages = []
+                for (kind, idx), need in demand.items():
+                    if kind == MaterialType.PRODUCT.value:
+                        available = _prod_stock(idx)
+                        name = products[idx].get("product_name") or products[idx].get("name")
+                        if not self.check_stock_availability(name, need, available):
+                            shortages.append(f"{name} (需 {need:.3f}, 可用 {available:.3f})")
+                    else:
+                        available = _mat_stock(idx)
+                        name = materials[idx].get("name", "")
+                        if not self.check_stock_availability(name, need, available):
+                            shortages.append(f"{name} (需 {need:.3f}, 可用 {available:.3f})")
+
+                if shortages:
+                    outcome["message"] = "库存不足: " + "; ".join(shortages)
+                    continue
+
+            # ---------- 写入台账与库存 ----------
+            for kind, idx, final_qty, raw_qty, line_uom in planned:
+                if kind == MaterialType.PRODUCT.value:
+                    new_stock = _prod_stock(idx) - final_qty
+                    prod_stock[idx] = new_stock
+                    products[idx]["stock_quantity"] = new_stock
+                    products[idx]["last_update"] = now_str
+
                     reason_note = f"生产领料: {target_issue.get('issue_code')}"
                     if normalize_unit(line_uom) != normalize_unit(BASE_UNIT_PRODUCT):
                         reason_note += f" (原: {raw_qty}{line_uom})"
-                    
-                    new_rec_id = self.data_service._get_next_id(product_records)
+
                     product_records.append({
-                        "id": new_rec_id,
-                        "date": datetime.now().strftime("%Y-%m-%d"),
-                        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "product_name": products[prod_idx].get("product_name") or products[prod_idx].get("name"),
-                        "product_type": products[prod_idx].get("type", "其他"),
+                        "id": next_prod_rec_id,
+                        "date": today_str,
+                        "created_at": now_str,
+                        "product_name": products[idx].get("product_name") or products[idx].get("name"),
+                        "product_type": products[idx].get("type", "其他"),
                         "type": StockMovementType.CONSUME_OUT.value,
                         "quantity": final_qty, # Stored in kg
                         "reason": reason_note,
@@ -589,51 +706,25 @@ class InventoryService:
                         "related_bom_id": rel_bom_id,
                         "related_bom_version_id": rel_bom_ver
                     })
-            else:
-                # ---------------- 原材料扣减 (基准单位: kg) ----------------
-                mat_idx = -1
-                current_stock = 0.0
-                is_untracked = False
-                
-                for idx, m in enumerate(materials):
-                    if m.get("id") == mid:
-                        current_stock = float(m.get("stock_quantity", 0.0))
-                        mat_name = m.get("name", "").strip()
-                        is_untracked = mat_name in self.UNTRACKED_MATERIALS
-                        mat_idx = idx
-                        break
-                
-                if mat_idx >= 0:
-                    # Convert to Base Unit (kg)
-                    final_qty, success = convert_to_base_unit(raw_qty, line_uom, 'raw_material')
-                    
-                    if not success:
-                         return False, f"单位转换失败: {line_uom} -> {BASE_UNIT_RAW_MATERIAL}"
-    
-                    new_stock = current_stock
-                    
-                    # 检查库存可用性 (虽然这里主要是扣减逻辑，但加上 check 更稳健，尽管业务要求免库存始终充足)
-                    if not self.check_stock_availability(materials[mat_idx].get("name", ""), final_qty, current_stock):
-                        # 注意：普通物料如果库存不足，是否应该报错？
-                        # 当前 post_issue 逻辑允许扣减到负数。
-                        # 这里我们保持原有逻辑，只对 untracked 做特殊处理。
-                        pass
+                    next_prod_rec_id += 1
+                else:
+                    mat_name = str(materials[idx].get("name", "") or "").strip()
+                    new_stock = _mat_stock(idx)
+                    if mat_name not in self.UNTRACKED_MATERIALS:
+                        new_stock = new_stock - final_qty
+                        mat_stock[idx] = new_stock
+                        materials[idx]["stock_quantity"] = new_stock
+                        materials[idx]["last_stock_update"] = now_str
 
-                    if not is_untracked:
-                        new_stock = current_stock - final_qty
-                        materials[mat_idx]["stock_quantity"] = new_stock
-                        materials[mat_idx]["last_stock_update"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
                     reason_note = f"生产领料: {target_issue.get('issue_code')}"
                     if normalize_unit(line_uom) != normalize_unit(BASE_UNIT_RAW_MATERIAL):
                         reason_note += f" (原: {raw_qty}{line_uom})"
-                    
-                    new_rec_id = self.data_service._get_next_id(records)
+
                     records.append({
-                        "id": new_rec_id,
-                        "date": datetime.now().strftime("%Y-%m-%d"),
-                        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "material_id": mid,
+                        "id": next_rec_id,
+                        "date": today_str,
+                        "created_at": now_str,
+                        "material_id": materials[idx].get("id"),
                         "type": StockMovementType.CONSUME_OUT.value,
                         "quantity": final_qty, # Stored in kg
                         "reason": reason_note,
@@ -642,18 +733,28 @@ class InventoryService:
                         "related_doc_id": issue_id,
                         "snapshot_stock": new_stock
                     })
-        
-        target_issue["status"] = IssueStatus.POSTED.value
-        target_issue["posted_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
+                    next_rec_id += 1
+
+            target_issue["status"] = IssueStatus.POSTED.value
+            target_issue["posted_at"] = now_str
+            seen_ids.add(issue_id)
+            posted_issues.append(outcome)
+            outcome["success"] = True
+            outcome["message"] = "过账成功"
+
+        if not posted_issues:
+            return outcomes
+
         data[DataCategory.INVENTORY_RECORDS.value] = records
         data[DataCategory.PRODUCT_INVENTORY_RECORDS.value] = product_records
         data[DataCategory.RAW_MATERIALS.value] = materials
         data[DataCategory.PRODUCT_INVENTORY.value] = products
-        
-        if self.data_service.save_data(data):
-            return True, "过账成功"
-        return False, "保存失败"
+
+        if not self.data_service.save_data(data):
+            for outcome in posted_issues:
+                outcome["success"] = False
+                outcome["message"] = "保存失败"
+        return outcomes
 
     def cancel_issue_posting(self, issue_id: int, operator: str = "System") -> Tuple[bool, str]:
         """
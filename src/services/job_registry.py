@@ -0,0 +1,28 @@
+"""
+Job Registry Module
+后台任务登记表：模型训练与导出等服务共用的有界任务状态表。
+"""
+
+import threading
+from typing import Dict, Any
+
+FINISHED_STATUSES = ("done", "failed")
+
+
+class JobRegistry:
+    """任务状态表 (job_id -> 任务)；读写任务状态须持有 lock"""
+
+    def __init__(self, max_jobs: int = 64):
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def add_job(self, job: Dict[str, Any]) -> None:
+        """登记任务 (调用方持有 lock)；超出上限时按提交顺序淘汰已结束的任务，进行中的任务保留"""
+        self.jobs[job["job_id"]] = job
+        excess = len(self.jobs) - self.max_jobs
+        if excess > 0:
+            finished = [jid for jid, j in self.jobs.items()
+                        if jid != job["job_id"] and j["status"] in FINISHED_STATUSES][:excess]
+            for jid in finished:
+                del self.jobs[jid]
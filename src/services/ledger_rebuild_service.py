@@ -0,0 +1,484 @@
+"""
+Ledger Rebuild Service Module
+库存台账的增量重建：台账按来源单据分段 (采购收货、领料单、生产单、发货单各一段)，
+只重新生成水位线之后发生变化的单据对应的分段，并按分段差额增量调整主库存。
+
+- 水位线：LEDGER_STATE_FILE 中记录上次重建时每张来源单据的指纹，指纹变化 / 新增 / 删除的单据视为已变化
+- 手工盘点 (adjust_*)、手动出入库等没有来源单据的流水原样保留
+- 检查点：每个物料 / 成品的 "主库存 - 台账合计" 差值。重建只应改变台账与库存的同一部分，
+  受影响条目的差值在重建前后必须一致，否则放弃保存；verify() 报告自上次重建以来差值发生变化的条目
+"""
+
+import json
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+from config import LEDGER_STATE_FILE, DEFAULT_UNIT
+from core.constants import WATER_MATERIAL_ALIASES, DEFAULT_UNIT_TON
+from core.enums import DataCategory, StockMovementType, MaterialType, IssueStatus, ProductionOrderStatus, \
+    ReceiptStatus, ShippingStatus
+from services.integrity_service import movement_sign
+from services.production_service import ProductionService
+from utils.unit_helper import convert_quantity, get_conversion_factor
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+CHECKPOINT_TOLERANCE = 1e-6
+
+SEGMENT_GOODS_RECEIPT = "GOODS_RECEIPT"
+SEGMENT_MATERIAL_ISSUE = "MATERIAL_ISSUE"
+SEGMENT_PRODUCTION_ORDER = "PRODUCTION_ORDER"
+SEGMENT_SHIPPING_ORDER = "SHIPPING_ORDER"
+
+# 分段类型 -> (来源单据集合, 归属该分段的流水 related_doc_type)
+# 领料单的流水由过账写为 ISSUE，撤销后改为 ISSUE_CANCEL 并补 return_in；旧重构脚本写为 MATERIAL_ISSUE
+SEGMENT_SOURCES = {
+    SEGMENT_GOODS_RECEIPT: (DataCategory.GOODS_RECEIPTS.value, ("GOODS_RECEIPT",)),
+    SEGMENT_MATERIAL_ISSUE: (DataCategory.MATERIAL_ISSUES.value, ("ISSUE", "ISSUE_CANCEL", "MATERIAL_ISSUE")),
+    SEGMENT_PRODUCTION_ORDER: (DataCategory.PRODUCTION_ORDERS.value, ("PRODUCTION_ORDER",)),
+    SEGMENT_SHIPPING_ORDER: (DataCategory.SHIPPING_ORDERS.value, ("SHIPPING_ORDER",)),
+}
+DOC_TYPE_SEGMENTS = {doc_type: seg for seg, (_, doc_types) in SEGMENT_SOURCES.items() for doc_type in doc_types}
+
+# 自动生成的历史收货 / 发货单明细未标注单位，数量为吨
+LEGACY_DOC_UNIT = DEFAULT_UNIT_TON
+
+LEDGERS = (DataCategory.INVENTORY_RECORDS.value, DataCategory.PRODUCT_INVENTORY_RECORDS.value)
+# 判断分段是否需要重写时比较的流水字段 (ID、操作人、说明等不影响库存)
+COMPARED_FIELDS = ("material_id", "product_name", "type", "quantity", "date")
+
+
+def segment_key(segment_type: str, doc_id: Any) -> str:
+    return f"{segment_type}:{doc_id}"
+
+
+def _fingerprint(doc: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(doc, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def _day(value: Any) -> str:
+    return str(value or "").split(" ")[0]
+
+
+class LedgerRebuildService:
+    """按来源单据分段增量重建库存台账"""
+
+    def __init__(self, data_service, state_file: Path = LEDGER_STATE_FILE):
+        self.data_service = data_service
+        self.state_file = Path(state_file)
+
+    # ------------------ 水位线状态 ------------------
+
+    def load_state(self) -> Optional[Dict[str, Any]]:
+        if not self.state_file.exists():
+            return None
+        try:
+            return json.loads(self.state_file.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ledger state unreadable, treating as missing: {e}")
+            return None
+
+    def _write_state(self, data: Dict[str, Any]):
+        state = {
+            "watermark": datetime.now().strftime(DATETIME_FORMAT),
+            "fingerprints": {key: _fingerprint(doc) for key, doc in self._source_docs(data).items()},
+            "checkpoints": self._drifts(data),
+        }
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.state_file)
+
+    # ------------------ 来源单据与分段 ------------------
+
+    @staticmethod
+    def _source_docs(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        docs = {}
+        for seg, (collection, _) in SEGMENT_SOURCES.items():
+            for doc in data.get(collection) or []:
+                if isinstance(doc, dict) and doc.get("id") is not None:
+                    docs[segment_key(seg, doc.get("id"))] = doc
+        return docs
+
+    @staticmethod
+    def _row_segment(row: Dict[str, Any], order_codes: Dict[str, Any]) -> Optional[str]:
+        """流水所属分段；无来源单据的流水 (手工盘点等) 返回 None"""
+        seg = DOC_TYPE_SEGMENTS.get(row.get("related_doc_type"))
+        if seg and row.get("related_doc_id") is not None:
+            return segment_key(seg, row.get("related_doc_id"))
+        # 生产完工入库流水只以批号记录生产单号
+        if row.get("related_doc_type") is None and row.get("type") == StockMovementType.PRODUCE_IN.value \
+                and row.get("batch_number") in order_codes:
+            return segment_key(SEGMENT_PRODUCTION_ORDER, order_codes[row.get("batch_number")])
+        return None
+
+    def _owned_rows(self, data: Dict[str, Any]) -> Dict[str, Dict[str, List[int]]]:
+        """分段 -> {台账集合: [行下标]}"""
+        order_codes = {o.get("order_code"): o.get("id") for o in data.get(DataCategory.PRODUCTION_ORDERS.value) or []
+                       if isinstance(o, dict) and o.get("order_code")}
+        owned = defaultdict(lambda: defaultdict(list))
+        for ledger in LEDGERS:
+            for pos, row in enumerate(data.get(ledger) or []):
+                seg = self._row_segment(row, order_codes) if isinstance(row, dict) else None
+                if seg:
+                    owned[seg][ledger].append(pos)
+        return owned
+
+    def _products(self, data: Dict[str, Any]):
+        inventory = data.get(DataCategory.PRODUCT_INVENTORY.value) or []
+        return inventory, ProductionService.build_product_name_index(inventory)
+
+    @staticmethod
+    def _match_product(name_index: Dict[str, int], name: Any) -> Optional[int]:
+        if not name:
+            return None
+        positions = [name_index[c] for c in ProductionService.get_candidate_names(str(name)) if c in name_index]
+        return min(positions) if positions else None
+
+    def _product_row(self, data, name, product_type, qty, unit, movement, doc_type, doc, reason, date, created_at,
+                     product_id=None):
+        inventory, name_index = self._products(data)
+        # 先按名称匹配 (历史领料单的成品 ID 与库存 ID 不一定对应)，再按成品 ID
+        pos = self._match_product(name_index, name)
+        if pos is None and product_id is not None:
+            pos = next((i for i, p in enumerate(inventory) if p.get("id") == product_id), None)
+        product = inventory[pos] if pos is not None else None
+        prod_unit = product.get("unit", DEFAULT_UNIT) if product else DEFAULT_UNIT
+        final_qty, ok = convert_quantity(qty, unit, prod_unit)
+        return {
+            "product_name": (product.get("product_name") or product.get("name")) if product else name,
+            "product_type": product.get("type", product_type) if product else product_type,
+            "type": movement,
+            "quantity": final_qty if ok else float(qty),
+            "unit": prod_unit,
+            "reason": reason,
+            "date": date,
+            "created_at": created_at,
+            "related_doc_type": doc_type,
+            "related_doc_id": doc.get("id"),
+        }
+
+    def expected_rows(self, data: Dict[str, Any], seg: str, doc: Optional[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """按来源单据生成该分段应有的流水 (单位与各业务流程写入时一致，统一存 kg)"""
+        rows = {ledger: [] for ledger in LEDGERS}
+        if doc is None:
+            return rows
+        seg_type = seg.split(":", 1)[0]
+        raw_ledger, prod_ledger = LEDGERS
+        materials = {m.get("id"): m for m in data.get(DataCategory.RAW_MATERIALS.value) or []}
+
+        def raw_row(material_id, qty, unit, movement, doc_type, reason, date, created_at):
+            material_unit = (materials.get(material_id) or {}).get("unit", DEFAULT_UNIT)
+            final_qty, ok = convert_quantity(qty, unit, material_unit)
+            return {"material_id": material_id, "type": movement, "quantity": final_qty if ok else float(qty),
+                    "unit": material_unit, "reason": reason, "date": date, "created_at": created_at,
+                    "related_doc_type": doc_type, "related_doc_id": doc.get("id")}
+
+        if seg_type == SEGMENT_GOODS_RECEIPT and doc.get("status") == ReceiptStatus.COMPLETED.value:
+            for item in doc.get("items") or []:
+                if item.get("material_id") is None:
+                    continue
+                rows[raw_ledger].append(raw_row(
+                    item.get("material_id"), item.get("quantity", 0.0), item.get("unit") or LEGACY_DOC_UNIT,
+                    StockMovementType.IN.value, "GOODS_RECEIPT", f"采购入库 (单号: {doc.get('receipt_code')})",
+                    _day(doc.get("date")), doc.get("created_at")))
+
+        elif seg_type == SEGMENT_MATERIAL_ISSUE and doc.get("status") == IssueStatus.POSTED.value:
+            reason = f"生产领料: {doc.get('issue_code')}"
+            date, created_at = _day(doc.get("posted_at")), doc.get("posted_at")
+            for line in doc.get("lines") or []:
+                qty, uom = line.get("required_qty", 0.0), line.get("uom") or DEFAULT_UNIT
+                if line.get("item_type", MaterialType.RAW_MATERIAL.value) == MaterialType.PRODUCT.value:
+                    row = self._product_row(data, line.get("item_name"), "其他", qty, uom,
+                                            StockMovementType.CONSUME_OUT.value, "ISSUE", doc, reason, date, created_at,
+                                            product_id=line.get("item_id"))
+                    row["related_order_id"] = doc.get("production_order_id")
+                    rows[prod_ledger].append(row)
+                else:
+                    rows[raw_ledger].append(raw_row(line.get("item_id"), qty, uom, StockMovementType.CONSUME_OUT.value,
+                                                    "ISSUE", reason, date, created_at))
+
+        elif seg_type == SEGMENT_PRODUCTION_ORDER and doc.get("status") == ProductionOrderStatus.FINISHED.value:
+            bom = next((b for b in data.get(DataCategory.BOMS.value) or [] if b.get("id") == doc.get("bom_id")), None)
+            name = doc.get("product_name") or (ProductionService.get_bom_product_name(bom) if bom else None)
+            qty = float(doc.get("plan_qty") or 0.0)
+            if name and qty > 0:
+                row = self._product_row(data, name, (bom or {}).get("bom_type", "其他"), qty, DEFAULT_UNIT,
+                                        StockMovementType.PRODUCE_IN.value, SEGMENT_PRODUCTION_ORDER, doc,
+                                        f"生产完工: {doc.get('order_code')}", _day(doc.get("finished_at")),
+                                        doc.get("finished_at"))
+                row["batch_number"] = doc.get("order_code")
+                rows[prod_ledger].append(row)
+            elif not name:
+                logger.warning(f"Production order {doc.get('order_code')} has no product name or BOM, segment left empty")
+
+        elif seg_type == SEGMENT_SHIPPING_ORDER and doc.get("status") == ShippingStatus.SHIPPED.value:
+            for item in doc.get("items") or []:
+                rows[prod_ledger].append(self._product_row(
+                    data, item.get("product_name"), item.get("product_type", "其他"), item.get("quantity", 0.0),
+                    item.get("unit") or LEGACY_DOC_UNIT, StockMovementType.SHIP_OUT.value, SEGMENT_SHIPPING_ORDER,
+                    doc, f"销售发货 (单号: {doc.get('shipping_code')})", _day(doc.get("date")), doc.get("created_at")))
+        return rows
+
+    # ------------------ 库存差额与检查点 ------------------
+
+    def _item_key(self, inventory, ledger: str, row: Dict[str, Any], name_index) -> Optional[str]:
+        """流水对应的库存条目: raw:<物料ID> / product:<成品ID>；未匹配到成品时为 None"""
+        if ledger == DataCategory.INVENTORY_RECORDS.value:
+            return f"raw:{row.get('material_id')}"
+        pos = self._match_product(name_index, row.get("product_name"))
+        return f"product:{inventory[pos].get('id')}" if pos is not None else None
+
+    @staticmethod
+    def _row_effect(units: Dict[Any, str], ledger: str, row: Dict[str, Any]) -> float:
+        """流水对库存的影响 (原材料按物料单位换算)"""
+        qty = movement_sign(row.get("type")) * float(row.get("quantity") or 0.0)
+        if ledger == DataCategory.INVENTORY_RECORDS.value and row.get("unit"):
+            qty *= get_conversion_factor(row.get("unit"), units.get(row.get("material_id"), DEFAULT_UNIT)) or 1.0
+        return qty
+
+    @staticmethod
+    def _units(data: Dict[str, Any]) -> Dict[Any, str]:
+        return {m.get("id"): m.get("unit", DEFAULT_UNIT) for m in data.get(DataCategory.RAW_MATERIALS.value) or []}
+
+    def _drifts(self, data: Dict[str, Any], items: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """检查点：条目 -> 主库存 - 台账合计 (免库存物料不计)"""
+        inventory, name_index = self._products(data)
+        units = self._units(data)
+        balances = defaultdict(float)
+        for ledger in LEDGERS:
+            for row in data.get(ledger) or []:
+                key = self._item_key(inventory, ledger, row, name_index) if isinstance(row, dict) else None
+                if key is not None:
+                    balances[key] += self._row_effect(units, ledger, row)
+        drifts = {}
+        for m in data.get(DataCategory.RAW_MATERIALS.value) or []:
+            if m.get("name") not in WATER_MATERIAL_ALIASES:
+                key = f"raw:{m.get('id')}"
+                drifts[key] = float(m.get("stock_quantity") or 0.0) - balances[key]
+        for pos, p in enumerate(inventory):
+            # 同名成品只有第一条会被流水关联
+            if self._match_product(name_index, p.get("product_name") or p.get("name")) == pos:
+                key = f"product:{p.get('id')}"
+                drifts[key] = float(p.get("stock_quantity") or p.get("current_stock") or 0.0) - balances[key]
+        if items is not None:
+            wanted = set(items)
+            drifts = {k: v for k, v in drifts.items() if k in wanted}
+        return drifts
+
+    def _item_label(self, data, key: str) -> str:
+        kind, ref = key.split(":", 1)
+        if kind == "raw":
+            material = next((m for m in data.get(DataCategory.RAW_MATERIALS.value) or [] if str(m.get("id")) == ref), {})
+            return f"原材料 {material.get('name', ref)}"
+        product = next((p for p in data.get(DataCategory.PRODUCT_INVENTORY.value) or [] if str(p.get("id")) == ref), {})
+        return f"成品 {product.get('product_name') or product.get('name') or ref}"
+
+    # ------------------ 计划与执行 ------------------
+
+    def _targets(self, data, state, segments, full) -> Tuple[Dict[str, str], bool]:
+        docs = self._source_docs(data)
+        if segments:
+            unknown = [seg for seg in segments if seg.split(":", 1)[0] not in SEGMENT_SOURCES or ":" not in seg]
+            if unknown:
+                raise ValueError(f"无效的分段: {', '.join(unknown)}")
+            return {seg: "指定" for seg in segments}, False
+        if full:
+            return {seg: "全部" for seg in set(docs) | set(self._owned_rows(data))}, False
+        if state is None:
+            return {}, True
+        known = state.get("fingerprints", {})
+        targets = {}
+        for seg, doc in docs.items():
+            if seg not in known:
+                targets[seg] = "新增"
+            elif known[seg] != _fingerprint(doc):
+                targets[seg] = "修改"
+        for seg in known:
+            if seg not in docs:
+                targets[seg] = "删除"
+        return targets, False
+
+    @staticmethod
+    def _comparable(rows: List[Dict[str, Any]]) -> List[str]:
+        return sorted(json.dumps([round(float(r.get(k) or 0.0), 6) if k == "quantity" else r.get(k)
+                                  for k in COMPARED_FIELDS], ensure_ascii=False, default=str) for r in rows)
+
+    def plan(self, segments: Optional[List[str]] = None, full: bool = False,
+             data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        计算重建计划 (不修改数据)
+        Args:
+            segments: 指定重建的分段 (如 "PRODUCTION_ORDER:16")；为空时按水位线找出变化的单据
+            full: 重建全部来源单据分段 (手工流水仍保留)
+        Returns:
+            {"baseline": 是否尚无水位线, "segments": [...], "skipped": 分段内容未变化数}
+        """
+        data = data if data is not None else self.data_service.load_data()
+        targets, baseline = self._targets(data, self.load_state(), segments, full)
+        docs = self._source_docs(data)
+        owned = self._owned_rows(data)
+        inventory, name_index = self._products(data)
+        units = self._units(data)
+        planned, skipped = [], 0
+        for seg, reason in sorted(targets.items()):
+            new_rows = self.expected_rows(data, seg, docs.get(seg))
+            old_rows = {ledger: [data[ledger][pos] for pos in owned.get(seg, {}).get(ledger, [])] for ledger in LEDGERS}
+            if all(self._comparable(old_rows[l]) == self._comparable(new_rows[l]) for l in LEDGERS):
+                skipped += 1
+                continue
+            delta = defaultdict(float)
+            for ledger in LEDGERS:
+                for sign, rows in ((-1, old_rows[ledger]), (1, new_rows[ledger])):
+                    for row in rows:
+                        key = self._item_key(inventory, ledger, row, name_index) or f"unmatched:{row.get('product_name')}"
+                        delta[key] += sign * self._row_effect(units, ledger, row)
+            planned.append({
+                "segment": seg, "reason": reason,
+                "removed": sum(len(v) for v in old_rows.values()),
+                "added": sum(len(v) for v in new_rows.values()),
+                "rows": new_rows,
+                "delta": {k: v for k, v in delta.items() if abs(v) > CHECKPOINT_TOLERANCE},
+            })
+        return {"baseline": baseline, "segments": planned, "skipped": skipped}
+
+    def _apply(self, data: Dict[str, Any], plan: Dict[str, Any]) -> List[str]:
+        """把计划写入 data (原地)，返回受影响的库存条目"""
+        owned = self._owned_rows(data)
+        now_str = datetime.now().strftime(DATETIME_FORMAT)
+        replaced = {p["segment"]: p["rows"] for p in plan["segments"]}
+
+        # 先补建生产单新产出的成品主数据，使其流水可关联
+        inventory, name_index = self._products(data)
+        for p in plan["segments"]:
+            for row in p["rows"][DataCategory.PRODUCT_INVENTORY_RECORDS.value]:
+                if row["type"] == StockMovementType.PRODUCE_IN.value and self._match_product(name_index, row["product_name"]) is None:
+                    inventory.append({"id": max((int(i.get("id") or 0) for i in inventory), default=0) + 1,
+                                      "product_name": row["product_name"], "type": row.get("product_type", "其他"),
+                                      "stock_quantity": 0.0, "unit": row.get("unit", DEFAULT_UNIT), "last_update": now_str})
+                    name_index.setdefault(row["product_name"], len(inventory) - 1)
+        data[DataCategory.PRODUCT_INVENTORY.value] = inventory
+
+        units = self._units(data)
+        stock_delta = defaultdict(float)
+        for ledger in LEDGERS:
+            old = data.get(ledger) or []
+            owner = {pos: seg for seg, ledgers in owned.items() if seg in replaced for pos in ledgers.get(ledger, [])}
+            next_id = max((int(r.get("id") or 0) for r in old if isinstance(r, dict)), default=0) + 1
+            reusable = defaultdict(list)
+            for pos, seg in owner.items():
+                reusable[seg].append(old[pos])
+            emitted, rebuilt = set(), []
+
+            def emit(seg):
+                nonlocal next_id
+                emitted.add(seg)
+                previous = reusable.get(seg, [])
+                for i, row in enumerate(replaced[seg][ledger]):
+                    row = dict(row)
+                    if i < len(previous):
+                        row["id"] = previous[i].get("id")
+                        if previous[i].get("operator"):
+                            row["operator"] = previous[i]["operator"]
+                    else:
+                        row["id"], next_id = next_id, next_id + 1
+                    rebuilt.append(row)
+                    stock_delta[self._item_key(inventory, ledger, row, name_index)] += self._row_effect(units, ledger, row)
+                for row in previous:
+                    stock_delta[self._item_key(inventory, ledger, row, name_index)] -= self._row_effect(units, ledger, row)
+
+            # 分段的新流水放在其原流水首次出现的位置，ID 依次沿用原流水
+            for pos, row in enumerate(old):
+                seg = owner.get(pos)
+                if seg is None:
+                    rebuilt.append(row)
+                elif seg not in emitted:
+                    emit(seg)
+            for seg in replaced:
+                if seg not in emitted:
+                    emit(seg)
+            data[ledger] = rebuilt
+
+        touched = []
+        materials = {f"raw:{m.get('id')}": m for m in data.get(DataCategory.RAW_MATERIALS.value) or []}
+        products = {f"product:{p.get('id')}": p for p in inventory}
+        for key, delta in stock_delta.items():
+            if key is None or abs(delta) <= CHECKPOINT_TOLERANCE:
+                continue
+            if key in materials:
+                material = materials[key]
+                if material.get("name") in WATER_MATERIAL_ALIASES:
+                    continue
+                material["stock_quantity"] = float(material.get("stock_quantity") or 0.0) + delta
+                material["last_stock_update"] = now_str
+            elif key in products:
+                product = products[key]
+                product["stock_quantity"] = float(product.get("stock_quantity") or product.get("current_stock") or 0.0) + delta
+                product.pop("current_stock", None)
+                product["last_update"] = now_str
+            else:
+                # 流水引用了不存在的物料，只重建流水
+                continue
+            touched.append(key)
+        return touched
+
+    def rebuild(self, segments: Optional[List[str]] = None, full: bool = False, dry_run: bool = False) -> Tuple[bool, str]:
+        """
+        增量重建台账
+        尚无水位线时，以当前单据建立水位线 (不改动台账)；之后每次只重建变化的单据分段。
+        Returns:
+            (成功与否, 说明)
+        """
+        data = self.data_service.load_data()
+        plan = self.plan(segments, full, data=data)
+        if plan["baseline"]:
+            if not dry_run:
+                self._write_state(data)
+            return True, "已建立台账水位线 (当前台账视为已与单据对齐，之后只重建变化的单据)"
+        if not plan["segments"]:
+            if not dry_run:
+                self._write_state(data)
+            return True, f"无需重建 (检查 {plan['skipped']} 个分段，台账与单据一致)"
+
+        summary = "；".join(f"{p['segment']} ({p['reason']}) -{p['removed']}/+{p['added']}" for p in plan["segments"])
+        if dry_run:
+            return True, f"预演: 将重建 {len(plan['segments'])} 个分段: {summary}"
+
+        work = json.loads(json.dumps(data, default=str))
+        before = self._drifts(work)
+        touched = self._apply(work, plan)
+        after = self._drifts(work, touched)
+        broken = [f"{self._item_label(work, k)} ({before.get(k, 0.0):g} -> {v:g})" for k, v in after.items()
+                  if k in before and abs(v - before[k]) > CHECKPOINT_TOLERANCE]
+        if broken:
+            logger.error(f"Ledger rebuild checkpoint mismatch: {broken}")
+            return False, "检查点校验失败，未保存: " + "；".join(broken)
+
+        changed = list(LEDGERS) + [DataCategory.RAW_MATERIALS.value, DataCategory.PRODUCT_INVENTORY.value]
+        if not self.data_service.save_data(work, changed=changed):
+            return False, "保存失败"
+        self._write_state(work)
+        logger.info(f"Ledger rebuilt incrementally: {summary}")
+        return True, f"已重建 {len(plan['segments'])} 个分段，调整 {len(touched)} 项库存: {summary}"
+
+    def verify(self) -> Dict[str, Any]:
+        """
+        对照水位线检查点
+        Returns:
+            {"watermark", "pending": 待重建分段, "drifted": 自上次重建后差值变化的条目}
+        """
+        state = self.load_state()
+        data = self.data_service.load_data()
+        if state is None:
+            return {"watermark": None, "pending": [], "drifted": []}
+        targets, _ = self._targets(data, state, None, False)
+        checkpoints = state.get("checkpoints", {})
+        drifted = [{"item": self._item_label(data, k), "key": k, "checkpoint": checkpoints[k], "current": v}
+                   for k, v in self._drifts(data).items()
+                   if k in checkpoints and abs(v - checkpoints[k]) > CHECKPOINT_TOLERANCE]
+        return {"watermark": state.get("watermark"), "pending": sorted(targets), "drifted": drifted}
@@ -0,0 +1,479 @@
+"""
+Maintenance Jobs Module
+数据维护作业框架：取代 scripts/ 中各自单线程遍历全部数据、多次保存的修复脚本。
+
+作业声明读取 / 写入的集合，把数据切分为互不依赖的实体 (entities，在主进程中生成，只含该实体需要的数据)，
+逐实体生成补丁 (work，纯函数；声明 parallel 且实测耗时足够大时在进程池中按分区并行运行)。所有补丁在主进程中合并、检测冲突，
+生成预演差异；确认后一次保存 (保存期间数据被他人修改则放弃)。
+
+新增作业：
+    @register_job
+    class MyJob(MaintenanceJob):
+        name, title = "my_job", "说明"
+        inputs = outputs = (DataCategory.RAW_MATERIALS.value,)
+        def entities(self, data): return [...]
+        @staticmethod
+        def work(entity): return [set_fields(collection, record_id, field=value)]
+"""
+
+import copy
+import time
+import logging
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Type
+
+from config import DEFAULT_UNIT
+from core.enums import DataCategory, StockMovementType, UnitType
+from services.integrity_service import movement_sign
+from utils.parallel import choose_workers, transfer_seconds
+from utils.unit_helper import convert_quantity, normalize_unit, BASE_UNIT_RAW_MATERIAL, BASE_UNIT_PRODUCT
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+SAMPLE_ENTITIES = 50   # 先串行处理的实体数，据此实测单实体耗时
+PARTITIONS_PER_WORKER = 4
+STOCK_TOLERANCE = 1e-6
+
+OP_SET = "set"
+OP_ADD = "add"
+OP_DELETE = "delete"
+
+
+def set_fields(collection: str, record_id: Any, unset: Tuple[str, ...] = (), **fields) -> Dict[str, Any]:
+    """补丁：修改记录字段 (unset 中的字段删除)"""
+    return {"op": OP_SET, "collection": collection, "id": record_id, "fields": fields, "unset": list(unset)}
+
+
+def add_record(collection: str, record: Dict[str, Any], ref: Optional[str] = None) -> Dict[str, Any]:
+    """补丁：新增记录 (未指定 id 时合并时分配)；ref 命名后其他补丁可用 ref_id(ref) 引用新 ID"""
+    return {"op": OP_ADD, "collection": collection, "record": record, "ref": ref}
+
+
+def delete_record(collection: str, record_id: Any) -> Dict[str, Any]:
+    """补丁：删除记录"""
+    return {"op": OP_DELETE, "collection": collection, "id": record_id}
+
+
+def ref_id(ref: str) -> Dict[str, str]:
+    return {"$ref": ref}
+
+
+class MaintenanceJob:
+    """维护作业基类"""
+    name = ""
+    title = ""
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    # work 耗时较长 (单实体毫秒级以上) 时设为 True，按实测耗时与 CPU 数量决定是否使用进程池；
+    # 内置作业单实体仅需微秒，进程池启动开销远大于收益，一律串行
+    parallel = False
+
+    def entities(self, data: Dict[str, Any]) -> List[Any]:
+        """切分为互不依赖的实体 (须可 pickle)"""
+        raise NotImplementedError
+
+    @staticmethod
+    def work(entity: Any) -> List[Dict[str, Any]]:
+        """处理单个实体，返回补丁列表 (在工作进程中运行，不得访问实体以外的数据)"""
+        raise NotImplementedError
+
+
+JOBS: Dict[str, Type[MaintenanceJob]] = {}
+
+
+def register_job(cls: Type[MaintenanceJob]) -> Type[MaintenanceJob]:
+    JOBS[cls.name] = cls
+    return cls
+
+
+def _work_partition(job_cls: Type[MaintenanceJob], partition: List[Any]) -> List[Dict[str, Any]]:
+    return [patch for entity in partition for patch in job_cls.work(entity)]
+
+
+def run_partitions(job_cls: Type[MaintenanceJob], entities: List[Any], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    执行 work，补丁按实体顺序返回
+    作业声明 parallel 时先串行处理前 SAMPLE_ENTITIES 个实体实测耗时，预计进程池明显更快才并行处理其余实体；
+    进程池不可用时回退为串行
+    """
+    if not job_cls.parallel or max_workers == 1 or len(entities) <= SAMPLE_ENTITIES:
+        return _work_partition(job_cls, entities)
+    sample, rest = entities[:SAMPLE_ENTITIES], entities[SAMPLE_ENTITIES:]
+    start = time.perf_counter()
+    patches = _work_partition(job_cls, sample)
+    item_seconds = (time.perf_counter() - start) / len(sample)
+    workers = choose_workers(len(rest), item_seconds, max_workers, transfer_seconds(sample, patches) / len(sample))
+    if workers > 1:
+        size = max(1, -(-len(rest) // (workers * PARTITIONS_PER_WORKER)))
+        partitions = [rest[i:i + size] for i in range(0, len(rest), size)]
+        try:
+            # 作业可能在 Streamlit 脚本线程中运行，fork 多线程进程可能继承被占用的锁而死锁，须用 spawn
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = pool.map(_work_partition, [job_cls] * len(partitions), partitions)
+                return patches + [patch for partial in results for patch in partial]
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning(f"Maintenance process pool unavailable, running serially: {e}")
+    return patches + _work_partition(job_cls, rest)
+
+
+def _resolve(value: Any, refs: Dict[str, Any]) -> Any:
+    if isinstance(value, dict) and set(value) == {"$ref"}:
+        if value["$ref"] not in refs:
+            raise KeyError(value["$ref"])
+        return refs[value["$ref"]]
+    return value
+
+
+def apply_patches(data: Dict[str, Any], patches: List[Dict[str, Any]],
+                  outputs: Tuple[str, ...]) -> Tuple[Dict[str, List[Dict[str, Any]]], List[Dict[str, Any]], List[str]]:
+    """
+    合并补丁 (不修改 data)
+    Returns:
+        (修改后的输出集合, 差异明细, 冲突说明)
+    """
+    result = {c: copy.deepcopy(data.get(c) or []) for c in outputs}
+    diff, conflicts, refs = [], [], {}
+    for patch in patches:
+        if patch["collection"] not in result:
+            conflicts.append(f"作业写入了未声明的集合: {patch['collection']}")
+    if conflicts:
+        return result, diff, conflicts
+
+    # 新增 -> 修改 -> 删除，新增记录的 ID 先确定，修改与删除才能引用
+    for patch in (p for p in patches if p["op"] == OP_ADD):
+        records = result[patch["collection"]]
+        record = {k: _resolve(v, refs) for k, v in patch["record"].items()}
+        if record.get("id") is None:
+            record = {"id": max((int(r.get("id") or 0) for r in records), default=0) + 1, **record}
+        records.append(record)
+        if patch.get("ref"):
+            refs[patch["ref"]] = record["id"]
+        diff.append({"collection": patch["collection"], "id": record["id"], "op": OP_ADD, "field": "", "old": None,
+                     "new": record})
+
+    indexes = {c: {r.get("id"): r for r in records if isinstance(r, dict)} for c, records in result.items()}
+    assigned = {}
+    for patch in (p for p in patches if p["op"] == OP_SET):
+        record_id = _resolve(patch["id"], refs)
+        record = indexes[patch["collection"]].get(record_id)
+        if record is None:
+            conflicts.append(f"{patch['collection']}#{record_id} 不存在")
+            continue
+        changes = [(f, _resolve(v, refs)) for f, v in patch["fields"].items()] + [(f, None) for f in patch["unset"]]
+        for field, value in changes:
+            key = (patch["collection"], record_id, field)
+            if key in assigned and assigned[key] != value:
+                conflicts.append(f"{patch['collection']}#{record_id}.{field} 被设置为不同的值: {assigned[key]!r} / {value!r}")
+                continue
+            assigned[key] = value
+            if field in patch["unset"]:
+                if field in record:
+                    diff.append({"collection": patch["collection"], "id": record_id, "op": OP_SET, "field": field,
+                                 "old": record.pop(field), "new": None})
+            elif record.get(field) != value:
+                diff.append({"collection": patch["collection"], "id": record_id, "op": OP_SET, "field": field,
+                             "old": record.get(field), "new": value})
+                record[field] = value
+
+    deleted = defaultdict(set)
+    for patch in (p for p in patches if p["op"] == OP_DELETE):
+        record_id = _resolve(patch["id"], refs)
+        if record_id in indexes[patch["collection"]] and record_id not in deleted[patch["collection"]]:
+            deleted[patch["collection"]].add(record_id)
+            diff.append({"collection": patch["collection"], "id": record_id, "op": OP_DELETE, "field": "",
+                         "old": indexes[patch["collection"]][record_id], "new": None})
+    for collection, ids in deleted.items():
+        result[collection] = [r for r in result[collection] if not (isinstance(r, dict) and r.get("id") in ids)]
+    return result, diff, conflicts
+
+
+class MaintenanceJobRunner:
+    """执行维护作业：并行生成补丁，合并后一次提交"""
+
+    def __init__(self, data_service):
+        self.data_service = data_service
+
+    @staticmethod
+    def list_jobs() -> Dict[str, str]:
+        return {name: cls.title for name, cls in JOBS.items()}
+
+    def plan(self, job_name: str, max_workers: Optional[int] = None,
+             data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        运行作业并合并补丁，不保存
+        Returns:
+            {"job", "revision", "entities", "diff", "conflicts", "collections", "duration_ms", ...}
+            revision 为生成计划时的数据修订号，执行时传给 run(expected_revision=...)
+        """
+        if job_name not in JOBS:
+            raise ValueError(f"未知的维护作业: {job_name}")
+        job_cls = JOBS[job_name]
+        job = job_cls()
+        data = data if data is not None else self.data_service.load_data()
+        revision = self.data_service.get_revision()
+        start = time.perf_counter()
+        entities = job.entities(data)
+        patches = run_partitions(job_cls, entities, max_workers)
+        result, diff, conflicts = apply_patches(data, patches, job.outputs)
+        return {
+            "job": job_name, "title": job.title, "revision": revision, "entities": len(entities), "patches": len(patches),
+            "diff": diff, "conflicts": conflicts, "collections": result,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def run(self, job_name: str, dry_run: bool = False, max_workers: Optional[int] = None,
+            expected_revision: Optional[int] = None) -> Tuple[bool, str]:
+        """
+        执行作业；dry_run 时只返回差异概要
+        Args:
+            expected_revision: 预演计划的修订号 (plan()["revision"])；数据自预演后有变化时拒绝执行，
+                保证提交的就是用户审阅过的差异
+        Returns:
+            (成功与否, 说明)
+        """
+        data = self.data_service.load_data()
+        revision = self.data_service.get_revision()
+        if expected_revision is not None and revision != expected_revision:
+            return False, "数据自预演后已被修改，请重新预演"
+        plan = self.plan(job_name, max_workers, data=data)
+        if plan["conflicts"]:
+            return False, "补丁冲突，未保存: " + "；".join(plan["conflicts"][:10])
+        if not plan["diff"]:
+            return True, f"{plan['title']}: 无需修改 (检查 {plan['entities']} 项)"
+        summary = format_diff_summary(plan["diff"])
+        if dry_run:
+            return True, f"预演 {plan['title']}: {summary}"
+
+        self.data_service.load_data()
+        if self.data_service.get_revision() != revision:
+            return False, "作业运行期间数据已被修改，请重新运行"
+        merged = dict(data)
+        merged.update(plan["collections"])
+        if not self.data_service.save_data(merged, changed=list(plan["collections"])):
+            return False, "保存失败"
+        logger.info(f"Maintenance job {job_name} committed: {summary}")
+        return True, f"{plan['title']} 完成: {summary}"
+
+
+def format_diff_summary(diff: List[Dict[str, Any]]) -> str:
+    counts = defaultdict(lambda: defaultdict(set))
+    for d in diff:
+        counts[d["collection"]][d["op"]].add(d["id"])
+    labels = {OP_ADD: "新增", OP_SET: "修改", OP_DELETE: "删除"}
+    return "；".join(f"{collection}: " + "，".join(f"{labels[op]} {len(ids)}" for op, ids in ops.items())
+                    for collection, ops in counts.items())
+
+
+# ------------------ 作业 ------------------
+
+def _ledger_balance(records: List[Tuple[Any, float, Any]], base_unit: str) -> float:
+    balance = 0.0
+    for rtype, qty, unit in records:
+        if unit:
+            qty, _ = convert_quantity(qty, unit, base_unit)
+        balance += movement_sign(rtype) * qty
+    return balance
+
+
+@register_job
+class RecalculateStockJob(MaintenanceJob):
+    """按台账重算原材料库存 (原 scripts/recalculate_stock.py)"""
+    name = "recalculate_stock"
+    title = "按台账重算原材料库存"
+    inputs = (DataCategory.RAW_MATERIALS.value, DataCategory.INVENTORY_RECORDS.value)
+    outputs = (DataCategory.RAW_MATERIALS.value,)
+
+    def entities(self, data):
+        ledger = defaultdict(list)
+        for r in data.get(DataCategory.INVENTORY_RECORDS.value) or []:
+            ledger[r.get("material_id")].append((r.get("type"), float(r.get("quantity") or 0.0), r.get("unit")))
+        now_str = datetime.now().strftime(DATETIME_FORMAT)
+        return [{"id": m.get("id"), "unit": normalize_unit(m.get("unit") or BASE_UNIT_RAW_MATERIAL),
+                 "stock": float(m.get("stock_quantity") or 0.0), "records": ledger.get(m.get("id"), []), "now": now_str}
+                for m in data.get(DataCategory.RAW_MATERIALS.value) or []]
+
+    @staticmethod
+    def work(entity):
+        balance = _ledger_balance(entity["records"], entity["unit"])
+        if abs(balance - entity["stock"]) <= STOCK_TOLERANCE:
+            return []
+        return [set_fields(DataCategory.RAW_MATERIALS.value, entity["id"],
+                           stock_quantity=balance, last_stock_update=entity["now"])]
+
+
+@register_job
+class FixInventoryUnitsJob(MaintenanceJob):
+    """修正领料流水中未换算为 kg 的数量并重算库存 (原 scripts/fix_inventory_units.py)"""
+    name = "fix_inventory_units"
+    title = "修正领料流水单位 (吨 -> kg)"
+    inputs = (DataCategory.RAW_MATERIALS.value, DataCategory.INVENTORY_RECORDS.value, DataCategory.MATERIAL_ISSUES.value)
+    outputs = (DataCategory.RAW_MATERIALS.value, DataCategory.INVENTORY_RECORDS.value)
+
+    TON_UNITS = (UnitType.TON.value, "ton", "Ton", "吨")
+    KG_UNITS = (UnitType.KG.value, "kg", "Kg", "KG")
+
+    def entities(self, data):
+        issues = {i.get("id"): i for i in data.get(DataCategory.MATERIAL_ISSUES.value) or []}
+        ledger = defaultdict(list)
+        for r in data.get(DataCategory.INVENTORY_RECORDS.value) or []:
+            ledger[r.get("material_id")].append(r)
+        entities = []
+        for m in data.get(DataCategory.RAW_MATERIALS.value) or []:
+            records = sorted(ledger.get(m.get("id"), []),
+                             key=lambda x: (x.get("created_at", ""), x.get("date", ""), str(x.get("id", ""))))
+            lines = {}
+            for r in records:
+                issue = issues.get(r.get("related_doc_id")) if r.get("related_doc_type") == "ISSUE" else None
+                if issue:
+                    line = next((l for l in issue.get("lines", []) if l.get("item_id") == m.get("id")), None)
+                    if line:
+                        lines[r.get("related_doc_id")] = {"uom": line.get("uom", UnitType.KG.value),
+                                                          "qty": float(line.get("required_qty", 0.0))}
+            entities.append({"id": m.get("id"), "unit": normalize_unit(m.get("unit") or BASE_UNIT_RAW_MATERIAL),
+                             "stock": float(m.get("stock_quantity") or 0.0), "lines": lines,
+                             "records": [{k: r.get(k) for k in ("id", "type", "quantity", "unit", "reason",
+                                                                "related_doc_type", "related_doc_id")} for r in records]})
+        return entities
+
+    @staticmethod
+    def work(entity):
+        patches, ledger = [], []
+        for r in entity["records"]:
+            qty = float(r.get("quantity") or 0.0)
+            line = entity["lines"].get(r.get("related_doc_id")) if r.get("related_doc_type") == "ISSUE" else None
+            note = None
+            if line and line["uom"] in FixInventoryUnitsJob.TON_UNITS and 0 < qty < 10.0:
+                note = "(Fix: Ton->kg)"
+            elif line and line["uom"] in FixInventoryUnitsJob.KG_UNITS and line["qty"] > 0 \
+                    and abs(qty * 1000.0 - line["qty"]) < 0.1:
+                note = "(Fix: Scale x1000)"
+            if note:
+                qty *= 1000.0
+            ledger.append((r.get("type"), qty, r.get("unit")))
+            if note:
+                reason = r.get("reason") or ""
+                patches.append(set_fields(DataCategory.INVENTORY_RECORDS.value, r.get("id"), quantity=qty,
+                                          reason=reason if note in reason else f"{reason} {note}",
+                                          snapshot_stock=_ledger_balance(ledger, entity["unit"])))
+        balance = _ledger_balance(ledger, entity["unit"])
+        if abs(balance - entity["stock"]) > STOCK_TOLERANCE:
+            patches.append(set_fields(DataCategory.RAW_MATERIALS.value, entity["id"], stock_quantity=balance))
+        return patches
+
+
+@register_job
+class FixUnitsByTypeJob(MaintenanceJob):
+    """按业务类型补全流水单位标签，不改数量 (原 scripts/fix_units_by_type.py)"""
+    name = "fix_units_by_type"
+    title = "按业务类型补全流水单位"
+    inputs = outputs = (DataCategory.INVENTORY_RECORDS.value, DataCategory.PRODUCT_INVENTORY_RECORDS.value)
+
+    # 成品侧与原材料侧流水均按 kg 存储 (见 utils.unit_helper)
+    UNIT_BY_TYPE = {
+        StockMovementType.PRODUCE_IN.value: BASE_UNIT_PRODUCT,
+        StockMovementType.SHIP_OUT.value: BASE_UNIT_PRODUCT,
+        StockMovementType.CONSUME_OUT.value: BASE_UNIT_RAW_MATERIAL,
+        StockMovementType.RETURN_IN.value: BASE_UNIT_RAW_MATERIAL,
+    }
+
+    def entities(self, data):
+        return [(collection, r.get("id"), r.get("type"), r.get("unit"))
+                for collection in self.outputs for r in data.get(collection) or []
+                if r.get("type") in self.UNIT_BY_TYPE]
+
+    @staticmethod
+    def work(entity):
+        collection, record_id, rtype, unit = entity
+        new_unit = FixUnitsByTypeJob.UNIT_BY_TYPE[rtype]
+        return [set_fields(collection, record_id, unit=new_unit)] if unit != new_unit else []
+
+
+@register_job
+class NormalizeProductsJob(MaintenanceJob):
+    """合并速凝剂名称别名并补齐必备成品 (原 scripts/normalize_products.py)"""
+    name = "normalize_products"
+    title = "规范成品名称并补齐必备成品"
+    inputs = outputs = (DataCategory.PRODUCT_INVENTORY.value, DataCategory.PRODUCT_INVENTORY_RECORDS.value,
+                        DataCategory.PRODUCTS.value)
+
+    # 与 DataService.normalize_product_aliases 相同
+    ALIASES = {
+        "YJSNJ-有碱速凝剂": ["有碱速凝剂", "碱速凝剂"],
+        "WJSNJ-无碱速凝剂": ["无碱速凝剂"],
+    }
+    ESSENTIAL_PRODUCTS = {
+        "PC-001母液": "聚羧酸减水剂母液",
+        "YJSNJ-有碱速凝剂": "速凝剂",
+        "WJSNJ-无碱速凝剂": "速凝剂",
+    }
+
+    def entities(self, data):
+        inventory = data.get(DataCategory.PRODUCT_INVENTORY.value) or []
+        records = data.get(DataCategory.PRODUCT_INVENTORY_RECORDS.value) or []
+        products = data.get(DataCategory.PRODUCTS.value) or []
+        now_str = datetime.now().strftime(DATETIME_FORMAT)
+        entities, present = [], {p.get("product_name") for p in inventory}
+        for canonical, aliases in self.ALIASES.items():
+            names = [canonical] + aliases
+            items = [p for p in inventory if str(p.get("product_name") or p.get("name")) in names]
+            if items:
+                present.add(canonical)   # 合并后一定存在规范名称条目
+                entities.append({"kind": "alias", "canonical": canonical, "aliases": aliases, "items": items, "now": now_str,
+                                 "records": [r.get("id") for r in records if r.get("product_name") in names]})
+        for name, category in self.ESSENTIAL_PRODUCTS.items():
+            definition = next((p for p in products if p.get("product_name") == name), None)
+            if definition is None or name not in present:
+                entities.append({"kind": "essential", "name": name, "category": category, "now": now_str,
+                                 "product_id": definition.get("id") if definition else None,
+                                 "in_inventory": name in present})
+        return entities
+
+    @staticmethod
+    def work(entity):
+        if entity["kind"] == "essential":
+            return NormalizeProductsJob._essential(entity)
+        inventory, ledger = DataCategory.PRODUCT_INVENTORY.value, DataCategory.PRODUCT_INVENTORY_RECORDS.value
+        canonical = entity["canonical"]
+        desired_type = NormalizeProductsJob._alias_type(canonical)
+        items = entity["items"]
+        total = sum(float(p.get("stock_quantity") or p.get("current_stock") or 0.0) for p in items)
+        keep = next((p for p in items if (p.get("product_name") or p.get("name")) == canonical), None)
+        patches = []
+        if keep is None:
+            patches.append(add_record(inventory, {"product_name": canonical, "type": desired_type, "stock_quantity": total,
+                                                  "unit": items[0].get("unit", DEFAULT_UNIT), "last_update": entity["now"]}))
+        elif len(items) > 1 or "current_stock" in keep or keep.get("type") != desired_type \
+                or abs(float(keep.get("stock_quantity") or 0.0) - total) > STOCK_TOLERANCE:
+            patches.append(set_fields(inventory, keep.get("id"), unset=("current_stock",) if "current_stock" in keep else (),
+                                      stock_quantity=total, type=desired_type, last_update=entity["now"]))
+        patches += [delete_record(inventory, p.get("id")) for p in items if p is not keep]
+        patches += [set_fields(ledger, record_id, product_name=canonical, product_type=desired_type)
+                    for record_id in entity["records"]]
+        return patches
+
+    @staticmethod
+    def _alias_type(canonical: str) -> str:
+        return "有碱速凝剂" if "有碱速凝剂" in canonical else "无碱速凝剂"
+
+    @staticmethod
+    def _essential(entity):
+        patches, product_id = [], entity["product_id"]
+        if product_id is None:
+            ref = f"product:{entity['name']}"
+            patches.append(add_record(DataCategory.PRODUCTS.value, {
+                "product_name": entity["name"], "type": entity["category"],
+                "description": "系统初始化产品", "created_at": entity["now"]}, ref=ref))
+            product_id = ref_id(ref)
+        if not entity["in_inventory"]:
+            patches.append(add_record(DataCategory.PRODUCT_INVENTORY.value, {
+                "product_id": product_id, "product_name": entity["name"],
+                # 别名组的规范名称与合并时设置的类型保持一致，避免下次运行再修改
+                "type": NormalizeProductsJob._alias_type(entity["name"])
+                if entity["name"] in NormalizeProductsJob.ALIASES else entity["category"],
+                "stock_quantity": 0.0, "unit": DEFAULT_UNIT, "last_update": entity["now"]}))
+        return patches
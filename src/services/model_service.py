@@ -0,0 +1,340 @@
+"""
+Model Service Module
+基于 NumPy 的回归模型 (岭回归 / 梯度提升树)，在后台线程训练，按数据集哈希缓存模型，
+并对候选配方做批量预测 (坍落度 / 强度等)。
+"""
+
+import logging
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.dataset_builder import DatasetBuilder
+from services.job_registry import JobRegistry
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------- Models --------------------
+class RidgeModel:
+    """岭回归 (特征标准化后闭式求解)"""
+    name = "ridge"
+    label = "岭回归"
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = float(alpha)
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "RidgeModel":
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.mean_ = X.mean(axis=0)
+        std = X.std(axis=0)
+        self.scale_ = np.where(std > 0, std, 1.0)
+        Z = (X - self.mean_) / self.scale_
+        self.intercept_ = y.mean()
+        gram = Z.T @ Z + self.alpha * np.eye(Z.shape[1])
+        self.coef_ = np.linalg.solve(gram, Z.T @ (y - self.intercept_))
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        Z = (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+        return Z @ self.coef_ + self.intercept_
+
+    def feature_importance(self) -> np.ndarray:
+        """标准化系数的绝对值"""
+        return np.abs(self.coef_)
+
+
+class GradientBoostingModel:
+    """
+    梯度提升回归树 (平方损失)
+
+    特征按分位数分箱 (最多 max_bins 个)，节点分裂时用一次 bincount 求出所有特征、
+    所有箱的梯度和，再用累积和得到每个切分点的增益；树以数组形式保存，预测按层向量化。
+    """
+    name = "gbrt"
+    label = "梯度提升树"
+
+    def __init__(self, n_estimators: int = 200, learning_rate: float = 0.1, max_depth: int = 3,
+                 min_samples_leaf: int = 3, max_bins: int = 32, subsample: float = 1.0, seed: int = 0):
+        self.n_estimators = int(n_estimators)
+        self.learning_rate = float(learning_rate)
+        self.max_depth = int(max_depth)
+        self.min_samples_leaf = int(min_samples_leaf)
+        self.max_bins = int(max_bins)
+        self.subsample = float(subsample)
+        self.seed = int(seed)
+
+    def _bin(self, X: np.ndarray) -> np.ndarray:
+        binned = np.empty(X.shape, dtype=np.int64)
+        for j, edges in enumerate(self.bin_edges_):
+            binned[:, j] = np.searchsorted(edges, X[:, j], side="right")
+        return binned
+
+    def _build_tree(self, B: np.ndarray, grad: np.ndarray) -> Dict[str, np.ndarray]:
+        n_features = B.shape[1]
+        nb = self.max_bins
+        offsets = np.arange(n_features) * nb
+        feature, threshold, left, right, value = [], [], [], [], []
+
+        def new_node(idx):
+            feature.append(-1)
+            threshold.append(0)
+            left.append(-1)
+            right.append(-1)
+            value.append(grad[idx].mean() if len(idx) else 0.0)
+            return len(feature) - 1
+
+        stack = [(new_node(np.arange(len(grad))), np.arange(len(grad)), 0)]
+        while stack:
+            node, idx, depth = stack.pop()
+            n = len(idx)
+            if depth >= self.max_depth or n < 2 * self.min_samples_leaf:
+                continue
+            flat = (B[idx] + offsets).ravel()
+            g = np.repeat(grad[idx], n_features)
+            sums = np.bincount(flat, weights=g, minlength=n_features * nb).reshape(n_features, nb)
+            counts = np.bincount(flat, minlength=n_features * nb).reshape(n_features, nb)
+            cs, cc = np.cumsum(sums, axis=1)[:, :-1], np.cumsum(counts, axis=1)[:, :-1]
+            total_s, total_c = sums.sum(axis=1, keepdims=True), counts.sum(axis=1, keepdims=True)
+            rs, rc = total_s - cs, total_c - cc
+            valid = (cc >= self.min_samples_leaf) & (rc >= self.min_samples_leaf)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                gain = np.where(valid, cs ** 2 / cc + rs ** 2 / rc, -np.inf)
+            best = int(np.argmax(gain))
+            j, b = divmod(best, nb - 1)
+            if not np.isfinite(gain[j, b]) or gain[j, b] <= total_s[j, 0] ** 2 / n + 1e-12:
+                continue
+            go_left = B[idx, j] <= b
+            feature[node], threshold[node] = j, b
+            left_idx, right_idx = idx[go_left], idx[~go_left]
+            left[node] = new_node(left_idx)
+            right[node] = new_node(right_idx)
+            stack.append((left[node], left_idx, depth + 1))
+            stack.append((right[node], right_idx, depth + 1))
+
+        return {
+            "feature": np.array(feature), "threshold": np.array(threshold),
+            "left": np.array(left), "right": np.array(right), "value": np.array(value),
+        }
+
+    @staticmethod
+    def _apply_tree(tree: Dict[str, np.ndarray], B: np.ndarray, max_depth: int) -> np.ndarray:
+        node = np.zeros(len(B), dtype=np.int64)
+        rows = np.arange(len(B))
+        for _ in range(max_depth):
+            feat = tree["feature"][node]
+            internal = feat >= 0
+            if not internal.any():
+                break
+            go_left = B[rows, np.where(internal, feat, 0)] <= tree["threshold"][node]
+            node = np.where(internal, np.where(go_left, tree["left"][node], tree["right"][node]), node)
+        return tree["value"][node]
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "GradientBoostingModel":
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        # 分箱边界: 唯一分位点，保证箱号 < max_bins
+        quantiles = np.linspace(0, 1, self.max_bins + 1)[1:-1]
+        self.bin_edges_ = [np.unique(np.quantile(X[:, j], quantiles)) for j in range(X.shape[1])]
+        B = self._bin(X)
+        rng = np.random.default_rng(self.seed)
+
+        self.init_ = y.mean()
+        pred = np.full(len(y), self.init_)
+        self.trees_: List[Dict[str, np.ndarray]] = []
+        self.split_count_ = np.zeros(X.shape[1])
+        for _ in range(self.n_estimators):
+            residual = y - pred
+            if self.subsample < 1.0:
+                sample = np.flatnonzero(rng.random(len(y)) < self.subsample)
+                tree = self._build_tree(B[sample], residual[sample])
+            else:
+                tree = self._build_tree(B, residual)
+            if (tree["feature"] < 0).all():
+                break
+            self.trees_.append(tree)
+            for f in tree["feature"][tree["feature"] >= 0]:
+                self.split_count_[f] += 1
+            pred += self.learning_rate * self._apply_tree(tree, B, self.max_depth)
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        B = self._bin(np.asarray(X, dtype=np.float64))
+        pred = np.full(len(B), self.init_)
+        for tree in self.trees_:
+            pred += self.learning_rate * self._apply_tree(tree, B, self.max_depth)
+        return pred
+
+    def feature_importance(self) -> np.ndarray:
+        """各特征被用于分裂的次数"""
+        return self.split_count_
+
+
+MODEL_TYPES = {
+    RidgeModel.name: RidgeModel,
+    GradientBoostingModel.name: GradientBoostingModel,
+}
+
+
+def regression_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+    """R² / RMSE / MAE"""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    if len(y_true) == 0:
+        return {"r2": float("nan"), "rmse": float("nan"), "mae": float("nan"), "n": 0}
+    err = y_true - y_pred
+    ss_tot = ((y_true - y_true.mean()) ** 2).sum()
+    return {
+        "r2": float(1 - (err ** 2).sum() / ss_tot) if ss_tot > 0 else float("nan"),
+        "rmse": float(np.sqrt((err ** 2).mean())),
+        "mae": float(np.abs(err).mean()),
+        "n": int(len(y_true)),
+    }
+
+
+# -------------------- Registry / Service --------------------
+class ModelRegistry(JobRegistry):
+    """每个 DataService 一份：已训练模型 (按数据集哈希 + 模型参数) 及训练任务状态"""
+
+    def __init__(self, max_models: int = 16, max_jobs: int = 64):
+        super().__init__(max_jobs)
+        self.max_models = max_models
+        self.models: Dict[str, Dict[str, Any]] = {}
+
+
+# 训练在单个后台线程中串行执行，避免并发训练占满 CPU 影响页面响应
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-train")
+_registries: "weakref.WeakKeyDictionary[Any, ModelRegistry]" = weakref.WeakKeyDictionary()
+
+
+class ModelService:
+    """模型训练与预测服务"""
+
+    def __init__(self, data_service=None):
+        """
+        Args:
+            data_service: DataService 实例 (模型缓存挂在其生命周期上)。
+        """
+        self.data_service = data_service
+        if data_service is None:
+            self.registry = ModelRegistry()
+        else:
+            self.registry = _registries.get(data_service)
+            if self.registry is None:
+                self.registry = ModelRegistry()
+                _registries[data_service] = self.registry
+
+    @staticmethod
+    def model_key(dataset: Dict[str, Any], model_type: str, params: Dict[str, Any]) -> str:
+        """训练数据 + 模型参数的哈希"""
+        frame = pd.concat([dataset["X_train"], dataset["y_train"].rename("__target__")], axis=1)
+        return DatasetBuilder.dataset_id(frame, {"model_type": model_type, "params": params,
+                                                 "features": list(dataset["X_train"].columns)})
+
+    def _fit(self, key: str, dataset: Dict[str, Any], model_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        started = datetime.now()
+        X_train = dataset["X_train"].to_numpy(dtype=np.float64)
+        y_train = dataset["y_train"].to_numpy(dtype=np.float64)
+        model = MODEL_TYPES[model_type](**params).fit(X_train, y_train)
+        X_test = dataset["X_test"].to_numpy(dtype=np.float64)
+        test_metrics = regression_metrics(dataset["y_test"].to_numpy(), model.predict(X_test)) if len(X_test) else None
+        features = list(dataset["X_train"].columns)
+        entry = {
+            "key": key,
+            "model_type": model_type,
+            "params": params,
+            "model": model,
+            "features": features,
+            "target": dataset["info"]["target"],
+            "fill_values": dataset["X_train"].mean().fillna(0.0).to_dict(),
+            "train_metrics": regression_metrics(y_train, model.predict(X_train)),
+            "test_metrics": test_metrics,
+            "importance": dict(zip(features, model.feature_importance().tolist())),
+            "trained_at": started.strftime("%Y-%m-%d %H:%M:%S"),
+            "train_seconds": (datetime.now() - started).total_seconds(),
+        }
+        with self.registry.lock:
+            self.registry.models[key] = entry
+            while len(self.registry.models) > self.registry.max_models:
+                self.registry.models.pop(next(iter(self.registry.models)))
+        logger.info(f"Model {model_type} trained on {len(y_train)} rows in {entry['train_seconds']:.2f}s")
+        return entry
+
+    def submit_training(self, dataset: Dict[str, Any], model_type: str = GradientBoostingModel.name,
+                        params: Optional[Dict[str, Any]] = None) -> Tuple[bool, str]:
+        """
+        提交后台训练任务 (prepare_ai_dataset 的输出)
+        已有相同数据集 + 参数的模型时直接命中缓存，不再训练。
+        Returns:
+            (是否成功提交, 任务ID 或错误信息)
+        """
+        if model_type not in MODEL_TYPES:
+            return False, f"未知的模型类型: {model_type}"
+        if not isinstance(dataset, dict) or len(dataset.get("X_train", [])) < 2:
+            return False, "训练样本不足"
+        params = dict(params or {})
+        key = self.model_key(dataset, model_type, params)
+        job_id = uuid.uuid4().hex[:12]
+        job = {"job_id": job_id, "model_key": key, "model_type": model_type,
+               "status": "pending", "message": "", "submitted_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        with self.registry.lock:
+            self.registry.add_job(job)
+            cached = key in self.registry.models
+        if cached:
+            job.update(status="done", message="命中模型缓存")
+            return True, job_id
+
+        def _run():
+            job["status"] = "running"
+            try:
+                self._fit(key, dataset, model_type, params)
+                job.update(status="done", message="训练完成")
+            except Exception as e:
+                logger.error(f"Model training failed: {e}")
+                job.update(status="failed", message=f"训练失败: {e}")
+
+        job["future"] = _executor.submit(_run)
+        return True, job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询训练任务 {job_id, model_key, status: pending/running/done/failed, message}"""
+        job = self.registry.jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != "future"}
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """等待训练任务结束 (测试及脚本使用)"""
+        job = self.registry.jobs.get(job_id)
+        if job and job.get("future") is not None:
+            job["future"].result(timeout=timeout)
+        return self.get_job(job_id)
+
+    def get_model(self, model_key: str) -> Optional[Dict[str, Any]]:
+        """获取已训练模型信息 (不含模型对象)"""
+        entry = self.registry.models.get(model_key)
+        if entry is None:
+            return None
+        return {k: v for k, v in entry.items() if k != "model"}
+
+    def predict(self, model_key: str, candidates: pd.DataFrame) -> pd.Series:
+        """
+        批量预测候选配方
+        Args:
+            candidates: 含模型特征列的 DataFrame，缺失列/缺失值用训练集均值填充
+        Returns:
+            与 candidates 同索引的预测值
+        """
+        entry = self.registry.models.get(model_key)
+        if entry is None:
+            raise ValueError("模型不存在或已被淘汰，请重新训练")
+        X = candidates.reindex(columns=entry["features"]).apply(pd.to_numeric, errors="coerce")
+        X = X.fillna(entry["fill_values"])
+        pred = entry["model"].predict(X.to_numpy(dtype=np.float64))
+        return pd.Series(pred, index=candidates.index, name=f"pred_{entry['target']}")
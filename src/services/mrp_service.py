@@ -0,0 +1,351 @@
+"""
+MRP Service Module
+考虑替代料的 BOM 展开与物料分配：按当前库存在主料与替代料之间分配需求，
+一批生产单一次计算完成。
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from core.enums import DataCategory, MaterialType, UnitType, IssueStatus, ProductionOrderStatus
+from core.constants import WATER_MATERIAL_ALIASES
+from utils.unit_helper import convert_quantity
+
+logger = logging.getLogger(__name__)
+
+ItemKey = Tuple[str, Any]
+
+
+def parse_substitutes(line: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    解析 BOM 行的替代料
+    结构化格式: [{item_type, item_id, item_name, ratio}]，ratio 为每 kg 主料所需替代料 kg 数；
+    旧数据中的文字说明 (str) 不参与分配。
+    """
+    subs = line.get("substitutes")
+    if not isinstance(subs, list):
+        return []
+    result = []
+    for sub in subs:
+        if not isinstance(sub, dict) or sub.get("item_id") is None:
+            continue
+        try:
+            ratio = float(sub.get("ratio", 1.0) or 1.0)
+        except (TypeError, ValueError):
+            ratio = 1.0
+        if ratio <= 0:
+            continue
+        result.append({
+            "item_type": sub.get("item_type") or MaterialType.RAW_MATERIAL.value,
+            "item_id": sub.get("item_id"),
+            "item_name": sub.get("item_name", ""),
+            "ratio": ratio
+        })
+    return result
+
+
+def format_substitutes(line: Dict[str, Any]) -> str:
+    """替代料显示文本 (兼容旧的文字说明)"""
+    subs = line.get("substitutes")
+    note = line.get("substitutes_note") or ""
+    if isinstance(subs, str):
+        return subs
+    parts = [
+        f"{s['item_name']}" + (f"×{s['ratio']:g}" if abs(s["ratio"] - 1.0) > 1e-9 else "")
+        for s in parse_substitutes(line)
+    ]
+    if note:
+        parts.append(note)
+    return ", ".join(parts)
+
+
+# -------------------- Allocation Strategies --------------------
+class SubstitutionStrategy(ABC):
+    """
+    替代料分配策略基类
+    allocate 接收主料需求 (kg)、候选物料 [(key, ratio)] (第一个为主料，ratio=1) 及可用量查询函数，
+    返回 ([(key, qty_kg)], 未满足的主料当量 kg)。
+    """
+    name = ""
+    label = ""
+
+    @abstractmethod
+    def allocate(self, required: float, candidates: List[Tuple[ItemKey, float]],
+                 available: Callable[[ItemKey], float]) -> Tuple[List[Tuple[ItemKey, float]], float]:
+        ...
+
+
+class PrimaryOnlyStrategy(SubstitutionStrategy):
+    """仅使用主料 (与原展开逻辑一致)"""
+    name = "primary_only"
+    label = "仅主料"
+
+    def allocate(self, required, candidates, available):
+        key = candidates[0][0]
+        shortage = max(required - max(available(key), 0.0), 0.0)
+        return [(key, required)], shortage
+
+
+class PrimaryFirstStrategy(SubstitutionStrategy):
+    """优先主料，不足部分按顺序由替代料补足；仍不足的部分计入主料"""
+    name = "primary_first"
+    label = "主料优先"
+
+    def allocate(self, required, candidates, available):
+        allocations = []
+        remaining = required
+        for key, ratio in candidates:
+            if remaining <= 1e-9:
+                break
+            avail = max(available(key), 0.0)
+            take = min(remaining * ratio, avail)
+            if take > 1e-9:
+                allocations.append((key, take))
+                remaining -= take / ratio
+        shortage = max(remaining, 0.0)
+        if shortage > 1e-9:
+            primary = candidates[0][0]
+            merged = dict(allocations)
+            merged[primary] = merged.get(primary, 0.0) + shortage
+            allocations = [(primary, merged.pop(primary))] + list(merged.items())
+        return allocations, shortage
+
+
+SUBSTITUTION_STRATEGIES: Dict[str, SubstitutionStrategy] = {
+    PrimaryFirstStrategy.name: PrimaryFirstStrategy(),
+    PrimaryOnlyStrategy.name: PrimaryOnlyStrategy(),
+}
+
+
+def register_substitution_strategy(strategy: SubstitutionStrategy) -> None:
+    """注册自定义替代料分配策略"""
+    SUBSTITUTION_STRATEGIES[strategy.name] = strategy
+
+
+class MRPService:
+    """替代料感知的物料需求计划"""
+
+    def __init__(self, data_service=None):
+        """
+        Args:
+            data_service: DataService 实例。
+        """
+        self.data_service = data_service
+
+    @staticmethod
+    def build_stock_index(data: Dict[str, Any]) -> Tuple[Dict[ItemKey, float], Dict[ItemKey, Dict[str, Any]]]:
+        """
+        构建库存索引 (统一为 kg)
+        Returns:
+            (stock, items): stock 为 (item_type, item_id) -> 可用量 kg (不计库存的水为 inf)，
+            items 为 (item_type, item_id) -> 主数据
+        """
+        stock: Dict[ItemKey, float] = {}
+        items: Dict[ItemKey, Dict[str, Any]] = {}
+        for m in data.get(DataCategory.RAW_MATERIALS.value, []):
+            key = (MaterialType.RAW_MATERIAL.value, m.get("id"))
+            if key in items:
+                continue
+            items[key] = m
+            if str(m.get("name", "") or "").strip() in WATER_MATERIAL_ALIASES:
+                stock[key] = float("inf")
+            else:
+                stock[key] = float(m.get("stock_quantity", 0.0) or 0.0)
+        for p in data.get(DataCategory.PRODUCT_INVENTORY.value, []):
+            key = (MaterialType.PRODUCT.value, p.get("id"))
+            if key in items:
+                continue
+            items[key] = p
+            qty = float(p.get("stock_quantity", 0.0) or 0.0)
+            qty_kg, ok = convert_quantity(qty, p.get("unit", UnitType.TON.value), UnitType.KG.value)
+            stock[key] = qty_kg if ok else qty
+        return stock, items
+
+    def allocate_orders(self, order_ids: List[int], strategy: str = PrimaryFirstStrategy.name,
+                        data: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        一次性为一批生产单展开 BOM 并分配主料/替代料
+
+        库存在批次内按订单顺序累计占用，后面的订单看到的是扣除前面分配后的余量。
+        Args:
+            order_ids: 生产单ID (按优先级排序)
+            strategy: 分配策略名称 (见 SUBSTITUTION_STRATEGIES)
+        Returns:
+            list: [{order_id, order_code, lines, shortages, substituted, unit_errors, feasible, message}]
+            lines 为领料单行格式 (kg)，替代料行带 substitute_for 字段；
+            无法换算为 kg 的行保留原单位与数量、不参与分配，记入 unit_errors (过账时由 post_issue 拒绝)
+        """
+        allocator = SUBSTITUTION_STRATEGIES.get(strategy)
+        if allocator is None:
+            raise ValueError(f"未知的替代料分配策略: {strategy}")
+
+        if data is None:
+            data = self.data_service.load_data()
+        order_map = {}
+        for o in data.get(DataCategory.PRODUCTION_ORDERS.value, []):
+            order_map.setdefault(o.get("id"), o)
+        version_map = {}
+        for v in data.get(DataCategory.BOM_VERSIONS.value, []):
+            version_map.setdefault(str(v.get("id")), v)
+
+        stock, items = self.build_stock_index(data)
+
+        def _available(key):
+            return stock.get(key, 0.0)
+
+        def _item_name(key, fallback):
+            item = items.get(key) or {}
+            return item.get("name") or item.get("product_name") or fallback
+
+        results = []
+        for order_id in order_ids:
+            order = order_map.get(order_id)
+            result = {
+                "order_id": order_id,
+                "order_code": order.get("order_code") if order else None,
+                "lines": [],
+                "shortages": [],
+                "substituted": [],
+                "unit_errors": [],
+                "feasible": False,
+                "message": ""
+            }
+            results.append(result)
+            if not order:
+                result["message"] = "生产单不存在"
+                continue
+            version = version_map.get(str(order.get("bom_version_id")))
+            if not version or not version.get("lines"):
+                result["message"] = "BOM 版本不存在或无物料行"
+                continue
+
+            base_qty = float(version.get("yield_base", 1000.0) or 1000.0)
+            if base_qty <= 0:
+                base_qty = 1000.0
+            ratio = float(order.get("plan_qty", 0.0) or 0.0) / base_qty
+
+            for line in version.get("lines", []):
+                primary = (line.get("item_type") or MaterialType.RAW_MATERIAL.value, line.get("item_id"))
+                line_uom = line.get("uom", UnitType.KG.value)
+                qty = float(line.get("qty", 0.0) or 0.0) * ratio
+                required, ok = convert_quantity(qty, line_uom, UnitType.KG.value)
+                if not ok:
+                    result["lines"].append({
+                        "item_id": primary[1],
+                        "item_type": primary[0],
+                        "item_name": line.get("item_name", "Unknown"),
+                        "required_qty": qty,
+                        "uom": line_uom,
+                        "phase": line.get("phase", "")
+                    })
+                    result["unit_errors"].append({"item_id": primary[1], "item_name": line.get("item_name"), "uom": line_uom})
+                    continue
+
+                candidates = [(primary, 1.0)] + [
+                    ((s["item_type"], s["item_id"]), s["ratio"]) for s in parse_substitutes(line)
+                ]
+                allocations, shortage = allocator.allocate(required, candidates, _available)
+
+                for key, alloc_qty in allocations:
+                    if key in stock:
+                        stock[key] -= alloc_qty
+                    issue_line = {
+                        "item_id": key[1],
+                        "item_type": key[0],
+                        "item_name": line.get("item_name", "Unknown") if key == primary
+                        else _item_name(key, "Unknown"),
+                        "required_qty": alloc_qty,
+                        "uom": UnitType.KG.value,
+                        "phase": line.get("phase", "")
+                    }
+                    if key != primary:
+                        issue_line["substitute_for"] = primary[1]
+                        result["substituted"].append({
+                            "item_name": issue_line["item_name"],
+                            "primary_name": line.get("item_name"),
+                            "qty": alloc_qty
+                        })
+                    result["lines"].append(issue_line)
+
+                if shortage > 1e-9:
+                    result["shortages"].append({
+                        "item_id": primary[1],
+                        "item_type": primary[0],
+                        "item_name": line.get("item_name"),
+                        "shortage_qty": shortage
+                    })
+
+            result["feasible"] = not result["shortages"] and not result["unit_errors"]
+            if result["unit_errors"]:
+                result["message"] = "单位无法换算为 kg: " + "; ".join(
+                    f"{e['item_name']} ({e['uom']})" for e in result["unit_errors"]
+                )
+            elif result["shortages"]:
+                result["message"] = "库存不足: " + "; ".join(
+                    f"{s['item_name']} 缺 {s['shortage_qty']:.3f} kg" for s in result["shortages"]
+                )
+            elif result["substituted"]:
+                result["message"] = "已使用替代料: " + "; ".join(
+                    f"{s['item_name']} 代 {s['primary_name']} {s['qty']:.3f} kg" for s in result["substituted"]
+                )
+            else:
+                result["message"] = "库存充足"
+        return results
+
+    def create_issues_from_orders(self, order_ids: List[int], strategy: str = PrimaryFirstStrategy.name,
+                                  allow_shortage: bool = True) -> List[Dict[str, Any]]:
+        """
+        按替代料分配结果批量生成领料单，并将生产单状态置为 issued (一次保存)
+        Args:
+            allow_shortage: 为 False 时，库存 (含替代料) 不足的订单不生成领料单
+        Returns:
+            list: [{order_id, order_code, success, message, issue_id}]
+        """
+        data = self.data_service.load_data()
+        plans = self.allocate_orders(order_ids, strategy=strategy, data=data)
+        order_map = {}
+        for o in data.get(DataCategory.PRODUCTION_ORDERS.value, []):
+            order_map.setdefault(o.get("id"), o)
+        issues = data.setdefault(DataCategory.MATERIAL_ISSUES.value, [])
+        next_id = max([i.get("id", 0) for i in issues], default=0) + 1
+        now = datetime.now()
+
+        outcomes = []
+        for plan in plans:
+            outcome = {
+                "order_id": plan["order_id"],
+                "order_code": plan["order_code"],
+                "success": False,
+                "message": plan["message"],
+                "issue_id": None
+            }
+            outcomes.append(outcome)
+            order = order_map.get(plan["order_id"])
+            if order and order.get("status") != ProductionOrderStatus.RELEASED.value:
+                outcome["message"] = "只有已下达的生产单可以生成领料单"
+                continue
+            if not plan["lines"] or (plan["shortages"] and not allow_shortage):
+                continue
+            issues.append({
+                "id": next_id,
+                "issue_code": f"ISS-{now.strftime('%Y%m%d')}-{next_id:03d}",
+                "production_order_id": plan["order_id"],
+                "created_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+                "status": IssueStatus.DRAFT.value,
+                "lines": plan["lines"]
+            })
+            order["status"] = ProductionOrderStatus.ISSUED.value
+            order["last_modified"] = now.strftime("%Y-%m-%d %H:%M:%S")
+            outcome["success"] = True
+            outcome["issue_id"] = next_id
+            next_id += 1
+
+        if any(o["success"] for o in outcomes) and not self.data_service.save_data(data):
+            for o in outcomes:
+                if o["success"]:
+                    o["success"] = False
+                    o["issue_id"] = None
+                    o["message"] = "保存失败"
+        return outcomes
@@ -0,0 +1,321 @@
+"""
+Production Service Module
+生产订单状态机：状态索引、成品库存解析缓存与批量状态流转。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from core.enums import DataCategory, ProductionOrderStatus, IssueStatus, StockMovementType
+from core.constants import PRODUCT_NAME_WJSNJ, PRODUCT_NAME_YJSNJ
+from utils.unit_helper import convert_quantity
+
+logger = logging.getLogger(__name__)
+
+S = ProductionOrderStatus
+
+# 允许的状态流转 (planned / in_progress 为旧数据状态，分别按草稿 / 领料中处理)
+ORDER_TRANSITIONS = {
+    S.DRAFT.value: {S.RELEASED.value, S.CANCELLED.value},
+    S.PLANNED.value: {S.RELEASED.value, S.CANCELLED.value},
+    S.RELEASED.value: {S.ISSUED.value, S.CANCELLED.value},
+    S.ISSUED.value: {S.FINISHED.value},
+    S.IN_PROGRESS.value: {S.FINISHED.value},
+    S.FINISHED.value: set(),
+    S.CANCELLED.value: set(),
+}
+
+ORDER_STATUS_LABELS = {
+    S.DRAFT.value: "草稿",
+    S.RELEASED.value: "已下达",
+    S.ISSUED.value: "领料中",
+    S.FINISHED.value: "已完工",
+    S.CANCELLED.value: "已取消",
+    S.PLANNED.value: "计划中",
+    S.IN_PROGRESS.value: "生产中",
+}
+
+# BOM 名称 -> 成品库存中的标准名称
+PRODUCT_NAME_ALIASES = {
+    "无碱速凝剂": PRODUCT_NAME_WJSNJ,
+    "有碱速凝剂": PRODUCT_NAME_YJSNJ,
+}
+
+
+class ProductionService:
+    """
+    生产订单生命周期服务
+
+    状态索引与成品名称索引按 DataService 修订号缓存；批量下达 / 完工在一次
+    load/save 中完成，每张订单返回独立结果。
+    """
+
+    def __init__(self, data_service=None):
+        """
+        Args:
+            data_service: DataService 实例。
+        """
+        self.data_service = data_service
+        self._revision = None
+        self._status_index: Dict[str, List[Dict[str, Any]]] = {}
+        self._product_name_index: Dict[str, int] = {}
+        self._bom_product_cache: Dict[Any, Optional[int]] = {}
+
+    # -------------------- Indexes --------------------
+    def _sync(self, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if data is None:
+            data = self.data_service.load_data()
+        revision = self.data_service.get_revision()
+        if revision != self._revision:
+            status_index: Dict[str, List[Dict[str, Any]]] = {}
+            for order in data.get(DataCategory.PRODUCTION_ORDERS.value, []):
+                status_index.setdefault(order.get("status") or S.DRAFT.value, []).append(order)
+            self._status_index = status_index
+            self._product_name_index = self.build_product_name_index(
+                data.get(DataCategory.PRODUCT_INVENTORY.value, [])
+            )
+            self._bom_product_cache = {}
+            self._revision = revision
+        return data
+
+    @staticmethod
+    def build_product_name_index(inventory: List[Dict[str, Any]]) -> Dict[str, int]:
+        """成品库存 名称 -> 下标 (同名取第一条)"""
+        index: Dict[str, int] = {}
+        for pos, p in enumerate(inventory):
+            name = str(p.get("product_name") or p.get("name") or "").strip()
+            if name:
+                index.setdefault(name, pos)
+        return index
+
+    @staticmethod
+    def get_bom_product_name(bom: Dict[str, Any]) -> str:
+        """BOM 对应的成品名称: 编码-名称"""
+        bom_code = str(bom.get("bom_code", "") or "").strip()
+        bom_name = str(bom.get("bom_name", "") or "").strip()
+        return f"{bom_code}-{bom_name}" if bom_code else bom_name
+
+    @staticmethod
+    def get_candidate_names(product_name: str) -> List[str]:
+        """成品匹配候选名称 (全名、去编码名称、速凝剂别名)"""
+        candidates = [product_name]
+        if "-" in product_name:
+            candidates.append(product_name.split("-", 1)[1])
+        alias = PRODUCT_NAME_ALIASES.get(product_name)
+        if alias:
+            candidates.append(alias)
+        return candidates
+
+    @staticmethod
+    def _match_product(name_index: Dict[str, int], product_name: str) -> Optional[int]:
+        positions = [name_index[c] for c in ProductionService.get_candidate_names(product_name) if c in name_index]
+        # 与原逐条扫描一致：取库存中最靠前的匹配项
+        return min(positions) if positions else None
+
+    def resolve_bom_product(self, bom: Dict[str, Any], data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """解析 BOM 对应的成品库存条目 (带缓存)，不存在时返回 None"""
+        data = self._sync(data)
+        bom_id = bom.get("id")
+        if bom_id not in self._bom_product_cache:
+            self._bom_product_cache[bom_id] = self._match_product(
+                self._product_name_index, self.get_bom_product_name(bom)
+            )
+        pos = self._bom_product_cache[bom_id]
+        if pos is None:
+            return None
+        return data.get(DataCategory.PRODUCT_INVENTORY.value, [])[pos]
+
+    # -------------------- Queries --------------------
+    def get_orders_by_status(self, status: str) -> List[Dict[str, Any]]:
+        """按状态获取生产单"""
+        self._sync()
+        return list(self._status_index.get(status, []))
+
+    def get_status_counts(self) -> Dict[str, int]:
+        """各状态生产单数量"""
+        self._sync()
+        return {status: len(orders) for status, orders in self._status_index.items()}
+
+    @staticmethod
+    def can_transition(current: Optional[str], target: str) -> bool:
+        return target in ORDER_TRANSITIONS.get(current or S.DRAFT.value, set())
+
+    # -------------------- Batch Transitions --------------------
+    @staticmethod
+    def _outcome(order_id: Any, order: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "order_id": order_id,
+            "order_code": order.get("order_code") if order else None,
+            "success": False,
+            "message": ""
+        }
+
+    def _save_outcomes(self, data: Dict[str, Any], outcomes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if any(o["success"] for o in outcomes) and not self.data_service.save_data(data):
+            for o in outcomes:
+                if o["success"]:
+                    o["success"] = False
+                    o["message"] = "保存失败"
+        return outcomes
+
+    def transition_orders(self, order_ids: List[int], target_status: str) -> List[Dict[str, Any]]:
+        """
+        批量状态流转 (完工请使用 finish_orders，需同时入库)
+        Returns:
+            list: [{order_id, order_code, success, message}]
+        """
+        if target_status == S.FINISHED.value:
+            return self.finish_orders(order_ids)
+
+        data = self._sync()
+        orders = data.get(DataCategory.PRODUCTION_ORDERS.value, [])
+        order_map = {}
+        for o in orders:
+            order_map.setdefault(o.get("id"), o)
+
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        outcomes = []
+        for order_id in order_ids:
+            order = order_map.get(order_id)
+            outcome = self._outcome(order_id, order)
+            outcomes.append(outcome)
+            if not order:
+                outcome["message"] = "生产单不存在"
+                continue
+            current = order.get("status") or S.DRAFT.value
+            if not self.can_transition(current, target_status):
+                outcome["message"] = (
+                    f"状态 {ORDER_STATUS_LABELS.get(current, current)} 不能变更为 "
+                    f"{ORDER_STATUS_LABELS.get(target_status, target_status)}"
+                )
+                continue
+            order["status"] = target_status
+            order["last_modified"] = now_str
+            outcome["success"] = True
+            outcome["message"] = f"{ORDER_STATUS_LABELS.get(current, current)} -> {ORDER_STATUS_LABELS.get(target_status, target_status)}"
+
+        return self._save_outcomes(data, outcomes)
+
+    def release_orders(self, order_ids: List[int]) -> List[Dict[str, Any]]:
+        """批量下达生产单"""
+        return self.transition_orders(order_ids, S.RELEASED.value)
+
+    def finish_orders(self, order_ids: List[int], operator: str = "User",
+                      require_posted_issues: bool = True) -> List[Dict[str, Any]]:
+        """
+        批量完工入库：更新状态、按 BOM 增加成品库存 (kg -> 库存单位) 并记录入库流水
+
+        Args:
+            order_ids: 生产单ID列表
+            operator: 操作人
+            require_posted_issues: 是否要求订单的领料单已全部过账
+        Returns:
+            list: [{order_id, order_code, success, message}]
+        """
+        data = self._sync()
+        orders = data.get(DataCategory.PRODUCTION_ORDERS.value, [])
+        boms = data.get(DataCategory.BOMS.value, [])
+        inventory = data.get(DataCategory.PRODUCT_INVENTORY.value, [])
+        records = data.get(DataCategory.PRODUCT_INVENTORY_RECORDS.value, [])
+        issues = data.get(DataCategory.MATERIAL_ISSUES.value, [])
+
+        order_map = {}
+        for o in orders:
+            order_map.setdefault(o.get("id"), o)
+        bom_map = {}
+        for b in boms:
+            bom_map.setdefault(b.get("id"), b)
+        issues_by_order: Dict[Any, List[Dict[str, Any]]] = {}
+        for iss in issues:
+            issues_by_order.setdefault(str(iss.get("production_order_id")), []).append(iss)
+
+        # 批次内新建的成品需要加入名称索引，因此使用副本
+        name_index = dict(self._product_name_index)
+        next_rec_id = self.data_service._get_next_id(records)
+        next_prod_id = self.data_service._get_next_id(inventory)
+
+        outcomes = []
+        for order_id in order_ids:
+            order = order_map.get(order_id)
+            outcome = self._outcome(order_id, order)
+            outcomes.append(outcome)
+            if not order:
+                outcome["message"] = "生产单不存在"
+                continue
+            current = order.get("status") or S.DRAFT.value
+            if current == S.FINISHED.value:
+                outcome["message"] = "生产单已完工"
+                continue
+            if require_posted_issues:
+                if not self.can_transition(current, S.FINISHED.value):
+                    outcome["message"] = f"状态 {ORDER_STATUS_LABELS.get(current, current)} 不能完工"
+                    continue
+                order_issues = issues_by_order.get(str(order_id), [])
+                if not order_issues or any(i.get("status") != IssueStatus.POSTED.value for i in order_issues):
+                    outcome["message"] = "请先完成所有领料单的过账"
+                    continue
+
+            plan_qty = float(order.get("plan_qty", 0.0) or 0.0)
+            if plan_qty <= 0:
+                outcome["message"] = "计划产量无效"
+                continue
+            bom = bom_map.get(order.get("bom_id"))
+            if not bom:
+                outcome["message"] = "关联 BOM 不存在"
+                continue
+
+            product_name = self.get_bom_product_name(bom)
+            product_type = bom.get("bom_type", "其他")
+            now = datetime.now()
+            now_str = now.strftime("%Y-%m-%d %H:%M:%S")
+
+            pos = self._match_product(name_index, product_name)
+            if pos is None:
+                # 成品不存在时自动创建
+                inventory.append({
+                    "id": next_prod_id,
+                    "name": product_name,
+                    "type": product_type,
+                    "stock_quantity": 0.0,
+                    "unit": "吨",
+                    "last_update": now_str
+                })
+                next_prod_id += 1
+                pos = len(inventory) - 1
+                name_index.setdefault(product_name, pos)
+
+            prod = inventory[pos]
+            prod_unit = prod.get("unit", "吨")
+            final_qty, ok = convert_quantity(plan_qty, "kg", prod_unit)
+            if not ok:
+                logger.warning(f"Finish production unit conversion failed: {plan_qty} kg -> {prod_unit}")
+                final_qty = plan_qty
+
+            new_stock = float(prod.get("stock_quantity", 0.0) or 0.0) + final_qty
+            prod["stock_quantity"] = new_stock
+            prod["last_update"] = now_str
+
+            records.append({
+                "id": next_rec_id,
+                "date": now.strftime("%Y-%m-%d"),
+                "created_at": now_str,
+                "product_name": prod.get("product_name") or prod.get("name"),
+                "product_type": product_type,
+                "type": StockMovementType.PRODUCE_IN.value,
+                "quantity": final_qty,
+                "reason": f"生产完工: {order.get('order_code')}",
+                "operator": operator,
+                "snapshot_stock": new_stock,
+                "batch_number": order.get("order_code")
+            })
+            next_rec_id += 1
+
+            order["status"] = S.FINISHED.value
+            order["finished_at"] = now_str
+            outcome["success"] = True
+            outcome["message"] = f"完工入库成功，库存增加 {final_qty:.3f} {prod_unit}"
+
+        data[DataCategory.PRODUCT_INVENTORY.value] = inventory
+        data[DataCategory.PRODUCT_INVENTORY_RECORDS.value] = records
+        return self._save_outcomes(data, outcomes)
@@ -0,0 +1,208 @@
+"""
+Record Maintenance Module
+数据维护：按集合分页或按单条记录读取 / 修改原始 JSON，用 core.models 中的模型校验后只替换对应部分，
+不再把整个数据文件作为一个字符串在浏览器与服务端之间往返。
+
+历史数据中已有不少记录与模型不完全一致 (如旧台账缺少 operator)，为不阻碍修正，
+校验只拒绝本次修改新引入的问题；原有问题作为提示返回。
+"""
+
+import json
+import logging
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from core.enums import DataCategory
+from core.models import (
+    Project, Experiment, RawMaterial, SynthesisRecord, Product, InventoryRecord, MotherLiquor,
+    BOMVersion, BOM, ProductionOrder, MaterialIssue, ProductStock, PasteExperiment, MortarExperiment,
+    ConcreteExperiment, ProductInventoryRecord, GoodsReceipt, ShippingOrder
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+
+# 可维护的集合 -> 校验模型 (None 表示只做结构校验)；用户与审计日志不允许直接编辑
+EDITABLE_COLLECTIONS: Dict[str, Optional[Type[BaseModel]]] = {
+    DataCategory.PROJECTS.value: Project,
+    DataCategory.EXPERIMENTS.value: Experiment,
+    DataCategory.RAW_MATERIALS.value: RawMaterial,
+    DataCategory.SYNTHESIS_RECORDS.value: SynthesisRecord,
+    DataCategory.PRODUCTS.value: Product,
+    DataCategory.PASTE_EXPERIMENTS.value: PasteExperiment,
+    DataCategory.MORTAR_EXPERIMENTS.value: MortarExperiment,
+    DataCategory.CONCRETE_EXPERIMENTS.value: ConcreteExperiment,
+    DataCategory.MOTHER_LIQUORS.value: MotherLiquor,
+    DataCategory.INVENTORY_RECORDS.value: InventoryRecord,
+    DataCategory.PRODUCT_INVENTORY.value: ProductStock,
+    DataCategory.PRODUCT_INVENTORY_RECORDS.value: ProductInventoryRecord,
+    DataCategory.BOMS.value: BOM,
+    DataCategory.BOM_VERSIONS.value: BOMVersion,
+    DataCategory.BOM_HISTORY.value: None,
+    DataCategory.PRODUCTION_ORDERS.value: ProductionOrder,
+    DataCategory.MATERIAL_ISSUES.value: MaterialIssue,
+    DataCategory.GOODS_RECEIPTS.value: GoodsReceipt,
+    DataCategory.SHIPPING_ORDERS.value: ShippingOrder,
+}
+
+
+def to_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, indent=2, default=str)
+
+
+def validation_issues(collection: str, record: Any) -> Dict[Tuple[str, str], str]:
+    """
+    校验单条记录
+    Returns:
+        {(字段路径, 错误类型): 说明}；无问题为空
+    """
+    if not isinstance(record, dict):
+        return {("", "type"): "记录必须是 JSON 对象"}
+    issues = {}
+    if record.get("id") is None:
+        issues[("id", "missing")] = "id: 缺少 id"
+    model = EDITABLE_COLLECTIONS.get(collection)
+    if model is not None:
+        try:
+            model.model_validate(record)
+        except ValidationError as e:
+            for err in e.errors():
+                loc = ".".join(str(p) for p in err["loc"])
+                issues[(loc, err["type"])] = f"{loc}: {err['msg']}"
+    return issues
+
+
+def _new_issues(collection: str, record: Dict[str, Any], original: Optional[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+    """(本次修改新引入的问题, 原记录已有且仍存在的问题)"""
+    issues = validation_issues(collection, record)
+    before = validation_issues(collection, original) if original is not None else {}
+    new = [msg for key, msg in issues.items() if key not in before]
+    kept = [msg for key, msg in issues.items() if key in before]
+    return new, kept
+
+
+class RecordMaintenanceService:
+    """按集合 / 记录维护原始数据"""
+
+    def __init__(self, data_service):
+        self.data_service = data_service
+
+    def _check_collection(self, collection: str):
+        if collection not in EDITABLE_COLLECTIONS:
+            raise ValueError(f"集合不支持维护: {collection}")
+
+    def _records(self, collection: str) -> List[Dict[str, Any]]:
+        return self.data_service.load_data().get(collection) or []
+
+    def list_collections(self) -> List[Dict[str, Any]]:
+        """可维护集合及记录数"""
+        data = self.data_service.load_data()
+        return [{"collection": name, "count": len(data.get(name) or []),
+                 "model": model.__name__ if model else ""}
+                for name, model in EDITABLE_COLLECTIONS.items()]
+
+    def get_collection_json(self, collection: str, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> str:
+        """读取集合的一页记录为 JSON 数组文本"""
+        self._check_collection(collection)
+        return to_json(self._records(collection)[offset:offset + limit])
+
+    def get_record_json(self, collection: str, record_id: Any) -> Optional[str]:
+        """读取单条记录为 JSON 文本，未找到返回 None"""
+        self._check_collection(collection)
+        record = next((r for r in self._records(collection) if isinstance(r, dict) and r.get("id") == record_id), None)
+        return to_json(record) if record is not None else None
+
+    def _commit(self, collection: str, records: List[Dict[str, Any]]) -> bool:
+        data = dict(self.data_service.load_data())
+        data[collection] = records
+        return self.data_service.save_data(data, changed=[collection])
+
+    def save_record(self, collection: str, record_id: Any, json_str: str,
+                    base_json: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        修改单条记录 (只替换该记录)
+        Args:
+            record_id: 原记录 ID；为 None 时新增记录
+            json_str: 修改后的记录 JSON
+            base_json: 编辑开始时读取的记录 JSON，提供时检查期间是否被他人修改
+        Returns:
+            (成功与否, 说明)
+        """
+        if collection not in EDITABLE_COLLECTIONS:
+            return False, f"集合不支持维护: {collection}"
+        try:
+            record = json.loads(json_str)
+        except json.JSONDecodeError as e:
+            return False, f"JSON 解析失败: {e}"
+        if not isinstance(record, dict):
+            return False, "记录必须是 JSON 对象"
+
+        records = list(self._records(collection))
+        pos = next((i for i, r in enumerate(records) if isinstance(r, dict) and r.get("id") == record_id), None)
+        if record_id is not None and pos is None:
+            return False, f"未找到记录 (ID: {record_id})"
+        original = records[pos] if pos is not None else None
+        if base_json is not None and original is not None and json.loads(base_json) != json.loads(to_json(original)):
+            return False, "记录已被修改，请重新加载后再编辑"
+        if any(i != pos and isinstance(r, dict) and r.get("id") == record.get("id") for i, r in enumerate(records)):
+            return False, f"ID 重复: {record.get('id')}"
+
+        new, kept = _new_issues(collection, record, original)
+        if new:
+            return False, "校验失败: " + "；".join(new)
+        if pos is None:
+            records.append(record)
+        else:
+            records[pos] = record
+        if not self._commit(collection, records):
+            return False, "保存失败 (写入文件错误)"
+        logger.info(f"Record {collection}#{record.get('id')} {'updated' if original is not None else 'added'} via maintenance")
+        message = "保存成功"
+        if kept:
+            message += f" (保留 {len(kept)} 项原有校验问题: {'；'.join(kept)})"
+        return True, message
+
+    def save_collection_page(self, collection: str, json_str: str, offset: int = 0,
+                             limit: int = DEFAULT_PAGE_SIZE, base_json: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        用 JSON 数组替换集合中 [offset, offset + limit) 这一页记录 (页内可增删)
+        Args:
+            base_json: 编辑开始时读取的本页 JSON，提供时检查该页是否仍为这些记录
+                (期间他人增删记录会使页面错位，按位置替换会误删 / 覆盖页外记录)
+        Returns:
+            (成功与否, 说明)
+        """
+        if collection not in EDITABLE_COLLECTIONS:
+            return False, f"集合不支持维护: {collection}"
+        try:
+            page = json.loads(json_str)
+        except json.JSONDecodeError as e:
+            return False, f"JSON 解析失败: {e}"
+        if not isinstance(page, list):
+            return False, "JSON 格式错误: 根节点必须是数组"
+
+        records = list(self._records(collection))
+        if base_json is not None and json.loads(base_json) != json.loads(to_json(records[offset:offset + limit])):
+            return False, "本页记录已被修改，请重新加载后再编辑"
+        originals = {str(r.get("id")): r for r in records[offset:offset + limit] if isinstance(r, dict)}
+        merged = records[:offset] + page + records[offset + limit:]
+        counts = Counter(str(r["id"]) for r in merged if isinstance(r, dict) and r.get("id") is not None)
+        duplicates = sorted(i for i, n in counts.items() if n > 1)
+        if duplicates:
+            return False, f"ID 重复: {', '.join(duplicates)}"
+
+        errors, kept = [], 0
+        for index, record in enumerate(page):
+            original = originals.get(str(record.get("id"))) if isinstance(record, dict) else None
+            new, old = _new_issues(collection, record, original)
+            kept += len(old)
+            errors.extend(f"第 {offset + index + 1} 条 {msg}" for msg in new)
+        if errors:
+            return False, "校验失败: " + "；".join(errors[:10]) + (f" 等 {len(errors)} 项" if len(errors) > 10 else "")
+        if not self._commit(collection, merged):
+            return False, "保存失败 (写入文件错误)"
+        logger.info(f"Collection {collection}[{offset}:{offset + limit}] replaced via maintenance ({len(page)} records)")
+        return True, "保存成功" + (f" (保留 {kept} 项原有校验问题)" if kept else "")
@@ -0,0 +1,321 @@
+"""
+Similarity Service Module
+配方相似度检索：把合成实验与成品配方表示为归一化的原料质量比例向量，
+用余弦相似度做 k 近邻查询；索引按集合代数增量同步。
+"""
+
+import logging
+import weakref
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+import numpy as np
+
+from core.enums import DataCategory
+from services.analysis_store import record_fingerprint
+
+logger = logging.getLogger(__name__)
+
+SOURCE_SYNTHESIS = "synthesis"
+SOURCE_PRODUCT = "product"
+SOURCE_LABELS = {SOURCE_SYNTHESIS: "合成实验", SOURCE_PRODUCT: "成品"}
+SOURCE_COLLECTIONS = {
+    SOURCE_SYNTHESIS: DataCategory.SYNTHESIS_RECORDS.value,
+    SOURCE_PRODUCT: DataCategory.PRODUCTS.value,
+}
+SYNTHESIS_MATERIAL_LISTS = ("reactor_materials", "a_materials", "b_materials", "additive_materials")
+
+RecordKey = Tuple[str, Any]
+
+
+def calculate_theoretical_solid(ingredients: List[Dict[str, Any]], raw_materials_map: Dict[str, Any]) -> float:
+    """
+    计算理论固含 (%)
+    Args:
+        ingredients: [{name, amount}]
+        raw_materials_map: 原材料名称 -> 原材料 (含 solid_content %)
+    """
+    total_mass = 0.0
+    total_solid_mass = 0.0
+    for item in ingredients:
+        name = item.get("name")
+        amount = float(item.get("amount", 0.0) or 0.0)
+        if name and amount > 0:
+            total_mass += amount
+            raw_mat = raw_materials_map.get(name)
+            solid_percent = float(raw_mat.get("solid_content", 0.0) or 0.0) if raw_mat else 0.0
+            total_solid_mass += amount * (solid_percent / 100.0)
+    if total_mass > 0:
+        return (total_solid_mass / total_mass) * 100.0
+    return 0.0
+
+
+def record_ingredients(source: str, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """统一为 [{name, amount, material_id}]"""
+    items = []
+    if source == SOURCE_SYNTHESIS:
+        for list_key in SYNTHESIS_MATERIAL_LISTS:
+            for m in record.get(list_key, []) or []:
+                items.append({"name": m.get("material_name"), "amount": m.get("amount"),
+                              "material_id": m.get("material_id")})
+    else:
+        for m in record.get("ingredients", []) or []:
+            items.append({"name": m.get("name"), "amount": m.get("amount", m.get("ratio")),
+                          "material_id": m.get("material_id")})
+    return items
+
+
+def record_label(source: str, record: Dict[str, Any]) -> str:
+    if source == SOURCE_SYNTHESIS:
+        return str(record.get("formula_id") or record.get("formula_name") or f"#{record.get('id')}")
+    return str(record.get("product_name") or f"#{record.get('id')}")
+
+
+class FormulationIndex:
+    """
+    配方向量索引
+
+    每行是一个配方的原料质量比例 (L2 归一化后做余弦相似度)；原料维度在遇到新原料时追加列。
+    upsert/remove 只改动对应行，删除的行先置零并在空行过多时压缩。
+    """
+
+    def __init__(self, initial_rows: int = 64, initial_dims: int = 32):
+        self.dims: Dict[str, int] = {}
+        self.dim_names: List[str] = []
+        self.matrix = np.zeros((initial_rows, initial_dims), dtype=np.float32)
+        self.rows: Dict[RecordKey, int] = {}
+        self.keys: List[Optional[RecordKey]] = []
+        self.meta: Dict[RecordKey, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _dim(self, name: str) -> int:
+        idx = self.dims.get(name)
+        if idx is None:
+            idx = len(self.dim_names)
+            self.dims[name] = idx
+            self.dim_names.append(name)
+            if idx >= self.matrix.shape[1]:
+                grown = np.zeros((self.matrix.shape[0], max(idx + 1, self.matrix.shape[1] * 2)), dtype=np.float32)
+                grown[:, :self.matrix.shape[1]] = self.matrix
+                self.matrix = grown
+        return idx
+
+    def vectorize(self, proportions: Dict[str, float], grow: bool = True) -> np.ndarray:
+        """比例字典 -> L2 归一化向量 (grow=False 时忽略索引中不存在的原料)"""
+        if grow:
+            entries = [(self._dim(name), value) for name, value in proportions.items()]
+        else:
+            entries = [(self.dims[name], value) for name, value in proportions.items() if name in self.dims]
+        vec = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        for idx, value in entries:
+            vec[idx] = value
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def upsert(self, key: RecordKey, proportions: Dict[str, float], meta: Dict[str, Any]) -> None:
+        vec = self.vectorize(proportions)
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row >= self.matrix.shape[0]:
+                grown = np.zeros((self.matrix.shape[0] * 2, self.matrix.shape[1]), dtype=np.float32)
+                grown[:self.matrix.shape[0]] = self.matrix
+                self.matrix = grown
+            self.keys.append(key)
+            self.rows[key] = row
+        self.matrix[row] = vec
+        self.meta[key] = meta
+
+    def remove(self, key: RecordKey) -> None:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        self.matrix[row] = 0.0
+        self.keys[row] = None
+        self.meta.pop(key, None)
+        if len(self.keys) > 32 and len(self.rows) < len(self.keys) // 2:
+            self._compact()
+
+    def _compact(self) -> None:
+        live = [(k, r) for r, k in enumerate(self.keys) if k is not None]
+        matrix = np.zeros((max(len(live) * 2, 64), self.matrix.shape[1]), dtype=np.float32)
+        for new_row, (k, old_row) in enumerate(live):
+            matrix[new_row] = self.matrix[old_row]
+        self.matrix = matrix
+        self.keys = [k for k, _ in live]
+        self.rows = {k: i for i, k in enumerate(self.keys)}
+
+    def query(self, vector: np.ndarray, k: int = 5, sources: Optional[Iterable[str]] = None,
+              exclude: Optional[RecordKey] = None) -> List[Tuple[RecordKey, float]]:
+        """余弦相似度 top-k (向量须已归一化)"""
+        n = len(self.keys)
+        if n == 0 or not np.any(vector):
+            return []
+        q = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        q[:len(vector)] = vector[:self.matrix.shape[1]]
+        sims = self.matrix[:n] @ q
+        allowed = set(sources) if sources else None
+        valid = np.array([
+            key is not None and key != exclude and (allowed is None or key[0] in allowed)
+            for key in self.keys
+        ], dtype=bool)
+        sims = np.where(valid & (sims > 0), sims, -1.0)
+        k = min(k, int((sims > 0).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(self.keys[i], float(sims[i])) for i in top]
+
+
+# 每个 DataService 一份索引 (随页面重建的服务对象共享)
+_indexes: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+class SimilarityService:
+    """配方相似度检索服务"""
+
+    def __init__(self, data_service=None):
+        """
+        Args:
+            data_service: DataService 实例。
+        """
+        self.data_service = data_service
+        state = _indexes.get(data_service) if data_service is not None else None
+        if state is None:
+            state = {"index": FormulationIndex(), "fingerprints": {}, "generations": {}}
+            if data_service is not None:
+                _indexes[data_service] = state
+        self._state = state
+
+    @property
+    def index(self) -> FormulationIndex:
+        return self._state["index"]
+
+    @staticmethod
+    def _name_resolver(data: Dict[str, Any]):
+        raw_by_name: Dict[str, Any] = {}
+        raw_by_id: Dict[Any, Dict[str, Any]] = {}
+        for m in data.get(DataCategory.RAW_MATERIALS.value, []):
+            raw_by_id.setdefault(m.get("id"), m)
+            name = str(m.get("name") or "").strip()
+            if name:
+                raw_by_name.setdefault(name, m)
+        return raw_by_name, raw_by_id
+
+    @staticmethod
+    def proportions(items: List[Dict[str, Any]], raw_by_name: Dict[str, Any],
+                    raw_by_id: Dict[Any, Dict[str, Any]]) -> Dict[str, float]:
+        """
+        原料质量比例 (与理论固含计算相同：amount / 总质量)
+        原料按主数据ID归并 (同一原料的不同名称/记录方式落在同一维度)，无法解析的按名称。
+        """
+        masses: Dict[str, float] = {}
+        for item in items:
+            try:
+                amount = float(item.get("amount", 0.0) or 0.0)
+            except (TypeError, ValueError):
+                continue
+            if amount <= 0:
+                continue
+            name = str(item.get("name") or "").strip()
+            mat = raw_by_id.get(item.get("material_id")) or raw_by_name.get(name)
+            key = f"raw:{mat.get('id')}" if mat else f"name:{name}"
+            if key == "name:":
+                continue
+            masses[key] = masses.get(key, 0.0) + amount
+        total = sum(masses.values())
+        return {k: v / total for k, v in masses.items()} if total > 0 else {}
+
+    def _current_generations(self) -> Dict[str, Any]:
+        if not hasattr(self.data_service, "get_generation"):
+            return {}
+        generations = {s: self.data_service.get_generation(c) for s, c in SOURCE_COLLECTIONS.items()}
+        # 原材料名称 / ID 映射与固含影响所有记录的向量与元数据
+        generations[DataCategory.RAW_MATERIALS.value] = self.data_service.get_generation(DataCategory.RAW_MATERIALS.value)
+        return generations
+
+    def sync(self, data: Optional[Dict[str, Any]] = None) -> FormulationIndex:
+        """
+        按集合代数同步索引：代数未变时直接返回；变化时只重新向量化指纹变化的记录，
+        原材料变化时全部重新向量化
+        """
+        generations = self._current_generations()
+        if generations and generations == self._state["generations"] and data is None:
+            return self.index
+        if data is None:
+            data = self.data_service.load_data() if self.data_service else {}
+        raw_by_name, raw_by_id = self._name_resolver(data)
+        index = self.index
+        fingerprints = self._state["fingerprints"]
+        raw_key = DataCategory.RAW_MATERIALS.value
+        if generations.get(raw_key) != self._state["generations"].get(raw_key):
+            fingerprints.clear()
+
+        seen = set()
+        for source, collection in SOURCE_COLLECTIONS.items():
+            for record in data.get(collection, []):
+                key = (source, record.get("id"))
+                seen.add(key)
+                fp = record_fingerprint(record)
+                if fingerprints.get(key) == fp:
+                    continue
+                items = record_ingredients(source, record)
+                index.upsert(key, self.proportions(items, raw_by_name, raw_by_id), {
+                    "label": record_label(source, record),
+                    "solid": calculate_theoretical_solid(items, raw_by_name),
+                    "date": record.get("synthesis_date") or record.get("production_date") or record.get("created_at"),
+                    "materials": {str(i.get("name")) for i in items if i.get("name")},
+                })
+                fingerprints[key] = fp
+        for key in [k for k in fingerprints if k not in seen]:
+            index.remove(key)
+            fingerprints.pop(key, None)
+        self._state["generations"] = generations
+        return index
+
+    def find_similar(self,
+                     source: Optional[str] = None,
+                     record_id: Any = None,
+                     ingredients: Optional[List[Dict[str, Any]]] = None,
+                     k: int = 5,
+                     sources: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        查找最相似的历史配方
+        Args:
+            source / record_id: 以已有记录为查询 (结果中排除其自身)
+            ingredients: 或直接给出 [{name, amount, material_id}]
+            k: 返回数量
+            sources: 限定结果来源 (synthesis / product)
+        Returns:
+            list: [{source, source_label, id, label, similarity, solid, date, shared_materials}]
+        """
+        index = self.sync()
+        exclude = None
+        if ingredients is None:
+            exclude = (source, record_id)
+            if exclude not in index.rows:
+                return []
+            vector = index.matrix[index.rows[exclude]].copy()
+            query_materials = index.meta[exclude]["materials"]
+        else:
+            data = self.data_service.load_data() if self.data_service else {}
+            raw_by_name, raw_by_id = self._name_resolver(data)
+            vector = index.vectorize(self.proportions(ingredients, raw_by_name, raw_by_id), grow=False)
+            query_materials = {str(i.get("name")) for i in ingredients if i.get("name")}
+
+        results = []
+        for key, sim in index.query(vector, k, sources, exclude):
+            meta = index.meta[key]
+            results.append({
+                "source": key[0],
+                "source_label": SOURCE_LABELS.get(key[0], key[0]),
+                "id": key[1],
+                "label": meta["label"],
+                "similarity": sim,
+                "solid": meta["solid"],
+                "date": meta["date"],
+                "shared_materials": sorted(meta["materials"] & query_materials),
+            })
+        return results
@@ -0,0 +1,152 @@
+"""
+Trend Service Module
+时间序列趋势聚合：把流动度 / 强度长表整理成 (实验 × 时间点) 的紧凑矩阵，
+向量化计算保持率曲线、按测试日期的滚动均值以及按配方的统计量。
+"""
+
+import logging
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLLING_WINDOW = 3
+KEY_COLUMNS = ("id", "recipe_id")
+ORDER_COLUMN = "test_date"
+GROUP_COLUMNS = ("recipe_name", "formula_name")
+
+# 趋势类型 -> (时间列, 数值列, 保持率基准时间；None 为每行最早的时间点)
+TREND_KINDS: Dict[str, Tuple[str, str, Optional[float]]] = {
+    "fluidity": ("minutes", "flow_mm", None),
+    "strength": ("age_days", "strength", 28.0),
+}
+
+TREND_COLUMNS = ["time", "value", "retention", "rolling_mean"]
+STAT_COLUMNS = ["group", "time", "n", "mean", "std", "min", "max", "retention_mean", "retention_std"]
+
+
+def _key_columns(long: pd.DataFrame) -> list:
+    return [c for c in KEY_COLUMNS if c in long.columns]
+
+
+def group_column(long: pd.DataFrame) -> Optional[str]:
+    """配方分组列：优先 recipe_name，其次 formula_name"""
+    for col in GROUP_COLUMNS:
+        if col in long.columns and long[col].notna().any():
+            return col
+    return None
+
+
+def time_matrix(long: pd.DataFrame, time_col: str, value_col: str) -> pd.DataFrame:
+    """
+    长表 -> (实验 × 时间点) 矩阵
+    行索引为 (id, recipe_id)，列为升序的时间点，同一格多次测量取均值，缺测为 NaN。
+    """
+    keys = _key_columns(long)
+    data = long[long[time_col].notna()]
+    if data.empty or not keys:
+        return pd.DataFrame(dtype=np.float32)
+    matrix = data.pivot_table(index=keys, columns=time_col, values=value_col, aggfunc="mean", observed=True)
+    matrix = matrix.reindex(columns=sorted(matrix.columns))
+    matrix.columns = matrix.columns.astype(np.float64)
+    return matrix.astype(np.float32)
+
+
+def retention_matrix(matrix: pd.DataFrame, reference: Optional[float] = None) -> pd.DataFrame:
+    """
+    保持率 (%) = 各时间点数值 / 基准值 × 100
+    Args:
+        reference: 基准时间点；None 时每行取最早有数据的时间点 (流动度经时损失)
+    """
+    if matrix.empty:
+        return matrix.copy()
+    values = matrix.to_numpy(dtype=np.float64)
+    if reference is None:
+        has_value = ~np.isnan(values)
+        first = np.where(has_value.any(axis=1), has_value.argmax(axis=1), 0)
+        base = values[np.arange(len(values)), first]
+    elif reference in matrix.columns:
+        base = matrix[reference].to_numpy(dtype=np.float64)
+    else:
+        base = np.full(len(values), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = values / base[:, None] * 100.0
+    ratio[~np.isfinite(ratio)] = np.nan
+    return pd.DataFrame(ratio.astype(np.float32), index=matrix.index, columns=matrix.columns)
+
+
+def rolling_matrix(matrix: pd.DataFrame, order: pd.Series, window: int = DEFAULT_ROLLING_WINDOW) -> pd.DataFrame:
+    """
+    按测试日期的滚动均值：每个时间点列在实验先后顺序上取最近 window 次测量的均值
+    Args:
+        order: 与 matrix 行对齐的排序键 (测试日期)
+    """
+    if matrix.empty:
+        return matrix.copy()
+    positions = np.argsort(pd.to_datetime(order, errors="coerce").to_numpy(), kind="stable")
+    ordered = matrix.iloc[positions]
+    rolled = ordered.rolling(max(int(window), 1), min_periods=1).mean()
+    return rolled.reindex(matrix.index).astype(np.float32)
+
+
+def trend_table(long: pd.DataFrame,
+                time_col: str,
+                value_col: str,
+                reference: Optional[float] = None,
+                window: int = DEFAULT_ROLLING_WINDOW) -> pd.DataFrame:
+    """
+    趋势长表：每个实验每个时间点一行
+    Returns:
+        DataFrame: [id, recipe_id, <分组列>, test_date, time, value, retention, rolling_mean]
+    """
+    keys = _key_columns(long)
+    group_col = group_column(long)
+    meta_cols = keys + [c for c in (group_col, ORDER_COLUMN) if c and c in long.columns]
+    matrix = time_matrix(long, time_col, value_col)
+    if matrix.empty:
+        return pd.DataFrame(columns=meta_cols + TREND_COLUMNS)
+
+    meta = long[meta_cols].drop_duplicates(subset=keys).set_index(keys).reindex(matrix.index)
+    order = meta[ORDER_COLUMN] if ORDER_COLUMN in meta.columns else pd.Series(np.arange(len(matrix)), index=matrix.index)
+    n_rows, n_times = matrix.shape
+    row_pos = np.repeat(np.arange(n_rows), n_times)
+    out = meta.reset_index().iloc[row_pos].reset_index(drop=True)
+    out["time"] = np.tile(matrix.columns.to_numpy(dtype=np.float32), n_rows)
+    out["value"] = matrix.to_numpy().ravel()
+    out["retention"] = retention_matrix(matrix, reference).to_numpy().ravel()
+    out["rolling_mean"] = rolling_matrix(matrix, order, window).to_numpy().ravel()
+    out = out[out["value"].notna()]
+    return out[meta_cols + TREND_COLUMNS].reset_index(drop=True)
+
+
+def formula_statistics(trend: pd.DataFrame, group_col: Optional[str] = None) -> pd.DataFrame:
+    """
+    按配方 × 时间点的统计量 (次数、均值、标准差、极值、平均保持率)
+    Returns:
+        DataFrame: [group, time, n, mean, std, min, max, retention_mean, retention_std]
+    """
+    group_col = group_col or group_column(trend)
+    if trend.empty or group_col is None:
+        return pd.DataFrame(columns=STAT_COLUMNS)
+    grouped = trend.dropna(subset=[group_col]).groupby([group_col, "time"], observed=True, sort=True)
+    stats = grouped["value"].agg(["count", "mean", "std", "min", "max"])
+    stats[["retention_mean", "retention_std"]] = grouped["retention"].agg(["mean", "std"])
+    stats = stats.rename(columns={"count": "n"}).reset_index().rename(columns={group_col: "group"})
+    return stats[STAT_COLUMNS]
+
+
+def label_retention(points: Sequence[Tuple[float, float]]) -> Dict[float, float]:
+    """
+    单条记录的保持率 (录入界面实时显示用)
+    Args:
+        points: [(分钟数, 数值)]，无法解析或未录入 (<=0) 的点忽略
+    Returns:
+        {分钟数: 保持率%}，以最早的时间点为基准
+    """
+    valid = sorted((t, v) for t, v in points if t is not None and not np.isnan(t) and v and v > 0)
+    if not valid:
+        return {}
+    base = valid[0][1]
+    return {t: v / base * 100.0 for t, v in valid}
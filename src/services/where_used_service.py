@@ -0,0 +1,304 @@
+"""
+Where-Used Service Module
+维护物料 (原材料 / 成品) 的反向引用索引，供改名、删除检查及 "在哪里使用" 查询使用。
+"""
+
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+from core.enums import DataCategory, MaterialType, MotherLiquorSourceType
+
+logger = logging.getLogger(__name__)
+
+# 引用类别 -> 显示名称
+REFERENCE_CATEGORIES = {
+    "bom_lines": "BOM 配方",
+    "synthesis_records": "合成实验",
+    "products": "成品配方",
+    "mother_liquors": "母液",
+    "material_issues": "领料单",
+    "ledger": "库存台账",
+}
+
+SYNTHESIS_MATERIAL_KEYS = ("reactor_materials", "a_materials", "b_materials")
+PRODUCT_INGREDIENT_KEYS = ("ingredients", "composition")
+
+ItemKey = Tuple[str, Any]
+
+# 索引分段 -> (构建方法, 读取的集合)
+INDEX_SECTIONS = {
+    "bom_lines": ("_bom_line_refs", (DataCategory.BOM_VERSIONS.value,)),
+    "synthesis_records": ("_synthesis_refs", (DataCategory.SYNTHESIS_RECORDS.value, DataCategory.RAW_MATERIALS.value)),
+    "products": ("_product_refs", (DataCategory.PRODUCTS.value, DataCategory.RAW_MATERIALS.value)),
+    "mother_liquors": ("_mother_liquor_refs", (DataCategory.MOTHER_LIQUORS.value, DataCategory.SYNTHESIS_RECORDS.value,
+                                               DataCategory.RAW_MATERIALS.value)),
+    "material_issues": ("_issue_refs", (DataCategory.MATERIAL_ISSUES.value,)),
+    "raw_ledger": ("_raw_ledger_refs", (DataCategory.INVENTORY_RECORDS.value,)),
+    "product_ledger": ("_product_ledger_refs", (DataCategory.PRODUCT_INVENTORY_RECORDS.value,
+                                                DataCategory.PRODUCT_INVENTORY.value)),
+}
+
+
+class WhereUsedService:
+    """
+    物料反向引用索引
+
+    索引结构: (item_type, item_id) -> [reference]，其中 reference 记录引用所在的
+    集合、记录下标及列表位置，改名/删除只需访问实际引用处。
+    索引按引用类别分段，每段按其读取集合的代数 (DataService.get_generation) 缓存，
+    保存只重建受影响的分段；文件被外部修改时所有代数递增，全部重建。
+    实例挂在共享的 DataService 上，各会话并发调用 get_index，重建由 _lock 串行化。
+    """
+
+    def __init__(self, data_service=None):
+        """
+        Args:
+            data_service: DataService 实例。
+        """
+        self.data_service = data_service
+        self._index: Optional[Dict[ItemKey, List[Dict[str, Any]]]] = None
+        self._sections: Dict[str, Dict[ItemKey, List[Dict[str, Any]]]] = {}
+        self._section_keys: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    # -------------------- Index Build --------------------
+    @staticmethod
+    def _name_map(items: List[Dict[str, Any]], *fields: str) -> Dict[str, Any]:
+        mapping = {}
+        for item in items:
+            for field in fields:
+                name = str(item.get(field) or "").strip()
+                if name:
+                    mapping.setdefault(name, item.get("id"))
+                    break
+        return mapping
+
+    @staticmethod
+    def _ref(category, collection, pos, record, label, list_key=None, item_pos=None, match="id") -> Dict[str, Any]:
+        return {
+            "category": category,
+            "collection": collection,
+            "record_index": pos,
+            "record_id": record.get("id"),
+            "label": label,
+            "list_key": list_key,
+            "item_index": item_pos,
+            "match": match,
+        }
+
+    @staticmethod
+    def _synthesis_materials(data: Dict[str, Any]):
+        """合成实验中的原材料 (按 material_id，缺失时按名称解析)"""
+        raw_ids = {m.get("id") for m in data.get(DataCategory.RAW_MATERIALS.value, [])}
+        raw_by_name = WhereUsedService._name_map(data.get(DataCategory.RAW_MATERIALS.value, []), "name")
+        for pos, record in enumerate(data.get(DataCategory.SYNTHESIS_RECORDS.value, [])):
+            for list_key in SYNTHESIS_MATERIAL_KEYS:
+                for j, item in enumerate(record.get(list_key, []) or []):
+                    mid = item.get("material_id")
+                    match = "id"
+                    if mid not in raw_ids:
+                        mid = raw_by_name.get(str(item.get("material_name") or "").strip())
+                        match = "name"
+                    if mid is not None:
+                        yield pos, record, list_key, j, mid, match
+
+    @staticmethod
+    def _bom_line_refs(data):
+        raw = MaterialType.RAW_MATERIAL.value
+        collection = DataCategory.BOM_VERSIONS.value
+        for pos, version in enumerate(data.get(collection, [])):
+            label = f"BOM#{version.get('bom_id')} {version.get('version') or ''}".strip()
+            for j, line in enumerate(version.get("lines", []) or []):
+                key = (line.get("item_type") or raw, line.get("item_id"))
+                yield key, WhereUsedService._ref("bom_lines", collection, pos, version, label, "lines", j)
+                subs = line.get("substitutes")
+                for sub in subs if isinstance(subs, list) else []:
+                    if isinstance(sub, dict) and sub.get("item_id") is not None:
+                        sub_key = (sub.get("item_type") or raw, sub.get("item_id"))
+                        yield sub_key, WhereUsedService._ref("bom_lines", collection, pos, version, f"{label} (替代料)",
+                                                             "lines", j, "substitute")
+
+    @staticmethod
+    def _synthesis_refs(data):
+        raw = MaterialType.RAW_MATERIAL.value
+        collection = DataCategory.SYNTHESIS_RECORDS.value
+        for pos, record, list_key, j, mid, match in WhereUsedService._synthesis_materials(data):
+            label = record.get("formula_id") or record.get("formula_name") or "未知"
+            yield (raw, mid), WhereUsedService._ref("synthesis_records", collection, pos, record, label, list_key, j, match)
+
+    @staticmethod
+    def _product_refs(data):
+        """成品配方 (按名称)"""
+        raw_by_name = WhereUsedService._name_map(data.get(DataCategory.RAW_MATERIALS.value, []), "name")
+        collection = DataCategory.PRODUCTS.value
+        for pos, prod in enumerate(data.get(collection, [])):
+            label = prod.get("product_name") or "未知"
+            for list_key in PRODUCT_INGREDIENT_KEYS:
+                for j, item in enumerate(prod.get(list_key, []) or []):
+                    mid = raw_by_name.get(str(item.get("name") or "").strip())
+                    if mid is not None:
+                        yield (MaterialType.RAW_MATERIAL.value, mid), WhereUsedService._ref(
+                            "products", collection, pos, prod, label, list_key, j, "name")
+
+    @staticmethod
+    def _mother_liquor_refs(data):
+        """母液 (经由来源合成实验间接引用)"""
+        record_materials: Dict[Any, set] = {}
+        for _, record, _, _, mid, _ in WhereUsedService._synthesis_materials(data):
+            record_materials.setdefault(record.get("id"), set()).add(mid)
+        collection = DataCategory.MOTHER_LIQUORS.value
+        for pos, ml in enumerate(data.get(collection, [])):
+            if ml.get("source_type") != MotherLiquorSourceType.SYNTHESIS.value:
+                continue
+            for mid in record_materials.get(ml.get("source_id"), ()):
+                yield (MaterialType.RAW_MATERIAL.value, mid), WhereUsedService._ref(
+                    "mother_liquors", collection, pos, ml, ml.get("name") or "未知", match="source")
+
+    @staticmethod
+    def _issue_refs(data):
+        collection = DataCategory.MATERIAL_ISSUES.value
+        for pos, issue in enumerate(data.get(collection, [])):
+            for j, line in enumerate(issue.get("lines", []) or []):
+                key = (line.get("item_type") or MaterialType.RAW_MATERIAL.value, line.get("item_id"))
+                yield key, WhereUsedService._ref("material_issues", collection, pos, issue,
+                                                 issue.get("issue_code") or "未知", "lines", j)
+
+    @staticmethod
+    def _raw_ledger_refs(data):
+        collection = DataCategory.INVENTORY_RECORDS.value
+        for pos, rec in enumerate(data.get(collection, [])):
+            mid = rec.get("material_id")
+            if mid is not None:
+                yield (MaterialType.RAW_MATERIAL.value, mid), WhereUsedService._ref(
+                    "ledger", collection, pos, rec, rec.get("reason") or rec.get("type") or "")
+
+    @staticmethod
+    def _product_ledger_refs(data):
+        product_by_name = WhereUsedService._name_map(
+            data.get(DataCategory.PRODUCT_INVENTORY.value, []), "product_name", "name"
+        )
+        collection = DataCategory.PRODUCT_INVENTORY_RECORDS.value
+        for pos, rec in enumerate(data.get(collection, [])):
+            pid = product_by_name.get(str(rec.get("product_name") or "").strip())
+            if pid is not None:
+                yield (MaterialType.PRODUCT.value, pid), WhereUsedService._ref(
+                    "ledger", collection, pos, rec, rec.get("reason") or rec.get("type") or "", match="name")
+
+    @staticmethod
+    def _build_section(name: str, data: Dict[str, Any]) -> Dict[ItemKey, List[Dict[str, Any]]]:
+        section: Dict[ItemKey, List[Dict[str, Any]]] = {}
+        for key, ref in getattr(WhereUsedService, INDEX_SECTIONS[name][0])(data):
+            section.setdefault(key, []).append(ref)
+        return section
+
+    @staticmethod
+    def _merge(sections: Iterable[Dict[ItemKey, List[Dict[str, Any]]]]) -> Dict[ItemKey, List[Dict[str, Any]]]:
+        index: Dict[ItemKey, List[Dict[str, Any]]] = {}
+        for section in sections:
+            for key, refs in section.items():
+                index.setdefault(key, []).extend(refs)
+        return index
+
+    @staticmethod
+    def build_index(data: Dict[str, Any]) -> Dict[ItemKey, List[Dict[str, Any]]]:
+        """全量构建反向引用索引"""
+        return WhereUsedService._merge(WhereUsedService._build_section(name, data) for name in INDEX_SECTIONS)
+
+    def get_index(self, data: Optional[Dict[str, Any]] = None) -> Dict[ItemKey, List[Dict[str, Any]]]:
+        """
+        获取索引；只重建所读集合代数发生变化的部分
+
+        Args:
+            data: 已加载的数据 (须为 data_service 当前数据)，为空时自动加载
+        """
+        if data is None:
+            data = self.data_service.load_data() if self.data_service else {}
+        with self._lock:
+            sections, section_keys = dict(self._sections), dict(self._section_keys)
+            changed = self._index is None
+            for name, (_, inputs) in INDEX_SECTIONS.items():
+                key = tuple(self.data_service.get_generation(c) for c in inputs) if self.data_service else None
+                if key is None or name not in sections or section_keys.get(name) != key:
+                    sections[name] = self._build_section(name, data)
+                    section_keys[name] = key
+                    changed = True
+            if changed:
+                # 新索引完整构建后再一并替换，已返回给其他会话的旧索引不受影响
+                self._index = self._merge(sections[name] for name in INDEX_SECTIONS)
+                self._sections, self._section_keys = sections, section_keys
+            return self._index
+
+    @staticmethod
+    def resolve_record(data: Dict[str, Any], ref: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按引用取回记录；下标处已不是该记录时按 ID 重新查找，找不到返回 None"""
+        records = data.get(ref["collection"]) or []
+        pos = ref["record_index"]
+        if pos < len(records) and records[pos].get("id") == ref["record_id"]:
+            return records[pos]
+        return next((r for r in records if r.get("id") == ref["record_id"]), None) if ref["record_id"] is not None else None
+
+    # -------------------- Queries --------------------
+    def get_references(self,
+                       item_id: Any,
+                       item_type: str = MaterialType.RAW_MATERIAL.value,
+                       categories: Optional[Iterable[str]] = None,
+                       data: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        查询物料的全部引用
+        Args:
+            item_id: 物料ID
+            item_type: raw_material / product
+            categories: 可选，限定引用类别 (见 REFERENCE_CATEGORIES)
+        Returns:
+            list: [{category, collection, record_index, record_id, label, list_key, item_index, match}]
+        """
+        refs = self.get_index(data).get((item_type, item_id), [])
+        if categories is not None:
+            allowed = set(categories)
+            refs = [r for r in refs if r["category"] in allowed]
+        return list(refs)
+
+    @staticmethod
+    def summarize(references: List[Dict[str, Any]]) -> Dict[str, int]:
+        """按类别统计引用数量"""
+        summary: Dict[str, int] = {}
+        for ref in references:
+            summary[ref["category"]] = summary.get(ref["category"], 0) + 1
+        return summary
+
+    def rename_references(self, data: Dict[str, Any], item_id: Any, old_name: str, new_name: str,
+                          item_type: str = MaterialType.RAW_MATERIAL.value) -> List[Dict[str, Any]]:
+        """
+        将按名称保存的引用改为新名称 (就地修改 data，不负责保存)
+
+        索引须在改名前构建 (改名后旧名称无法再解析到该物料)。
+        Returns:
+            被修改的记录列表 (去重)
+        """
+        name_fields = {
+            "synthesis_records": "material_name",
+            "products": "name",
+            "bom_lines": "item_name",
+        }
+        touched = {}
+        for ref in self.get_references(item_id, item_type, categories=name_fields.keys(), data=data):
+            record = self.resolve_record(data, ref)
+            if record is None:
+                continue
+            items = record.get(ref["list_key"]) or []
+            if ref["item_index"] >= len(items):
+                continue
+            item = items[ref["item_index"]]
+            field = name_fields[ref["category"]]
+            if ref["match"] == "substitute":
+                for sub in item.get("substitutes") or []:
+                    if isinstance(sub, dict) and sub.get("item_id") == item_id and sub.get("item_name") == old_name:
+                        sub["item_name"] = new_name
+                        touched[id(record)] = (ref["category"], record)
+                continue
+            if item.get(field) != old_name:
+                continue
+            item[field] = new_name
+            touched[id(record)] = (ref["category"], record)
+        return [record for _, record in touched.values()]
@@ -9,6 +9,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 from services.data_service import DataService
 from services.analysis_service import AnalysisService
+from services.chart_pipeline import prepare_chart_data, COUNT_COLUMN
 
 def render_analysis(data_service: DataService):
     """Render the analysis page."""
@@ -53,7 +54,10 @@ def render_analysis(data_service: DataService):
     # --- Tab 2: Correlation ---
     with tab2:
         st.subheader("相关性热力图")
-        corr_matrix = analysis_service.get_correlation_matrix(df)
+        # 特征过多时热力图不可读，只取有效样本最多的前 30 个数值列
+        numeric_df = df.select_dtypes(include='number')
+        heat_cols = numeric_df.count().nlargest(30).index.tolist()
+        corr_matrix = analysis_service.get_correlation_matrix(df, heat_cols)
         
         if not corr_matrix.empty:
             fig = px.imshow(
@@ -71,7 +75,7 @@ def render_analysis(data_service: DataService):
     with tab3:
         st.subheader("自定义绘图")
         
-        numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
+        numeric_cols = df.select_dtypes(include='number').columns.tolist()
         all_cols = df.columns.tolist()
         
         if len(numeric_cols) < 2:
@@ -89,14 +93,21 @@ def render_analysis(data_service: DataService):
             
             color_arg = None if color_by == "None" else color_by
             
+            # 大数据量时在服务端降采样/汇总后再交给 Plotly
+            chart_kind = {"散点图": "scatter", "折线图": "line", "柱状图": "bar"}[plot_type]
+            chart_df, chart_info = prepare_chart_data(df, chart_kind, x_axis, y_axis, color_arg)
+            
             if plot_type == "散点图":
-                fig = px.scatter(df, x=x_axis, y=y_axis, color=color_arg, title=f"{y_axis} vs {x_axis}")
+                fig = px.scatter(chart_df, x=x_axis, y=y_axis, color=color_arg, title=f"{y_axis} vs {x_axis}",
+                                 size=COUNT_COLUMN if chart_info["reduced"] else None)
             elif plot_type == "折线图":
-                fig = px.line(df, x=x_axis, y=y_axis, color=color_arg, title=f"{y_axis} over {x_axis}")
+                fig = px.line(chart_df, x=x_axis, y=y_axis, color=color_arg, title=f"{y_axis} over {x_axis}")
             else:
-                fig = px.bar(df, x=x_axis, y=y_axis, color=color_arg, title=f"{y_axis} by {x_axis}")
+                fig = px.bar(chart_df, x=x_axis, y=y_axis, color=color_arg, title=f"{y_axis} by {x_axis}")
                 
             st.plotly_chart(fig, use_container_width=True)
+            if chart_info["reduced"]:
+                st.caption(f"原始 {chart_info['original']} 行，图表显示 {chart_info['rendered']} 个点")
 
     # --- Tab 4: AI Preparation ---
     with tab4:
@@ -104,7 +115,7 @@ def render_analysis(data_service: DataService):
         
         st.markdown("选择目标变量（预测对象）和特征变量（输入），生成用于PyTorch或TensorFlow的训练代码。")
         
-        numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
+        numeric_cols = df.select_dtypes(include='number').columns.tolist()
         
         if not numeric_cols:
             st.warning("没有数值列可用于AI训练")
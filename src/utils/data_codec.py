@@ -0,0 +1,129 @@
+"""
+Data Codec
+主数据文件的序列化：可选 orjson 加速、紧凑格式及 gzip / zstd 压缩。
+读取时按文件头自动识别格式，新旧文件均可透明读取。
+"""
+
+import gzip
+import json
+import math
+import logging
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMAT_PRETTY = "pretty"    # 缩进 JSON (默认，便于人工查看)
+FORMAT_COMPACT = "compact"  # 无空白 JSON
+FORMAT_GZIP = "gzip"        # 紧凑 JSON + gzip
+FORMAT_ZSTD = "zstd"        # 紧凑 JSON + zstd (需安装 zstandard，否则退回 gzip)
+DATA_FORMATS = (FORMAT_PRETTY, FORMAT_COMPACT, FORMAT_GZIP, FORMAT_ZSTD)
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def _has_non_finite(data: Any) -> bool:
+    """数据中是否含 NaN / Infinity (orjson 会静默写为 null)"""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        for item in (value.values() if type(value) is dict else value):
+            kind = type(item)
+            if kind is float:
+                if not math.isfinite(item):
+                    return True
+            elif kind is dict or kind is list or kind is tuple:
+                stack.append(item)
+    return False
+
+
+def _dumps(data: Any, pretty: bool) -> bytes:
+    # 缩进格式 (默认) 始终用标准库，输出与以往一致；orjson 只用于紧凑 / 压缩格式
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8")
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # 超出 64 位的整数等 orjson 不支持的值，交给标准库处理
+            payload = None
+        # NaN 只会变成 null，输出中没有 null 时无需扫描
+        if payload is not None and (b"null" not in payload or not _has_non_finite(data)):
+            return payload
+        if payload is not None:
+            logger.warning("Data contains NaN/Infinity, serializing with json to preserve them")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_data(data: Any, fmt: str = FORMAT_PRETTY) -> bytes:
+    """按格式序列化数据"""
+    if fmt not in DATA_FORMATS:
+        raise ValueError(f"未知的数据文件格式: {fmt}")
+    if fmt == FORMAT_ZSTD and zstandard is None:
+        logger.warning("zstandard not installed, falling back to gzip for data file")
+        fmt = FORMAT_GZIP
+    payload = _dumps(data, pretty=(fmt == FORMAT_PRETTY))
+    if fmt == FORMAT_GZIP:
+        # mtime=0 使相同内容得到相同字节，便于比较
+        return gzip.compress(payload, compresslevel=GZIP_LEVEL, mtime=0)
+    if fmt == FORMAT_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    return payload
+
+
+def detect_format(raw: bytes) -> str:
+    """按文件头识别格式 (未压缩的 JSON 统一返回 compact/pretty 中的 compact)"""
+    if raw.startswith(GZIP_MAGIC):
+        return FORMAT_GZIP
+    if raw.startswith(ZSTD_MAGIC):
+        return FORMAT_ZSTD
+    return FORMAT_COMPACT
+
+
+def decode_bytes(raw: bytes) -> bytes:
+    """解压为 JSON 文本字节"""
+    fmt = detect_format(raw)
+    if fmt == FORMAT_GZIP:
+        return gzip.decompress(raw)
+    if fmt == FORMAT_ZSTD:
+        if zstandard is None:
+            raise ValueError("数据文件为 zstd 压缩格式，需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    return raw
+
+
+def decode_data(raw: bytes) -> Any:
+    """反序列化任意格式的数据文件内容"""
+    text = decode_bytes(raw)
+    if text.startswith(b"\xef\xbb\xbf"):
+        text = text[3:]
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # 旧文件中可能含 NaN 等标准库可解析的非标准字面量
+            pass
+    return json.loads(text.decode("utf-8"))
+
+
+def read_data_file(path: Path) -> Any:
+    """读取数据文件 (自动识别格式)"""
+    return decode_data(Path(path).read_bytes())
+
+
+def read_json_text(path: Path) -> str:
+    """读取数据文件为 JSON 文本 (压缩文件自动解压)"""
+    return decode_bytes(Path(path).read_bytes()).decode("utf-8-sig")
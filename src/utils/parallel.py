@@ -0,0 +1,48 @@
+"""
+Parallel Helper Module
+进程池并行的成本估算：按可用 CPU 数量与实测的单项耗时决定是否值得启动进程池。
+"""
+
+import os
+import time
+import pickle
+from typing import Any, Optional
+
+# spawn 进程池启动 (子进程重新导入模块) 实测约 1.5 s；多核时各工作进程并行启动
+POOL_STARTUP_SECONDS = 1.5
+# 估算误差较大，预计至少快 1.5 倍才启用进程池
+MIN_SPEEDUP = 1.5
+
+
+def available_cpus() -> int:
+    """当前进程可用的 CPU 数量"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def transfer_seconds(*payload: Any) -> float:
+    """实测 payload 在进程间传递 (pickle 往返) 的耗时"""
+    start = time.perf_counter()
+    pickle.loads(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+    return time.perf_counter() - start
+
+
+def choose_workers(items: int, item_seconds: float, max_workers: Optional[int] = None,
+                   item_transfer_seconds: float = 0.0, startup_seconds: float = POOL_STARTUP_SECONDS) -> int:
+    """
+    估算串行与进程池的总耗时，返回工作进程数 (1 表示串行更快)
+    Args:
+        items: 待处理项数
+        item_seconds: 实测单项处理耗时
+        max_workers: 工作进程数上限 (默认按可用 CPU 数量)
+        item_transfer_seconds: 实测单项参数与结果的进程间传递耗时 (在主进程中串行发生)
+    """
+    workers = min(max_workers or available_cpus(), available_cpus(), items)
+    if workers < 2:
+        return 1
+    serial = items * item_seconds
+    pooled = startup_seconds + items * (item_seconds / workers + item_transfer_seconds)
+    return workers if pooled * MIN_SPEEDUP <= serial else 1
+
@@ -39,6 +39,7 @@ def mock_data_file(tmp_path):
         DataCategory.PRODUCTION_ORDERS.value: [],
         DataCategory.BOMS.value: [],
         DataCategory.BOM_VERSIONS.value: [],  # Note: This might be needed if not in initial list but used
+        DataCategory.BOM_HISTORY.value: [],
         DataCategory.MOTHER_LIQUORS.value: [],
         DataCategory.MATERIAL_ISSUES.value: [],
         DataCategory.USERS.value: [],
@@ -0,0 +1,224 @@
+
+import pytest
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from services.analysis_service import AnalysisService, FrameCache
+from services.analysis_store import AnalysisStore
+import services.analysis_store as analysis_store
+from services.feature_screening import screen_features, correlation_matrix
+from services.dataset_builder import load_split
+from core.enums import DataCategory
+
+def test_dataframe_cache_by_generation(data_service, monkeypatch):
+    """测试分析数据框按集合代数缓存"""
+    data_service.add_concrete_experiment({"formula_name": "C30", "performance": {"strengths": {"7d": 25.1}}})
+    data_service.add_mortar_experiment({"formula_name": "M1", "flow": 210})
+    flattened = []
+    original = AnalysisService._flatten_collection
+    monkeypatch.setattr(AnalysisService, "_flatten_collection",
+                        lambda self, data_type, *args: flattened.append(data_type) or original(self, data_type, *args))
+
+    service = AnalysisService(data_service)
+    concrete = service.get_data_as_dataframe("concrete")
+    assert len(concrete) == 1
+    assert "strength_7d" in concrete.columns
+
+    # 新建的 AnalysisService 共享同一 DataService 的缓存
+    assert AnalysisService(data_service).get_data_as_dataframe("concrete").equals(concrete)
+    mortar = service.get_data_as_dataframe("mortar")
+    assert flattened == ["concrete", "mortar"]
+
+    # 修改砂浆集合不影响混凝土缓存
+    data_service.add_mortar_experiment({"formula_name": "M2", "flow": 220})
+    assert service.get_data_as_dataframe("concrete").equals(concrete)
+    assert len(service.get_data_as_dataframe("mortar")) == 2
+    assert flattened == ["concrete", "mortar", "mortar"]
+
+    # 未指明集合的保存使全部缓存失效 (内容未变，重新取得的数据相同)
+    data_service.save_data(data_service.load_data())
+    assert service.get_data_as_dataframe("concrete").equals(concrete)
+
+def test_cached_frames_not_shared_with_callers(data_service):
+    """测试调用方修改返回的 DataFrame 不影响缓存"""
+    data_service.add_concrete_experiment({"formula_name": "C30", "performance": {"strengths": {"7d": 25.1}}})
+    data_service.add_concrete_experiment({"formula_name": "C40"})
+    service = AnalysisService(data_service)
+    for _ in range(2):   # 首次 (写入缓存) 与再次 (命中缓存) 返回的都是副本
+        df = service.get_data_as_dataframe("concrete")
+        expected = df.copy()
+        df["extra"] = 1.0
+        df.dropna(subset=["strength_7d"], inplace=True)
+        df.loc[:, "formula_name"] = "X"
+        assert service.get_data_as_dataframe("concrete").equals(expected)
+
+    strength = service.get_strength_table("concrete")
+    expected = strength.copy()
+    strength.drop(strength.index, inplace=True)
+    assert service.get_strength_table("concrete").equals(expected)
+
+    store = service.store
+    records = data_service.load_data()[DataCategory.PRODUCTS.value] + [{"id": 1, "name": "P"}]
+    frame = store.get_frame("products", records)
+    frame["name"] = "Q"
+    assert list(store.get_frame("products", records)["name"]) == ["P"]
+
+def test_frame_cache_lru():
+    """测试 LRU 淘汰"""
+    cache = FrameCache(max_entries=2)
+    frames = {name: pd.DataFrame({"a": [float(i)]}) for i, name in enumerate(("x", "y", "z"))}
+    cache.put(("x", 1), frames["x"])
+    cache.put(("y", 1), frames["y"])
+    assert cache.get(("x", 1)).equals(frames["x"])
+    cache.put(("z", 1), frames["z"])
+    assert cache.get(("y", 1)) is None
+    assert cache.get(("x", 1)).equals(frames["x"])
+    # 新代数替换旧代数
+    cache.put(("x", 2), frames["y"])
+    assert cache.get(("x", 1)) is None
+
+def test_analysis_store_incremental(tmp_path, monkeypatch):
+    """测试增量扁平化及 Parquet 持久化"""
+    records = [
+        {"id": i, "formula_name": f"C{i}", "slump": 180 + i, "strength": {"28d": 40.0 + i}, "tags": ["a"]}
+        for i in range(1, 4)
+    ]
+    flattened = []
+    original = analysis_store.flatten_records
+    monkeypatch.setattr(analysis_store, "flatten_records",
+                        lambda recs: flattened.append(len(recs)) or original(recs))
+
+    store = AnalysisStore(tmp_path)
+    df = store.get_frame("concrete_experiments", records)
+    assert list(df["id"]) == [1, 2, 3]
+    assert (tmp_path / "concrete_experiments.parquet").exists()
+
+    # 新增一条、修改一条、删除一条：只扁平化变化的两条
+    records[0]["slump"] = 200
+    records = records[:2] + [{"id": 4, "formula_name": "C4", "slump": 190, "strength": {"28d": 45.0}, "tags": []}]
+    df = store.get_frame("concrete_experiments", records)
+    assert flattened == [3, 2]
+    assert list(df["id"]) == [1, 2, 4]
+    assert list(df["slump"]) == [200, 182, 190]
+    assert df["strength_28d"].dtype.kind == "f"
+
+    # 新实例从磁盘恢复，无需重新扁平化
+    reloaded = AnalysisStore(tmp_path).get_frame("concrete_experiments", records)
+    assert flattened == [3, 2]
+    assert list(reloaded["id"]) == [1, 2, 4]
+
+def test_analysis_store_appends_deltas(tmp_path, monkeypatch):
+    """测试变化只追加增量文件，重启后按增量日志重放，累积过多时合并"""
+    records = [{"id": i, "formula_name": f"C{i}", "slump": 180 + i} for i in range(1, 21)]
+    store = AnalysisStore(tmp_path)
+    store.get_frame("c", records)
+    base = tmp_path / "c.parquet"
+    base_mtime = base.stat().st_mtime_ns
+
+    records[2] = {**records[2], "slump": 300}
+    records = records[:5] + records[6:] + [{"id": 21, "formula_name": "C21", "slump": 1}]
+    df = store.get_frame("c", records)
+    assert base.stat().st_mtime_ns == base_mtime
+    assert len(list(tmp_path.glob("c.delta-*.parquet"))) == 1
+    assert list(df["id"]) == [r["id"] for r in records] and df.loc[2, "slump"] == 300
+
+    reloaded = AnalysisStore(tmp_path).get_frame("c", records)
+    pd.testing.assert_frame_equal(reloaded, df)
+
+    monkeypatch.setattr(analysis_store, "MAX_DELTA_PARTS", 2)
+    for i in range(2):
+        records[0] = {**records[0], "slump": 400 + i}
+        df = store.get_frame("c", records)
+    assert base.stat().st_mtime_ns != base_mtime
+    assert not list(tmp_path.glob("c.delta-*.parquet"))
+    assert len(list(tmp_path.glob("c.journal-*.jsonl"))) <= 1
+    pd.testing.assert_frame_equal(AnalysisStore(tmp_path).get_frame("c", records), df)
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_analysis_store_concurrent_refresh(tmp_path):
+    """测试多个会话并发刷新同一集合：结果与磁盘缓存保持一致"""
+    import threading
+    store = AnalysisStore(tmp_path)
+    base = [{"id": i, "slump": i} for i in range(1, 51)]
+    store.get_frame("c", base)
+    versions = [[{**r, "slump": r["slump"] + k} if r["id"] % 5 == k else r for r in base] for k in range(5)]
+    errors = []
+
+    def refresh(records):
+        try:
+            for _ in range(5):
+                df = store.get_frame("c", records)
+                assert list(df["slump"]) == [r["slump"] for r in records]
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=refresh, args=(v,)) for v in versions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    final = store.get_frame("c", versions[0])
+    pd.testing.assert_frame_equal(AnalysisStore(tmp_path).get_frame("c", versions[0]), final)
+
+def test_screen_features_pairwise_missing(data_service):
+    """测试特征筛选：成对缺失与 pandas 结果一致，按代数缓存"""
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=60)
+    df = pd.DataFrame({
+        "signal": x,
+        "noise": rng.normal(size=60),
+        "target": 3 * x + rng.normal(size=60) * 0.1,
+    })
+    df.loc[::7, "signal"] = np.nan
+    df.loc[::11, "target"] = np.nan
+
+    ranked = screen_features(df, "target", methods=["pearson", "spearman", "mutual_info"], top_k=1)
+    assert list(ranked["feature"]) == ["signal"]
+    assert ranked["pearson"].iloc[0] == pytest.approx(df["signal"].corr(df["target"]))
+    assert ranked["spearman"].iloc[0] == pytest.approx(df.corr(method="spearman").loc["signal", "target"])
+    assert ranked["n_obs"].iloc[0] == (df["signal"].notna() & df["target"].notna()).sum()
+
+    matrix = correlation_matrix(df)
+    assert np.allclose(matrix.to_numpy(), df.corr().to_numpy())
+
+    for i in range(5):
+        data_service.add_concrete_experiment({
+            "formula_name": f"C{i}", "water_cement_ratio": 0.3 + i * 0.02,
+            "performance": {"strengths": {"28d": 60 - i * 4.0}}
+        })
+    service = AnalysisService(data_service)
+    result = service.screen_features("concrete", "strength_28d")
+    assert result["feature"].iloc[0] == "water_cement_ratio"
+    assert result["pearson"].iloc[0] == pytest.approx(-1.0)
+    assert service.screen_features("concrete", "strength_28d").equals(result)
+
+def test_export_ai_dataset_reproducible(data_service):
+    """测试数据集导出：种子划分可复现、分层、memmap 与 manifest"""
+    for i in range(40):
+        data_service.add_concrete_experiment({
+            "formula_name": f"F{i % 4}", "water_cement_ratio": 0.3 + (i % 10) * 0.01,
+            "sand_ratio": None if i % 9 == 0 else 40.0 + i % 5,
+            "performance": {"strengths": {"28d": 50.0 - i * 0.2}}
+        })
+    service = AnalysisService(data_service)
+    df = service.get_data_as_dataframe("concrete")
+    features = ["water_cement_ratio", "sand_ratio"]
+
+    first = service.prepare_ai_dataset(df, "strength_28d", features, seed=7, stratify_by="formula_name")
+    second = service.prepare_ai_dataset(df.iloc[::-1], "strength_28d", features, seed=7, stratify_by="formula_name")
+    assert sorted(first["X_train"].index) == sorted(second["X_train"].index)
+    # 每个配方 10 行，按 0.8 分层后每组 8 行训练
+    assert first["X_train"].join(df["formula_name"]).groupby("formula_name", observed=True).size().tolist() == [8] * 4
+
+    manifest = service.export_ai_dataset("concrete", "strength_28d", features, seed=7, stratify_by="formula_name")
+    assert manifest["reused"] is False
+    assert manifest["splits"]["train"]["rows"] == 32 and manifest["splits"]["test"]["rows"] == 8
+    X, y, loaded = load_split(manifest["path"], "train")
+    assert isinstance(X, np.memmap) and X.shape == (32, 2) and X.dtype == np.float32
+    assert not np.isnan(X).any()
+    assert loaded["fill_values"]["sand_ratio"] == pytest.approx(manifest["feature_stats"]["mean"]["sand_ratio"])
+    train_part = pd.read_parquet(Path(manifest["path"]) / manifest["splits"]["train"]["parquet"][0])
+    assert np.allclose(train_part["strength_28d"].to_numpy(), y)
+
+    again = service.export_ai_dataset("concrete", "strength_28d", features, seed=7, stratify_by="formula_name")
+    assert again["reused"] is True and again["dataset_id"] == manifest["dataset_id"]
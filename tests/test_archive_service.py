@@ -0,0 +1,112 @@
+
+import pyarrow.parquet as pq
+from core.enums import DataCategory
+import services.archive_service as archive_service
+from services.archive_service import ArchiveService, month_partitions, UNDATED_PARTITION
+
+
+def test_month_partitions():
+    """测试按时间字段分月，无法解析的记录归入 undated"""
+    records = [{"created_at": "2024-01-05 09:00:00"}, {"date": "2024-02-01"}, {"date": "坏数据"}]
+    parts = month_partitions(records, ("created_at", "date"))
+    assert {k: len(v) for k, v in parts.items()} == {"2024-01": 1, "2024-02": 1, UNDATED_PARTITION: 1}
+
+
+def test_archive_snapshots_and_ledger_partitions(data_service, tmp_path):
+    """测试快照归档、按月分区增量更新、列裁剪读取及审计日志只追加"""
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [
+        {"id": 1, "name": "水泥", "price": 0.5, "tags": ["a"]},
+        {"id": 2, "name": "减水剂", "price": "面议"},
+    ]
+    data[DataCategory.INVENTORY_RECORDS.value] = [
+        {"id": 1, "material_id": 1, "type": "in", "quantity": 10, "created_at": "2024-01-05 09:00:00"},
+        {"id": 2, "material_id": 1, "type": "out", "quantity": 2, "date": "2024-02-01"},
+    ]
+    data[DataCategory.AUDIT_LOGS.value] = [{"time": "2024-01-01 08:00:00", "action": "LOGIN"}]
+    data[DataCategory.USERS.value] = [{"username": "admin", "password_hash": "x"}]
+    data[DataCategory.PERFORMANCE_DATA.value]["synthesis"] = [{"id": 1, "solid": 40.0}]
+    data_service.save_data(data)
+
+    service = ArchiveService(data_service, archive_dir=tmp_path / "archive")
+    ok, message = service.create_archive()
+    assert ok, message
+    snapshot = service.list_snapshots()[-1]
+    assert not (service.snapshot_dir / snapshot / "users.parquet").exists()
+    assert pq.read_metadata(service.snapshot_dir / snapshot / "raw_materials.parquet").row_group(0).column(0).compression == "ZSTD"
+
+    # 嵌套 / 混合类型列以 JSON 保存，读回还原
+    assert service.read_records(DataCategory.RAW_MATERIALS.value) == [
+        {"id": 1, "name": "水泥", "price": 0.5, "tags": ["a"]}, {"id": 2, "name": "减水剂", "price": "面议"},
+    ]
+    assert service.read_records("performance_data.synthesis") == [{"id": 1, "solid": 40.0}]
+    ledger = DataCategory.INVENTORY_RECORDS.value
+    assert service.list_partitions(ledger) == ["2024-01", "2024-02"]
+    df = service.read_collection(ledger, columns=["quantity", "missing"], start_month="2024-02")
+    assert df["quantity"].tolist() == [2] and df["missing"].isna().all()
+
+    # 只有变化的月份被重写；删除的月份被移除
+    jan = service.ledger_dir / ledger / "month=2024-01.parquet"
+    jan_mtime = jan.stat().st_mtime_ns
+    data = data_service.load_data()
+    data[ledger][1]["quantity"] = 3
+    data[ledger].append({"id": 3, "material_id": 1, "type": "in", "quantity": 5, "date": "2024-03-02"})
+    data[DataCategory.AUDIT_LOGS.value] = [{"time": "2024-01-02 08:00:00", "action": "LOGOUT"}]
+    data_service.save_data(data)
+    assert service.create_archive()[0]
+    assert jan.stat().st_mtime_ns == jan_mtime
+    assert service.read_collection(ledger, columns=["quantity"])["quantity"].tolist() == [10, 3, 5]
+
+    data[ledger] = [r for r in data[ledger] if r["id"] != 1]
+    data_service.save_data(data)
+    service.create_archive()
+    assert service.list_partitions(ledger) == ["2024-02", "2024-03"]
+
+    # 审计日志：主数据截断后历史仍保留在归档中
+    actions = [r["action"] for r in service.read_records(DataCategory.AUDIT_LOGS.value)]
+    assert actions == ["LOGIN", "LOGOUT"]
+
+    summary = {row["collection"]: row for row in service.get_summary()}
+    assert summary[ledger]["rows"] == 2 and summary[ledger]["files"] == 2
+    assert service.archive_if_due() is False
+
+
+def test_archive_if_due_backs_off_after_failure(data_service, tmp_path):
+    """测试归档失败后退避，不在每次页面刷新时重新提交"""
+    blocked = tmp_path / "blocked"
+    blocked.write_text("not a directory")
+    service = ArchiveService(data_service, archive_dir=blocked)
+    ok, message = service.create_archive()
+    assert not ok and message.startswith("归档失败")
+    assert service.archive_if_due() is False
+    assert service.archive_if_due(retry_seconds=0) is True
+
+
+def test_archive_if_due_submits_once_under_concurrency(data_service, tmp_path, monkeypatch):
+    """测试多个会话同时到期时只提交一次归档"""
+    import threading
+    release, runs = threading.Event(), []
+
+    def slow_archive(self, data=None):
+        runs.append(data)
+        release.wait(5)
+        return True, ""
+    monkeypatch.setattr(ArchiveService, "create_archive", slow_archive)
+    service = ArchiveService(data_service, archive_dir=tmp_path / "archive")
+    start, results = threading.Barrier(8), []
+
+    def session():
+        start.wait()
+        results.append(service.archive_if_due())
+    threads = [threading.Thread(target=session) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert service.archive_if_due() is False   # 已提交的归档尚未完成
+    release.set()
+    archive_service._executor.submit(lambda: None).result(5)
+    assert len(runs) == 1
+    assert service.archive_if_due() is True    # 完成后 (本例未生成快照) 可再次提交
+    archive_service._executor.submit(lambda: None).result(5)
@@ -59,3 +59,118 @@ def test_explode_bom_not_found(bom_service):
     """测试不存在的BOM版本"""
     result = bom_service.explode_bom(999, 1000)
     assert result == []
+
+def test_bom_history_and_material_changes(bom_service, data_service):
+    """测试BOM变更历史记录与物料变更索引"""
+    line_a = {"item_id": 1, "item_name": "Material A", "item_type": MaterialType.RAW_MATERIAL.value,
+              "qty": 10.0, "uom": UnitType.KG.value}
+    line_b = {"item_id": 2, "item_name": "Material B", "item_type": MaterialType.RAW_MATERIAL.value,
+              "qty": 5.0, "uom": UnitType.KG.value}
+
+    v1 = data_service.add_bom_version({"bom_id": 101, "version": "V1", "effective_from": "2024-01-01",
+                                       "yield_base": 1000.0, "lines": [dict(line_a)]})
+    v2 = data_service.add_bom_version({"bom_id": 202, "version": "V1", "effective_from": "2024-01-01",
+                                       "yield_base": 1000.0, "lines": [dict(line_a), dict(line_b)]})
+
+    # 模拟页面就地修改 lines 后再更新
+    version = next(v for v in data_service.get_bom_versions(101) if v["id"] == v1)
+    version["lines"][0]["qty"] = 12.0
+    assert data_service.update_bom_version(v1, {"lines": version["lines"]})
+    # 无实际变化不产生记录
+    assert data_service.update_bom_version(v1, {"lines": version["lines"]})
+
+    history = bom_service.get_bom_history(101)
+    assert [h["event"] for h in history] == ["updated", "created"]
+    assert history[0]["diffs"] == [{
+        "type": "modified", "item_type": "raw_material", "item_id": 1, "item_name": "Material A",
+        "uom": "kg", "qty": 2.0, "old_qty": 10.0, "new_qty": 12.0
+    }]
+
+    changes = bom_service.get_material_changes(1)
+    assert len(changes) == 3
+    assert {c["bom_id"] for c in changes} == {101, 202}
+    assert bom_service.get_material_changes(2)[0]["type"] == "added"
+    assert bom_service.get_material_changes(1, since="2999-01-01") == []
+
+    # 头信息变更也被记录，索引增量更新
+    assert data_service.update_bom_version(v2, {"yield_base": 2000.0})
+    assert bom_service.get_bom_history(202)[0]["fields"] == {"yield_base": [1000.0, 2000.0]}
+
+    # 版本差异缓存随版本更新失效
+    ver_a = next(v for v in data_service.get_all_bom_versions() if v["id"] == v1)
+    ver_b = next(v for v in data_service.get_all_bom_versions() if v["id"] == v2)
+    diff = bom_service.get_bom_version_diff(ver_a, ver_b)
+    assert {(d["type"], d["item_id"]) for d in diff} == {("modified", 1), ("added", 2)}
+    diff[0]["qty"] = -1
+    assert bom_service.get_bom_version_diff(ver_a, ver_b) == bom_service.history_service.diff_lines(ver_a["lines"], ver_b["lines"])
+    data_service.update_bom_version(v1, {"lines": [dict(line_a, qty=10.0), dict(line_b)]})
+    ver_a = next(v for v in data_service.get_all_bom_versions() if v["id"] == v1)
+    assert bom_service.get_bom_version_diff(ver_a, ver_b) == []
+
+    # 绕过历史记录直接修改版本 (如导入、记录维护) 同样使缓存失效
+    data = data_service.load_data()
+    next(v for v in data["bom_versions"] if v["id"] == v1)["lines"][1]["qty"] = 6.0
+    assert data_service.save_data(data, changed=["bom_versions"])
+    ver_a = next(v for v in data_service.get_all_bom_versions() if v["id"] == v1)
+    assert [(d["type"], d["item_id"]) for d in bom_service.get_bom_version_diff(ver_a, ver_b)] == [("modified", 2)]
+
+def test_allocate_orders_with_substitutes(bom_service, data_service):
+    """测试替代料分配：批次内累计占用库存，主料不足时由替代料补足"""
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [
+        {"id": 1, "name": "Monomer A", "stock_quantity": 15.0},
+        {"id": 2, "name": "Monomer B", "stock_quantity": 8.0},
+        {"id": 3, "name": "水", "stock_quantity": 0.0},
+    ]
+    data[DataCategory.BOM_VERSIONS.value] = [{
+        "id": 1, "bom_id": 1, "version": "V1", "yield_base": 100.0, "lines": [
+            {"item_id": 1, "item_name": "Monomer A", "item_type": "raw_material", "qty": 10.0, "uom": "kg",
+             "substitutes": [{"item_id": 2, "item_name": "Monomer B", "ratio": 1.0}]},
+            {"item_id": 3, "item_name": "水", "item_type": "raw_material", "qty": 90.0, "uom": "kg",
+             "substitutes": "旧的文字说明"},
+        ]
+    }]
+    data[DataCategory.PRODUCTION_ORDERS.value] = [
+        {"id": 1, "order_code": "PO-1", "bom_id": 1, "bom_version_id": 1, "plan_qty": 100.0, "status": "released"},
+        {"id": 2, "order_code": "PO-2", "bom_id": 1, "bom_version_id": 1, "plan_qty": 100.0, "status": "released"},
+        {"id": 3, "order_code": "PO-3", "bom_id": 1, "bom_version_id": 1, "plan_qty": 100.0, "status": "released"},
+    ]
+    data_service.save_data(data)
+
+    plans = bom_service.allocate_orders([1, 2, 3])
+    assert [p["feasible"] for p in plans] == [True, True, False]
+    assert [(l["item_id"], l["required_qty"]) for l in plans[0]["lines"]] == [(1, 10.0), (3, 90.0)]
+    # 第二单: 主料剩 5，替代料补 5
+    assert [(l["item_id"], l["required_qty"]) for l in plans[1]["lines"]] == [(1, 5.0), (2, 5.0), (3, 90.0)]
+    assert plans[1]["lines"][1]["substitute_for"] == 1
+    # 第三单: 替代料剩 3，缺口 7 计入主料
+    assert [(l["item_id"], l["required_qty"]) for l in plans[2]["lines"]] == [(1, 7.0), (2, 3.0), (3, 90.0)]
+    assert plans[2]["shortages"][0]["shortage_qty"] == pytest.approx(7.0)
+
+    only_primary = bom_service.allocate_orders([1, 2], strategy="primary_only")
+    assert [p["feasible"] for p in only_primary] == [True, False]
+
+    outcomes = bom_service.create_issues_from_orders([1, 2, 3], allow_shortage=False)
+    assert [o["success"] for o in outcomes] == [True, True, False]
+    data = data_service.load_data()
+    assert len(data[DataCategory.MATERIAL_ISSUES.value]) == 2
+    assert [o["status"] for o in data[DataCategory.PRODUCTION_ORDERS.value]] == ["issued", "issued", "released"]
+    assert bom_service.create_issues_from_orders([1])[0]["message"] == "只有已下达的生产单可以生成领料单"
+
+def test_allocate_orders_keeps_unconvertible_uom(bom_service, data_service):
+    """测试无法换算为 kg 的 BOM 行保留原单位与数量，不参与分配并标记为不可领料"""
+    from services.mrp_service import SubstitutionStrategy
+    with pytest.raises(TypeError):
+        SubstitutionStrategy()
+
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [{"id": 1, "name": "Additive", "stock_quantity": 100.0}]
+    data[DataCategory.BOM_VERSIONS.value] = [{"id": 1, "bom_id": 1, "version": "V1", "yield_base": 100.0, "lines": [
+        {"item_id": 1, "item_name": "Additive", "item_type": "raw_material", "qty": 2.0, "uom": "桶"}]}]
+    data[DataCategory.PRODUCTION_ORDERS.value] = [
+        {"id": 1, "order_code": "PO-1", "bom_id": 1, "bom_version_id": 1, "plan_qty": 100.0, "status": "released"}]
+    data_service.save_data(data)
+
+    plan = bom_service.allocate_orders([1])[0]
+    assert not plan["feasible"] and "桶" in plan["message"]
+    assert [(l["required_qty"], l["uom"]) for l in plan["lines"]] == [(2.0, "桶")]
@@ -0,0 +1,47 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+from services.chart_pipeline import lttb_indices, prepare_chart_data, histogram_bins, linear_fit, COUNT_COLUMN
+
+
+def test_lttb_keeps_shape():
+    """测试 LTTB 保留首尾点与峰值"""
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500.0)
+    y[4321] = 50.0
+    idx = lttb_indices(x, y, 200)
+    assert len(idx) == 200 and idx[0] == 0 and idx[-1] == 9999
+    assert 4321 in idx
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_prepare_chart_data_budgets():
+    """测试折线/散点/柱状图的点数预算"""
+    n = 50_000
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "date": pd.date_range("2020-01-01", periods=n, freq="h"),
+        "x": rng.normal(size=n),
+        "y": rng.normal(size=n),
+        "grp": np.where(np.arange(n) % 2 == 0, "A", "B"),
+    })
+    line, info = prepare_chart_data(df, "line", "date", "y", "grp", max_points=1000)
+    assert info["reduced"] and len(line) <= 1000
+    assert set(line["grp"]) == {"A", "B"}
+    assert pd.api.types.is_datetime64_any_dtype(line["date"])
+
+    scatter, info = prepare_chart_data(df, "scatter", "x", "y", max_points=2500)
+    assert len(scatter) <= 2500
+    assert scatter[COUNT_COLUMN].sum() == n
+
+    bars, _ = prepare_chart_data(df, "bar", "grp", "y")
+    assert bars.set_index("grp")["y"].to_dict() == pytest.approx(df.groupby("grp")["y"].sum().to_dict())
+
+    small, info = prepare_chart_data(df.head(100), "scatter", "x", "y")
+    assert not info["reduced"] and len(small) == 100
+
+    hist = histogram_bins(df["x"], nbins=10)
+    assert hist["count"].sum() == n
+    fit = linear_fit(pd.DataFrame({"a": [0.0, 1.0, 2.0], "b": [1.0, 3.0, 5.0]}), "a", "b")
+    assert fit["b"].tolist() == pytest.approx([1.0, 5.0])
@@ -0,0 +1,53 @@
+
+import gzip
+import json
+import math
+import pytest
+from core.enums import DataCategory
+from utils.data_codec import (
+    DATA_FORMATS, FORMAT_GZIP, FORMAT_PRETTY, encode_data, decode_data, detect_format, read_data_file
+)
+
+
+def test_encode_decode_all_formats():
+    """测试各格式往返一致且读取时自动识别"""
+    data = {"raw_materials": [{"id": 1, "name": "水泥", "price": 0.45, "tags": ["a"], "note": None}], "n": 10 ** 20}
+    for fmt in DATA_FORMATS:
+        assert decode_data(encode_data(data, fmt)) == data
+    assert detect_format(encode_data(data, FORMAT_GZIP)) == FORMAT_GZIP
+    assert "水泥" in encode_data(data, FORMAT_PRETTY).decode("utf-8")
+    with pytest.raises(ValueError):
+        encode_data(data, "xml")
+
+
+def test_non_finite_floats_preserved_and_pretty_unchanged():
+    """测试 NaN / Infinity 在各格式中保留 (不被写为 null)，缩进格式与标准库输出一致"""
+    data = {"a": float("nan"), "b": [float("inf"), None], "c": "中"}
+    for fmt in DATA_FORMATS:
+        decoded = decode_data(encode_data(data, fmt))
+        assert math.isnan(decoded["a"]) and decoded["b"] == [float("inf"), None]
+    plain = {"a": [1, None], "b": "中"}
+    assert encode_data(plain, FORMAT_PRETTY) == json.dumps(plain, ensure_ascii=False, indent=4).encode("utf-8")
+
+
+def test_legacy_files_read_transparently(tmp_path):
+    """测试旧格式 (缩进、BOM、NaN 字面量) 仍可读取"""
+    path = tmp_path / "data.json"
+    path.write_bytes(b"\xef\xbb\xbf" + json.dumps({"v": float("nan"), "s": "中"}, indent=4, ensure_ascii=False).encode("utf-8"))
+    data = read_data_file(path)
+    assert math.isnan(data["v"]) and data["s"] == "中"
+
+
+def test_data_service_switches_format(data_service):
+    """测试切换为压缩格式后保存、读取与原始 JSON 内容均透明"""
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [{"id": 1, "name": "水泥"}]
+    data_service.data_format = FORMAT_GZIP
+    assert data_service.save_data(data)
+    raw = data_service.data_file.read_bytes()
+    assert detect_format(raw) == FORMAT_GZIP
+    assert json.loads(gzip.decompress(raw))[DataCategory.RAW_MATERIALS.value][0]["name"] == "水泥"
+
+    data_service._data_cache = None
+    assert data_service.load_data()[DataCategory.RAW_MATERIALS.value] == [{"id": 1, "name": "水泥"}]
+    assert json.loads(data_service.get_json_content())[DataCategory.RAW_MATERIALS.value][0]["id"] == 1
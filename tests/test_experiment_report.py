@@ -0,0 +1,58 @@
+import zipfile
+from datetime import date
+from openpyxl import load_workbook
+import services.experiment_report as experiment_report
+from services.experiment_report import (
+    filter_experiments, write_batch_report, report_sheet_title, BATCH_MODE_ZIP, REPORT_SAMPLE
+)
+
+
+def _experiments(n):
+    return [{
+        "id": i, "formula_name": f"PC-{i % 3}", "operator": "张三" if i % 2 else "李四",
+        "test_date": f"2024-03-{i + 1:02d}", "water_cement_ratio": 0.45,
+        "test_recipes": [{"name": "基准", "performance": {"strengths": {"7d": 20.0 + i, "28d": 35.0 + i}}}],
+    } for i in range(n)]
+
+
+def test_filter_experiments():
+    """测试按日期、配方、人员及ID筛选实验"""
+    records = _experiments(6) + [{"id": 99, "formula_name": "PC-0", "created_at": "2024-03-02 10:00:00"}]
+    assert [r["id"] for r in filter_experiments(records, formula_name="PC-0")] == [0, 3, 99]
+    assert [r["id"] for r in filter_experiments(records, operator="张三")] == [1, 3, 5]
+    got = filter_experiments(records, date_from=date(2024, 3, 2), date_to=date(2024, 3, 3))
+    assert [r["id"] for r in got] == [1, 2, 99]
+    assert [r["id"] for r in filter_experiments(records, experiment_ids=["4", 5])] == [4, 5]
+
+    used = set()
+    titles = [report_sheet_title({"id": 1, "formula_name": "A/B:" + "长" * 40}, used) for _ in range(2)]
+    assert titles[0] == "1_A_B_" + "长" * 25 and titles[1].endswith("_2") and len(titles[1]) == 31
+
+
+def test_write_batch_report_workbook_and_zip(tmp_path, monkeypatch):
+    """测试批量报告：单工作簿含目录，ZIP 按实测耗时选择串行或多进程生成"""
+    experiments = _experiments(3)
+    path = tmp_path / "batch.xlsx"
+    assert write_batch_report("concrete", experiments, path) == 3
+    wb = load_workbook(path)
+    assert wb.sheetnames == ["报告目录", "0_PC-0", "1_PC-1", "2_PC-2"]
+    assert [row[4] for row in list(wb["报告目录"].values)[1:]] == wb.sheetnames[1:]
+    assert wb["1_PC-1"]["A1"].value.startswith("混凝土外加剂性能试验报告")
+
+    # 报告生成仅需毫秒级，未达到进程池启动开销时串行
+    monkeypatch.setattr(experiment_report, "ProcessPoolExecutor", None)
+    write_batch_report("mortar", _experiments(10), tmp_path / "serial.zip", mode=BATCH_MODE_ZIP)
+    monkeypatch.undo()
+
+    many = _experiments(REPORT_SAMPLE + 7)
+    stages = []
+    zpath = tmp_path / "batch.zip"
+    monkeypatch.setattr(experiment_report, "choose_workers", lambda *args, **kwargs: 2)
+    write_batch_report("mortar", many, zpath, mode=BATCH_MODE_ZIP,
+                       progress=lambda f, s: stages.append(f))
+    with zipfile.ZipFile(zpath) as zf:
+        names = zf.namelist()
+        assert len(names) == len(many) and names[0] == "砂浆实验报告_0_PC-0.xlsx"
+        with zf.open(names[-1]) as f:
+            assert load_workbook(f)["砂浆实验报告"]["A1"].value.startswith("混凝土外加剂匀质性试验报告")
+    assert stages[-1] == 1.0 and stages == sorted(stages)
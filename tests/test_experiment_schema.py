@@ -0,0 +1,60 @@
+
+import numpy as np
+import pandas as pd
+from services.experiment_schema import (
+    EXPERIMENT_SCHEMAS, parse_age_days, parse_flow_minutes, strength_long, fluidity_long
+)
+
+
+def test_parse_age_and_flow_labels():
+    """测试龄期与流动度时间点解析"""
+    assert parse_age_days("7d") == 7
+    assert parse_age_days("1y") == 365
+    assert parse_age_days("12h") == 0.5
+    assert parse_age_days("28天") == 28
+    assert parse_age_days("abc") == 0
+    assert parse_age_days("3mo") == 90 and parse_age_days("3m") == 0
+    assert sorted(["28d", "1y", "3d", "1d"], key=parse_age_days) == ["1d", "3d", "28d", "1y"]
+    assert parse_flow_minutes("初始") == 0
+    assert parse_flow_minutes("1_5h") == 90
+    assert parse_flow_minutes("30min") == 30
+    assert np.isnan(parse_flow_minutes("?")) and np.isnan(parse_flow_minutes("60m"))
+
+
+def test_typed_flatten_concrete_and_paste():
+    """测试按结构扁平化：每个配方一行，float32/category 类型，强度长表"""
+    concrete = [{
+        "id": 1, "formula_name": "C30", "test_date": "2026-01-18 23:07", "water_cement_ratio": 0.4,
+        "materials": {"binders": [{"name": "水泥", "dosage": 300.0}], "water": 160.0, "total_binder": 300.0},
+        "test_recipes": [
+            {"id": "r1", "name": "配方1", "components": [{"name": "母液A", "dosage": 12.0}],
+             "performance": {"air_content": 2.1, "p_初始": {"slump": 200, "spread": 500},
+                             "strengths": {"7d": 30.5, "28d": 45.0}}},
+            {"id": "r2", "name": "配方2", "components": [],
+             "performance": {"strengths": {"28d": 41.0, "3d": 0.0}}},
+        ],
+    }, {"id": 2, "formula_name": "C35", "water_cement_ratio": "0.38"}]
+
+    df = EXPERIMENT_SCHEMAS["concrete"].flatten(concrete)
+    assert list(df["id"]) == [1, 1, 2]
+    assert df["water_cement_ratio"].dtype == np.float32
+    assert df["water_cement_ratio"].iloc[2] == np.float32(0.38)
+    assert isinstance(df["formula_name"].dtype, pd.CategoricalDtype)
+    assert df["slump_initial_mm"].iloc[0] == 200
+    assert df["binder_水泥"].iloc[1] == 300
+    assert df["component_母液A"].iloc[0] == 12
+    assert pd.isna(df["recipe_id"].iloc[2])
+    assert pd.api.types.is_datetime64_any_dtype(df["test_date"])
+
+    long = strength_long(df)
+    assert list(zip(long["recipe_name"], long["age"].astype(str), long["strength"])) == [
+        ("配方1", "7d", np.float32(30.5)), ("配方1", "28d", np.float32(45.0)), ("配方2", "28d", np.float32(41.0))
+    ]
+
+    paste = [{"id": 5, "formula_name": "P1", "performance": {
+        "flow_initial_mm": 220.0, "std_flow_initial_mm": 210.0, "flow_1h_mm": 200.0, "flow_2h_mm": 0.0,
+        "standard_sample_name": "自定义/无"}}]
+    flows = fluidity_long(EXPERIMENT_SCHEMAS["paste"].flatten(paste))
+    assert list(flows["minutes"]) == [0, 60]
+    assert list(flows["flow_mm"]) == [220, 200]
+    assert flows["std_flow_mm"].iloc[0] == 210
@@ -0,0 +1,72 @@
+
+from pathlib import Path
+from openpyxl import load_workbook
+from core.enums import DataCategory
+from services.export_jobs import ExportJobService, EXPORT_FULL, EXPORT_REPORT, EXPORT_BATCH_REPORT
+
+
+def test_export_jobs_run_in_background_and_cache(data_service, tmp_path):
+    """测试后台导出、进度及按数据代数缓存文件"""
+    data = data_service.load_data()
+    data[DataCategory.CONCRETE_EXPERIMENTS.value] = [{
+        "id": 7, "formula_name": "C30", "water_cement_ratio": 0.45,
+        "test_recipes": [{"name": "基准", "performance": {"strengths": {"7d": 25.0, "28d": 36.5}}}],
+    }]
+    data_service.save_data(data)
+    service = ExportJobService(data_service, output_dir=tmp_path)
+
+    ok, job_id = service.submit(EXPORT_FULL)
+    assert ok
+    job = service.wait(job_id, timeout=30)
+    assert job["status"] == "done" and job["progress"] == 1.0
+    assert "混凝土实验" in load_workbook(job["path"], read_only=True).sheetnames
+
+    # 数据未变化：命中缓存，直接完成
+    ok, again = ExportJobService(data_service, output_dir=tmp_path).submit(EXPORT_FULL)
+    cached = service.get_job(again)
+    assert cached["status"] == "done" and cached["message"] == "命中缓存" and cached["path"] == job["path"]
+
+    params = {"experiment_type": "concrete", "experiment_id": 7, "strength_chart_type": "bar"}
+    ok, report_id = service.submit(EXPORT_REPORT, params)
+    report = service.wait(report_id, timeout=30)
+    assert report["status"] == "done" and report["file_name"].startswith("混凝土实验报告_7_")
+    ws = load_workbook(report["path"])["混凝土实验报告"]
+    assert ws["A1"].value.startswith("混凝土外加剂性能试验报告")
+
+    # 报告所属集合变化后重新生成
+    data_service.save_data(data_service.load_data(), changed=[DataCategory.CONCRETE_EXPERIMENTS.value])
+    ok, rebuilt_id = service.submit(EXPORT_REPORT, params)
+    rebuilt = service.wait(rebuilt_id, timeout=30)
+    assert rebuilt["message"] == "导出完成" and rebuilt["path"] != report["path"]
+
+    ok, missing_id = service.submit(EXPORT_REPORT, {"experiment_type": "concrete", "experiment_id": 99})
+    assert service.wait(missing_id, timeout=30)["status"] == "failed"
+    assert service.submit(EXPORT_REPORT, {"experiment_type": "paste", "experiment_id": 1}) == (False, "不支持的实验类型")
+    assert Path(job["path"]).parent == tmp_path
+
+    ok, batch_id = service.submit(EXPORT_BATCH_REPORT, {"experiment_type": "concrete", "mode": "zip",
+                                                        "date_from": "2024-01-01", "experiment_ids": [7]})
+    batch = service.wait(batch_id, timeout=60)
+    assert batch["status"] == "failed" and "没有符合条件" in batch["message"]  # 记录无日期，被日期条件排除
+    ok, batch_id = service.submit(EXPORT_BATCH_REPORT, {"experiment_type": "concrete", "mode": "zip"})
+    batch = service.wait(batch_id, timeout=60)
+    assert batch["path"].endswith(".zip") and batch["file_name"].endswith(".zip")
+    assert service.submit(EXPORT_BATCH_REPORT, {"experiment_type": "concrete", "mode": "pdf"})[0] is False
+
+
+def test_export_jobs_dedupe_running_and_evict_finished(data_service, tmp_path):
+    """测试同一导出进行中时复用任务 (缓存文件已被清理也不重复生成)，登记超限只淘汰已结束任务"""
+    from services.export_jobs import ExportJobRegistry
+    service = ExportJobService(data_service, output_dir=tmp_path)
+    key = service.artifact_key(EXPORT_FULL, {})
+    with service.registry.lock:
+        service.registry.artifacts[key] = {"path": str(tmp_path / "removed.xlsx"), "file_name": "x.xlsx"}
+        service.registry.add_job({"job_id": "busy", "artifact_key": key, "status": "running"})
+    assert service.submit(EXPORT_FULL) == (True, "busy")
+
+    registry = ExportJobRegistry(max_jobs=1)
+    with registry.lock:
+        registry.add_job({"job_id": "a", "status": "pending"})
+        registry.add_job({"job_id": "b", "status": "done"})
+        registry.add_job({"job_id": "c", "status": "running"})
+    assert list(registry.jobs) == ["a", "c"]
@@ -0,0 +1,40 @@
+
+import os
+import time
+from pathlib import Path
+from openpyxl import load_workbook
+from core.enums import DataCategory
+from services.export_service import ExportService, EXPORT_FILE_PREFIX
+
+
+def test_export_to_excel_streams_all_collections(data_service, tmp_path):
+    """测试导出写入临时文件，含 SAP 台账及嵌套字段"""
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [{"id": 1, "name": "水泥\x01", "tags": ["a", "b"]}]
+    data[DataCategory.INVENTORY_RECORDS.value] = [
+        {"id": 1, "material_id": 1, "type": "in", "quantity": 10},
+        {"id": 2, "material_id": 1, "type": "consume_out", "quantity": 2, "reason": "生产"},
+    ]
+    data[DataCategory.USERS.value] = [{"username": "admin", "password_hash": "x"}]
+    data_service.save_data(data)
+
+    out_dir = tmp_path / "exports"
+    stale = out_dir / f"{EXPORT_FILE_PREFIX}old.xlsx"
+    out_dir.mkdir()
+    stale.write_bytes(b"")
+    os.utime(stale, (time.time() - 3 * 86400,) * 2)
+
+    ok, path = ExportService(data_service, output_dir=out_dir).export_to_excel()
+    assert ok and Path(path).parent == out_dir
+    assert not stale.exists()
+
+    wb = load_workbook(path)
+    assert "原材料台账" in wb.sheetnames and "数据字典" in wb.sheetnames
+    assert not any("用户" in name for name in wb.sheetnames)
+    ledger = list(wb["原材料台账"].values)
+    assert ledger[0] == ("id", "material_id", "type", "quantity", "reason")
+    assert ledger[1][-1] is None and ledger[2][-1] == "生产"
+    materials = list(wb["原材料"].values)
+    assert materials[1] == (1, "水泥", '["a", "b"]')
+    summary = {row[0]: row[2] for row in list(wb["数据字典"].values)[1:]}
+    assert summary["原材料台账"] == 2 and summary["项目"] == 0
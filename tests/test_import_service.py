@@ -0,0 +1,89 @@
+
+from datetime import datetime
+from io import BytesIO
+from openpyxl import Workbook
+from core.enums import DataCategory
+from services.export_service import write_excel_export
+from services.import_service import ImportService, plan_collection, CONFLICT_OVERWRITE, IMPORT_MODE_REPLACE
+
+
+def _workbook(sheets):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, rows in sheets.items():
+        ws = wb.create_sheet(title)
+        for row in rows:
+            ws.append(row)
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_plan_collection_matches_by_id_and_natural_key():
+    """测试按 ID / 业务键匹配，新增分配 ID，文件内重复行合并"""
+    existing = [{"id": 1, "name": "水泥", "material_number": "M-1", "price": 1},
+                {"id": 2, "name": "砂", "price": 2}]
+    rows = [
+        {"id": 1, "price": 1},                      # 未变化
+        {"material_number": "M-1", "price": 5},     # 按物料编号匹配 -> 冲突
+        {"name": "砂", "price": 3},                 # 按名称匹配 -> 冲突
+        {"id": 2, "name": "石子"},                  # ID 被占用但按 ID 匹配 -> 冲突
+        {"name": "粉煤灰", "price": 4},             # 新增
+        {"name": "粉煤灰", "price": 4},             # 文件内重复 -> 未变化
+        {"id": 1, "name": "矿粉"},                  # 业务键不同但 ID 命中
+    ]
+    keys = (("material_number",), ("name",))
+    records, stats = plan_collection(existing, rows, keys)
+    assert stats == {"insert": 1, "update": 0, "unchanged": 2, "skip": 4, "delete": 0}
+    assert records[:2] == existing and records[2] == {"id": 3, "name": "粉煤灰", "price": 4}
+
+    records, stats = plan_collection(existing, rows, keys, conflict=CONFLICT_OVERWRITE)
+    assert stats["update"] == 4
+    assert records[0] == {"id": 1, "name": "矿粉", "material_number": "M-1", "price": 5}
+    assert existing[0]["price"] == 1  # 原列表不被修改
+
+    records, stats = plan_collection(existing, [{"id": 7, "name": "A"}, {"name": "B"}], keys, IMPORT_MODE_REPLACE)
+    assert [r["id"] for r in records] == [7, 8] and stats["delete"] == 2
+
+
+def test_import_excel_dry_run_and_commit(data_service, tmp_path):
+    """测试导出文件回导无变化、预演不保存、提交一次写入"""
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [
+        {"id": 1, "name": "水泥", "unit": "kg", "tags": ["a"]},
+        {"id": 2, "name": "砂", "unit": "kg"},
+    ]
+    data[DataCategory.PERFORMANCE_DATA.value]["synthesis"] = [{"id": 1, "solid": 40.5}]
+    data_service.save_data(data)
+    service = ImportService(data_service)
+
+    path = tmp_path / "export.xlsx"
+    write_excel_export(data_service.load_data(), path)
+    ok, message = service.import_excel(path.open("rb"))
+    assert ok and "原材料: 新增 0，更新 0，未变化 2" in message
+
+    workbook = _workbook({
+        "原材料": [["id", "name", "unit", "created_date"],
+                   [None, "水泥", "t", None],
+                   [None, "减水剂", "kg", datetime(2024, 3, 1)]],
+        "原材料_2": [["id", "name"], [None, "石粉"]],
+        "合成性能数据": [["id", "solid"], [1, 41.0]],
+        "用户": [["username"], ["hacker"]],
+    })
+    revision = data_service.get_revision()
+    ok, message = service.import_excel(workbook, conflict=CONFLICT_OVERWRITE, dry_run=True)
+    assert ok and message.startswith("原材料: 新增 2，更新 1") and "合成性能数据: 新增 0，更新 1" in message
+    assert data_service.get_revision() == revision
+
+    ok, message = service.import_excel(workbook, conflict=CONFLICT_OVERWRITE)
+    assert ok and data_service.get_revision() == revision + 1
+    saved = data_service.load_data()
+    materials = saved[DataCategory.RAW_MATERIALS.value]
+    assert materials[0] == {"id": 1, "name": "水泥", "unit": "t", "tags": ["a"]}
+    assert materials[2] == {"id": 3, "name": "减水剂", "unit": "kg", "created_date": "2024-03-01"}
+    assert materials[3]["id"] == 4
+    assert saved[DataCategory.PERFORMANCE_DATA.value]["synthesis"] == [{"id": 1, "solid": 41}]
+    assert saved[DataCategory.USERS.value] == []
+
+    assert service.import_excel(_workbook({"其他": [["a"], [1]]})) == (False, "未找到可导入的工作表")
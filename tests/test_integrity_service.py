@@ -0,0 +1,81 @@
+
+import json
+import pytest
+from core.enums import DataCategory
+from services.integrity_service import (
+    CHECKS, SEVERITY_ERROR, SEVERITY_WARNING, IntegrityService, make_issue, register_check, run_integrity_checks
+)
+
+
+def _data():
+    return {
+        DataCategory.RAW_MATERIALS.value: [
+            {"id": 1, "name": "水泥", "unit": "kg", "stock_quantity": 1500},
+            {"id": 2, "name": "减水剂", "unit": "kg", "stock_quantity": 0.05},
+            {"id": 3, "name": "水", "unit": "kg", "stock_quantity": 0},
+        ],
+        DataCategory.INVENTORY_RECORDS.value: [
+            {"id": 1, "material_id": 1, "type": "in", "quantity": 2, "unit": "吨"},
+            {"id": 2, "material_id": 1, "type": "consume_out", "quantity": 600, "unit": "kg", "related_doc_id": 7},
+            {"id": 3, "material_id": 1, "type": "return_in", "quantity": 100, "unit": "kg", "related_doc_id": 7},
+            {"id": 4, "material_id": 2, "type": "in", "quantity": 0.05, "unit": "kg"},
+            {"id": 5, "material_id": 2, "type": "return_in", "quantity": 1, "unit": "kg", "related_doc_id": 8},
+            {"id": 5, "material_id": 99, "type": "in", "quantity": 1, "unit": "L"},
+            {"id": 6, "material_id": 3, "type": "consume_out", "quantity": 50, "unit": "kg"},
+        ],
+        DataCategory.PRODUCT_INVENTORY.value: [{"id": 1, "product_name": "速凝剂", "stock_quantity": 30}],
+        DataCategory.PRODUCT_INVENTORY_RECORDS.value: [
+            {"id": 1, "product_name": "WJ-速凝剂", "type": "produce_in", "quantity": 50},
+            {"id": 2, "product_name": "速凝剂", "type": "SHIP_OUT", "quantity": 20},
+            {"id": 3, "product_name": "不存在", "type": "in", "quantity": 1},
+        ],
+        DataCategory.BOM_VERSIONS.value: [{"id": 1, "bom_id": 5}],
+        DataCategory.USERS.value: [{"id": 1}, {"id": 1}],
+    }
+
+
+def _found(report, check):
+    return {(i["collection"], i["record_id"], i["severity"]) for i in report["issues"] if i["check"] == check}
+
+
+def test_checks_find_expected_issues():
+    """测试各检查项发现预期问题，且水等免库存物料、成品名称前缀匹配不误报"""
+    report = run_integrity_checks(_data())
+    records = DataCategory.INVENTORY_RECORDS.value
+
+    assert _found(report, "duplicate_ids") == {(records, 5, SEVERITY_ERROR)}
+    assert _found(report, "orphan_references") == {
+        (records, 5, SEVERITY_ERROR),
+        (DataCategory.BOM_VERSIONS.value, 1, SEVERITY_ERROR),
+        (DataCategory.PRODUCT_INVENTORY_RECORDS.value, 3, SEVERITY_WARNING),
+    }
+    # 水泥: 2 吨 - 600 + 100 = 1500 kg 一致；减水剂: 0.05 + 1 != 0.05
+    assert _found(report, "ledger_vs_stock") == {(DataCategory.RAW_MATERIALS.value, 2, SEVERITY_ERROR)}
+    assert _found(report, "unit_mismatch") == {(DataCategory.RAW_MATERIALS.value, 2, SEVERITY_WARNING)}
+    chains = {i["record_id"]: i for i in report["issues"] if i["check"] == "issue_return_chains"}
+    assert chains[5]["severity"] == SEVERITY_ERROR and chains[3]["severity"] == SEVERITY_WARNING
+    assert chains[3]["details"]["issue_ids"] == [2]
+
+    assert report["summary"]["total"] == len(report["issues"])
+    assert set(report["checks"]) == set(CHECKS)
+    json.dumps(report)
+
+
+def test_select_and_register_checks(data_service):
+    """测试只运行指定检查项、注册自定义检查项，以及通过服务读取当前数据"""
+    report = run_integrity_checks(_data(), checks=["duplicate_ids"])
+    assert list(report["checks"]) == ["duplicate_ids"]
+    with pytest.raises(ValueError):
+        run_integrity_checks(_data(), checks=["nope"])
+
+    @register_check("no_projects", "没有项目")
+    def _check(index):
+        if not index.records.get(DataCategory.PROJECTS.value):
+            return [make_issue("no_projects", SEVERITY_WARNING, DataCategory.PROJECTS.value, None, "没有项目")]
+        return []
+
+    try:
+        report = IntegrityService(data_service).run(["no_projects", "duplicate_ids"])
+        assert report["summary"] == {"total": 1, SEVERITY_ERROR: 0, SEVERITY_WARNING: 1}
+    finally:
+        CHECKS.pop("no_projects")
@@ -0,0 +1,51 @@
+
+import pandas as pd
+import pytest
+from core.enums import DataCategory
+from services.inventory_report_service import (
+    InventoryReportService, parse_datetimes, period_labels, record_datetimes
+)
+
+
+def test_parse_and_period_labels():
+    """测试向量化时间解析与周/月/年分桶"""
+    values = pd.Series(["2024-01-01 08:00:00", "2024-12-30", "2024/02/03", "", None, "坏数据"])
+    parsed = parse_datetimes(values)
+    assert parsed.iloc[:3].tolist() == [pd.Timestamp("2024-01-01 08:00"), pd.Timestamp("2024-12-30"),
+                                        pd.Timestamp("2024-02-03")]
+    assert parsed.iloc[3:].isna().all()
+    # 2024-12-30 属于 ISO 2025 年第 1 周
+    assert period_labels(parsed, "周").tolist() == ["2024-W01", "2025-W01", "2024-W05", "", "", ""]
+    assert period_labels(parsed, "月").tolist()[:3] == ["2024-01", "2024-12", "2024-02"]
+    assert period_labels(parsed, "年度").tolist()[:3] == ["2024", "2024", "2024"]
+
+    df = pd.DataFrame({"created_at": [None, "2024-03-01 10:00:00"], "date": ["2024-02-01", "2024-01-01"]})
+    assert record_datetimes(df).tolist() == [pd.Timestamp("2024-02-01"), pd.Timestamp("2024-03-01 10:00")]
+
+
+def test_period_statistics_cached_per_generation(data_service):
+    """测试周期汇总及按台账代数缓存"""
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [{"id": 1, "name": "水泥"}]
+    data[DataCategory.INVENTORY_RECORDS.value] = [
+        {"material_id": 1, "type": "consume_out", "quantity": 2, "unit": "ton", "created_at": "2024-01-05 09:00:00"},
+        {"material_id": 1, "type": "consume_out", "quantity": 500, "unit": "kg", "date": "2024-02-01"},
+        {"material_id": 1, "type": "in", "quantity": 999, "unit": "kg", "date": "2024-02-01"},
+    ]
+    data[DataCategory.PRODUCT_INVENTORY_RECORDS.value] = [
+        {"type": "in", "quantity": 3, "date": "2024-01-10"},
+        {"type": "out", "quantity": 1, "date": "2024-01-11", "related_doc_type": "SHIPPING"},
+        {"type": "out", "quantity": 5, "date": "2024-01-11", "related_doc_type": "ADJUST"},
+    ]
+    data_service.save_data(data)
+
+    service = InventoryReportService(data_service)
+    stats = service.get_period_statistics("月")
+    assert stats["mat_agg"].set_index("period")["quantity"].to_dict() == {"2024-01": 2, "2024-02": 500}
+    assert stats["mat_by_type"].loc["水泥"].to_dict() == pytest.approx({"2024-01": 2000.0, "2024-02": 500.0})
+    assert stats["prod_agg"]["quantity"].tolist() == [3]
+    assert stats["ship_agg"]["quantity"].tolist() == [1]
+    assert InventoryReportService(data_service).get_period_statistics("月") is stats
+
+    data_service.save_data(data_service.load_data(), changed=[DataCategory.INVENTORY_RECORDS.value])
+    assert service.get_period_statistics("月") is not stats
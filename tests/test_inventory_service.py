@@ -125,3 +125,61 @@ def test_post_issue_invalid_id(inventory_service):
     success, msg = inventory_service.post_issue(999)
     assert success is False
     assert "不存在" in msg
+
+def test_post_issues_batch(inventory_service, data_service):
+    """测试批量领料过账：累计校验库存，逐单返回结果"""
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value].extend([
+        {"id": 1, "name": "Test Material", "stock_quantity": 100.0, "unit": UnitType.KG.value},
+        {"id": 2, "name": "水", "stock_quantity": 0.0, "unit": UnitType.KG.value}
+    ])
+    data[DataCategory.PRODUCT_INVENTORY.value].append(
+        {"id": 7, "product_name": "母液A", "type": "母液", "stock_quantity": 500.0, "unit": UnitType.KG.value}
+    )
+
+    def _issue(issue_id, qty):
+        return {
+            "id": issue_id,
+            "issue_code": f"ISS-00{issue_id}",
+            "status": IssueStatus.DRAFT.value,
+            "lines": [
+                {"item_id": 1, "item_name": "Test Material", "item_type": MaterialType.RAW_MATERIAL.value,
+                 "required_qty": qty, "uom": UnitType.KG.value},
+                {"item_id": 2, "item_name": "水", "item_type": MaterialType.RAW_MATERIAL.value,
+                 "required_qty": 50.0, "uom": UnitType.KG.value},
+                {"item_id": 99, "item_name": "母液A", "item_type": MaterialType.PRODUCT.value,
+                 "required_qty": 0.1, "uom": UnitType.TON.value}
+            ]
+        }
+
+    # 第三张单据在前两张扣减后库存不足
+    data[DataCategory.MATERIAL_ISSUES.value].extend([_issue(1, 40.0), _issue(2, 40.0), _issue(3, 40.0)])
+    data_service.save_data(data)
+
+    outcomes = inventory_service.post_issues([1, 2, 3, 999])
+
+    assert [o["success"] for o in outcomes] == [True, True, False, False]
+    assert "库存不足" in outcomes[2]["message"]
+    assert "不存在" in outcomes[3]["message"]
+
+    new_data = data_service.load_data()
+    mats = {m["id"]: m for m in new_data[DataCategory.RAW_MATERIALS.value]}
+    assert mats[1]["stock_quantity"] == 20.0
+    assert mats[2]["stock_quantity"] == 0.0
+
+    # 成品按名称容错匹配，吨换算为 kg
+    prod = new_data[DataCategory.PRODUCT_INVENTORY.value][0]
+    assert prod["stock_quantity"] == 300.0
+
+    records = new_data[DataCategory.INVENTORY_RECORDS.value]
+    assert len(records) == 4
+    assert len({r["id"] for r in records}) == 4
+    assert len(new_data[DataCategory.PRODUCT_INVENTORY_RECORDS.value]) == 2
+
+    statuses = {i["id"]: i["status"] for i in new_data[DataCategory.MATERIAL_ISSUES.value]}
+    assert statuses == {1: IssueStatus.POSTED.value, 2: IssueStatus.POSTED.value, 3: IssueStatus.DRAFT.value}
+
+    # 重复过账
+    again = inventory_service.post_issues([1])
+    assert again[0]["success"] is False
+    assert "已过账" in again[0]["message"]
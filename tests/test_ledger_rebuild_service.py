@@ -0,0 +1,100 @@
+
+import pytest
+from core.enums import DataCategory
+from services.ledger_rebuild_service import LedgerRebuildService
+
+RAW = DataCategory.RAW_MATERIALS.value
+PRODUCTS = DataCategory.PRODUCT_INVENTORY.value
+RECORDS = DataCategory.INVENTORY_RECORDS.value
+PRODUCT_RECORDS = DataCategory.PRODUCT_INVENTORY_RECORDS.value
+
+
+def _seed(data_service):
+    data = data_service.load_data()
+    data[RAW] = [{"id": 1, "name": "水泥", "unit": "kg", "stock_quantity": 900.0},
+                 {"id": 2, "name": "水", "unit": "kg", "stock_quantity": 0.0}]
+    data[PRODUCTS] = [{"id": 1, "product_name": "WJSNJ-无碱速凝剂", "unit": "kg", "stock_quantity": 4000.0}]
+    data[DataCategory.BOMS.value] = [{"id": 1, "bom_code": "WJSNJ", "bom_name": "无碱速凝剂", "bom_type": "速凝剂"}]
+    data[DataCategory.GOODS_RECEIPTS.value] = [
+        {"id": 1, "receipt_code": "GR-1", "date": "2026-01-01", "status": "completed",
+         "items": [{"material_id": 1, "quantity": 1.0}]}]
+    data[DataCategory.MATERIAL_ISSUES.value] = [
+        {"id": 1, "issue_code": "ISS-1", "production_order_id": 1, "status": "posted", "posted_at": "2026-01-02 08:00:00",
+         "lines": [{"item_id": 1, "item_name": "水泥", "item_type": "raw_material", "required_qty": 300.0, "uom": "kg"},
+                   {"item_id": 2, "item_name": "水", "item_type": "raw_material", "required_qty": 500.0, "uom": "kg"}]}]
+    data[DataCategory.PRODUCTION_ORDERS.value] = [
+        {"id": 1, "order_code": "PROD-1", "bom_id": 1, "plan_qty": 5000.0, "status": "finished",
+         "finished_at": "2026-01-02 18:00:00"}]
+    data[DataCategory.SHIPPING_ORDERS.value] = []
+    data[RECORDS] = [
+        {"id": 1, "material_id": 1, "type": "in", "quantity": 1000.0, "unit": "kg", "date": "2026-01-01",
+         "related_doc_type": "GOODS_RECEIPT", "related_doc_id": 1},
+        {"id": 2, "material_id": 1, "type": "adjust_in", "quantity": 200.0, "date": "2026-01-01", "reason": "盘点"},
+        {"id": 3, "material_id": 1, "type": "consume_out", "quantity": 300.0, "date": "2026-01-02",
+         "related_doc_type": "ISSUE", "related_doc_id": 1, "operator": "张三"},
+        {"id": 4, "material_id": 2, "type": "consume_out", "quantity": 500.0, "date": "2026-01-02",
+         "related_doc_type": "ISSUE", "related_doc_id": 1},
+    ]
+    # 完工入库流水只以批号关联生产单；成品主库存比台账多 -1000 (历史差异，重建不应改变)
+    data[PRODUCT_RECORDS] = [
+        {"id": 1, "product_name": "WJSNJ-无碱速凝剂", "type": "produce_in", "quantity": 5000.0, "date": "2026-01-02",
+         "batch_number": "PROD-1"}]
+    data_service.save_data(data)
+
+
+def test_first_run_sets_baseline_then_rebuilds_only_changed_documents(data_service, tmp_path):
+    """测试首次建立水位线，之后只重建修改的单据，保留手工流水与 ID，按差额调整库存"""
+    _seed(data_service)
+    service = LedgerRebuildService(data_service, tmp_path / "ledger_state.json")
+    assert service.plan(full=True)["segments"] == []   # 台账与单据一致
+    ok, message = service.rebuild()
+    assert ok and "水位线" in message
+    assert service.rebuild()[1].startswith("无需重建")
+
+    data = data_service.load_data()
+    data[DataCategory.MATERIAL_ISSUES.value][0]["lines"][0]["required_qty"] = 350.0
+    data[DataCategory.PRODUCTION_ORDERS.value][0]["plan_qty"] = 6000.0
+    data_service.save_data(data)
+
+    plan = service.plan()
+    assert [(p["segment"], p["reason"]) for p in plan["segments"]] == [("MATERIAL_ISSUE:1", "修改"), ("PRODUCTION_ORDER:1", "修改")]
+    revision = data_service.get_revision()
+    assert service.rebuild(dry_run=True)[0] and data_service.get_revision() == revision
+
+    ok, message = service.rebuild()
+    assert ok, message
+    data = data_service.load_data()
+    records = {r["id"]: r for r in data[RECORDS]}
+    assert records[2]["type"] == "adjust_in"                       # 手工盘点保留
+    assert records[3]["quantity"] == 350.0 and records[3]["operator"] == "张三"  # 沿用原 ID 与操作人
+    assert records[1]["quantity"] == 1000.0                         # 未变化的收货单不动
+    assert data[RAW][0]["stock_quantity"] == pytest.approx(850.0)
+    assert data[RAW][1]["stock_quantity"] == 0.0                    # 免库存物料
+    assert data[PRODUCTS][0]["stock_quantity"] == pytest.approx(5000.0)
+    assert data[PRODUCT_RECORDS][0]["related_doc_type"] == "PRODUCTION_ORDER"
+    assert service.verify() == {"watermark": service.load_state()["watermark"], "pending": [], "drifted": []}
+
+
+def test_deleted_and_cancelled_documents_and_verify(data_service, tmp_path):
+    """测试撤销 / 删除单据移除其流水，verify 报告待重建分段与检查点变化"""
+    _seed(data_service)
+    service = LedgerRebuildService(data_service, tmp_path / "ledger_state.json")
+    service.rebuild()
+
+    data = data_service.load_data()
+    data[DataCategory.MATERIAL_ISSUES.value][0]["status"] = "cancelled"
+    data[DataCategory.GOODS_RECEIPTS.value] = []
+    data[RAW][0]["stock_quantity"] = 950.0   # 绕过台账直接改库存
+    data_service.save_data(data)
+
+    result = service.verify()
+    assert result["pending"] == ["GOODS_RECEIPT:1", "MATERIAL_ISSUE:1"]
+    assert [d["item"] for d in result["drifted"]] == ["原材料 水泥"]
+
+    ok, _ = service.rebuild()
+    assert ok
+    data = data_service.load_data()
+    assert [r["id"] for r in data[RECORDS]] == [2]
+    assert data[RAW][0]["stock_quantity"] == pytest.approx(950.0 - 1000.0 + 300.0)
+    with pytest.raises(ValueError):
+        service.plan(segments=["ORDER:1"])
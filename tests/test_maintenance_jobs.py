@@ -0,0 +1,126 @@
+
+import pytest
+from core.enums import DataCategory
+import services.maintenance_jobs as maintenance_jobs
+from services.maintenance_jobs import MaintenanceJobRunner, apply_patches, set_fields, add_record, ref_id
+
+
+def _seed(data_service, **collections):
+    data = data_service.load_data()
+    data.update(collections)
+    assert data_service.save_data(data)
+    return data_service.get_revision()
+
+
+def test_recalculate_stock_dry_run_and_single_commit(data_service):
+    """测试重算库存：预演不修改数据，正式执行一次保存"""
+    revision = _seed(data_service, **{
+        DataCategory.RAW_MATERIALS.value: [{"id": 1, "name": "水泥", "unit": "kg", "stock_quantity": 0.0},
+                                           {"id": 2, "name": "砂", "unit": "吨", "stock_quantity": 1.0}],
+        DataCategory.INVENTORY_RECORDS.value: [
+            {"id": 1, "material_id": 1, "type": "in", "quantity": 2, "unit": "吨"},
+            {"id": 2, "material_id": 1, "type": "consume_out", "quantity": 500, "unit": "kg"},
+            {"id": 3, "material_id": 2, "type": "in", "quantity": 1000, "unit": "kg"},
+        ]})
+    runner = MaintenanceJobRunner(data_service)
+
+    ok, message = runner.run("recalculate_stock", dry_run=True)
+    assert ok and "修改 1" in message
+    assert data_service.get_revision() == revision
+
+    ok, message = runner.run("recalculate_stock")
+    assert ok, message
+    assert data_service.get_revision() == revision + 1
+    materials = data_service.load_data()[DataCategory.RAW_MATERIALS.value]
+    assert materials[0]["stock_quantity"] == pytest.approx(1500.0)
+    assert "last_stock_update" not in materials[1]
+    assert runner.run("recalculate_stock")[1].endswith("无需修改 (检查 2 项)")
+
+
+def test_run_refuses_plan_older_than_data(data_service):
+    """测试执行须基于预演时的数据：预演后数据有变化则拒绝提交"""
+    _seed(data_service, **{
+        DataCategory.RAW_MATERIALS.value: [{"id": 1, "name": "水泥", "unit": "kg", "stock_quantity": 0.0}],
+        DataCategory.INVENTORY_RECORDS.value: [{"id": 1, "material_id": 1, "type": "in", "quantity": 5, "unit": "kg"}]})
+    runner = MaintenanceJobRunner(data_service)
+    plan = runner.plan("recalculate_stock")
+    data_service.save_data(data_service.load_data(), changed=[DataCategory.PROJECTS.value])
+    ok, message = runner.run("recalculate_stock", expected_revision=plan["revision"])
+    assert not ok and "重新预演" in message
+    assert data_service.load_data()[DataCategory.RAW_MATERIALS.value][0]["stock_quantity"] == 0.0
+    assert runner.run("recalculate_stock", expected_revision=runner.plan("recalculate_stock")["revision"])[0]
+
+
+def test_serial_and_parallel_results_match(data_service, monkeypatch):
+    """测试进程池分区执行与串行执行得到相同差异"""
+    _seed(data_service, **{
+        DataCategory.INVENTORY_RECORDS.value: [
+            {"id": i, "material_id": 1, "type": "consume_out" if i % 2 else "return_in", "quantity": 1} for i in range(1, 41)],
+        DataCategory.PRODUCT_INVENTORY_RECORDS.value: [
+            {"id": i, "product_name": "PC-001母液", "type": "produce_in", "quantity": 1, "unit": "ton"} for i in range(1, 11)],
+    })
+    runner = MaintenanceJobRunner(data_service)
+    serial = runner.plan("fix_units_by_type")
+    monkeypatch.setattr(maintenance_jobs.FixUnitsByTypeJob, "parallel", True)
+    monkeypatch.setattr(maintenance_jobs, "SAMPLE_ENTITIES", 5)
+    monkeypatch.setattr(maintenance_jobs, "choose_workers", lambda *args, **kwargs: 2)
+    parallel = runner.plan("fix_units_by_type")
+    assert serial["diff"] == parallel["diff"] and len(serial["diff"]) == 50
+    assert {d["new"] for d in serial["diff"]} == {"kg"}
+
+
+def test_builtin_jobs_run_serially(data_service, monkeypatch):
+    """测试内置作业单实体耗时极短，不启动进程池"""
+    _seed(data_service, **{
+        DataCategory.RAW_MATERIALS.value: [{"id": i, "name": f"M{i}", "unit": "kg", "stock_quantity": 0.0} for i in range(1, 301)],
+        DataCategory.INVENTORY_RECORDS.value: [{"id": i, "material_id": i, "type": "in", "quantity": 1} for i in range(1, 301)],
+    })
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("不应启动进程池")
+    monkeypatch.setattr(maintenance_jobs, "ProcessPoolExecutor", no_pool)
+    runner = MaintenanceJobRunner(data_service)
+    for job in maintenance_jobs.JOBS:
+        runner.plan(job)
+    plan = runner.plan("recalculate_stock")
+    assert len(plan["diff"]) == 600 and plan["duration_ms"] < 1000
+
+    # 声明 parallel 的作业同样按实测耗时判断：微秒级实体不值得启动进程池
+    monkeypatch.setattr(maintenance_jobs.RecalculateStockJob, "parallel", True)
+    assert len(runner.plan("recalculate_stock")["diff"]) == 600
+
+
+def test_apply_patches_conflicts_and_refs():
+    """测试补丁合并：同一字段不同取值为冲突，新增记录 ID 可被引用"""
+    data = {"a": [{"id": 1, "x": 0}], "b": []}
+    _, _, conflicts = apply_patches(data, [set_fields("a", 1, x=1), set_fields("a", 1, x=2)], ("a",))
+    assert conflicts and data["a"][0]["x"] == 0
+    _, _, conflicts = apply_patches(data, [set_fields("a", 9, x=1)], ("a",))
+    assert conflicts
+
+    result, diff, conflicts = apply_patches(data, [
+        add_record("a", {"name": "n"}, ref="new"), add_record("b", {"a_id": ref_id("new")})], ("a", "b"))
+    assert not conflicts and result["b"] == [{"id": 1, "a_id": 2}] and len(diff) == 2
+
+
+def test_normalize_products(data_service):
+    """测试合并速凝剂别名并补齐必备成品"""
+    _seed(data_service, **{
+        DataCategory.PRODUCT_INVENTORY.value: [
+            {"id": 1, "product_name": "有碱速凝剂", "stock_quantity": 100.0, "unit": "kg"},
+            {"id": 2, "product_name": "碱速凝剂", "current_stock": 50.0, "unit": "kg"},
+        ],
+        DataCategory.PRODUCT_INVENTORY_RECORDS.value: [
+            {"id": 1, "product_name": "碱速凝剂", "type": "produce_in", "quantity": 50.0}],
+    })
+    ok, message = MaintenanceJobRunner(data_service).run("normalize_products")
+    assert ok, message
+    data = data_service.load_data()
+    inventory = {p["product_name"]: p for p in data[DataCategory.PRODUCT_INVENTORY.value]}
+    assert set(inventory) == {"YJSNJ-有碱速凝剂", "WJSNJ-无碱速凝剂", "PC-001母液"}
+    assert inventory["YJSNJ-有碱速凝剂"]["stock_quantity"] == 150.0
+    assert inventory["PC-001母液"]["unit"] == "kg"
+    products = {p["product_name"]: p["id"] for p in data[DataCategory.PRODUCTS.value]}
+    assert inventory["PC-001母液"]["product_id"] == products["PC-001母液"]
+    assert data[DataCategory.PRODUCT_INVENTORY_RECORDS.value][0]["product_name"] == "YJSNJ-有碱速凝剂"
+    assert MaintenanceJobRunner(data_service).run("normalize_products")[1].endswith("无需修改 (检查 2 项)")
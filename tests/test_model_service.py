@@ -0,0 +1,67 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+from services.model_service import ModelService, RidgeModel, GradientBoostingModel, regression_metrics
+
+
+def _dataset(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({"wc": rng.uniform(0.3, 0.5, n), "dosage": rng.uniform(0.5, 2.0, n)})
+    y = pd.Series(80 - 100 * X["wc"] + 10 * np.sin(3 * X["dosage"]) + rng.normal(0, 0.2, n), name="strength")
+    split = np.arange(n) < int(n * 0.8)
+    return {
+        "X_train": X[split], "X_test": X[~split], "y_train": y[split], "y_test": y[~split],
+        "info": {"features": list(X.columns), "target": "strength"},
+    }
+
+
+def test_models_fit():
+    """测试岭回归与梯度提升树的拟合效果"""
+    data = _dataset()
+    X = data["X_train"].to_numpy()
+    linear = RidgeModel(alpha=0.0).fit(X, 80 - 100 * X[:, 0] + 5 * X[:, 1])
+    assert linear.coef_ / linear.scale_ == pytest.approx([-100, 5])
+
+    ridge = RidgeModel().fit(X, data["y_train"].to_numpy())
+
+    gbrt = GradientBoostingModel(n_estimators=150).fit(data["X_train"].to_numpy(), data["y_train"].to_numpy())
+    metrics = regression_metrics(data["y_test"], gbrt.predict(data["X_test"].to_numpy()))
+    assert metrics["r2"] > 0.95
+    # 非线性项上梯度提升优于线性模型
+    assert metrics["rmse"] < regression_metrics(data["y_test"], ridge.predict(data["X_test"].to_numpy()))["rmse"]
+
+
+def test_background_training_cache_and_predict(data_service):
+    """测试后台训练、按数据集哈希缓存及批量预测"""
+    data = _dataset()
+    service = ModelService(data_service)
+    ok, job_id = service.submit_training(data, "gbrt", {"n_estimators": 50})
+    assert ok
+    job = service.wait(job_id, timeout=30)
+    assert job["status"] == "done"
+
+    # 新实例共享缓存，相同数据与参数不再训练
+    ok, again = ModelService(data_service).submit_training(data, "gbrt", {"n_estimators": 50})
+    cached = service.get_job(again)
+    assert cached["status"] == "done" and cached["model_key"] == job["model_key"]
+    assert cached["message"] == "命中模型缓存"
+
+    candidates = pd.DataFrame({"wc": [0.35, 0.45], "dosage": [1.0, None]})
+    preds = service.predict(job["model_key"], candidates)
+    assert list(preds.index) == [0, 1]
+    assert preds.iloc[0] > preds.iloc[1]
+
+    assert service.submit_training(data, "unknown")[0] is False
+
+
+def test_job_registry_evicts_only_finished_jobs():
+    """测试训练任务登记超出上限时只淘汰已结束的任务"""
+    from services.model_service import ModelRegistry
+    registry = ModelRegistry(max_jobs=2)
+    with registry.lock:
+        registry.add_job({"job_id": "a", "status": "running"})
+        registry.add_job({"job_id": "b", "status": "done"})
+        registry.add_job({"job_id": "c", "status": "pending"})
+        registry.add_job({"job_id": "d", "status": "failed"})
+    assert list(registry.jobs) == ["a", "c", "d"]
@@ -0,0 +1,19 @@
+import utils.parallel as parallel
+from utils.parallel import choose_workers
+
+
+def test_choose_workers(monkeypatch):
+    """测试进程池成本估算：单核或单项耗时极短时串行，耗时足够大时按 CPU 数量并行"""
+    monkeypatch.setattr(parallel, "available_cpus", lambda: 1)
+    assert choose_workers(10000, 1.0) == 1
+
+    monkeypatch.setattr(parallel, "available_cpus", lambda: 4)
+    assert choose_workers(300, 20e-6) == 1          # 微秒级实体：串行 6 ms，远小于进程启动开销
+    assert choose_workers(40, 0.016) == 1           # 40 份报告：串行 0.64 s
+    assert choose_workers(1000, 0.016) == 4         # 串行 16 s
+    assert choose_workers(1000, 0.016, max_workers=2) == 2
+    assert choose_workers(1000, 0.016, max_workers=16) == 4
+    assert choose_workers(3, 10.0) == 3
+    # 进程间传递耗时与处理耗时相当时并行无收益
+    assert choose_workers(1000, 0.016, item_transfer_seconds=0.016) == 1
+
@@ -0,0 +1,69 @@
+
+import pytest
+from core.enums import DataCategory, ProductionOrderStatus, IssueStatus
+
+def _seed(data_service):
+    data = data_service.load_data()
+    data[DataCategory.BOMS.value] = [
+        {"id": 1, "bom_code": "", "bom_name": "无碱速凝剂", "bom_type": "速凝剂"},
+        {"id": 2, "bom_code": "PC", "bom_name": "母液A", "bom_type": "母液"},
+    ]
+    data[DataCategory.PRODUCT_INVENTORY.value] = [
+        {"id": 1, "name": "WJSNJ-无碱速凝剂", "stock_quantity": 1.0, "unit": "吨"},
+    ]
+    data[DataCategory.PRODUCTION_ORDERS.value] = [
+        {"id": 1, "order_code": "PO-1", "bom_id": 1, "bom_version_id": 1, "plan_qty": 2000.0, "status": "issued"},
+        {"id": 2, "order_code": "PO-2", "bom_id": 2, "bom_version_id": 1, "plan_qty": 500.0, "status": "issued"},
+        {"id": 3, "order_code": "PO-3", "bom_id": 2, "bom_version_id": 1, "plan_qty": 500.0, "status": "issued"},
+        {"id": 4, "order_code": "PO-4", "bom_id": 2, "bom_version_id": 1, "plan_qty": 100.0, "status": "draft"},
+        {"id": 5, "order_code": "PO-5", "bom_id": 2, "bom_version_id": 1, "plan_qty": 100.0, "status": "finished"},
+    ]
+    data[DataCategory.MATERIAL_ISSUES.value] = [
+        {"id": 1, "production_order_id": 1, "status": IssueStatus.POSTED.value, "lines": []},
+        {"id": 2, "production_order_id": 2, "status": IssueStatus.POSTED.value, "lines": []},
+        {"id": 3, "production_order_id": 3, "status": IssueStatus.DRAFT.value, "lines": []},
+    ]
+    data_service.save_data(data)
+
+def test_status_index_and_release(data_service):
+    """测试状态索引与批量下达"""
+    _seed(data_service)
+    svc = data_service.production_service
+
+    assert svc.get_status_counts() == {"issued": 3, "draft": 1, "finished": 1}
+    assert [o["id"] for o in svc.get_orders_by_status("draft")] == [4]
+
+    result = svc.release_orders([4, 5, 99])
+    assert [r["success"] for r in result] == [True, False, False]
+    assert result[2]["message"] == "生产单不存在"
+    assert svc.get_status_counts()["released"] == 1
+    assert "draft" not in svc.get_status_counts()
+
+def test_finish_orders_batch(data_service):
+    """测试批量完工：别名解析、自动建档、领料过账检查"""
+    _seed(data_service)
+    svc = data_service.production_service
+
+    bom = data_service.get_all_boms()[0]
+    assert svc.resolve_bom_product(bom)["id"] == 1
+
+    result = svc.finish_orders([1, 2, 3], operator="tester")
+    assert [r["success"] for r in result] == [True, True, False]
+    assert result[2]["message"] == "请先完成所有领料单的过账"
+
+    data = data_service.load_data()
+    inventory = data[DataCategory.PRODUCT_INVENTORY.value]
+    assert inventory[0]["stock_quantity"] == pytest.approx(3.0)
+    assert inventory[1]["name"] == "PC-母液A"
+    assert inventory[1]["stock_quantity"] == pytest.approx(0.5)
+    records = data[DataCategory.PRODUCT_INVENTORY_RECORDS.value]
+    assert [r["id"] for r in records] == [1, 2]
+    assert svc.get_status_counts()["finished"] == 3
+
+    # 单张完工 (兼容接口) 不检查领料状态
+    ok, msg = data_service.finish_production_order(3)
+    assert ok
+    ok, msg = data_service.finish_production_order(3)
+    assert not ok and msg == "生产单已完工"
+    data = data_service.load_data()
+    assert len(data[DataCategory.PRODUCT_INVENTORY.value]) == 2
@@ -0,0 +1,78 @@
+
+import json
+from core.enums import DataCategory
+from services.record_maintenance import RecordMaintenanceService
+
+RAW = DataCategory.RAW_MATERIALS.value
+INVENTORY = DataCategory.INVENTORY_RECORDS.value
+
+
+def _seed(data_service):
+    data = data_service.load_data()
+    data[RAW] = [{"id": 1, "name": "水泥", "unit": "kg"}, {"id": 2, "name": "砂", "unit": "kg"}]
+    # 历史记录缺少必填字段 operator
+    data[INVENTORY] = [{"id": 1, "material_id": 1, "type": "in", "quantity": 10}]
+    data_service.save_data(data)
+    return RecordMaintenanceService(data_service)
+
+
+def test_save_record_only_touches_its_collection(data_service):
+    """测试修改单条记录只替换该记录，其他集合代数不变"""
+    service = _seed(data_service)
+    base = service.get_record_json(RAW, 1)
+    generation = data_service.get_generation(INVENTORY)
+    record = json.loads(base)
+    record["unit"] = "t"
+    ok, message = service.save_record(RAW, 1, json.dumps(record), base_json=base)
+    assert ok, message
+    assert data_service.load_data()[RAW][0]["unit"] == "t"
+    assert data_service.get_generation(INVENTORY) == generation
+
+    # 编辑期间记录被他人修改
+    ok, message = service.save_record(RAW, 1, base, base_json=base)
+    assert not ok and "重新加载" in message
+
+    ok, message = service.save_record(RAW, None, json.dumps({"id": 2, "name": "石子"}))
+    assert not ok and "ID 重复" in message
+    ok, message = service.save_record(RAW, None, json.dumps({"id": 3, "name": "石子"}))
+    assert ok and len(data_service.load_data()[RAW]) == 3
+    assert service.save_record(DataCategory.USERS.value, 1, "{}")[0] is False
+
+
+def test_validation_rejects_only_new_issues(data_service):
+    """测试只拒绝新引入的校验问题，原有问题保留并提示"""
+    service = _seed(data_service)
+    ok, message = service.save_record(RAW, 1, json.dumps({"id": 1, "name": "水泥", "stock_quantity": "很多"}))
+    assert not ok and "stock_quantity" in message
+
+    record = json.loads(service.get_record_json(INVENTORY, 1))
+    record["quantity"] = 12
+    ok, message = service.save_record(INVENTORY, 1, json.dumps(record))
+    assert ok and "operator" in message
+    assert data_service.load_data()[INVENTORY][0]["quantity"] == 12
+
+
+def test_save_collection_page(data_service):
+    """测试按页替换记录 (页内可增删)，重复 ID 与 JSON 错误被拒绝"""
+    service = _seed(data_service)
+    page = json.loads(service.get_collection_json(RAW, offset=1, limit=1))
+    assert page == [{"id": 2, "name": "砂", "unit": "kg"}]
+
+    ok, _ = service.save_collection_page(RAW, json.dumps([{"id": 1, "name": "重复"}]), offset=1, limit=1)
+    assert not ok
+    assert service.save_collection_page(RAW, "[{", offset=1, limit=1)[1].startswith("JSON 解析失败")
+
+    ok, message = service.save_collection_page(
+        RAW, json.dumps([{"id": 2, "name": "河砂"}, {"id": 5, "name": "矿粉"}]), offset=1, limit=1)
+    assert ok, message
+    assert [r["name"] for r in data_service.load_data()[RAW]] == ["水泥", "河砂", "矿粉"]
+
+    # 编辑期间他人删除了前面的记录，页面错位：拒绝保存，页外记录不受影响
+    base = service.get_collection_json(RAW, offset=1, limit=1)
+    data = data_service.load_data()
+    data[RAW] = data[RAW][1:]
+    data_service.save_data(data, changed=[RAW])
+    ok, message = service.save_collection_page(RAW, json.dumps([{"id": 2, "name": "中砂"}]), offset=1, limit=1,
+                                               base_json=base)
+    assert not ok and "已被修改" in message
+    assert [r["name"] for r in data_service.load_data()[RAW]] == ["河砂", "矿粉"]
@@ -0,0 +1,77 @@
+
+import numpy as np
+import pytest
+from core.enums import DataCategory
+from services.similarity_service import SimilarityService, FormulationIndex, calculate_theoretical_solid
+
+
+def _synthesis(rid, pe, aa, water):
+    return {
+        "id": rid, "formula_id": f"F-{rid}",
+        "reactor_materials": [{"material_name": "TPEG", "amount": pe}, {"material_name": "水", "amount": water}],
+        "a_materials": [{"material_name": "丙烯酸", "amount": aa}],
+    }
+
+
+def test_find_similar_and_incremental_sync(data_service):
+    """测试按原料比例的 kNN 查询及增量同步"""
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [
+        {"id": 1, "name": "TPEG", "solid_content": 100},
+        {"id": 2, "name": "丙烯酸", "solid_content": 100},
+        {"id": 3, "name": "水", "solid_content": 0},
+    ]
+    data[DataCategory.SYNTHESIS_RECORDS.value] = [
+        _synthesis(1, 300, 30, 300),
+        _synthesis(2, 600, 60, 600),   # 与 1 比例完全相同
+        _synthesis(3, 300, 120, 100),
+    ]
+    # 成品以 material_id 引用同一原料，应与按名称记录的合成实验落在同一维度
+    data[DataCategory.PRODUCTS.value] = [{
+        "id": 1, "product_name": "P-1",
+        "ingredients": [{"name": "聚醚", "material_id": 1, "amount": 10}, {"name": "水", "amount": 10}],
+    }]
+    data_service.save_data(data)
+
+    service = SimilarityService(data_service)
+    results = service.find_similar("synthesis", 1, k=3)
+    assert [(r["source"], r["id"]) for r in results] == [("synthesis", 2), ("product", 1), ("synthesis", 3)]
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-6)
+    assert results[0]["solid"] == pytest.approx(330 / 630 * 100)
+    assert results[1]["shared_materials"] == ["水"]
+
+    only_products = service.find_similar("synthesis", 1, k=5, sources=["product"])
+    assert [r["id"] for r in only_products] == [1]
+
+    # 新增记录后仅增量更新；删除的记录从结果中消失
+    index = service.index
+    data[DataCategory.SYNTHESIS_RECORDS.value] = [r for r in data[DataCategory.SYNTHESIS_RECORDS.value] if r["id"] != 2]
+    data[DataCategory.SYNTHESIS_RECORDS.value].append(_synthesis(4, 299, 30, 301))
+    data_service.save_data(data, changed=[DataCategory.SYNTHESIS_RECORDS.value])
+    results = SimilarityService(data_service).find_similar("synthesis", 1, k=1)
+    assert SimilarityService(data_service).index is index
+    assert [r["id"] for r in results] == [4]
+
+    adhoc = service.find_similar(ingredients=[{"name": "TPEG", "amount": 1}, {"name": "丙烯酸", "amount": 1}], k=1)
+    assert adhoc[0]["id"] == 3
+
+    # 原材料固含修改后缓存的元数据随之更新
+    data[DataCategory.RAW_MATERIALS.value][0]["solid_content"] = 50
+    data_service.save_data(data, changed=[DataCategory.RAW_MATERIALS.value])
+    results = service.find_similar("synthesis", 1, k=1)
+    assert results[0]["solid"] == pytest.approx((299 * 0.5 + 30) / 630 * 100)
+
+
+def test_formulation_index_grows_and_compacts():
+    """测试索引维度扩展与删除后压缩"""
+    index = FormulationIndex(initial_rows=2, initial_dims=2)
+    for i in range(40):
+        index.upsert(("synthesis", i), {f"m{i}": 0.5, "water": 0.5}, {"label": str(i)})
+    assert index.matrix.shape[1] >= 41
+    for i in range(30):
+        index.remove(("synthesis", i))
+    assert len(index) == 10 and len(index.keys) < 40
+    hits = index.query(index.vectorize({"m35": 1.0}, grow=False), k=2)
+    assert hits[0][0] == ("synthesis", 35)
+    assert np.isclose(hits[0][1], np.sqrt(0.5))
+    assert calculate_theoretical_solid([{"name": "a", "amount": 1}], {}) == 0.0
@@ -0,0 +1,62 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+import services.analysis_service as analysis_service
+from services.analysis_service import AnalysisService
+from services.trend_service import time_matrix, retention_matrix, trend_table, formula_statistics, label_retention
+from core.enums import DataCategory
+
+
+def _long():
+    return pd.DataFrame({
+        "id": [1, 1, 1, 2, 2, 3, 3],
+        "recipe_id": ["r"] * 7,
+        "formula_name": ["A", "A", "A", "A", "A", "B", "B"],
+        "test_date": ["2024-01-01"] * 3 + ["2024-01-05"] * 2 + ["2024-01-03"] * 2,
+        "minutes": [0, 60, 120, 0, 60, 0, 30],
+        "flow_mm": [240, 216, 180, 260, 247, 200, 190],
+    })
+
+
+def test_trend_matrix_retention_and_stats():
+    """测试时间矩阵、保持率、滚动均值与配方统计"""
+    long = _long()
+    matrix = time_matrix(long, "minutes", "flow_mm")
+    assert list(matrix.columns) == [0, 30, 60, 120]
+    assert matrix.shape == (3, 4) and np.isnan(matrix.loc[(2, "r"), 120])
+
+    retention = retention_matrix(matrix)
+    assert retention.loc[(1, "r"), 60] == pytest.approx(90.0)
+    assert retention.loc[(2, "r"), 60] == pytest.approx(95.0)
+
+    trend = trend_table(long, "minutes", "flow_mm", window=2)
+    assert len(trend) == len(long)
+    # 初始流动度按日期排序: 240 (01-01), 200 (01-03), 260 (01-05)
+    initial = trend[trend["time"] == 0].set_index("id")["rolling_mean"]
+    assert initial.loc[1] == pytest.approx(240) and initial.loc[3] == pytest.approx(220)
+    assert initial.loc[2] == pytest.approx(230)
+
+    stats = formula_statistics(trend).set_index(["group", "time"])
+    assert stats.loc[("A", 60), "n"] == 2
+    assert stats.loc[("A", 60), "retention_mean"] == pytest.approx(92.5)
+    assert label_retention([(60, 180.0), (0, 200.0), (np.nan, 100.0)]) == {0: 100.0, 60: 90.0}
+
+
+def test_trend_table_cached_by_generation(data_service, monkeypatch):
+    """测试趋势结果按集合代数缓存"""
+    data = data_service.load_data()
+    data[DataCategory.PASTE_EXPERIMENTS.value] = [{
+        "id": 1, "formula_name": "A", "test_date": "2024-01-01 10:00",
+        "performance": {"flow_initial_mm": 250, "flow_1h_mm": 225, "flow_30min_mm": 240},
+    }]
+    data_service.save_data(data)
+    built = []
+    monkeypatch.setattr(analysis_service, "trend_table", lambda *args: built.append(1) or trend_table(*args))
+    service = AnalysisService(data_service)
+    trend = service.get_trend_table("paste", "fluidity")
+    assert trend.sort_values("time")["retention"].tolist() == pytest.approx([100.0, 96.0, 90.0])
+    assert AnalysisService(data_service).get_trend_table("paste", "fluidity").equals(trend)
+    assert len(built) == 1
+    stats = service.get_trend_statistics("paste", "fluidity")
+    assert stats["group"].unique().tolist() == ["A"]
@@ -0,0 +1,117 @@
+
+import pytest
+from core.enums import DataCategory, MaterialType
+
+def _seed(data_service):
+    data = data_service.load_data()
+    data[DataCategory.RAW_MATERIALS.value] = [
+        {"id": 1, "name": "Acid", "stock_quantity": 100.0},
+        {"id": 2, "name": "Monomer", "stock_quantity": 50.0},
+        {"id": 3, "name": "Unused", "stock_quantity": 0.0},
+    ]
+    data[DataCategory.PRODUCT_INVENTORY.value] = [{"id": 10, "product_name": "PC-50", "stock_quantity": 5.0}]
+    data[DataCategory.SYNTHESIS_RECORDS.value] = [
+        {"id": 7, "formula_id": "F-001", "formula_name": "F1",
+         "reactor_materials": [{"material_name": "Acid", "quantity": 10.0}],
+         "a_materials": [{"material_name": "Monomer", "quantity": 5.0, "material_id": 2}]}
+    ]
+    data[DataCategory.PRODUCTS.value] = [
+        {"id": 1, "product_name": "Blend", "ingredients": [{"name": "Acid", "ratio": 0.5}]}
+    ]
+    data[DataCategory.MOTHER_LIQUORS.value] = [
+        {"id": 1, "name": "ML-1", "source_type": "synthesis", "source_id": 7}
+    ]
+    data[DataCategory.BOM_VERSIONS.value] = [
+        {"id": 1, "bom_id": 5, "version": "V1", "lines": [
+            {"item_type": "raw_material", "item_id": 2, "item_name": "Monomer", "qty": 10.0},
+            {"item_type": "product", "item_id": 10, "item_name": "PC-50", "qty": 1.0},
+        ]}
+    ]
+    data[DataCategory.INVENTORY_RECORDS.value] = [
+        {"id": 1, "material_id": 3, "type": "in", "quantity": 1.0, "reason": "迁移自成品库存: Unused"},
+        {"id": 2, "material_id": 3, "type": "in", "quantity": 1.0, "reason": "采购"},
+    ]
+    data[DataCategory.PRODUCT_INVENTORY_RECORDS.value] = [
+        {"id": 1, "product_name": "PC-50", "type": "in", "quantity": 5.0}
+    ]
+    data_service.save_data(data)
+
+def test_where_used_references(data_service):
+    """测试反向引用索引覆盖各类引用"""
+    _seed(data_service)
+    svc = data_service.where_used_service
+
+    acid = svc.summarize(data_service.get_where_used(1))
+    assert acid == {"synthesis_records": 1, "products": 1, "mother_liquors": 1}
+    monomer = svc.summarize(data_service.get_where_used(2))
+    assert monomer == {"bom_lines": 1, "synthesis_records": 1, "mother_liquors": 1}
+    product = svc.summarize(data_service.get_where_used(10, MaterialType.PRODUCT.value))
+    assert product == {"bom_lines": 1, "ledger": 1}
+
+    # 索引按分段读取集合的代数缓存：无关集合保存不重建，台账保存只重建台账分段
+    index = svc.get_index()
+    assert svc.get_index() is index
+    data_service.save_data(data_service.load_data(), changed=[DataCategory.PROJECTS.value])
+    assert svc.get_index() is index
+    bom_section = svc._sections["bom_lines"]
+    data_service.save_data(data_service.load_data(), changed=[DataCategory.INVENTORY_RECORDS.value])
+    assert svc.get_index() is not index and svc._sections["bom_lines"] is bom_section
+    data_service.save_data(data_service.load_data())
+    svc.get_index()
+    assert svc._sections["bom_lines"] is not bom_section
+
+def test_rename_and_delete_use_index(data_service):
+    """测试改名同步引用、删除检查与迁移清理"""
+    _seed(data_service)
+
+    ok, msg = data_service.delete_raw_material(2)
+    assert not ok and msg.startswith("无法删除") and "共 2 处引用" in msg
+
+    ok, _ = data_service.update_raw_material(2, {"name": "Monomer-X"})
+    assert ok
+    data = data_service.load_data()
+    assert data[DataCategory.SYNTHESIS_RECORDS.value][0]["a_materials"][0]["material_name"] == "Monomer-X"
+    assert data[DataCategory.BOM_VERSIONS.value][0]["lines"][0]["item_name"] == "Monomer-X"
+    ok, _ = data_service.update_raw_material(1, {"name": "Acid-2"})
+    data = data_service.load_data()
+    assert data[DataCategory.PRODUCTS.value][0]["ingredients"][0]["name"] == "Acid-2"
+    assert data[DataCategory.SYNTHESIS_RECORDS.value][0]["reactor_materials"][0]["material_name"] == "Acid-2"
+    assert len(data_service.get_where_used(1)) == 3
+
+    # 索引建立后台账记录位置发生变化，清理仍按记录 ID 处理
+    svc = data_service.where_used_service
+    svc.get_index()
+    data_service.load_data()[DataCategory.INVENTORY_RECORDS.value].reverse()
+    ok, msg = data_service.cleanup_migrated_raw_materials(["Unused"])
+    assert ok
+    data = data_service.load_data()
+    assert [r["id"] for r in data[DataCategory.INVENTORY_RECORDS.value]] == [2]
+    assert all(m["id"] != 3 for m in data[DataCategory.RAW_MATERIALS.value])
+
+def test_concurrent_get_index_rebuilds_once(data_service, monkeypatch):
+    """测试多个会话并发取索引：变化的分段只重建一次，结果与全量构建一致"""
+    import threading
+    import time
+    from services.where_used_service import WhereUsedService
+    _seed(data_service)
+    svc = data_service.where_used_service
+    svc.get_index()
+    data_service.save_data(data_service.load_data(), changed=[DataCategory.BOM_VERSIONS.value])
+
+    builds = []
+    original = WhereUsedService._build_section
+
+    def slow_build(name, data):
+        builds.append(name)
+        time.sleep(0.05)
+        return original(name, data)
+    monkeypatch.setattr(WhereUsedService, "_build_section", staticmethod(slow_build))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(svc.get_index())) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert builds == ["bom_lines"]
+    assert all(r is results[0] for r in results)
+    assert results[0] == WhereUsedService.build_index(data_service.load_data())